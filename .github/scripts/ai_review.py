@@ -7,10 +7,20 @@ Pull Request を自動的にレビューして GitHub にコメントを投稿
 import os
 import sys
 import asyncio
+import sqlite3
 import openai
-from github import Github
+from github import Github, GithubException
 import requests
 
+# Bot と同じ分割レビューエンジンとレビューストアを使う
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'bots', 'code_reviewer'))
+from diff_filter import DiffFilter
+from github_scheduler import PRIORITY_BACKGROUND, get_scheduler
+from review_engine import ChunkedReviewEngine
+from review_findings import Finding, build_review_payload
+from review_store import ReviewStore, review_incrementally
+
 class GitHubActionReviewer:
     """GitHub Actions 用の AI レビューアー"""
     
@@ -24,9 +34,66 @@ class GitHubActionReviewer:
         if not all([self.openai_key, self.github_token, self.repo_owner, self.repo_name]):
             raise ValueError("必要な環境変数が設定されていません")
         
-        self.github = Github(self.github_token)
-        self.repo = self.github.get_repo(f"{self.repo_owner}/{self.repo_name}")
+        # レート制限はスケジューラーで待って再試行するので PyGithub 自体の再試行は使わない
+        self.github = Github(self.github_token, retry=None)
+        self.scheduler = get_scheduler()
+        self.max_rate_limit_wait = float(os.getenv('GITHUB_MAX_RATE_LIMIT_WAIT', '600'))
+        self.repo = self.github_call(self.github.get_repo, f"{self.repo_owner}/{self.repo_name}")
         self.openai_client = openai.OpenAI(api_key=self.openai_key)
+        self.engine = ChunkedReviewEngine(
+            self.complete,
+            chunk_token_budget=int(os.getenv('REVIEW_CHUNK_TOKENS', '4000')),
+            max_concurrency=int(os.getenv('REVIEW_MAX_CONCURRENCY', '4')),
+            review_output_tokens=1200
+        )
+        
+        # ワークフロー間で actions/cache に保存されるファイル (無ければ新規作成)
+        cache_path = os.getenv('REVIEW_CACHE_PATH', '.review-cache/reviews.db')
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self.store = ReviewStore(sqlite3.connect(cache_path))
+        self.store.prune(float(os.getenv('REVIEW_STORE_MAX_AGE_DAYS', '90')))
+        
+        # ロックファイル・生成ファイル (チェックアウトした .gitattributes の linguist-generated など) は要約する
+        self.diff_filter = DiffFilter(
+            [p.strip() for p in os.getenv('DIFF_EXCLUDE_GLOBS', '').split(',') if p.strip()],
+            max_hunk_lines=int(os.getenv('DIFF_MAX_HUNK_LINES', '400')),
+            max_file_lines=int(os.getenv('DIFF_MAX_FILE_LINES', '3000')),
+            mode=os.getenv('DIFF_FILTER_MODE', 'summarize')
+        ).with_gitattributes(self.read_gitattributes())
+    
+    @staticmethod
+    def read_gitattributes() -> str:
+        """チェックアウトしたリポジトリの .gitattributes (無ければ空)"""
+        try:
+            with open('.gitattributes', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return ''
+    
+    def github_call(self, func, *args, method: str = 'GET', **kwargs):
+        """PyGithub の呼び出しをレート制限スケジューラーを通して実行 (レート制限で拒否されたら待って再試行)"""
+        for attempt in range(3):
+            self.scheduler.acquire_sync(self.github_token, PRIORITY_BACKGROUND, method,
+                                        max_wait=self.max_rate_limit_wait)
+            try:
+                result = func(*args, **kwargs)
+            except GithubException as e:
+                wait = self.scheduler.update(self.github_token, e.status, e.headers, str(e.data))
+                if wait is None or attempt == 2:
+                    raise
+                print(f"⏳ GitHub のレート制限のため {wait:.0f} 秒後に再試行します")
+                continue
+            finally:
+                self.scheduler.release(self.github_token)
+            # PyGithub は最後のレスポンスのレート制限のヘッダーを保持している
+            try:
+                remaining, limit = self.github.rate_limiting
+                self.scheduler.record_budget(self.github_token, limit, remaining,
+                                             self.github.rate_limiting_resettime)
+            except GithubException:
+                # レート制限が無効な GitHub Enterprise Server など
+                pass
+            return result
     
     def get_pr_diff(self) -> str:
         """PR の差分を取得"""
@@ -36,7 +103,16 @@ class GitHubActionReviewer:
         }
         
         url = f"https://api.github.com/repos/{self.repo_owner}/{self.repo_name}/pulls/{self.pr_number}"
-        response = requests.get(url, headers=headers)
+        for attempt in range(3):
+            self.scheduler.acquire_sync(self.github_token, PRIORITY_BACKGROUND, max_wait=self.max_rate_limit_wait)
+            try:
+                response = requests.get(url, headers=headers)
+            finally:
+                self.scheduler.release(self.github_token)
+            wait = self.scheduler.update(self.github_token, response.status_code, response.headers, response.text)
+            if wait is None or attempt == 2:
+                break
+            print(f"⏳ GitHub のレート制限のため {wait:.0f} 秒後に再試行します")
         
         if response.status_code == 200:
             return response.text
@@ -46,29 +122,10 @@ class GitHubActionReviewer:
     
     def get_pr_files(self):
         """PR で変更されたファイルを取得"""
-        pr = self.repo.get_pull(self.pr_number)
-        return list(pr.get_files())
+        pr = self.github_call(self.repo.get_pull, self.pr_number)
+        return self.github_call(lambda: list(pr.get_files()))
     
-    async def review_code(self, diff: str, pr_info: dict) -> str:
-        """コードをレビュー"""
-        # 差分が長すぎる場合は切り詰め
-        if len(diff) > 12000:
-            diff = diff[:12000] + "\n... (差分が長いため切り詰められました)"
-        
-        prompt = f"""
-あなたは経験豊富なソフトウェアエンジニアです。以下のPull Requestをレビューしてください。
-
-## PR情報
-- タイトル: {pr_info.get('title', 'N/A')}
-- 作成者: {pr_info.get('author', 'N/A')}
-- 変更ファイル数: {pr_info.get('changed_files', 0)}
-
-## 差分
-```diff
-{diff}
-```
-
-以下の観点でレビューを行い、GitHub のコメント形式で回答してください：
+    REVIEW_INSTRUCTIONS = """以下の観点でレビューを行い、GitHub のコメント形式で回答してください：
 
 ### 🔍 コード品質
 - 可読性と保守性
@@ -86,41 +143,75 @@ class GitHubActionReviewer:
 - ベストプラクティス
 
 良い点も含めて建設的なフィードバックを提供してください。
-重要な問題には ⚠️、改善提案には 💡 を使用してください。
-"""
-        
+重要な問題には ⚠️、改善提案には 💡 を使用してください。"""
+    
+    async def complete(self, prompt: str, max_tokens: int) -> str:
+        """レビュー用のモデルを呼ぶ"""
+        response = await asyncio.to_thread(
+            self.openai_client.chat.completions.create,
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0.3
+        )
+        return response.choices[0].message.content.strip()
+    
+    async def review_code(self, diff: str, pr_info: dict) -> dict:
+        """コードをレビュー (前回からパッチが変わったファイルだけを、チャンクに分けて並列にレビューしてまとめる)"""
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1200,
-                temperature=0.3
+            result = await review_incrementally(
+                self.engine, self.store, f"{self.repo_owner}/{self.repo_name}", self.pr_number,
+                pr_info['head_sha'], diff, pr_info, self.REVIEW_INSTRUCTIONS, diff_filter=self.diff_filter
             )
-            
-            return response.choices[0].message.content.strip()
         except Exception as e:
-            return f"❌ AI レビュー生成エラー: {str(e)}"
-    
-    def post_review_comment(self, review_text: str):
-        """GitHub PR にレビューコメントを投稿"""
-        pr = self.repo.get_pull(self.pr_number)
+            return {'review': f"❌ AI レビュー生成エラー: {str(e)}", 'cached': False}
         
-        # AI レビューのヘッダーを追加
-        comment_body = f"""## 🤖 AI Code Review
-
-{review_text}
-
----
-*このレビューは AI によって自動生成されました。参考程度にご利用ください。*
-"""
+        diff_filter = result.get('filter') or {}
+        if diff_filter:
+            print(f"✂️ フィルター: {diff_filter['files_dropped']} ファイル・{diff_filter['hunks_summarized']} ハンクを要約, "
+                  f"約 {diff_filter['tokens_saved']} トークン削減 ({diff_filter['tokens_before']} → {diff_filter['tokens_after']})")
+        if result['cached']:
+            print(f"♻️ 前回 ({result['previous_head_sha'][:7]}) から差分の変更なし")
+            return result
+        print(f"📦 {result['chunks']} チャンク: {result['files_reviewed']}/{result['files_total']} ファイルをレビュー, "
+              f"{len(result['reused_files'])} ファイルは前回の指摘を再利用")
+        notes = []
+        if result['reused_files']:
+            notes.append(f"> ♻️ 前回のレビューからパッチに変更が無いため指摘を再利用したファイル: "
+                         f"{', '.join(result['reused_files'][:30])}")
+        if result['omitted_files']:
+            notes.append(f"> ℹ️ 分量の上限により未レビューのファイル: "
+                         f"{', '.join(result['omitted_files'][:30])}")
+        if diff_filter.get('dropped'):
+            notes.append(f"> ✂️ 生成ファイル・ロックファイルなどのためレビュー対象外: "
+                         f"{', '.join(d['path'] for d in diff_filter['dropped'][:30])}")
+        result['notes'] = notes
+        return result
+    
+    def post_review_comment(self, review_result: dict, diff: str, head_sha: str):
+        """GitHub PR に講評と行コメントを1回のレビューとして投稿"""
+        pr = self.github_call(self.repo.get_pull, self.pr_number)
+        payload = build_review_payload(
+            review_result['review'],
+            [Finding.from_dict(f) for f in review_result.get('findings', [])],
+            diff, review_result.get('notes'),
+            header="## 🤖 AI Code Review",
+            footer="---\n*このレビューは AI によって自動生成されました。参考程度にご利用ください。*"
+        )
         
         try:
-            pr.create_review(
-                body=comment_body,
-                event="COMMENT"
-            )
-            print("✅ レビューコメントを投稿しました")
+            commit = self.github_call(self.repo.get_commit, head_sha)
+            try:
+                self.github_call(pr.create_review, method='POST', commit=commit, body=payload['body'],
+                                 event="COMMENT", comments=payload['comments'])
+            except GithubException as e:
+                # 行の位置が拒否された場合は全ての指摘を本文に入れて送り直す
+                if e.status != 422 or not payload['comments']:
+                    raise
+                print(f"⚠️ 行コメントが拒否されたため本文にまとめて投稿します: {e.data}")
+                self.github_call(pr.create_review, method='POST', commit=commit, body=payload['fallback_body'],
+                                 event="COMMENT")
+            print(f"✅ レビューを投稿しました (行コメント {payload['inline']} 件, 本文 {payload['unanchored']} 件)")
         except Exception as e:
             print(f"❌ コメント投稿エラー: {e}")
     
@@ -129,13 +220,14 @@ class GitHubActionReviewer:
         print(f"🔍 PR #{self.pr_number} をレビュー中...")
         
         # PR 情報を取得
-        pr = self.repo.get_pull(self.pr_number)
+        pr = self.github_call(self.repo.get_pull, self.pr_number)
         pr_info = {
             'title': pr.title,
             'author': pr.user.login,
             'changed_files': pr.changed_files,
             'additions': pr.additions,
-            'deletions': pr.deletions
+            'deletions': pr.deletions,
+            'head_sha': pr.head.sha
         }
         
         # 差分を取得
@@ -152,10 +244,18 @@ class GitHubActionReviewer:
         # AI レビューを実行
         review_result = await self.review_code(diff, pr_info)
         
+        # 同じコミットを既にレビュー済み (reopened など) なら投稿しない
+        if review_result['cached'] and review_result['previous_head_sha'] == pr_info['head_sha']:
+            print("📝 このコミットはレビュー済みのため投稿をスキップします")
+            return
+        
         # GitHub にコメントを投稿
-        self.post_review_comment(review_result)
+        self.post_review_comment(review_result, diff, pr_info['head_sha'])
         
         print("✅ AI レビューが完了しました")
+        stats = self.scheduler.snapshot(self.github_token)
+        print(f"📊 GitHub API: {stats['requests']} リクエスト, レート制限で待機 {stats['delayed']} 回 "
+              f"(合計 {stats['wait_seconds']:.1f}s), 一次 {stats['primary_limited']}・二次 {stats['secondary_limited']} 回")
 
 async def main():
     """メイン実行関数"""
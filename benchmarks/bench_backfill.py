@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+論文バックフィルのスループットベンチマーク
+arXiv スナップショット形式の合成 JSON Lines を一時ファイルに書き出し、
+PaperBackfill で一時 DB に投入したときの行/秒を計測する
+(全文検索なし / 行ごとのトリガー / バッチ単位の索引を比較)
+
+使い方:
+    python benchmarks/bench_backfill.py --papers 500000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'paper_summarizer'))
+
+from bot import PaperDatabase
+from paper_backfill import PaperBackfill, iter_jsonl_records
+from paper_search import PaperSearchIndex
+
+WORDS = [f'term{i}' for i in range(5000)]
+
+def write_snapshot(path: str, count: int, seed: int = 0):
+    """合成スナップショットを書き出す"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                'id': f'{2000 + i // 100000}.{i % 100000:05d}',
+                'title': ' '.join(rng.choices(WORDS, k=10)),
+                'authors': 'Jane Doe, John Smith',
+                'abstract': ' '.join(rng.choices(WORDS, k=150)),
+                'versions': [{'version': 'v1', 'created': 'Mon, 2 Apr 2007 19:18:42 GMT'}],
+                'update_date': '2008-11-13',
+            }) + '\n')
+
+def run(snapshot: str, db_path: str, mode: str, batch_size: int) -> dict:
+    """1回分の投入を計測"""
+    db = PaperDatabase(db_path)
+    search_index = PaperSearchIndex(db.conn) if mode != 'none' else None
+    backfill = PaperBackfill(db.conn, batch_size=batch_size,
+                             search_index=search_index if mode == 'batch' else None)
+    with open(snapshot, 'rb') as stream:
+        stats = backfill.load(iter_jsonl_records(stream))
+    db.close()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='論文バックフィルのスループット計測')
+    parser.add_argument('--papers', type=int, default=500000)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'snapshot.jsonl')
+        started = time.perf_counter()
+        write_snapshot(snapshot, args.papers)
+        size_mb = os.path.getsize(snapshot) / 1024 / 1024
+        print(f'スナップショット作成: {args.papers:,} 件 {size_mb:.0f}MB ({time.perf_counter() - started:.1f}s)')
+
+        labels = {'none': '全文検索なし', 'trigger': '行ごとのトリガー', 'batch': 'バッチ単位の索引'}
+        for mode, label in labels.items():
+            stats = run(snapshot, os.path.join(tmp, f'papers_{mode}.db'), mode, args.batch_size)
+            print(f"{label}: {stats['inserted']:,} 件 {stats['elapsed']:.1f}s "
+                  f"({stats['rows_per_second']:,.0f} 行/秒)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+論文全文検索のレイテンシベンチマーク
+合成した論文を一時 DB に投入し、FTS5 (bm25) 検索と LIKE による全件走査を比較する
+
+使い方:
+    python benchmarks/bench_paper_search.py --papers 100000 --queries 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'paper_summarizer'))
+
+from bot import PaperDatabase
+from paper_search import PaperSearchIndex
+
+VOCABULARY = (
+    'transformer diffusion attention graph reinforcement policy gradient retrieval augmented '
+    'language model vision contrastive self supervised benchmark dataset robust adversarial '
+    'federated privacy quantization pruning distillation sparse mixture experts agent planning '
+    'reasoning chain thought alignment preference optimization reward speech audio video '
+    'segmentation detection generative adversarial network kernel bayesian causal inference'
+).split()
+
+# 実際の論文に近づけるため、合成語を加えた語彙から Zipf 分布で語を選ぶ
+LEXICON = VOCABULARY + [f'term{i}' for i in range(20000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(LEXICON))]
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    """Zipf 分布に従う語からテキストを作成"""
+    return ' '.join(rng.choices(LEXICON, weights=WEIGHTS, k=words))
+
+def populate(db: PaperDatabase, count: int, seed: int = 0):
+    """合成論文を投入 (トリガー経由でインデックスも更新される)"""
+    rng = random.Random(seed)
+    rows = (
+        (f'bench.{i:07d}', synthetic_text(rng, 10), 'Author A, Author B',
+         synthetic_text(rng, 150), '2024-01-01', synthetic_text(rng, 60))
+        for i in range(count)
+    )
+    db.conn.executemany('''
+        INSERT INTO papers (arxiv_id, title, authors, abstract, published_date, summary)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    db.conn.commit()
+
+def percentile(samples, pct: float) -> float:
+    """パーセンタイル (ミリ秒)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='論文全文検索のレイテンシ計測')
+    parser.add_argument('--papers', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PaperDatabase(os.path.join(tmp, 'papers.db'))
+        index = PaperSearchIndex(db.conn)
+
+        started = time.perf_counter()
+        populate(db, args.papers)
+        print(f'{args.papers:,} 件を投入: {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        index.rebuild()
+        print(f'インデックス再構築: {time.perf_counter() - started:.1f}s')
+
+        rng = random.Random(1)
+        # よく出る語 1 つ + 中頻度の語 1 つ
+        queries = [
+            f'{rng.choice(VOCABULARY)} {rng.choice(LEXICON[100:2000])}'
+            for _ in range(args.queries)
+        ]
+
+        fts_samples = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, limit=5)
+            fts_samples.append(time.perf_counter() - started)
+
+        like_samples = []
+        for query in queries[:10]:
+            terms = query.split()
+            started = time.perf_counter()
+            db.conn.execute(
+                'SELECT arxiv_id FROM papers WHERE abstract LIKE ? AND abstract LIKE ?',
+                [f'%{t}%' for t in terms]
+            ).fetchall()
+            like_samples.append(time.perf_counter() - started)
+
+        print(f'FTS5 bm25 ({len(fts_samples)} クエリ): '
+              f'p50={percentile(fts_samples, 0.5):.1f}ms p95={percentile(fts_samples, 0.95):.1f}ms '
+              f'mean={statistics.mean(fts_samples) * 1000:.1f}ms')
+        print(f'LIKE 全件走査 ({len(like_samples)} クエリ): '
+              f'p50={percentile(like_samples, 0.5):.1f}ms p95={percentile(like_samples, 0.95):.1f}ms')
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+論文ベクトルインデックスのベンチマーク
+合成した論文を一時インデックスに追記し、起動時の読み込み時間と
+全件走査 / IVF による top-k 検索のレイテンシを計測する
+
+使い方:
+    python benchmarks/bench_paper_vectors.py --papers 100000 --queries 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'paper_summarizer'))
+
+from paper_vectors import VectorIndex
+
+LEXICON = [f'term{i}' for i in range(20000)]
+CUM_WEIGHTS = []
+_total = 0.0
+for _rank in range(len(LEXICON)):
+    _total += 1 / (_rank + 1)
+    CUM_WEIGHTS.append(_total)
+
+def synthetic_paper(rng: random.Random, i: int) -> dict:
+    """Zipf 分布の語から合成論文を作成"""
+    return {
+        'arxiv_id': f'bench.{i:07d}',
+        'title': ' '.join(rng.choices(LEXICON, cum_weights=CUM_WEIGHTS, k=10)),
+        'abstract': ' '.join(rng.choices(LEXICON, cum_weights=CUM_WEIGHTS, k=150)),
+    }
+
+def percentile(samples, pct: float) -> float:
+    """パーセンタイル (ミリ秒)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+def measure(index: VectorIndex, ids, **kwargs):
+    """検索レイテンシを計測"""
+    samples = []
+    for arxiv_id in ids:
+        vector = index.vector_for(arxiv_id)
+        started = time.perf_counter()
+        index.search(vector, k=5, exclude=[arxiv_id], **kwargs)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description='論文ベクトルインデックスの計測')
+    parser.add_argument('--papers', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'vectors')
+        index = VectorIndex(prefix)
+
+        started = time.perf_counter()
+        for start in range(0, args.papers, 1000):
+            index.add_papers(synthetic_paper(rng, i) for i in range(start, min(args.papers, start + 1000)))
+        elapsed = time.perf_counter() - started
+        print(f'追記: {args.papers:,} 件 {elapsed:.1f}s ({args.papers / elapsed:,.0f} 件/秒)')
+
+        started = time.perf_counter()
+        index = VectorIndex(prefix)
+        index.matrix()
+        print(f'起動時の読み込み: {(time.perf_counter() - started) * 1000:.1f}ms')
+
+        ids = rng.sample(index.ids, min(args.queries, index.size))
+        brute = measure(index, ids)
+        print(f'全件走査: p50 {statistics.median(brute) * 1000:.2f}ms / p95 {percentile(brute, 0.95):.2f}ms')
+
+        started = time.perf_counter()
+        index.build_ivf(args.nlist)
+        print(f'IVF 学習: {time.perf_counter() - started:.1f}s (nlist={args.nlist})')
+        ivf = measure(index, ids, nprobe=8)
+        print(f'IVF (nprobe=8): p50 {statistics.median(ivf) * 1000:.2f}ms / p95 {percentile(ivf, 0.95):.2f}ms')
+
+if __name__ == '__main__':
+    main()
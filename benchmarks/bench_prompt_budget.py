@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+プロンプト予算管理のベンチマーク
+合成したコード差分と日本語の文章について、トークナイザー (tiktoken または近似) で数える速度・
+キャッシュに当たった場合の速度・fit 1回あたりの時間と、文字数 // 4 の見積もりとの差を計測する
+
+使い方:
+    python benchmarks/bench_prompt_budget.py --model gpt-4 --kb 200 --repeat 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+
+from prompt_budget import PromptBudget, Section, get_counter
+
+IDENTIFIERS = ['request', 'response', 'handler', 'config', 'session', 'value', 'items', 'result', 'index']
+JAPANESE_WORDS = ['大規模言語モデル', 'の', '推論', 'を', '高速化', 'する', '手法', 'について', '評価', 'した。']
+
+def synthetic_diff(rng: random.Random, size: int) -> str:
+    """Python のコード差分らしいテキスト"""
+    lines = []
+    while sum(len(line) for line in lines) < size:
+        name = rng.choice(IDENTIFIERS)
+        lines.append(f'+    {name}_{rng.randint(0, 99)} = compute({rng.choice(IDENTIFIERS)}, {rng.randint(0, 999)})\n')
+    return 'diff --git a/app.py b/app.py\n@@ -1,0 +1,100 @@\n' + ''.join(lines)
+
+def synthetic_japanese(rng: random.Random, size: int) -> str:
+    """日本語の文章"""
+    parts = []
+    while sum(len(part) for part in parts) < size:
+        parts.append(rng.choice(JAPANESE_WORDS))
+    return ''.join(parts)
+
+def measure(label: str, func, repeat: int) -> float:
+    """repeat 回の平均ミリ秒"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - started) * 1000 / repeat
+    print(f'  {label}: {elapsed:.2f}ms')
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='プロンプト予算管理の計測')
+    parser.add_argument('--model', default='gpt-4')
+    parser.add_argument('--kb', type=int, default=200, help='テキストの大きさ (KB)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    counter = get_counter(args.model)
+    print(f'トークナイザー: {counter.name}')
+    for label, text in (('コード差分', synthetic_diff(rng, args.kb * 1024)),
+                        ('日本語', synthetic_japanese(rng, args.kb * 1024 // 3))):
+        tokens = counter.tokenizer.count(text)
+        print(f'{label}: {len(text):,} 文字, {tokens:,} トークン (文字数 // 4 = {len(text) // 4:,}, '
+              f'1トークンあたり {len(text) / tokens:.2f} 文字)')
+        measure('数える (キャッシュなし)', lambda: counter.tokenizer.count(text), args.repeat)
+        counter.count(text)
+        measure('数える (キャッシュ)', lambda: counter.count(text), args.repeat)
+
+        budget = PromptBudget(args.model, 1000)
+        measure(f'fit ({budget.input_tokens} トークンに切り詰め)',
+                lambda: budget.fit(lambda body: f'レビューしてください。\n{body}\n', [Section('body', text)]),
+                args.repeat)
+    print(f'キャッシュ: {counter.snapshot()}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+要約パイプラインのスループットベンチマーク
+ローカルのスタブ completion サーバーに対して PaperSummarizer を実行し、
+同時実行数ごとの papers/min を計測する (OpenAI API は呼ばない)
+
+使い方:
+    python benchmarks/bench_summarizer.py --papers 100 --latency 0.5 --concurrency 1 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'paper_summarizer'))
+
+from bot import PaperSummarizer
+
+async def start_stub_server(latency: float, rate_limit_every: int):
+    """chat.completions 互換のスタブサーバーを起動"""
+    counter = {'requests': 0, 'rate_limited': 0}
+
+    async def completions(request):
+        counter['requests'] += 1
+        # 指定回数ごとに 429 を返してバックオフ経路も通す
+        if rate_limit_every and counter['requests'] % rate_limit_every == 0:
+            counter['rate_limited'] += 1
+            return web.json_response(
+                {'error': {'message': 'rate limited', 'type': 'rate_limit_error'}},
+                status=429,
+                headers={'retry-after-ms': '200'}
+            )
+
+        await asyncio.sleep(latency)
+        return web.json_response({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'gpt-3.5-turbo',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': '🔬 **研究概要**: スタブ要約'},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 300, 'completion_tokens': 200, 'total_tokens': 500}
+        })
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/v1', counter
+
+async def run(concurrency: int, papers: int, base_url: str, rpm: float, tpm: float) -> float:
+    """指定した同時実行数で papers 件を要約し、経過秒数を返す"""
+    summarizer = PaperSummarizer(
+        'stub-key',
+        max_concurrency=concurrency,
+        requests_per_minute=rpm,
+        tokens_per_minute=tpm,
+        base_url=base_url
+    )
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        summarizer.generate_summary(f'Paper {i}', 'Abstract ' * 100)
+        for i in range(papers)
+    ))
+    elapsed = time.perf_counter() - started
+    await summarizer.client.close()
+    return elapsed
+
+async def main():
+    parser = argparse.ArgumentParser(description='要約パイプラインのスループット計測')
+    parser.add_argument('--papers', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.5, help='スタブの応答遅延 (秒)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--rpm', type=float, default=3500)
+    parser.add_argument('--tpm', type=float, default=1000000)
+    parser.add_argument('--rate-limit-every', type=int, default=0,
+                        help='N リクエストごとに 429 を返す (0 で無効)')
+    args = parser.parse_args()
+
+    runner, base_url, counter = await start_stub_server(args.latency, args.rate_limit_every)
+    try:
+        # 旧実装 (逐次 + 固定 3 秒待機) の理論値
+        legacy = 60 / (args.latency + 3)
+        print(f'旧実装 (逐次 + sleep 3s) 理論値: {legacy:.1f} papers/min')
+
+        for concurrency in args.concurrency:
+            elapsed = await run(concurrency, args.papers, base_url, args.rpm, args.tpm)
+            print(f'concurrency={concurrency:>3}: {args.papers} 件 / {elapsed:.2f}s '
+                  f'= {args.papers * 60 / elapsed:.1f} papers/min')
+
+        print(f'スタブへのリクエスト数: {counter["requests"]} (429: {counter["rate_limited"]})')
+    finally:
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+AI コードレビューエンジン
+CodeReviewerBot と Webhook サーバーのワーカーが共有する (レビューの観点・モデル呼び出し・再利用ストア)
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+import openai
+
+from diff_filter import DiffFilter
+from prompt_budget import PromptBudget, Section
+from review_engine import ChunkedReviewEngine
+from review_store import ReviewStore, review_incrementally
+
+class AICodeReviewer:
+    """AI コードレビューエンジン"""
+    
+    MODEL = "gpt-4"  # より高品質なレビューのためGPT-4を使用
+    FILE_MODEL = "gpt-3.5-turbo"
+    FILE_OUTPUT_TOKENS = 800
+    # 1ファイルのレビューに使う入力トークン数の上限 (コンテキスト長より小さくしてコストを抑える)
+    FILE_INPUT_TOKENS = 3000
+    
+    REVIEW_INSTRUCTIONS = """以下の観点でレビューを行い、日本語で回答してください：
+
+### 🔍 **コード品質**
+- コードの可読性と保守性
+- 命名規則の適切性
+- 関数・クラスの設計
+
+### 🐛 **潜在的な問題**
+- バグの可能性
+- エラーハンドリング
+- エッジケースの考慮
+
+### 🚀 **パフォーマンス**
+- 効率性の改善点
+- メモリ使用量
+- 計算量の最適化
+
+### 🔒 **セキュリティ**
+- セキュリティ上の懸念
+- 入力値検証
+- 権限管理
+
+### 💡 **改善提案**
+- より良い実装方法
+- リファクタリングの提案
+- ベストプラクティスの適用
+
+良い点も含めて、建設的なフィードバックを提供してください。
+重大な問題がある場合は ⚠️ で、軽微な改善点は 💡 で示してください。"""
+    
+    def __init__(self, api_key: str, chunk_token_budget: int = 4000, reduce_token_budget: int = 5000,
+                 max_concurrency: int = 4, max_chunks: int = 20, store: Optional[ReviewStore] = None,
+                 diff_filter: Optional[DiffFilter] = None):
+        self.client = openai.OpenAI(api_key=api_key)
+        self.store = store
+        self.diff_filter = diff_filter or DiffFilter()
+        self.engine = ChunkedReviewEngine(
+            self.complete,
+            chunk_token_budget=chunk_token_budget,
+            reduce_token_budget=reduce_token_budget,
+            max_concurrency=max_concurrency,
+            max_chunks=max_chunks,
+            model=self.MODEL
+        )
+        self.file_budget = PromptBudget(self.FILE_MODEL, self.FILE_OUTPUT_TOKENS,
+                                        max_input_tokens=self.FILE_INPUT_TOKENS)
+    
+    async def complete(self, prompt: str, max_tokens: int) -> str:
+        """レビュー用のモデルを呼ぶ"""
+        response = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model=self.MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0.3  # 一貫性のあるレビューのため低めに設定
+        )
+        return response.choices[0].message.content.strip()
+    
+    async def review_code_diff(self, diff: str, pr_info: Dict, repo: Optional[str] = None,
+                               full: bool = False, gitattributes: Optional[str] = None) -> Dict:
+        """コード差分をレビュー (大きな差分はチャンクに分けて並列にレビューしてまとめる)
+        
+        ストアがあれば前回からパッチが変わったファイルだけをレビューする (full で全ファイル)
+        ロックファイル・生成ファイルなどはプロンプトを作る前に要約する (gitattributes はリポジトリの .gitattributes)
+        """
+        diff_filter = self.diff_filter.with_gitattributes(gitattributes)
+        try:
+            if self.store and repo and pr_info.get('head_sha'):
+                return await review_incrementally(
+                    self.engine, self.store, repo, pr_info['number'], pr_info['head_sha'],
+                    diff, pr_info, self.REVIEW_INSTRUCTIONS, full=full, diff_filter=diff_filter
+                )
+            return await self.engine.review(diff, pr_info, self.REVIEW_INSTRUCTIONS, diff_filter=diff_filter)
+        except Exception as e:
+            return {"review": f"❌ レビュー生成中にエラーが発生しました: {str(e)}", "chunks": 0}
+    
+    @staticmethod
+    def build_file_prompt(filename: str, file_content: str) -> str:
+        """1ファイルのレビュープロンプト"""
+        return f"""
+ファイル `{filename}` の変更内容をレビューしてください。
+
+```
+{file_content}
+```
+
+このファイルの変更について、簡潔で具体的なフィードバックを日本語で提供してください。
+"""
+    
+    async def review_specific_file(self, file_content: str, filename: str) -> str:
+        """特定のファイルをレビュー (入力はトークン数の上限まで)"""
+        prompt, _ = self.file_budget.fit(
+            lambda file_content: self.build_file_prompt(filename, file_content),
+            [Section('file_content', file_content)]
+        )
+        
+        try:
+            response = await asyncio.to_thread(
+                self.client.chat.completions.create,
+                model=self.FILE_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.FILE_OUTPUT_TOKENS,
+                temperature=0.3
+            )
+            
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            return f"❌ ファイルレビュー中にエラーが発生しました: {str(e)}"
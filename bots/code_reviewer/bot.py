@@ -6,18 +6,23 @@ GitHub Pull Request を自動的にレビューし、改善提案を行う
 import os
 import sys
 import asyncio
-import json
-from typing import Dict, List, Optional
+import io
+import sqlite3
+from typing import Dict
 import discord
-from discord.ext import commands
-import openai
-from github import Github
-import requests
+from discord.ext import commands, tasks
 from datetime import datetime
 
 # 親ディレクトリを import パスに追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from base_bot import BaseBot, BaseBotConfig, setup_base_bot
+from ai_reviewer import AICodeReviewer
+from diff_filter import DiffFilter
+from github_client import GitHubClient, GitHubError
+from github_scheduler import PRIORITY_INTERACTIVE
+from review_findings import Finding, format_counts, format_digest, format_report
+from review_store import ReviewStore
 
 class CodeReviewerConfig(BaseBotConfig):
     """コードレビューBot の設定"""
@@ -27,160 +32,27 @@ class CodeReviewerConfig(BaseBotConfig):
         self.github_token = os.getenv('GITHUB_TOKEN')
         self.github_repo_owner = os.getenv('GITHUB_REPO_OWNER')
         self.github_repo_name = os.getenv('GITHUB_REPO_NAME')
+        self.github_api_url = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+        self.github_timeout = float(os.getenv('GITHUB_API_TIMEOUT', '30'))
+        self.github_max_connections = int(os.getenv('GITHUB_MAX_CONNECTIONS', '10'))
+        # レート制限の解除をこれ以上待つ必要があればエラーにする (秒)
+        self.github_max_rate_limit_wait = float(os.getenv('GITHUB_MAX_RATE_LIMIT_WAIT', '60'))
+        self.review_chunk_tokens = int(os.getenv('REVIEW_CHUNK_TOKENS', '4000'))
+        self.review_reduce_tokens = int(os.getenv('REVIEW_REDUCE_TOKENS', '5000'))
+        self.review_max_concurrency = int(os.getenv('REVIEW_MAX_CONCURRENCY', '4'))
+        self.review_max_chunks = int(os.getenv('REVIEW_MAX_CHUNKS', '20'))
+        self.review_store_db = os.getenv('REVIEW_STORE_DB', 'code_reviews.db')
+        # これより古い PR のレビュー結果は削除する (日)
+        self.review_store_max_age_days = float(os.getenv('REVIEW_STORE_MAX_AGE_DAYS', '90'))
+        self.diff_exclude_globs = [p.strip() for p in os.getenv('DIFF_EXCLUDE_GLOBS', '').split(',') if p.strip()]
+        self.diff_max_hunk_lines = int(os.getenv('DIFF_MAX_HUNK_LINES', '400'))
+        self.diff_max_file_lines = int(os.getenv('DIFF_MAX_FILE_LINES', '3000'))
+        self.diff_max_line_length = int(os.getenv('DIFF_MAX_LINE_LENGTH', '1000'))
+        self.diff_filter_mode = os.getenv('DIFF_FILTER_MODE', 'summarize')
         self.review_channel_name = 'code-review-queue'
 
-class GitHubManager:
-    """GitHub API 管理クラス"""
-    
-    def __init__(self, token: str, repo_owner: str, repo_name: str):
-        self.github = Github(token)
-        self.repo = self.github.get_repo(f"{repo_owner}/{repo_name}")
-        self.repo_owner = repo_owner
-        self.repo_name = repo_name
-    
-    def get_pull_request(self, pr_number: int):
-        """Pull Request を取得"""
-        return self.repo.get_pull(pr_number)
-    
-    def get_pr_diff(self, pr_number: int) -> str:
-        """Pull Request の差分を取得"""
-        pr = self.get_pull_request(pr_number)
-        
-        # GitHub API で diff を取得
-        headers = {
-            'Authorization': f'token {self.github._Github__requester._Requester__authorizationHeader.split()[1]}',
-            'Accept': 'application/vnd.github.v3.diff'
-        }
-        
-        url = f"https://api.github.com/repos/{self.repo_owner}/{self.repo_name}/pulls/{pr_number}"
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return response.text
-        else:
-            return ""
-    
-    def get_pr_files(self, pr_number: int) -> List[Dict]:
-        """Pull Request で変更されたファイル一覧を取得"""
-        pr = self.get_pull_request(pr_number)
-        files = []
-        
-        for file in pr.get_files():
-            files.append({
-                'filename': file.filename,
-                'status': file.status,
-                'additions': file.additions,
-                'deletions': file.deletions,
-                'changes': file.changes,
-                'patch': file.patch if hasattr(file, 'patch') else None
-            })
-        
-        return files
-    
-    def post_review_comment(self, pr_number: int, body: str, commit_sha: str = None):
-        """Pull Request にレビューコメントを投稿"""
-        pr = self.get_pull_request(pr_number)
-        
-        if commit_sha is None:
-            commit_sha = pr.head.sha
-        
-        # レビューを作成
-        pr.create_review(
-            body=body,
-            event="COMMENT"
-        )
-
-class AICodeReviewer:
-    """AI コードレビューエンジン"""
-    
-    def __init__(self, api_key: str):
-        self.client = openai.OpenAI(api_key=api_key)
-    
-    async def review_code_diff(self, diff: str, pr_info: Dict) -> str:
-        """コード差分をレビュー"""
-        prompt = f"""
-あなたは経験豊富なシニアソフトウェアエンジニアです。以下のPull Requestをレビューしてください。
-
-## Pull Request 情報
-- タイトル: {pr_info.get('title', 'N/A')}
-- 説明: {pr_info.get('body', 'N/A')}
-- 変更ファイル数: {pr_info.get('changed_files', 0)}
-- 追加行数: {pr_info.get('additions', 0)}
-- 削除行数: {pr_info.get('deletions', 0)}
-
-## コード差分
-```diff
-{diff[:8000]}  # 長すぎる場合は切り詰め
-```
-
-以下の観点でレビューを行い、日本語で回答してください：
-
-### 🔍 **コード品質**
-- コードの可読性と保守性
-- 命名規則の適切性
-- 関数・クラスの設計
-
-### 🐛 **潜在的な問題**
-- バグの可能性
-- エラーハンドリング
-- エッジケースの考慮
-
-### 🚀 **パフォーマンス**
-- 効率性の改善点
-- メモリ使用量
-- 計算量の最適化
-
-### 🔒 **セキュリティ**
-- セキュリティ上の懸念
-- 入力値検証
-- 権限管理
-
-### 💡 **改善提案**
-- より良い実装方法
-- リファクタリングの提案
-- ベストプラクティスの適用
-
-良い点も含めて、建設的なフィードバックを提供してください。
-重大な問題がある場合は ⚠️ で、軽微な改善点は 💡 で示してください。
-"""
-        
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-4",  # より高品質なレビューのためGPT-4を使用
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1500,
-                temperature=0.3  # 一貫性のあるレビューのため低めに設定
-            )
-            
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"❌ レビュー生成中にエラーが発生しました: {str(e)}"
-    
-    async def review_specific_file(self, file_content: str, filename: str) -> str:
-        """特定のファイルをレビュー"""
-        prompt = f"""
-ファイル `{filename}` の変更内容をレビューしてください。
-
-```
-{file_content[:4000]}
-```
-
-このファイルの変更について、簡潔で具体的なフィードバックを日本語で提供してください。
-"""
-        
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"❌ ファイルレビュー中にエラーが発生しました: {str(e)}"
+class GitHubManager(GitHubClient):
+    """GitHub API 管理クラス (共有セッションで非同期に呼び出す)"""
 
 class CodeReviewerBot(BaseBot):
     """コードレビューBot メインクラス"""
@@ -192,17 +64,38 @@ class CodeReviewerBot(BaseBot):
         self.github_manager = None
         self.ai_reviewer = None
         self.review_channel = None
+        self.review_store = ReviewStore(sqlite3.connect(config.review_store_db))
         
         # GitHub と AI の初期化
         if config.github_token and config.github_repo_owner and config.github_repo_name:
             self.github_manager = GitHubManager(
                 config.github_token,
                 config.github_repo_owner,
-                config.github_repo_name
+                config.github_repo_name,
+                api_url=config.github_api_url,
+                timeout=config.github_timeout,
+                max_connections=config.github_max_connections,
+                # スラッシュコマンドからの呼び出しはバックグラウンドのジョブより先に出す
+                priority=PRIORITY_INTERACTIVE,
+                max_rate_limit_wait=config.github_max_rate_limit_wait
             )
         
         if config.openai_api_key:
-            self.ai_reviewer = AICodeReviewer(config.openai_api_key)
+            self.ai_reviewer = AICodeReviewer(
+                config.openai_api_key,
+                chunk_token_budget=config.review_chunk_tokens,
+                reduce_token_budget=config.review_reduce_tokens,
+                max_concurrency=config.review_max_concurrency,
+                max_chunks=config.review_max_chunks,
+                store=self.review_store,
+                diff_filter=DiffFilter(
+                    config.diff_exclude_globs,
+                    max_hunk_lines=config.diff_max_hunk_lines,
+                    max_file_lines=config.diff_max_file_lines,
+                    max_line_length=config.diff_max_line_length,
+                    mode=config.diff_filter_mode
+                )
+            )
     
     async def on_ready(self):
         """Bot 起動時の処理"""
@@ -218,43 +111,63 @@ class CodeReviewerBot(BaseBot):
         
         if not self.review_channel:
             self.logger.warning(f'レビューチャンネル "{self.config.review_channel_name}" が見つかりません')
+        
+        if not self.prune_review_store.is_running():
+            self.prune_review_store.start()
     
-    async def review_pull_request(self, pr_number: int) -> Dict:
-        """Pull Request をレビュー"""
+    @tasks.loop(hours=24)
+    async def prune_review_store(self):
+        """古い PR のレビュー結果を削除 (起動時と1日ごと)"""
+        pruned = self.review_store.prune(self.config.review_store_max_age_days)
+        if pruned:
+            self.logger.info(f'{pruned} 件の PR のレビュー結果を削除しました')
+    
+    async def review_pull_request(self, pr_number: int, full: bool = False) -> Dict:
+        """Pull Request をレビュー (full なら前回の指摘を使わずに全ファイルをレビュー)"""
         if not self.github_manager or not self.ai_reviewer:
             return {"error": "GitHub または OpenAI の設定が不完全です"}
         
+        pr = self.github_manager.open_pull_request(pr_number)
         try:
-            # PR 情報を取得
-            pr = self.github_manager.get_pull_request(pr_number)
-            pr_info = {
-                'title': pr.title,
-                'body': pr.body or "",
-                'changed_files': pr.changed_files,
-                'additions': pr.additions,
-                'deletions': pr.deletions,
-                'author': pr.user.login,
-                'url': pr.html_url
-            }
-            
-            # 差分を取得
-            diff = self.github_manager.get_pr_diff(pr_number)
+            # メタデータ・差分・ファイル一覧を並列に取得 (このレビュー中は再取得しない)
+            (_, diff, files), gitattributes = await asyncio.gather(pr.load(), pr.file_text('.gitattributes'))
+            pr_info = await pr.info()
             
             if not diff:
                 return {"error": "差分を取得できませんでした"}
             
             # AI レビューを実行
-            review_result = await self.ai_reviewer.review_code_diff(diff, pr_info)
+            review_result = await self.ai_reviewer.review_code_diff(
+                diff, pr_info, repo=f"{self.config.github_repo_owner}/{self.config.github_repo_name}",
+                full=full, gitattributes=gitattributes
+            )
             
             return {
                 "success": True,
                 "pr_info": pr_info,
-                "review": review_result
+                "files": files,
+                "review": review_result["review"],
+                "findings": [Finding.from_dict(f) for f in review_result.get("findings", [])],
+                "coverage": review_result
             }
             
+        except GitHubError as e:
+            self.logger.error(f"PR 取得エラー: {e}")
+            if e.status == 404:
+                return {"error": f"PR #{pr_number} が見つかりません"}
+            return {"error": str(e)}
         except Exception as e:
             self.logger.error(f"PR レビューエラー: {e}")
             return {"error": str(e)}
+        finally:
+            pr.close()
+    
+    async def close(self):
+        """Bot 終了時に GitHub の共有セッションとレビューストアを閉じる"""
+        if self.github_manager:
+            await self.github_manager.close()
+        await super().close()
+        self.review_store.conn.close()
     
     async def post_review_to_discord(self, review_data: Dict):
         """レビュー結果を Discord に投稿"""
@@ -282,19 +195,57 @@ class CodeReviewerBot(BaseBot):
             timestamp=datetime.now()
         )
         
-        # レビュー内容を分割して表示（Discord の制限対応）
-        review_chunks = [review[i:i+1024] for i in range(0, len(review), 1024)]
+        # 全体の講評と、ファイルごとの指摘のダイジェスト (入りきらない分は添付の Markdown に全て入れる)
+        findings = review_data.get("findings", [])
+        # embed 全体の上限 (6000 文字) に収まるように講評とダイジェストの文字数を分ける
+        summary_limit = 1500
+        embed.description += f"\n**指摘**: {format_counts(findings)}\n\n"
+        embed.description += review if len(review) <= summary_limit else review[:summary_limit - 1] + "…"
+        fields, omitted = format_digest(findings, max_total_chars=2800)
+        for name, value in fields:
+            embed.add_field(name=name, value=value, inline=False)
+        truncated = omitted > 0 or len(review) > summary_limit
         
-        for i, chunk in enumerate(review_chunks[:3]):  # 最大3つのフィールド
-            embed.add_field(
-                name=f"📝 レビュー結果 ({i+1})" if len(review_chunks) > 1 else "📝 レビュー結果",
-                value=chunk,
-                inline=False
-            )
+        coverage = review_data.get("coverage", {})
+        footer = "AI Code Reviewer"
+        if coverage.get("cached"):
+            footer += f" | 前回 ({coverage['previous_head_sha'][:7]}) から差分の変更なし: 前回のレビューを表示"
+        elif coverage.get("chunks", 0) > 1 or coverage.get("reused_files"):
+            footer += (f" | {coverage['chunks']} チャンクに分割"
+                       f" | {coverage['files_reviewed']}/{coverage['files_total']} ファイルをレビュー")
+            if coverage.get("reused_files"):
+                footer += f" | {len(coverage['reused_files'])} ファイルは前回の指摘を再利用"
+            if coverage.get("omitted_files"):
+                footer += f" (未レビュー {len(coverage['omitted_files'])})"
+        diff_filter = coverage.get("filter") or {}
+        if diff_filter.get("files_dropped") or diff_filter.get("hunks_summarized"):
+            footer += (f" | {diff_filter['files_dropped']} ファイル・{diff_filter['hunks_summarized']} ハンクを要約"
+                       f" (約 {diff_filter['tokens_saved']:,} トークン削減)")
+        embed.set_footer(text=footer)
+        
+        # 再利用したファイルを表示
+        reused = coverage.get("reused_files") or []
+        if reused and not coverage.get("cached"):
+            names = ", ".join(f"`{path}`" for path in reused[:15])
+            if len(reused) > 15:
+                names += f" ほか {len(reused) - 15} 件"
+            embed.add_field(name="♻️ 前回の指摘を再利用 (パッチに変更なし)", value=names[:1024], inline=False)
         
-        embed.set_footer(text="AI Code Reviewer")
+        if not truncated:
+            await self.review_channel.send(embed=embed)
+            return
         
-        await self.review_channel.send(embed=embed)
+        embed.add_field(
+            name="📎 全文",
+            value="講評の全文と全ての指摘を添付ファイルにまとめました"
+                  + (f" (ダイジェストに入りきらなかった指摘 {omitted} 件)" if omitted else ""),
+            inline=False
+        )
+        report = format_report(f"PR #{pr_info['number']} {pr_info['title']}", review, findings)
+        await self.review_channel.send(
+            embed=embed,
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename=f"review-pr-{pr_info['number']}.md")
+        )
 
 # コマンド群
 class CodeReviewCommands(commands.Cog):
@@ -304,8 +255,8 @@ class CodeReviewCommands(commands.Cog):
         self.bot = bot
     
     @discord.app_commands.command(name="review_pr", description="Pull Request をレビュー")
-    @discord.app_commands.describe(pr_number="レビューする PR 番号")
-    async def review_pr(self, interaction: discord.Interaction, pr_number: int):
+    @discord.app_commands.describe(pr_number="レビューする PR 番号", full="前回の指摘を使わずに全ファイルをレビューし直す")
+    async def review_pr(self, interaction: discord.Interaction, pr_number: int, full: bool = False):
         """Pull Request レビューコマンド"""
         await interaction.response.defer()
         
@@ -316,7 +267,7 @@ class CodeReviewCommands(commands.Cog):
         await interaction.followup.send(f"🔍 PR #{pr_number} をレビュー中...")
         
         # レビューを実行
-        review_data = await self.bot.review_pull_request(pr_number)
+        review_data = await self.bot.review_pull_request(pr_number, full=full)
         
         # Discord に結果を投稿
         await self.bot.post_review_to_discord(review_data)
@@ -337,17 +288,17 @@ class CodeReviewCommands(commands.Cog):
         
         try:
             # 最新の PR を取得
-            pulls = self.bot.github_manager.repo.get_pulls(state='open')
-            latest_pr = next(iter(pulls), None)
+            pulls = await self.bot.github_manager.list_pull_requests(state='open', limit=1)
+            latest_pr = pulls[0] if pulls else None
             
             if not latest_pr:
                 await interaction.followup.send("📭 オープンな PR が見つかりません")
                 return
             
-            await interaction.followup.send(f"🔍 最新の PR #{latest_pr.number} をレビュー中...")
+            await interaction.followup.send(f"🔍 最新の PR #{latest_pr['number']} をレビュー中...")
             
             # レビューを実行
-            review_data = await self.bot.review_pull_request(latest_pr.number)
+            review_data = await self.bot.review_pull_request(latest_pr['number'])
             
             # Discord に結果を投稿
             await self.bot.post_review_to_discord(review_data)
@@ -355,7 +306,7 @@ class CodeReviewCommands(commands.Cog):
             if "error" in review_data:
                 await interaction.followup.send(f"❌ レビューに失敗しました: {review_data['error']}")
             else:
-                await interaction.followup.send(f"✅ PR #{latest_pr.number} のレビューが完了しました！")
+                await interaction.followup.send(f"✅ PR #{latest_pr['number']} のレビューが完了しました！")
                 
         except Exception as e:
             await interaction.followup.send(f"❌ エラーが発生しました: {str(e)}")
@@ -370,7 +321,7 @@ class CodeReviewCommands(commands.Cog):
             return
         
         try:
-            pulls = list(self.bot.github_manager.repo.get_pulls(state='open'))
+            pulls = await self.bot.github_manager.list_pull_requests(state='open', limit=10)
             
             if not pulls:
                 await interaction.followup.send("📭 オープンな PR が見つかりません")
@@ -383,8 +334,8 @@ class CodeReviewCommands(commands.Cog):
             
             for pr in pulls[:10]:  # 最大10件表示
                 embed.add_field(
-                    name=f"#{pr.number} {pr.title[:50]}",
-                    value=f"👤 {pr.user.login} | 📅 {pr.created_at.strftime('%Y-%m-%d')}",
+                    name=f"#{pr['number']} {pr['title'][:50]}",
+                    value=f"👤 {pr['user']['login']} | 📅 {pr['created_at'][:10]}",
                     inline=False
                 )
             
@@ -392,6 +343,38 @@ class CodeReviewCommands(commands.Cog):
             
         except Exception as e:
             await interaction.followup.send(f"❌ エラーが発生しました: {str(e)}")
+    
+    @discord.app_commands.command(name="github_rate_limit", description="GitHub API のレート制限の状態を表示")
+    async def github_rate_limit(self, interaction: discord.Interaction):
+        """レート制限スケジューラーの状態表示コマンド"""
+        if not self.bot.github_manager:
+            await interaction.response.send_message("❌ GitHub の設定が不完全です")
+            return
+        
+        snapshot = self.bot.github_manager.snapshot()
+        scheduler = snapshot["rate_limit"]
+        embed = discord.Embed(title="⏱️ GitHub API のレート制限", color=discord.Color.blue())
+        for state in scheduler["tokens"].values():
+            for resource, budget in state["resources"].items():
+                embed.add_field(
+                    name=f"📊 {resource}",
+                    value=f"残り {budget['remaining']}/{budget['limit']} | リセットまで {budget['reset_in'] / 60:.0f} 分",
+                    inline=True
+                )
+            queued = state["queued"]
+            status = f"実行中 {state['in_flight']} | 待ち 対話 {queued['interactive']}・バックグラウンド {queued['background']}"
+            if state["paused_for"]:
+                status += f"\n⏸️ {state['pause_reason']} のため {state['paused_for']:.0f} 秒停止中"
+            embed.add_field(name="🚦 キュー", value=status, inline=False)
+        embed.add_field(
+            name="📈 累計",
+            value=(f"リクエスト {scheduler['requests']} | 待機 {scheduler['delayed']} 回 "
+                   f"(最長 {scheduler['max_wait_seconds']:.1f}s) | 制限 一次 {scheduler['primary_limited']}・"
+                   f"二次 {scheduler['secondary_limited']} | 拒否 {scheduler['rejected']} | "
+                   f"再試行 {snapshot['rate_limited']}"),
+            inline=False
+        )
+        await interaction.response.send_message(embed=embed)
 
 async def main():
     """メイン実行関数"""
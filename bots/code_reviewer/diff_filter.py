@@ -0,0 +1,282 @@
+"""
+レビュー前の差分フィルター
+unified diff を1行ずつ読みながら、ロックファイル・生成ファイル・ベンダーコード・バイナリ・minify された
+ファイル・大きすぎるファイルやハンクを判定し、プロンプトを作る前に1行の要約に置き換える (または削除する)
+対象外のファイルは中身を保持しないので、巨大なロックファイルがあってもメモリを使わない
+パスの規則は既定のパターン・追加の glob・リポジトリの .gitattributes (linguist-generated など) から作る
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from review_engine import CountFunc, estimate_tokens, path_from_header
+
+REASON_LABELS = {
+    'lockfile': 'ロックファイル',
+    'generated': '生成ファイル',
+    'vendored': 'ベンダーコード',
+    'binary': 'バイナリ',
+    'excluded': '除外パターン',
+    'minified': 'minify されたファイル',
+    'too_large': '大きすぎる差分',
+    'hunk': '大きなハンク',
+}
+
+DEFAULT_RULES: List[Tuple[str, str]] = [
+    # ロックファイル
+    *((pattern, 'lockfile') for pattern in (
+        'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lockb',
+        'poetry.lock', 'Pipfile.lock', 'uv.lock', 'Cargo.lock', 'go.sum', 'composer.lock',
+        'Gemfile.lock', 'mix.lock', 'pubspec.lock', 'packages.lock.json',
+    )),
+    # 生成物・スナップショット (build/ や dist/ という名前のソースディレクトリもあるので出力先はルートだけ。
+    # ノートブックなどは DIFF_EXCLUDE_GLOBS で指定する)
+    *((pattern, 'generated') for pattern in (
+        '*.min.js', '*.min.css', '*.map', '*.snap', '__snapshots__/', '*.pb.go', '*_pb2.py', '*_pb2_grpc.py',
+        '*.generated.*', '/dist/', '/build/',
+    )),
+    # ベンダーコード
+    *((pattern, 'vendored') for pattern in ('vendor/', 'third_party/', 'node_modules/')),
+]
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """gitattributes 形式の glob を正規表現にする
+
+    スラッシュを含まないパターンはどの階層のファイル名にも一致し、末尾がスラッシュならそのディレクトリ以下に一致する
+    先頭のスラッシュはルートからのパスに固定する
+    """
+    anchored = '/' in pattern.rstrip('/')
+    directory = pattern.endswith('/')
+    pattern = pattern.strip('/')
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+
+    body = ''.join(parts)
+    prefix = '' if anchored else '(?:.*/)?'
+    suffix = '/.*' if directory else '(?:/.*)?'
+    return re.compile(f'^{prefix}{body}{suffix}$')
+
+def parse_gitattributes(text: str) -> List[Tuple[str, Optional[str]]]:
+    """.gitattributes からレビュー対象外の判定に使う (パターン, 理由) を取り出す
+
+    理由が None の行 (linguist-generated=false など) は前の規則を打ち消す
+    """
+    rules = []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        pattern, *attrs = line.split()
+        for attr in attrs:
+            if attr in ('linguist-generated', 'linguist-generated=true'):
+                rules.append((pattern, 'generated'))
+            elif attr in ('linguist-vendored', 'linguist-vendored=true'):
+                rules.append((pattern, 'vendored'))
+            elif attr in ('-diff', 'binary'):
+                rules.append((pattern, 'binary'))
+            elif attr in ('linguist-generated=false', '-linguist-generated',
+                          'linguist-vendored=false', '-linguist-vendored'):
+                rules.append((pattern, None))
+    return rules
+
+class DiffFilterResult:
+    """フィルター後の差分と省略した内容"""
+
+    def __init__(self, count_tokens: CountFunc = estimate_tokens):
+        self.count_tokens = count_tokens
+        self.parts: List[str] = []
+        self.files_total = 0
+        self.dropped: List[Dict] = []
+        self.hunks_summarized = 0
+        self.tokens_before = 0
+
+    @property
+    def text(self) -> str:
+        """フィルター後の unified diff"""
+        return ''.join(self.parts)
+
+    @property
+    def tokens_after(self) -> int:
+        """フィルター後のトークン数"""
+        return self.count_tokens(self.text)
+
+    def summary(self) -> Dict:
+        """レビュー結果に付ける集計"""
+        tokens_after = self.tokens_after
+        return {
+            'files_total': self.files_total,
+            'files_dropped': len(self.dropped),
+            'hunks_summarized': self.hunks_summarized,
+            'tokens_before': self.tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': max(0, self.tokens_before - tokens_after),
+            'dropped': [{'path': d['path'], 'reason': d['reason']} for d in self.dropped],
+        }
+
+class _FileState:
+    """読み込み中のファイル"""
+
+    def __init__(self, path: str, reason: Optional[str]):
+        self.path = path
+        self.reason = reason
+        self.header: List[str] = []
+        self.hunks: List[Dict] = []
+        self.additions = 0
+        self.deletions = 0
+        self.lines = 0
+
+class DiffFilter:
+    """パス・サイズの規則で差分を間引くフィルター"""
+
+    def __init__(self, exclude_globs: Optional[List[str]] = None, max_hunk_lines: int = 400,
+                 max_file_lines: int = 3000, max_line_length: int = 1000, mode: str = 'summarize',
+                 attribute_rules: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 count_tokens: CountFunc = estimate_tokens):
+        if mode not in ('summarize', 'drop'):
+            raise ValueError(f'不明なモード: {mode}')
+        self.exclude_globs = list(exclude_globs or [])
+        self.max_hunk_lines = max_hunk_lines
+        self.max_file_lines = max_file_lines
+        self.max_line_length = max_line_length
+        self.mode = mode
+        self.attribute_rules = list(attribute_rules or [])
+        self.count_tokens = count_tokens
+        rules = DEFAULT_RULES + [(pattern, 'excluded') for pattern in self.exclude_globs]
+        self._rules = [(glob_to_regex(pattern), reason) for pattern, reason in rules]
+        self._attribute_rules = [(glob_to_regex(pattern), reason) for pattern, reason in self.attribute_rules]
+
+    def with_gitattributes(self, text: Optional[str]) -> 'DiffFilter':
+        """リポジトリの .gitattributes の規則を加えたフィルター"""
+        if not text:
+            return self
+        return DiffFilter(
+            self.exclude_globs, self.max_hunk_lines, self.max_file_lines, self.max_line_length,
+            self.mode, self.attribute_rules + parse_gitattributes(text), self.count_tokens
+        )
+
+    def classify_path(self, path: str) -> Optional[str]:
+        """パスだけで対象外と分かる場合はその理由 (.gitattributes は後の行ほど優先)"""
+        reason = None
+        for regex, rule_reason in self._rules:
+            if regex.match(path):
+                reason = rule_reason
+                break
+        for regex, rule_reason in self._attribute_rules:
+            if regex.match(path):
+                reason = rule_reason
+        return reason
+
+    def filter(self, diff: str) -> DiffFilterResult:
+        """差分文字列をフィルター"""
+        return self.filter_lines(diff.splitlines(keepends=True))
+
+    def filter_lines(self, lines: Iterable[str]) -> DiffFilterResult:
+        """差分を1行ずつ読んでフィルター (対象外のファイルとハンクの中身は保持しない)"""
+        result = DiffFilterResult(self.count_tokens)
+        current: Optional[_FileState] = None
+
+        for line in lines:
+            result.tokens_before += self.count_tokens(line)
+            if line.startswith('diff --git '):
+                if current:
+                    self._emit(current, result)
+                path = path_from_header(line)
+                current = _FileState(path, self.classify_path(path))
+                current.header.append(line)
+                result.files_total += 1
+                continue
+            if current is None:
+                continue
+
+            if not current.hunks and not line.startswith('@@'):
+                # ファイルヘッダー
+                if line.startswith('+++ b/'):
+                    current.path = line[len('+++ b/'):].rstrip('\n')
+                    current.reason = current.reason or self.classify_path(current.path)
+                elif line.startswith('Binary files ') or line.startswith('GIT binary patch'):
+                    current.reason = 'binary'
+                if line.startswith(('diff --git', 'index ', '--- ', '+++ ', 'new file', 'deleted file',
+                                    'rename ', 'similarity ', 'old mode', 'new mode')):
+                    current.header.append(line)
+                continue
+
+            if line.startswith('@@'):
+                current.hunks.append({'header': line, 'lines': [], 'additions': 0, 'deletions': 0,
+                                      'oversized': False})
+                continue
+
+            hunk = current.hunks[-1]
+            excluded = current.reason is not None
+            current.lines += 1
+            if line.startswith('+'):
+                current.additions += 1
+                hunk['additions'] += 1
+                if len(line) > self.max_line_length:
+                    current.reason = current.reason or 'minified'
+            elif line.startswith('-'):
+                current.deletions += 1
+                hunk['deletions'] += 1
+            if current.lines > self.max_file_lines:
+                current.reason = current.reason or 'too_large'
+
+            if current.reason:
+                # 対象外と決まったファイルは中身を捨てて数えるだけにする
+                if not excluded:
+                    for h in current.hunks:
+                        h['lines'] = []
+                continue
+            if hunk['oversized'] or len(hunk['lines']) >= self.max_hunk_lines:
+                hunk['oversized'] = True
+                hunk['lines'] = []
+                continue
+            hunk['lines'].append(line)
+
+        if current:
+            self._emit(current, result)
+        return result
+
+    def _emit(self, state: _FileState, result: DiffFilterResult):
+        """1ファイル分を出力 (対象外なら要約行だけ)"""
+        if state.reason:
+            result.dropped.append({
+                'path': state.path,
+                'reason': state.reason,
+                'additions': state.additions,
+                'deletions': state.deletions,
+            })
+            if self.mode == 'summarize':
+                result.parts.extend(
+                    line for line in state.header if line.startswith(('diff --git', '--- ', '+++ ', 'rename '))
+                )
+                result.parts.append(
+                    f'# [省略: {REASON_LABELS[state.reason]}] +{state.additions} -{state.deletions} 行\n'
+                )
+            return
+
+        result.parts.extend(state.header)
+        for hunk in state.hunks:
+            result.parts.append(hunk['header'])
+            if hunk['oversized']:
+                result.hunks_summarized += 1
+                result.parts.append(
+                    f"# [省略: {REASON_LABELS['hunk']}] +{hunk['additions']} -{hunk['deletions']} 行\n"
+                )
+            else:
+                result.parts.extend(hunk['lines'])
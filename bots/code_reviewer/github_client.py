@@ -0,0 +1,379 @@
+"""
+非同期 GitHub API クライアント
+共有 aiohttp セッション (接続プール) で REST API を呼び出し、ETag による条件付きリクエストで
+未変更のリソース (304) は保存済みの本文を返す
+全てのリクエストは共有の GitHubRequestScheduler を通し、レート制限の残りに応じて順番と間隔を決める
+(二次レート制限などで拒否されたリクエストは待ってから再試行する)
+1回のレビュー中は PullRequestContext が PR・差分・ファイル一覧を並列に取得して保持する
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from github_scheduler import (
+    PRIORITY_BACKGROUND, GitHubRequestScheduler, RateLimitExceeded, get_scheduler, resource_for
+)
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = 'application/vnd.github+json'
+DIFF_MEDIA_TYPE = 'application/vnd.github.v3.diff'
+RAW_MEDIA_TYPE = 'application/vnd.github.raw'
+
+class GitHubError(Exception):
+    """GitHub API のエラー応答"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(f'GitHub API {status}: {message}')
+        self.status = status
+        self.message = message
+        self.headers = dict(headers or {})
+        # レート制限による拒否なら再試行までの秒数
+        self.retry_after = retry_after
+
+class ETagCache:
+    """URL ごとの ETag と本文の LRU キャッシュ"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[str, object]]' = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[str, object]]:
+        """(etag, 本文) を取得"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[str, str], etag: str, body):
+        """保存 (上限を超えたら古いものから捨てる)"""
+        self._entries[key] = (etag, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class GitHubClient:
+    """接続プールと ETag キャッシュを持つ GitHub REST API クライアント"""
+
+    API_URL = 'https://api.github.com'
+    USER_AGENT = 'AIForgeCodeReviewer/1.0 (+https://github.com/daideguchi/ai-forge-community)'
+
+    def __init__(self, token: str, repo_owner: str, repo_name: str, api_url: Optional[str] = None,
+                 timeout: float = 30.0, max_connections: int = 10, etag_cache_size: int = 256,
+                 scheduler: Optional[GitHubRequestScheduler] = None, priority: int = PRIORITY_BACKGROUND,
+                 max_rate_limit_wait: float = 300.0, max_retries: int = 2):
+        self.token = token
+        self.repo_owner = repo_owner
+        self.repo_name = repo_name
+        self.api_url = (api_url or self.API_URL).rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.etag_cache = ETagCache(etag_cache_size)
+        # 同じトークンを使う他のクライアントとレート制限の残りを共有する
+        self.scheduler = scheduler or get_scheduler()
+        self.priority = priority
+        # これより長くレート制限の解除を待つ必要があればエラーにする
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.max_retries = max_retries
+        self.stats = {
+            'requests': 0,
+            'not_modified': 0,
+            'errors': 0,
+            'rate_limited': 0,
+            'bytes_total': 0,
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def repo_path(self) -> str:
+        """repos/{owner}/{name}"""
+        return f'repos/{self.repo_owner}/{self.repo_name}'
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """共有セッションを取得 (初回のみ作成)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={
+                    'Authorization': f'Bearer {self.token}',
+                    'User-Agent': self.USER_AGENT,
+                    'X-GitHub-Api-Version': '2022-11-28',
+                }
+            )
+        return self._session
+
+    async def close(self):
+        """セッションを閉じる"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _url(self, path: str) -> str:
+        """相対パスを API の URL にする (ページングの次 URL はそのまま)"""
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f'{self.api_url}/{path.lstrip("/")}'
+
+    async def request(self, method: str, path: str, accept: str = JSON_MEDIA_TYPE,
+                      params: Optional[Dict] = None, json: Optional[Dict] = None,
+                      priority: Optional[int] = None) -> Tuple[object, Dict]:
+        """API を呼び出して (本文, レスポンス情報) を返す
+
+        GET は ETag があれば If-None-Match を付け、304 なら保存済みの本文を返す
+        (304 は GitHub のレート制限を消費しない)
+        スケジューラーの順番を待ってから送り、レート制限で拒否されたら解除を待って max_retries 回まで再試行する
+
+        Args:
+            priority: スケジューラーでの優先度 (省略時はクライアントの priority)
+        """
+        priority = self.priority if priority is None else priority
+        resource = resource_for(path)
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.scheduler.acquire(self.token, priority, method, resource,
+                                             max_wait=self.max_rate_limit_wait)
+            except RateLimitExceeded as e:
+                self.stats['errors'] += 1
+                raise GitHubError(429, str(e), retry_after=e.wait) from e
+            try:
+                return await self._send(method, path, accept, params, json)
+            except GitHubError as e:
+                if e.retry_after is None or attempt == self.max_retries:
+                    raise
+                self.stats['rate_limited'] += 1
+                logger.warning(f'GitHub API: {method} {path} がレート制限で拒否されたため '
+                               f'{e.retry_after:.0f} 秒後に再試行します ({attempt + 1}/{self.max_retries})')
+            finally:
+                self.scheduler.release(self.token)
+
+    async def _send(self, method: str, path: str, accept: str, params: Optional[Dict],
+                    json: Optional[Dict]) -> Tuple[object, Dict]:
+        """1回分のリクエスト (レスポンスのレート制限をスケジューラーに記録する)"""
+        session = await self.get_session()
+        url = self._url(path)
+        headers = {'Accept': accept}
+        cache_key = None
+        cached = None
+        if method == 'GET':
+            query = '&'.join(f'{k}={v}' for k, v in sorted((params or {}).items()))
+            cache_key = (f'{url}?{query}' if query else url, accept)
+            cached = self.etag_cache.get(cache_key)
+            if cached:
+                headers['If-None-Match'] = cached[0]
+
+        started = time.perf_counter()
+        self.stats['requests'] += 1
+        try:
+            async with session.request(method, url, headers=headers, params=params, json=json) as response:
+                info = {
+                    'status': response.status,
+                    'links': {rel: str(link['url']) for rel, link in response.links.items()},
+                    'latency_ms': 0.0,
+                }
+                if response.status == 304 and cached:
+                    self.stats['not_modified'] += 1
+                    self.scheduler.update(self.token, response.status, response.headers)
+                    body = cached[1]
+                elif response.status >= 400:
+                    self.stats['errors'] += 1
+                    text = await response.text()
+                    retry_after = self.scheduler.update(self.token, response.status, response.headers, text)
+                    raise GitHubError(response.status, text[:500], response.headers, retry_after=retry_after)
+                else:
+                    self.scheduler.update(self.token, response.status, response.headers)
+                    raw = await response.read()
+                    self.stats['bytes_total'] += len(raw)
+                    if accept == JSON_MEDIA_TYPE:
+                        body = await response.json(content_type=None) if raw else None
+                    else:
+                        body = raw.decode('utf-8', errors='replace')
+                    etag = response.headers.get('ETag')
+                    if cache_key and etag:
+                        self.etag_cache.put(cache_key, etag, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.stats['errors'] += 1
+            raise
+
+        info['latency_ms'] = (time.perf_counter() - started) * 1000
+        logger.info(f'GitHub API: {method} {url} status={info["status"]} {info["latency_ms"]:.0f}ms')
+        return body, info
+
+    async def get_json(self, path: str, params: Optional[Dict] = None):
+        """GET して JSON を返す"""
+        body, _ = await self.request('GET', path, params=params)
+        return body
+
+    async def get_paginated(self, path: str, params: Optional[Dict] = None, max_pages: int = 30) -> List:
+        """Link ヘッダーの next を辿って全ページの配列を連結"""
+        items = []
+        params = {'per_page': 100, **(params or {})}
+        url = path
+        for _ in range(max_pages):
+            body, info = await self.request('GET', url, params=params)
+            items.extend(body or [])
+            url = info['links'].get('next')
+            if not url:
+                break
+            # 次 URL にクエリが含まれている
+            params = None
+        return items
+
+    async def get_pull_request(self, pr_number: int) -> Dict:
+        """Pull Request のメタデータを取得"""
+        return await self.get_json(f'{self.repo_path}/pulls/{pr_number}')
+
+    async def get_pr_diff(self, pr_number: int) -> str:
+        """Pull Request の unified diff を取得"""
+        body, _ = await self.request('GET', f'{self.repo_path}/pulls/{pr_number}', accept=DIFF_MEDIA_TYPE)
+        return body or ''
+
+    async def get_pr_files(self, pr_number: int) -> List[Dict]:
+        """Pull Request で変更されたファイル一覧を取得"""
+        files = await self.get_paginated(f'{self.repo_path}/pulls/{pr_number}/files')
+        return [
+            {
+                'filename': f['filename'],
+                'status': f['status'],
+                'additions': f['additions'],
+                'deletions': f['deletions'],
+                'changes': f['changes'],
+                'patch': f.get('patch'),
+            }
+            for f in files
+        ]
+
+    async def get_file_text(self, path: str, ref: Optional[str] = None) -> Optional[str]:
+        """リポジトリのファイルの中身を取得 (無ければ None)"""
+        try:
+            body, _ = await self.request('GET', f'{self.repo_path}/contents/{path}', accept=RAW_MEDIA_TYPE,
+                                         params={'ref': ref} if ref else None)
+        except GitHubError as e:
+            if e.status == 404:
+                return None
+            raise
+        return body
+
+    async def list_pull_requests(self, state: str = 'open', limit: int = 30) -> List[Dict]:
+        """Pull Request 一覧を新しい順に取得"""
+        return await self.get_json(f'{self.repo_path}/pulls', params={
+            'state': state, 'sort': 'created', 'direction': 'desc', 'per_page': min(limit, 100),
+        }) or []
+
+    async def create_review(self, pr_number: int, body: str, event: str = 'COMMENT',
+                            commit_id: Optional[str] = None, comments: Optional[List[Dict]] = None) -> Dict:
+        """Pull Request にレビューを作成"""
+        payload = {'body': body, 'event': event}
+        if commit_id:
+            payload['commit_id'] = commit_id
+        if comments:
+            payload['comments'] = comments
+        result, _ = await self.request('POST', f'{self.repo_path}/pulls/{pr_number}/reviews', json=payload)
+        return result
+
+    def open_pull_request(self, pr_number: int) -> 'PullRequestContext':
+        """1回のレビュー用に PR の取得結果を保持するコンテキストを作成"""
+        return PullRequestContext(self, pr_number)
+
+    def snapshot(self) -> Dict:
+        """現在のメトリクス"""
+        requests = self.stats['requests']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['not_modified'] / requests if requests else 0.0,
+            'etag_entries': len(self.etag_cache),
+            'rate_limit': self.scheduler.snapshot(self.token),
+        }
+
+class PullRequestContext:
+    """1回のレビュー中に PR・差分・ファイル一覧を一度だけ取得して保持する"""
+
+    def __init__(self, client: GitHubClient, pr_number: int):
+        self.client = client
+        self.pr_number = pr_number
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _fetch(self, name: str, coro_factory) -> asyncio.Future:
+        """同じリソースの取得は最初の1回を共有する (失敗した場合は次回やり直す)"""
+        task = self._tasks.get(name)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = asyncio.ensure_future(coro_factory())
+            self._tasks[name] = task
+        return asyncio.shield(task)
+
+    async def pull(self) -> Dict:
+        """PR のメタデータ"""
+        return await self._fetch('pull', lambda: self.client.get_pull_request(self.pr_number))
+
+    async def diff(self) -> str:
+        """unified diff"""
+        return await self._fetch('diff', lambda: self.client.get_pr_diff(self.pr_number))
+
+    async def files(self) -> List[Dict]:
+        """変更ファイル一覧"""
+        return await self._fetch('files', lambda: self.client.get_pr_files(self.pr_number))
+
+    async def file_text(self, path: str) -> Optional[str]:
+        """head のコミットにあるファイルの中身 (.gitattributes など)"""
+        async def fetch():
+            pr = await self.pull()
+            return await self.client.get_file_text(path, ref=pr['head']['sha'])
+        return await self._fetch(f'file:{path}', fetch)
+
+    async def load(self) -> Tuple[Dict, str, List[Dict]]:
+        """メタデータ・差分・ファイル一覧を並列に取得"""
+        pull, diff, files = await asyncio.gather(self.pull(), self.diff(), self.files())
+        return pull, diff, files
+
+    async def info(self) -> Dict:
+        """プロンプトと Discord 表示に使う PR 情報"""
+        pr = await self.pull()
+        return {
+            'number': pr['number'],
+            'title': pr['title'],
+            'body': pr.get('body') or '',
+            'changed_files': pr.get('changed_files', 0),
+            'additions': pr.get('additions', 0),
+            'deletions': pr.get('deletions', 0),
+            'author': pr['user']['login'],
+            'url': pr['html_url'],
+            'head_sha': pr['head']['sha'],
+        }
+
+    async def create_review(self, body: str, event: str = 'COMMENT', comments: Optional[List[Dict]] = None) -> Dict:
+        """取得済みの head SHA に対してレビューを作成 (PR を取り直さない)"""
+        pr = await self.pull()
+        return await self.client.create_review(
+            self.pr_number, body, event=event, commit_id=pr['head']['sha'], comments=comments
+        )
+
+    async def post_review(self, payload: Dict, event: str = 'COMMENT') -> Dict:
+        """build_review_payload の本文と行コメントを1回のレビューとして投稿
+
+        行コメントの位置が拒否された場合 (422: 差分が更新された・行が差分に無いなど) は、
+        全ての指摘を本文に入れた fallback_body で行コメント無しに送り直す
+        """
+        try:
+            return await self.create_review(payload['body'], event=event, comments=payload['comments'])
+        except GitHubError as e:
+            if e.status != 422 or not payload['comments']:
+                raise
+            logger.warning(f'PR #{self.pr_number} の行コメントが拒否されたため本文にまとめて投稿します: {e.message[:200]}')
+            return await self.create_review(payload['fallback_body'], event=event)
+
+    def close(self):
+        """未完了の取得を取り消す"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        self._tasks.clear()
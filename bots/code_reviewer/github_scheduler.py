@@ -0,0 +1,349 @@
+"""
+GitHub API のレート制限を考慮したリクエストスケジューラー
+レスポンスの X-RateLimit-Limit / Remaining / Reset / Resource をトークン・リソースごとに記録し、
+二次レート制限 (403 / 429 の retry-after や "secondary rate limit") を受けたらそのトークンの全リクエストを止める
+リクエストは優先度順 (対話的なコマンド → バックグラウンドのジョブ) に出し、残りが少なくなったら
+リセットまでの時間に均等に散らして、上限に達する前に間隔を空ける
+非同期のクライアント (GitHubClient) と同期のスクリプト (GitHub Actions・Webhook セットアップ) で同じ状態を使う
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+# 二次レート制限の対象になりやすい、内容を作成・変更するリクエスト
+MUTATING_METHODS = {'POST', 'PATCH', 'PUT', 'DELETE'}
+
+# 二次レート制限で retry-after が無い場合の待機 (GitHub のドキュメントでは少なくとも1分)
+SECONDARY_LIMIT_WAIT = 60.0
+
+def token_key(token: str) -> str:
+    """メトリクス・ログに出すトークンの識別子 (トークン自体は出さない)"""
+    return hashlib.sha256((token or '').encode('utf-8')).hexdigest()[:12]
+
+def resource_for(path: str) -> str:
+    """API のパスからレート制限のリソース (core / search / graphql)"""
+    path = path.split('://', 1)[-1]
+    if '/search/' in f'/{path.lstrip("/")}':
+        return 'search'
+    if path.rstrip('/').endswith('graphql'):
+        return 'graphql'
+    return 'core'
+
+class RateLimitExceeded(Exception):
+    """レート制限の解除を待つ時間が上限を超える"""
+
+    def __init__(self, wait: float, reason: str):
+        super().__init__(f'GitHub のレート制限 ({reason}) のため {wait:.0f} 秒待つ必要があります')
+        self.wait = wait
+        self.reason = reason
+
+class RateLimitBudget:
+    """1つのトークン・リソースの一次レート制限 (最後のレスポンスのヘッダー)"""
+
+    def __init__(self, limit: int, remaining: int, reset_at: float, used: int = 0):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.used = used
+
+class TokenState:
+    """1つのトークンのレート制限と待ち行列"""
+
+    def __init__(self):
+        self.budgets: Dict[str, RateLimitBudget] = {}
+        self.paused_until = 0.0
+        self.pause_reason = ''
+        self.secondary_strikes = 0
+        self.last_request = 0.0
+        self.last_mutation = 0.0
+        self.in_flight = 0
+        # (優先度, 到着順) のヒープ。先頭だけがリクエストを出せる
+        self.waiters: List[Tuple[int, int]] = []
+        self._changed: Optional[asyncio.Event] = None
+        self._loop = None
+
+    def bind(self, loop):
+        """イベントループが変わったら (テスト・再起動) 前のループの待ち行列を捨てる"""
+        if self._loop is not loop:
+            self._loop = loop
+            self._changed = None
+            self.waiters = []
+            self.in_flight = 0
+
+    def changed(self) -> asyncio.Event:
+        """状態が変わった時に起こされるイベント"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def notify(self):
+        """待っているリクエストに再計算させる"""
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+class GitHubRequestScheduler:
+    """トークンごとの一次・二次レート制限を追跡して GitHub API 呼び出しを順番に出す
+
+    - バックグラウンドのリクエストは残りの reserve_ratio を対話的なリクエストのために残す
+    - 残りが pace_ratio を下回ったら、バックグラウンドのリクエストはリセットまでの時間に均等に散らす
+    - 作成・変更のリクエストは mutation_interval 秒以上空ける (二次レート制限の対策)
+    - 同時に出すリクエストはトークンごとに max_concurrency まで
+    """
+
+    def __init__(self, max_concurrency: int = 10, mutation_interval: float = 1.0, reserve_ratio: float = 0.05,
+                 pace_ratio: float = 0.2, reset_margin: float = 1.0, clock: Callable[[], float] = time.time):
+        self.max_concurrency = max_concurrency
+        self.mutation_interval = mutation_interval
+        self.reserve_ratio = reserve_ratio
+        self.pace_ratio = pace_ratio
+        # Reset の時刻ちょうどではまだ回復していないことがあるので少し待つ
+        self.reset_margin = reset_margin
+        self.clock = clock
+        self.tokens: Dict[str, TokenState] = {}
+        self._seq = itertools.count()
+        self.stats = {
+            'requests': 0,
+            'delayed': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'rejected': 0,
+            'primary_limited': 0,
+            'secondary_limited': 0,
+        }
+        self.priority_stats = {
+            name: {'requests': 0, 'wait_seconds': 0.0} for name in PRIORITY_NAMES.values()
+        }
+
+    def state(self, token: str) -> TokenState:
+        """トークンの状態 (初回のみ作成)"""
+        key = token_key(token)
+        if key not in self.tokens:
+            self.tokens[key] = TokenState()
+        return self.tokens[key]
+
+    def delay(self, token: str, priority: int = PRIORITY_BACKGROUND, method: str = 'GET',
+              resource: str = 'core') -> Tuple[float, str]:
+        """このリクエストを出せるまでの (秒数, 理由)"""
+        state = self.state(token)
+        now = self.clock()
+        waits = [(0.0, '')]
+        if state.paused_until > now:
+            waits.append((state.paused_until - now, state.pause_reason))
+
+        budget = state.budgets.get(resource)
+        if budget is not None and budget.reset_at > now:
+            reserve = 0 if priority <= PRIORITY_INTERACTIVE else math.ceil(budget.limit * self.reserve_ratio)
+            usable = budget.remaining - reserve
+            if usable <= 0:
+                waits.append((budget.reset_at - now + self.reset_margin, 'primary'))
+            elif priority > PRIORITY_INTERACTIVE and budget.remaining < budget.limit * self.pace_ratio:
+                # 残りをリセットまでの時間に均等に散らす
+                interval = (budget.reset_at - now) / usable
+                waits.append((state.last_request + interval - now, 'pacing'))
+
+        if method.upper() in MUTATING_METHODS:
+            waits.append((state.last_mutation + self.mutation_interval - now, 'mutation'))
+        wait, reason = max(waits)
+        return max(0.0, wait), reason
+
+    def _start(self, state: TokenState, priority: int, method: str, resource: str, waited: float):
+        """リクエストを出したことを記録"""
+        now = self.clock()
+        state.in_flight += 1
+        state.last_request = now
+        if method.upper() in MUTATING_METHODS:
+            state.last_mutation = now
+        # 次のレスポンスのヘッダーで正しい値に戻るまで残りを1つ減らしておく
+        budget = state.budgets.get(resource)
+        if budget is not None and budget.remaining > 0:
+            budget.remaining -= 1
+
+        name = PRIORITY_NAMES.get(priority, PRIORITY_NAMES[PRIORITY_BACKGROUND])
+        self.stats['requests'] += 1
+        self.priority_stats[name]['requests'] += 1
+        if waited > 0:
+            self.stats['delayed'] += 1
+            self.stats['wait_seconds'] += waited
+            self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+            self.priority_stats[name]['wait_seconds'] += waited
+
+    def _reject(self, wait: float, reason: str):
+        """待機の上限を超えたリクエストを断る"""
+        self.stats['rejected'] += 1
+        raise RateLimitExceeded(wait, reason)
+
+    async def acquire(self, token: str, priority: int = PRIORITY_BACKGROUND, method: str = 'GET',
+                      resource: str = 'core', max_wait: Optional[float] = None) -> float:
+        """リクエストを出してよくなるまで待つ (終わったら release を呼ぶ)
+
+        Returns:
+            待機した秒数
+
+        Raises:
+            RateLimitExceeded: 待ち行列の先頭で max_wait 秒を超えて待つ必要がある場合
+        """
+        state = self.state(token)
+        state.bind(asyncio.get_running_loop())
+        entry = (priority, next(self._seq))
+        heapq.heappush(state.waiters, entry)
+        started = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if state.waiters[0] == entry and state.in_flight < self.max_concurrency:
+                    wait, reason = self.delay(token, priority, method, resource)
+                    if wait <= 0:
+                        break
+                    if max_wait is not None and wait > max_wait:
+                        self._reject(wait, reason)
+                    timeout = wait
+                try:
+                    await asyncio.wait_for(state.changed().wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # 取り消し・拒否の場合も含めて待ち行列から外し、次のリクエストに順番を回す
+            if entry in state.waiters:
+                state.waiters.remove(entry)
+                heapq.heapify(state.waiters)
+            state.notify()
+
+        waited = time.monotonic() - started
+        self._start(state, priority, method, resource, waited)
+        return waited
+
+    def acquire_sync(self, token: str, priority: int = PRIORITY_BACKGROUND, method: str = 'GET',
+                     resource: str = 'core', max_wait: Optional[float] = None) -> float:
+        """同期のスクリプト用の acquire (順番待ちは無く、レート制限の分だけ sleep する)"""
+        state = self.state(token)
+        waited = 0.0
+        while True:
+            wait, reason = self.delay(token, priority, method, resource)
+            if wait <= 0:
+                break
+            if max_wait is not None and waited + wait > max_wait:
+                self._reject(wait, reason)
+            logger.info(f'GitHub のレート制限 ({reason}) のため {wait:.1f} 秒待ちます')
+            time.sleep(wait)
+            waited += wait
+        self._start(state, priority, method, resource, waited)
+        return waited
+
+    def release(self, token: str):
+        """リクエストが終わったことを記録"""
+        state = self.state(token)
+        state.in_flight = max(0, state.in_flight - 1)
+        state.notify()
+
+    def record_budget(self, token: str, limit: int, remaining: int, reset_at: float, used: int = 0,
+                      resource: str = 'core'):
+        """一次レート制限の状態を記録 (PyGithub などヘッダーを直接見られないクライアント用)"""
+        state = self.state(token)
+        state.budgets[resource] = RateLimitBudget(limit, remaining, reset_at, used)
+        state.notify()
+
+    def pause(self, token: str, seconds: float, reason: str):
+        """トークンの全リクエストを一時停止"""
+        state = self.state(token)
+        until = self.clock() + seconds
+        if until > state.paused_until:
+            state.paused_until = until
+            state.pause_reason = reason
+        state.notify()
+
+    def update(self, token: str, status: int, headers, body: str = '') -> Optional[float]:
+        """レスポンスのヘッダーからレート制限を記録
+
+        Returns:
+            レート制限による失敗なら再試行までの秒数 (それ以外は None)
+        """
+        # aiohttp・requests・PyGithub でヘッダー名の大文字小文字の扱いが違うので小文字にそろえる
+        headers = {str(name).lower(): value for name, value in (headers or {}).items()}
+        state = self.state(token)
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        if remaining is not None and reset is not None:
+            try:
+                self.record_budget(
+                    token, int(headers.get('x-ratelimit-limit', 0)), int(remaining), float(reset),
+                    int(headers.get('x-ratelimit-used', 0)), headers.get('x-ratelimit-resource', 'core')
+                )
+            except ValueError:
+                pass
+
+        if status not in (403, 429):
+            if status < 400:
+                state.secondary_strikes = 0
+            return None
+
+        retry_after = headers.get('retry-after')
+        if remaining == '0' and not retry_after:
+            wait = max(0.0, float(reset) - self.clock()) + self.reset_margin if reset else SECONDARY_LIMIT_WAIT
+            self.stats['primary_limited'] += 1
+            self.pause(token, wait, 'primary')
+            logger.warning(f'GitHub の一次レート制限に達しました: {wait:.0f} 秒後にリセット')
+            return wait
+        if retry_after or status == 429 or 'rate limit' in (body or '').lower():
+            try:
+                wait = float(retry_after)
+            except (TypeError, ValueError):
+                # retry-after が無ければ1分から倍々に待つ
+                wait = SECONDARY_LIMIT_WAIT * (2 ** min(state.secondary_strikes, 3))
+            state.secondary_strikes += 1
+            self.stats['secondary_limited'] += 1
+            self.pause(token, wait, 'secondary')
+            logger.warning(f'GitHub の二次レート制限を受けました: {wait:.0f} 秒停止します')
+            return wait
+        # 権限不足などの 403
+        return None
+
+    def snapshot(self, token: Optional[str] = None) -> Dict:
+        """現在の状態 (token を渡すとそのトークンだけ)"""
+        now = self.clock()
+        keys = [token_key(token)] if token is not None else list(self.tokens)
+        tokens = {}
+        for key in keys:
+            state = self.tokens.get(key)
+            if state is None:
+                continue
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in state.waiters:
+                queued[PRIORITY_NAMES.get(priority, PRIORITY_NAMES[PRIORITY_BACKGROUND])] += 1
+            tokens[key] = {
+                'in_flight': state.in_flight,
+                'queued': queued,
+                'paused_for': max(0.0, state.paused_until - now),
+                'pause_reason': state.pause_reason if state.paused_until > now else '',
+                'resources': {
+                    resource: {
+                        'limit': budget.limit,
+                        'remaining': budget.remaining,
+                        'used': budget.used,
+                        'reset_in': max(0.0, budget.reset_at - now),
+                    }
+                    for resource, budget in state.budgets.items()
+                },
+            }
+        return {**self.stats, 'by_priority': self.priority_stats, 'tokens': tokens}
+
+_shared_scheduler: Optional[GitHubRequestScheduler] = None
+
+def get_scheduler() -> GitHubRequestScheduler:
+    """プロセス内で共有するスケジューラー (同じトークンを使うクライアント間で残りを共有する)"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = GitHubRequestScheduler()
+    return _shared_scheduler
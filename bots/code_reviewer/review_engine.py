@@ -0,0 +1,460 @@
+"""
+大きな差分の分割レビュー (map-reduce)
+unified diff をファイル・ハンク単位に分けてトークン予算ごとのチャンクに詰め、
+チャンクを同時実行数の上限付きで並列にレビューしてから、部分レビューを最後にまとめる
+所要時間は全チャンクの合計ではなく最も遅いチャンク + まとめの1回で決まる
+CodeReviewerBot と .github/scripts/ai_review.py の両方から使う (標準ライブラリと bots/prompt_budget.py に依存)
+チャンクの予算はモデルのトークナイザーで数え、モデルの入力上限を超えないように抑える
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from prompt_budget import DEFAULT_MODEL, PromptBudget, get_counter
+from review_findings import FINDINGS_FORMAT, collect_findings, number_diff_lines
+
+logger = logging.getLogger(__name__)
+
+# (プロンプト, 最大出力トークン数) を受け取って LLM の応答本文を返す関数
+CompleteFunc = Callable[[str, int], Awaitable[str]]
+
+# トークン数を数える関数
+CountFunc = Callable[[str], int]
+
+# PR の説明に使うトークン数の上限
+PR_BODY_TOKENS = 300
+
+def estimate_tokens(text: str) -> int:
+    """既定のモデルのトークナイザーで数えたトークン数"""
+    return get_counter(DEFAULT_MODEL).count(text)
+
+class DiffFile:
+    """unified diff の1ファイル分 (ヘッダーとハンク)"""
+
+    def __init__(self, path: str, header: List[str]):
+        self.path = path
+        self.header = header
+        self.hunks: List[List[str]] = []
+
+    @property
+    def header_text(self) -> str:
+        """diff --git から最初の @@ までの行"""
+        return ''.join(self.header)
+
+    @property
+    def text(self) -> str:
+        """ファイル全体の差分"""
+        return self.header_text + ''.join(''.join(hunk) for hunk in self.hunks)
+
+def path_from_header(line: str) -> str:
+    """diff --git a/x b/y から変更後のパスを取り出す"""
+    parts = line.rstrip('\n').split(' b/', 1)
+    if len(parts) == 2:
+        return parts[1]
+    return line.rstrip('\n')[len('diff --git '):]
+
+def parse_unified_diff(diff: str) -> List[DiffFile]:
+    """unified diff をファイルとハンクに分割"""
+    files: List[DiffFile] = []
+    current: Optional[DiffFile] = None
+
+    for line in diff.splitlines(keepends=True):
+        if line.startswith('diff --git '):
+            current = DiffFile(path_from_header(line), [line])
+            files.append(current)
+        elif current is None:
+            # diff --git 行の前にある前置き (git format-patch のメールヘッダーなど) は捨てる
+            continue
+        elif line.startswith('@@'):
+            current.hunks.append([line])
+        elif current.hunks:
+            current.hunks[-1].append(line)
+        else:
+            if line.startswith('+++ b/'):
+                current.path = line[len('+++ b/'):].rstrip('\n')
+            current.header.append(line)
+
+    return files
+
+class DiffChunk:
+    """1回のレビュー依頼に入れる差分の塊"""
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.parts: List[str] = []
+        self.tokens = 0
+
+    def add(self, path: str, text: str, tokens: int):
+        """差分を追加"""
+        if path not in self.paths:
+            self.paths.append(path)
+        self.parts.append(text)
+        self.tokens += tokens
+
+    @property
+    def text(self) -> str:
+        """チャンクの差分"""
+        return ''.join(self.parts)
+
+def _split_lines(header: str, lines: List[str], budget: int, count_tokens: CountFunc = estimate_tokens) -> List[str]:
+    """予算を超える1つのハンクを行単位で分割 (各片にファイルヘッダーとハンク行を付ける)"""
+    prefix = header + lines[0]
+    pieces = []
+    current: List[str] = []
+    size = count_tokens(prefix)
+    for line in lines[1:]:
+        line_tokens = count_tokens(line)
+        if current and size + line_tokens > budget:
+            pieces.append(prefix + ''.join(current))
+            current = []
+            size = count_tokens(prefix)
+        current.append(line)
+        size += line_tokens
+    if current or not pieces:
+        pieces.append(prefix + ''.join(current))
+    return pieces
+
+def pack_diff(files: List[DiffFile], token_budget: int, count_tokens: CountFunc = estimate_tokens) -> List[DiffChunk]:
+    """ファイルを順にトークン予算まで詰める (大きなファイルはハンク単位、大きなハンクは行単位で分ける)"""
+    chunks: List[DiffChunk] = []
+    current = DiffChunk()
+
+    def flush():
+        nonlocal current
+        if current.parts:
+            chunks.append(current)
+        current = DiffChunk()
+
+    for diff_file in files:
+        text = diff_file.text
+        tokens = count_tokens(text)
+        if tokens <= token_budget:
+            if current.tokens + tokens > token_budget:
+                flush()
+            current.add(diff_file.path, text, tokens)
+            continue
+
+        # 1ファイルで予算を超える: ハンクごとにヘッダーを付け直して詰める
+        header = diff_file.header_text
+        for hunk in diff_file.hunks or [[]]:
+            hunk_text = header + ''.join(hunk)
+            hunk_tokens = count_tokens(hunk_text)
+            pieces = ([hunk_text] if hunk_tokens <= token_budget
+                      else _split_lines(header, hunk, token_budget, count_tokens))
+            for piece in pieces:
+                piece_tokens = count_tokens(piece)
+                if current.tokens + piece_tokens > token_budget:
+                    flush()
+                current.add(diff_file.path, piece, piece_tokens)
+
+    flush()
+    return chunks
+
+def split_review(review: str, paths: List[str]) -> Tuple[str, Dict[str, str]]:
+    """レビューを全体の講評と `#### <パス>` の見出しごとの指摘に分ける
+
+    ファイルの見出しより上位の (# が3つ以下の) 他の見出しからは再び全体の講評とする
+    見出しが1つも無ければ指摘は空
+    """
+    summary: List[str] = []
+    findings: Dict[str, List[str]] = {}
+    current = None
+    for line in review.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            heading = stripped.lstrip('#').strip().strip('`').strip()
+            if heading in paths:
+                current = heading
+                findings.setdefault(current, [])
+                continue
+            if len(stripped) - len(stripped.lstrip('#')) <= 3:
+                current = None
+        if current is None:
+            summary.append(line)
+        else:
+            findings[current].append(line)
+    return '\n'.join(summary).strip(), {path: '\n'.join(lines).strip() for path, lines in findings.items()}
+
+def split_findings(review: str, paths: List[str]) -> Dict[str, str]:
+    """チャンクのレビューを `#### <パス>` の見出しでファイルごとの指摘に分ける
+
+    見出しの無いファイルには割り当てない (チャンク全体のレビューはまとめにだけ使う。
+    各ファイルに写すと講評の文が全ファイルの指摘として重複する)
+    """
+    _, findings = split_review(review, paths)
+    return findings
+
+class ChunkedReviewEngine:
+    """差分をチャンクに分けて並列にレビューし、部分レビューを1つにまとめる"""
+
+    def __init__(self, complete: CompleteFunc, chunk_token_budget: int = 4000,
+                 reduce_token_budget: int = 5000, max_concurrency: int = 4, max_chunks: int = 20,
+                 chunk_output_tokens: int = 800, review_output_tokens: int = 1500, model: str = DEFAULT_MODEL):
+        self.complete = complete
+        self.model = model
+        self.counter = get_counter(model)
+        self.chunk_token_budget = chunk_token_budget
+        self.reduce_token_budget = reduce_token_budget
+        self.max_chunks = max_chunks
+        self.chunk_output_tokens = chunk_output_tokens
+        self.review_output_tokens = review_output_tokens
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def format_pr_info(self, pr_info: Dict) -> str:
+        """プロンプト用の PR 情報"""
+        lines = [
+            f"- タイトル: {pr_info.get('title', 'N/A')}",
+            f"- 作成者: {pr_info.get('author', 'N/A')}",
+            f"- 変更ファイル数: {pr_info.get('changed_files', 0)}",
+            f"- 追加行数: {pr_info.get('additions', 0)}",
+            f"- 削除行数: {pr_info.get('deletions', 0)}",
+        ]
+        if pr_info.get('body'):
+            lines.insert(1, f"- 説明: {self.counter.truncate(pr_info['body'], PR_BODY_TOKENS)}")
+        return '\n'.join(lines)
+
+    def build_review_prompt(self, diff: str, pr_info: Dict, instructions: str) -> str:
+        """1回で収まる差分のレビュープロンプト"""
+        return f"""
+あなたは経験豊富なシニアソフトウェアエンジニアです。以下のPull Requestをレビューしてください。
+
+## Pull Request 情報
+{self.format_pr_info(pr_info)}
+
+## コード差分
+```diff
+{diff}
+```
+
+{instructions}
+
+最初に PR 全体の講評を書き、その後にファイルごとの指摘を書いてください。
+{FINDINGS_FORMAT}
+"""
+
+    def build_chunk_prompt(self, chunk: DiffChunk, index: int, total: int, pr_info: Dict,
+                           instructions: str) -> str:
+        """分割した差分の一部をレビューするプロンプト"""
+        paths = '\n'.join(f'- {path}' for path in chunk.paths)
+        return f"""
+あなたは経験豊富なシニアソフトウェアエンジニアです。
+以下は Pull Request の差分を {total} 個に分けたうちの {index} 番目です。この部分だけをレビューしてください。
+
+## Pull Request 情報
+{self.format_pr_info(pr_info)}
+
+## この部分に含まれるファイル
+{paths}
+
+## コード差分
+```diff
+{chunk.text}
+```
+
+最終的なレビューは後で他の部分と統合します。以下の観点に沿って、見つかった問題点と良い点を
+簡潔に挙げてください。指摘が無い観点は省略してください。
+{FINDINGS_FORMAT}
+
+{instructions}
+"""
+
+    def build_reduce_prompt(self, partials: List[Dict], pr_info: Dict, instructions: str,
+                            omitted: List[str]) -> str:
+        """部分レビューを1つのレビューにまとめるプロンプト"""
+        sections = '\n\n'.join(
+            f"### {p.get('label') or '部分 ' + str(p['index'])} ({', '.join(p['paths'][:10])})\n{p['review']}"
+            for p in partials
+        )
+        notes = ''
+        if omitted:
+            notes = f"\n\n※ 以下のファイルは分量の上限によりレビューしていません: {', '.join(omitted[:30])}"
+        return f"""
+あなたは経験豊富なシニアソフトウェアエンジニアです。
+以下は1つの Pull Request を分割して行った部分レビューです。重複した指摘をまとめ、重要度の高い順に整理して、
+PR 全体に対する1つの講評にしてください。個々の指摘は該当する行へのコメントとして別に投稿されるので、
+全体の評価と特に重要な問題に絞って、ファイル名と該当箇所を示しながら簡潔にまとめてください。
+
+## Pull Request 情報
+{self.format_pr_info(pr_info)}
+
+## 部分レビュー
+{sections}{notes}
+
+{instructions}
+"""
+
+    def input_budget(self, empty_prompt: str, output_tokens: int, configured: int) -> int:
+        """差分・部分レビューに使えるトークン数 (設定値をモデルの入力上限から定型部分を除いた分に抑える)"""
+        limit = PromptBudget(self.model, output_tokens).input_tokens - self.counter.count(empty_prompt)
+        return max(256, min(configured, limit))
+
+    async def _complete(self, prompt: str, max_tokens: int) -> str:
+        """同時実行数の上限付きで LLM を呼ぶ"""
+        async with self.semaphore:
+            return await self.complete(prompt, max_tokens)
+
+    async def _review_chunk(self, chunk: DiffChunk, index: int, total: int, pr_info: Dict,
+                            instructions: str) -> Dict:
+        """1チャンクをレビュー (失敗しても他のチャンクは続ける)"""
+        started = time.perf_counter()
+        try:
+            review = await self._complete(
+                self.build_chunk_prompt(chunk, index, total, pr_info, instructions),
+                self.chunk_output_tokens
+            )
+            error = None
+        except Exception as e:
+            review, error = '', str(e) or e.__class__.__name__
+            logger.warning(f'チャンク {index}/{total} のレビューに失敗: {error}')
+        return {
+            'index': index,
+            'paths': chunk.paths,
+            'review': review,
+            'error': error,
+            'elapsed': time.perf_counter() - started,
+        }
+
+    def _group_partials(self, partials: List[Dict], budget: int) -> List[List[Dict]]:
+        """まとめのプロンプトが予算に収まるように部分レビューをグループ分け"""
+        groups: List[List[Dict]] = [[]]
+        size = 0
+        for partial in partials:
+            # 部分レビューの見出し (ラベルとファイル名) の分も含める
+            tokens = self.counter.count(partial['review']) + 8 + 4 * min(len(partial['paths']), 10)
+            if groups[-1] and size + tokens > budget:
+                groups.append([])
+                size = 0
+            groups[-1].append(partial)
+            size += tokens
+        return groups
+
+    async def _reduce(self, partials: List[Dict], pr_info: Dict, instructions: str,
+                      omitted: List[str]) -> str:
+        """部分レビューをまとめる (予算を超える場合はグループごとにまとめてから再度まとめる)"""
+        budget = self.input_budget(
+            self.build_reduce_prompt([], pr_info, instructions, omitted), self.review_output_tokens,
+            self.reduce_token_budget
+        )
+        while True:
+            groups = self._group_partials(partials, budget)
+            # 1グループに収まる (またはこれ以上まとめても減らない) なら最終のまとめ
+            if len(groups) == 1 or len(groups) >= len(partials):
+                return await self._complete(
+                    self.build_reduce_prompt(partials, pr_info, instructions, omitted),
+                    self.review_output_tokens
+                )
+            merged = await asyncio.gather(*(
+                self._complete(self.build_reduce_prompt(group, pr_info, instructions, []),
+                               self.chunk_output_tokens)
+                for group in groups
+            ))
+            partials = [
+                {'index': i, 'paths': [p for partial in group for p in partial['paths']], 'review': text}
+                for i, (group, text) in enumerate(zip(groups, merged), start=1)
+            ]
+
+    async def review(self, diff: str, pr_info: Dict, instructions: str,
+                     reuse: Optional[Dict[str, str]] = None, diff_filter=None) -> Dict:
+        """差分全体をレビュー
+
+        Args:
+            reuse: 前回から変更の無いファイルの指摘 (パス -> 指摘)。これらのファイルはレビューせずにまとめに使う
+            diff_filter: プロンプトを作る前に生成ファイルなどを間引く DiffFilter (集計は filter に入る)
+
+        Returns:
+            review (本文), chunks, files_total, files_reviewed, failed_chunks, omitted_files,
+            reused_files, file_findings, findings (行に紐づいた指摘の dict), filter, elapsed
+        """
+        started = time.perf_counter()
+        filter_summary = None
+        if diff_filter is not None:
+            filtered = diff_filter.filter(diff)
+            diff = filtered.text
+            filter_summary = filtered.summary()
+        # 行に紐づいた指摘を返せるように、差分の各行に変更後の行番号を付けてからチャンクに分ける
+        files = parse_unified_diff(number_diff_lines(diff))
+        all_paths = [f.path for f in files]
+        reuse = reuse or {}
+        reused = {f.path: reuse[f.path] for f in files if f.path in reuse}
+        pending = [f for f in files if f.path not in reused]
+        chunk_budget = self.input_budget(
+            self.build_chunk_prompt(DiffChunk(), 1, 1, pr_info, instructions),
+            max(self.chunk_output_tokens, self.review_output_tokens),
+            self.chunk_token_budget
+        )
+        chunks = pack_diff(pending, chunk_budget, self.counter.count) if pending else []
+
+        if len(chunks) <= 1 and not reused:
+            # 1回で収まる差分は分割せずにそのままレビュー
+            text = chunks[0].text if chunks else diff
+            review = await self._complete(
+                self.build_review_prompt(text, pr_info, instructions), self.review_output_tokens
+            )
+            summary, file_findings = split_review(review, all_paths)
+            return {
+                'review': summary if file_findings else review,
+                'chunks': 1,
+                'files_total': len(all_paths),
+                'files_reviewed': len(all_paths),
+                'failed_chunks': 0,
+                'omitted_files': [],
+                'reused_files': [],
+                'file_findings': file_findings,
+                'findings': [f.to_dict() for f in collect_findings(file_findings)],
+                'filter': filter_summary,
+                'elapsed': time.perf_counter() - started,
+            }
+
+        selected = chunks[:self.max_chunks]
+        covered = {path for chunk in selected for path in chunk.paths}
+        omitted = [f.path for f in pending if f.path not in covered]
+
+        partials = await asyncio.gather(*(
+            self._review_chunk(chunk, i, len(selected), pr_info, instructions)
+            for i, chunk in enumerate(selected, start=1)
+        ))
+        succeeded = [p for p in partials if not p['error']]
+        failed = [p for p in partials if p['error']]
+        if not succeeded and not reused:
+            raise RuntimeError(f'全 {len(partials)} チャンクのレビューに失敗しました: {failed[0]["error"]}')
+
+        for partial in failed:
+            omitted.extend(path for path in partial['paths'] if path not in omitted)
+        reviewed = {path for partial in succeeded for path in partial['paths']}
+        file_findings: Dict[str, str] = {}
+        for partial in succeeded:
+            file_findings.update(split_findings(partial['review'], partial['paths']))
+
+        # 再利用する指摘は同じ内容ごとにまとめて (見出しが無かったチャンクの重複を避ける) まとめに渡す
+        by_text: Dict[str, List[str]] = {}
+        for path, text in reused.items():
+            if text:
+                by_text.setdefault(text, []).append(path)
+        cached_partials = [
+            {'index': i, 'label': '前回から変更なし (再利用)', 'paths': paths, 'review': text}
+            for i, (text, paths) in enumerate(by_text.items(), start=1)
+        ]
+
+        map_elapsed = time.perf_counter() - started
+        review = await self._reduce(succeeded + cached_partials, pr_info, instructions, omitted)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f'分割レビュー: {len(selected)} チャンク, {len(reviewed)}/{len(all_paths)} ファイル '
+            f'(再利用 {len(reused)}), map {map_elapsed:.1f}s '
+            f'(最長チャンク {max((p["elapsed"] for p in partials), default=0):.1f}s), 合計 {elapsed:.1f}s'
+        )
+        return {
+            'review': review,
+            'chunks': len(selected),
+            'files_total': len(all_paths),
+            'files_reviewed': len(reviewed),
+            'failed_chunks': len(failed),
+            'omitted_files': omitted,
+            'reused_files': list(reused),
+            'file_findings': file_findings,
+            'findings': [f.to_dict() for f in collect_findings({**reused, **file_findings})],
+            'filter': filter_summary,
+            'elapsed': elapsed,
+        }
@@ -0,0 +1,335 @@
+"""
+ファイル・行に紐づいたレビューの指摘
+チャンクのレビュー (`#### <パス>` 見出しの下の `- L12: ⚠️ ...` 形式の箇条書き) を構造化した指摘にし、
+GitHub の1回の create_review (行コメントをまとめて送る) と Discord のダイジェストを同じデータから作る
+"""
+
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+SEVERITY_ICONS = {
+    'critical': '⚠️',
+    'suggestion': '💡',
+    'good': '👍',
+    'note': '📝',
+}
+SEVERITY_ORDER = ['critical', 'suggestion', 'note', 'good']
+ICON_SEVERITIES = {'⚠️': 'critical', '⚠': 'critical', '💡': 'suggestion', '👍': 'good', '✅': 'good'}
+
+# チャンク・1回のレビューのプロンプトに付ける出力形式の指示
+FINDINGS_FORMAT = """指摘はファイルごとに `#### <ファイルパス>` の見出しの下に、1件1行の箇条書きで書いてください。
+特定の行への指摘は `- L<行番号>: ⚠️ 内容` (複数行なら `- L<開始>-<終了>: 💡 内容`)、
+ファイル全体への指摘は `- ⚠️ 内容` の形式にしてください (重大な問題は ⚠️、改善提案は 💡、良い点は 👍)。
+行番号は差分の各行の記号の後に付けた、変更後のファイルの行番号を使ってください。"""
+
+HUNK_START = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+BULLET = re.compile(r'^\s*[-*・]\s+(.*)$')
+LINE_ANCHOR = re.compile(r'^\**L(\d+)(?:\s*[-–~]\s*L?(\d+))?\**\s*[:：]?\s*')
+# 箇条書きの先頭の行番号 (保存済みの指摘をずらす時に使う)
+LINE_REFERENCE = re.compile(r'(^\s*[-*・]\s+\**)L(\d+)(?:(\s*[-–~]\s*L?)(\d+))?', re.MULTILINE)
+
+# GitHub の本文の上限 (65536 文字) より少し小さくする
+MAX_BODY_CHARS = 60000
+
+class Finding:
+    """ファイル (と行) に紐づいた1件の指摘"""
+
+    def __init__(self, path: str, message: str, severity: str = 'note',
+                 line: Optional[int] = None, end_line: Optional[int] = None):
+        self.path = path
+        self.message = message
+        self.severity = severity
+        self.line = line
+        self.end_line = end_line
+
+    @property
+    def icon(self) -> str:
+        """重要度のアイコン"""
+        return SEVERITY_ICONS[self.severity]
+
+    @property
+    def location(self) -> str:
+        """path:L12 (行が無ければパスだけ)"""
+        if self.line is None:
+            return self.path
+        if self.end_line and self.end_line != self.line:
+            return f'{self.path}:L{self.line}-L{self.end_line}'
+        return f'{self.path}:L{self.line}'
+
+    def to_dict(self) -> Dict:
+        """JSON にできる形"""
+        return {
+            'path': self.path,
+            'line': self.line,
+            'end_line': self.end_line,
+            'severity': self.severity,
+            'message': self.message,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Finding':
+        """to_dict の逆"""
+        return cls(data['path'], data['message'], data.get('severity', 'note'),
+                   data.get('line'), data.get('end_line'))
+
+def number_diff_lines(diff: str) -> str:
+    """ハンク内の行に変更後のファイルの行番号を付ける (削除行は空欄)
+
+    `+ 12 | code` のように記号の直後に番号を置くので、行頭の記号で差分を読む処理はそのまま使える
+    """
+    out = []
+    number = None
+    for line in diff.splitlines(keepends=True):
+        match = HUNK_START.match(line)
+        if match:
+            number = int(match.group(1))
+            out.append(line)
+        elif line.startswith('diff --git '):
+            number = None
+            out.append(line)
+        elif number is None or line[:1] not in ('+', '-', ' '):
+            out.append(line)
+        elif line.startswith('-'):
+            out.append(f'-{"":>5} | {line[1:]}')
+        else:
+            out.append(f'{line[0]}{number:>5} | {line[1:]}')
+            number += 1
+    return ''.join(out)
+
+def hunk_starts(patch: str) -> List[int]:
+    """パッチの各ハンクの変更後の開始行"""
+    starts = []
+    for line in patch.splitlines():
+        match = HUNK_START.match(line)
+        if match:
+            starts.append(int(match.group(1)))
+    return starts
+
+def shift_findings(text: str, old_starts: List[int], new_starts: List[int]) -> str:
+    """保存済みの指摘の行番号を今回の差分の行に合わせる
+
+    パッチの中身が同じでベースの更新でハンクがずれただけの場合に、行番号を各ハンクのずれの分だけ動かす
+    (ハンクの数が違う場合はそのまま返す)
+    """
+    if not old_starts or len(old_starts) != len(new_starts) or old_starts == new_starts:
+        return text
+
+    def shift(number: int) -> int:
+        index = 0
+        for i, start in enumerate(old_starts):
+            if number >= start:
+                index = i
+        return number - old_starts[index] + new_starts[index]
+
+    def replace(match) -> str:
+        anchor = f'{match.group(1)}L{shift(int(match.group(2)))}'
+        if match.group(3):
+            anchor += f'{match.group(3)}{shift(int(match.group(4)))}'
+        return anchor
+
+    return LINE_REFERENCE.sub(replace, text)
+
+def _parse_severity(text: str) -> Tuple[str, str]:
+    """先頭のアイコンから重要度を取り出す"""
+    for icon, severity in ICON_SEVERITIES.items():
+        if text.startswith(icon):
+            return severity, text[len(icon):].lstrip('️').strip()
+    for icon, severity in ICON_SEVERITIES.items():
+        if icon in text:
+            return severity, text
+    return 'note', text
+
+def parse_file_findings(path: str, text: str) -> List[Finding]:
+    """1ファイル分の指摘の箇条書きを Finding にする (字下げした行は直前の指摘の続きとする)"""
+    findings: List[Finding] = []
+    for raw in text.splitlines():
+        match = BULLET.match(raw)
+        if match:
+            body = match.group(1).strip()
+            line = end_line = None
+            anchor = LINE_ANCHOR.match(body)
+            if anchor:
+                line = int(anchor.group(1))
+                end_line = int(anchor.group(2)) if anchor.group(2) else None
+                body = body[anchor.end():]
+            severity, message = _parse_severity(body)
+            if message:
+                findings.append(Finding(path, message, severity, line, end_line))
+        elif raw.strip() and findings and raw.startswith((' ', '\t')):
+            findings[-1].message += '\n' + raw.strip()
+        elif raw.strip() and not raw.lstrip().startswith('#'):
+            # 箇条書きになっていない指摘はファイル全体への指摘として扱う
+            severity, message = _parse_severity(raw.strip())
+            findings.append(Finding(path, message, severity))
+    return findings
+
+def collect_findings(file_findings: Dict[str, str]) -> List[Finding]:
+    """ファイルごとの指摘の本文から全ての指摘"""
+    return [finding for path, text in file_findings.items() for finding in parse_file_findings(path, text)]
+
+def commentable_lines(diff: str) -> Dict[str, List[Set[int]]]:
+    """行コメントを付けられる変更後の行番号 (ファイルごと・ハンクごと)"""
+    lines: Dict[str, List[Set[int]]] = {}
+    path = None
+    number = None
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            parts = line.split(' b/', 1)
+            path = parts[1] if len(parts) == 2 else None
+            number = None
+            continue
+        if line.startswith('+++ b/'):
+            path = line[len('+++ b/'):]
+            continue
+        match = HUNK_START.match(line)
+        if match and path:
+            number = int(match.group(1))
+            lines.setdefault(path, []).append(set())
+            continue
+        if number is None or path is None:
+            continue
+        if line.startswith('+') or line.startswith(' '):
+            lines[path][-1].add(number)
+            number += 1
+    return lines
+
+def _anchor(finding: Finding, hunks: List[Set[int]]) -> Optional[Dict]:
+    """指摘を行コメントの位置にする (差分に無い行なら None)"""
+    if finding.line is None:
+        return None
+    for hunk in hunks:
+        if finding.line in hunk:
+            position = {'line': finding.line, 'side': 'RIGHT'}
+            end = finding.end_line
+            if end and end > finding.line and end in hunk:
+                position = {'start_line': finding.line, 'start_side': 'RIGHT', 'line': end, 'side': 'RIGHT'}
+            return position
+        # 範囲の終わりだけが差分に含まれる場合はそこに付ける
+        if finding.end_line and finding.end_line in hunk:
+            return {'line': finding.end_line, 'side': 'RIGHT'}
+    return None
+
+def _severity_rank(finding: Finding) -> int:
+    """重要度の並び順"""
+    return SEVERITY_ORDER.index(finding.severity)
+
+def _findings_section(findings: List[Finding], title: str) -> str:
+    """本文に入れる指摘の一覧 (ファイルごと)"""
+    if not findings:
+        return ''
+    lines = [f'### {title}']
+    current = None
+    for finding in sorted(findings, key=lambda f: (f.path, f.line or 0)):
+        if finding.path != current:
+            current = finding.path
+            lines.append(f'\n**`{current}`**')
+        where = f'L{finding.line}: ' if finding.line is not None else ''
+        lines.append(f'- {where}{finding.icon} {finding.message}')
+    return '\n'.join(lines)
+
+def _fit_body(parts: List[str]) -> str:
+    """本文を GitHub の上限に収める"""
+    body = '\n\n'.join(part for part in parts if part)
+    if len(body) > MAX_BODY_CHARS:
+        body = body[:MAX_BODY_CHARS] + '\n\n…(長すぎるため省略しました)'
+    return body
+
+def build_review_payload(summary: str, findings: List[Finding], diff: str, notes: Optional[List[str]] = None,
+                         max_comments: int = 50, header: str = '', footer: str = '') -> Dict:
+    """1回の create_review で送る本文と行コメント
+
+    差分に無い行・ファイル全体への指摘と、上限 (max_comments) を超えた指摘は本文に入れる
+    fallback_body は行コメントが拒否された (422) 場合に全ての指摘を本文に入れて送り直すための本文
+
+    Returns:
+        body, comments ([{path, line, side, (start_line, start_side), body}]), fallback_body, inline, unanchored
+    """
+    hunks = commentable_lines(diff)
+    anchored: Dict[Tuple, List[Finding]] = {}
+    unanchored: List[Finding] = []
+    # 重要な指摘から行コメントにする
+    for finding in sorted(findings, key=_severity_rank):
+        position = _anchor(finding, hunks.get(finding.path, []))
+        if position is None:
+            unanchored.append(finding)
+            continue
+        key = (finding.path, tuple(sorted(position.items())))
+        if key not in anchored and len(anchored) >= max_comments:
+            unanchored.append(finding)
+            continue
+        anchored.setdefault(key, []).append(finding)
+
+    comments = []
+    for (path, position), group in anchored.items():
+        comments.append({
+            'path': path,
+            **dict(position),
+            'body': '\n\n'.join(f'{f.icon} {f.message}' for f in group),
+        })
+
+    notes_text = '\n>\n'.join(notes or [])
+    body = _fit_body([header, summary, _findings_section(unanchored, 'ファイル全体・差分外の指摘'),
+                      notes_text, footer])
+    fallback_body = _fit_body([header, summary, _findings_section(findings, '指摘'), notes_text, footer])
+    return {
+        'body': body,
+        'comments': comments,
+        'fallback_body': fallback_body,
+        'inline': sum(len(group) for group in anchored.values()),
+        'unanchored': len(unanchored),
+    }
+
+def severity_counts(findings: List[Finding]) -> Dict[str, int]:
+    """重要度ごとの件数"""
+    counts = {severity: 0 for severity in SEVERITY_ORDER}
+    for finding in findings:
+        counts[finding.severity] += 1
+    return counts
+
+def format_counts(findings: List[Finding]) -> str:
+    """⚠️ 2 · 💡 5 · 👍 1 (0 件の重要度は省く)"""
+    counts = severity_counts(findings)
+    return ' · '.join(f'{SEVERITY_ICONS[s]} {counts[s]}' for s in SEVERITY_ORDER if counts[s]) or '指摘なし'
+
+def format_digest(findings: List[Finding], max_fields: int = 20, max_field_chars: int = 1024,
+                  max_total_chars: int = 4500, message_chars: int = 160) -> Tuple[List[Tuple[str, str]], int]:
+    """Discord の embed に入れるファイルごとのダイジェスト
+
+    重要な指摘から順に、1件1行 (長い指摘は message_chars で切る) で embed の上限まで入れる
+
+    Returns:
+        ([(フィールド名, 本文)], 入りきらなかった指摘の件数)
+    """
+    by_path: Dict[str, List[Finding]] = {}
+    for finding in sorted(findings, key=lambda f: (_severity_rank(f), f.path, f.line or 0)):
+        by_path.setdefault(finding.path, []).append(finding)
+
+    fields = []
+    total = 0
+    omitted = 0
+    for path, items in by_path.items():
+        name = f'`{path}`'[:256]
+        lines = []
+        size = 0
+        for finding in items:
+            message = ' '.join(finding.message.split())
+            if len(message) > message_chars:
+                message = message[:message_chars - 1] + '…'
+            where = f'L{finding.line} ' if finding.line is not None else ''
+            line = f'{finding.icon} {where}{message}'
+            if (size + len(line) + 1 > max_field_chars or total + len(name) + size + len(line) > max_total_chars
+                    or len(fields) >= max_fields):
+                omitted += 1
+                continue
+            lines.append(line)
+            size += len(line) + 1
+        if lines:
+            fields.append((name, '\n'.join(lines)))
+            total += len(name) + size
+    return fields, omitted
+
+def format_report(title: str, summary: str, findings: List[Finding], notes: Optional[List[str]] = None) -> str:
+    """全ての指摘を含む Markdown のレポート (Discord の添付ファイル用)"""
+    parts = [f'# {title}', summary, _findings_section(findings, f'指摘 ({format_counts(findings)})')]
+    parts.extend(notes or [])
+    return '\n\n'.join(part for part in parts if part) + '\n'
@@ -0,0 +1,262 @@
+"""
+差分レビューの再利用ストア
+PR ごとにレビューした head SHA・最終レビュー・ファイルごとのパッチのハッシュと指摘を保存し、
+再レビューではパッチが変わったファイルだけを LLM に渡して、残りは保存済みの指摘を使う
+CodeReviewerBot (SQLite ファイル) と .github/scripts/ai_review.py (ワークフロー間で
+actions/cache に保存する SQLite ファイル) の両方から使う
+"""
+
+import hashlib
+import re
+import time
+from typing import Dict, List, Optional
+
+from review_engine import ChunkedReviewEngine, parse_unified_diff
+from review_findings import collect_findings, hunk_starts, shift_findings
+
+# 指摘の形式を変えたら上げる (古い指摘を再利用しないように)
+PROMPT_VERSION = '2'
+
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+def patch_hash(patch: str, version: str = '') -> str:
+    """ファイルのパッチのハッシュ
+
+    index 行 (blob ハッシュ) とハンクの行番号は除く (ベースブランチの更新で行がずれただけなら同じ値)
+    """
+    digest = hashlib.sha256(version.encode('utf-8'))
+    for line in patch.splitlines():
+        if line.startswith('index '):
+            continue
+        digest.update(HUNK_HEADER.sub('@@', line).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def hash_diff_files(diff: str, version: str = '') -> Dict[str, str]:
+    """unified diff のファイルごとのパッチハッシュ"""
+    return {f.path: patch_hash(f.text, version) for f in parse_unified_diff(diff)}
+
+def combine_hashes(file_hashes: Dict[str, str]) -> str:
+    """ファイルごとのハッシュから差分全体のハッシュを作成"""
+    material = '\n'.join(f'{path}\x1f{file_hashes[path]}' for path in sorted(file_hashes))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def instructions_version(instructions: str) -> str:
+    """プロンプトのバージョンと観点の文面から指摘のバージョンを作成"""
+    return hashlib.sha256(f'{PROMPT_VERSION}\x1f{instructions}'.encode('utf-8')).hexdigest()[:16]
+
+class ReviewStore:
+    """SQLite に永続化される PR ごとのレビュー結果"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.init_table()
+
+    def init_table(self):
+        """レビュー結果テーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_runs (
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                head_sha TEXT NOT NULL,
+                diff_hash TEXT NOT NULL,
+                review TEXT NOT NULL,
+                files_total INTEGER DEFAULT 0,
+                files_reviewed INTEGER DEFAULT 0,
+                files_reused INTEGER DEFAULT 0,
+                reviewed_at REAL NOT NULL,
+                PRIMARY KEY (repo, pr_number)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_files (
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                patch_hash TEXT NOT NULL,
+                findings TEXT NOT NULL,
+                head_sha TEXT NOT NULL,
+                reviewed_at REAL NOT NULL,
+                hunk_starts TEXT DEFAULT '',
+                PRIMARY KEY (repo, pr_number, path)
+            )
+        ''')
+
+        # ハンクの開始行の列が無い古いテーブルに追加
+        cursor.execute('PRAGMA table_info(review_files)')
+        if 'hunk_starts' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE review_files ADD COLUMN hunk_starts TEXT DEFAULT ''")
+
+        self.conn.commit()
+
+    def get_run(self, repo: str, pr_number: int) -> Optional[Dict]:
+        """前回のレビュー (無ければ None)"""
+        row = self.conn.execute('''
+            SELECT head_sha, diff_hash, review, files_total, files_reviewed, files_reused, reviewed_at
+            FROM review_runs WHERE repo = ? AND pr_number = ?
+        ''', (repo, pr_number)).fetchone()
+        if row is None:
+            return None
+        columns = ['head_sha', 'diff_hash', 'review', 'files_total', 'files_reviewed', 'files_reused', 'reviewed_at']
+        return dict(zip(columns, row))
+
+    def plan(self, repo: str, pr_number: int, file_hashes: Dict[str, str],
+             file_starts: Optional[Dict[str, List[int]]] = None) -> Dict:
+        """今回の差分のうち再利用できるファイルとレビューが必要なファイルを決める
+
+        file_starts (パス -> 今回の各ハンクの開始行) を渡すと、再利用する指摘の行番号を今回の差分に合わせる
+
+        Returns:
+            reuse (パス -> 指摘), changed (パス), previous (前回の get_run),
+            unchanged (差分全体が前回と同じなら True)
+        """
+        rows = self.conn.execute('''
+            SELECT path, patch_hash, findings, hunk_starts FROM review_files WHERE repo = ? AND pr_number = ?
+        ''', (repo, pr_number)).fetchall()
+        stored = {path: (digest, findings, starts) for path, digest, findings, starts in rows}
+
+        reuse = {}
+        changed = []
+        for path, digest in file_hashes.items():
+            if path in stored and stored[path][0] == digest:
+                findings, starts = stored[path][1], stored[path][2]
+                if file_starts and starts:
+                    old_starts = [int(start) for start in starts.split(',')]
+                    findings = shift_findings(findings, old_starts, file_starts.get(path, []))
+                reuse[path] = findings
+            else:
+                changed.append(path)
+
+        previous = self.get_run(repo, pr_number)
+        return {
+            'reuse': reuse,
+            'changed': changed,
+            'previous': previous,
+            'unchanged': previous is not None and previous['diff_hash'] == combine_hashes(file_hashes),
+        }
+
+    def save(self, repo: str, pr_number: int, head_sha: str, file_hashes: Dict[str, str],
+             findings: Dict[str, str], result: Dict, now: Optional[float] = None,
+             file_starts: Optional[Dict[str, List[int]]] = None):
+        """レビュー結果を保存 (差分から消えたファイルの指摘は削除)"""
+        now = time.time() if now is None else now
+        file_starts = file_starts or {}
+        # レビューできなかったファイルが残っていれば、次回は同じ差分でもレビューし直す
+        diff_hash = '' if result.get('omitted_files') else combine_hashes(file_hashes)
+        try:
+            self.conn.executemany('''
+                INSERT INTO review_files
+                    (repo, pr_number, path, patch_hash, findings, head_sha, reviewed_at, hunk_starts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo, pr_number, path) DO UPDATE SET
+                    patch_hash = excluded.patch_hash, findings = excluded.findings,
+                    head_sha = excluded.head_sha, reviewed_at = excluded.reviewed_at,
+                    hunk_starts = excluded.hunk_starts
+            ''', [
+                (repo, pr_number, path, file_hashes[path], text, head_sha, now,
+                 ','.join(str(start) for start in file_starts.get(path, [])))
+                for path, text in findings.items() if path in file_hashes
+            ])
+            placeholders = ','.join('?' * len(file_hashes))
+            self.conn.execute(f'''
+                DELETE FROM review_files
+                WHERE repo = ? AND pr_number = ? AND path NOT IN ({placeholders})
+            ''', [repo, pr_number, *file_hashes])
+            self.conn.execute('''
+                INSERT OR REPLACE INTO review_runs
+                    (repo, pr_number, head_sha, diff_hash, review, files_total, files_reviewed,
+                     files_reused, reviewed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (repo, pr_number, head_sha, diff_hash, result['review'],
+                  result.get('files_total', 0), result.get('files_reviewed', 0),
+                  len(result.get('reused_files', [])), now))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def prune(self, max_age_days: float = 90, now: Optional[float] = None) -> int:
+        """古い PR のレビュー結果を削除
+
+        Returns:
+            削除した PR 数
+        """
+        cutoff = (time.time() if now is None else now) - max_age_days * 86400
+        stale = self.conn.execute(
+            'SELECT repo, pr_number FROM review_runs WHERE reviewed_at < ?', (cutoff,)
+        ).fetchall()
+        self.conn.executemany('DELETE FROM review_files WHERE repo = ? AND pr_number = ?', stale)
+        self.conn.executemany('DELETE FROM review_runs WHERE repo = ? AND pr_number = ?', stale)
+        self.conn.commit()
+        return len(stale)
+
+    def get_stats(self) -> Dict:
+        """保存件数と直近のレビューで再利用したファイルの割合"""
+        runs, files_total, files_reused = self.conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(files_total), 0), COALESCE(SUM(files_reused), 0) FROM review_runs
+        ''').fetchone()
+        stored_files = self.conn.execute('SELECT COUNT(*) FROM review_files').fetchone()[0]
+        return {
+            'prs': runs,
+            'stored_files': stored_files,
+            'reuse_rate': files_reused / files_total if files_total else 0.0,
+        }
+
+async def review_incrementally(engine: ChunkedReviewEngine, store: ReviewStore, repo: str, pr_number: int,
+                               head_sha: str, diff: str, pr_info: Dict, instructions: str,
+                               full: bool = False, diff_filter=None) -> Dict:
+    """前回からパッチが変わったファイルだけをレビューし、残りは保存済みの指摘を使う
+
+    差分全体が前回と同じなら LLM を呼ばずに前回のレビューを返す (cached = True)
+
+    Args:
+        full: 保存済みの指摘を使わずに全ファイルをレビューし直す
+        diff_filter: 生成ファイルなどを間引く DiffFilter (ハッシュも間引いた後の差分で計算する)
+    """
+    filter_summary = None
+    if diff_filter is not None:
+        filtered = diff_filter.filter(diff)
+        diff = filtered.text
+        filter_summary = filtered.summary()
+
+    file_hashes = hash_diff_files(diff, instructions_version(instructions))
+    file_starts = {f.path: hunk_starts(f.text) for f in parse_unified_diff(diff)}
+    plan = store.plan(repo, pr_number, file_hashes, file_starts)
+
+    if plan['unchanged'] and not full:
+        previous = plan['previous']
+        return {
+            'review': previous['review'],
+            'cached': True,
+            'previous_head_sha': previous['head_sha'],
+            'chunks': 0,
+            'files_total': len(file_hashes),
+            'files_reviewed': 0,
+            'failed_chunks': 0,
+            'omitted_files': [],
+            'reused_files': list(file_hashes),
+            'changed_files': [],
+            'file_findings': {},
+            'findings': [f.to_dict() for f in collect_findings(plan['reuse'])],
+            'filter': filter_summary,
+            'elapsed': 0.0,
+        }
+
+    reuse = {} if full else plan['reuse']
+    result = await engine.review(diff, pr_info, instructions, reuse=reuse)
+    result['cached'] = False
+    result['filter'] = filter_summary
+    result['previous_head_sha'] = plan['previous']['head_sha'] if plan['previous'] else None
+    result['changed_files'] = [path for path in file_hashes if path not in result['reused_files']]
+
+    # 今回レビューしたファイルと再利用したファイルの指摘を保存 (失敗・上限で漏れたファイルは次回レビューする)
+    findings = {path: reuse[path] for path in result['reused_files']}
+    findings.update(result['file_findings'])
+    # 見出しの無いファイルは「指摘なし」として保存する (レビュー全体は run の review にだけ残す)
+    for path in file_hashes:
+        if path not in findings and path not in result['omitted_files']:
+            findings[path] = ''
+    store.save(repo, pr_number, head_sha, file_hashes, findings, result, file_starts=file_starts)
+    return result
@@ -19,6 +19,7 @@ import random
 # 親ディレクトリを import パスに追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base_bot import BaseBot, BaseBotConfig, setup_base_bot
+from prompt_budget import PromptBudget, Section
 
 class HumanInLoopConfig(BaseBotConfig):
     """Human-in-the-Loop Bot の設定"""
@@ -223,6 +224,13 @@ class AIResponseGenerator:
         self.client = openai.OpenAI(api_key=api_key)
         self.models = ['gpt-3.5-turbo', 'gpt-4']
         self.temperatures = [0.3, 0.7, 1.0]
+        self.max_tokens = 500
+        self.budgets = {model: PromptBudget(model, self.max_tokens) for model in self.models}
+    
+    def fit_prompt(self, model: str, prompt: str) -> str:
+        """プロンプトをモデルの入力上限に収める (コンテキスト長の小さいモデルでは切り詰める)"""
+        fitted, _ = self.budgets[model].fit(lambda prompt: prompt, [Section('prompt', prompt)])
+        return fitted
     
     async def generate_responses(self, prompt: str, num_responses: int = 3) -> List[Dict]:
         """複数の応答を生成"""
@@ -236,8 +244,8 @@ class AIResponseGenerator:
                 response = await asyncio.to_thread(
                     self.client.chat.completions.create,
                     model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=500,
+                    messages=[{"role": "user", "content": self.fit_prompt(model, prompt)}],
+                    max_tokens=self.max_tokens,
                     temperature=temperature
                 )
                 
@@ -4,10 +4,15 @@ arXiv などの RSS フィードを監視し、新しい論文を要約して Di
 """
 
 import asyncio
+import json
+import re
 import sqlite3
+import time
+from xml.etree.ElementTree import ParseError
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
 import feedparser
+import numpy as np
 import openai
 import discord
 from discord.ext import commands, tasks
@@ -17,27 +22,106 @@ import sys
 # 親ディレクトリを import パスに追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from base_bot import BaseBot, BaseBotConfig, setup_base_bot
+from prompt_budget import PromptBudget, Section
+from rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from check_runs import CheckRun, CheckRunCoordinator
+from feed_fetcher import FeedFetcher
+from feed_scheduler import FeedScheduler, extract_feed_timing
+from paper_queue import PaperQueue
+from summary_cache import SummaryCache, make_cache_key
+from summary_stream import EditThrottle, LatencyStats
+from summary_variants import (
+    BASE_LANGUAGE, LANGUAGE_NAMES, SummaryVariantStore, language_from_locale, read_user_language
+)
+from feed_parser import FeedEntry, iter_chunks, iter_feed_entries
+from paper_search import PaperSearchIndex
+from paper_storage import PaperStorage
+from paper_vectors import VectorIndex
+from relevance import RelevanceModel, reaction_label, select_relevant
+
+def extract_arxiv_id(entry_id: str) -> str:
+    """エントリ ID から arXiv ID を抽出 (バージョン番号を除去)
+    
+    http://arxiv.org/abs/2401.01234v2 と oai:arXiv.org:2401.01234v2 の両形式に対応
+    """
+    tail = re.split(r'[/:]', entry_id.strip())[-1]
+    return re.sub(r'v\d+$', '', tail)
 
 class PaperSummarizerConfig(BaseBotConfig):
     """論文要約 Bot の設定"""
     def __init__(self):
         super().__init__()
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        self.rss_urls = os.getenv('ARXIV_RSS_URLS', '').split(',')
+        self.rss_urls = [
+            url.strip() for url in os.getenv('ARXIV_RSS_URLS', '').split(',') if url.strip()
+        ]
         self.summary_channel_name = 'paper-summaries'
-        self.check_interval_hours = 6  # 6時間ごとにチェック
+        self.paper_vector_index_path = os.getenv('PAPER_VECTOR_INDEX', 'paper_vectors')
+        self.summary_cache_max_entries = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '50000'))
+        self.summary_cache_max_age_days = float(os.getenv('SUMMARY_CACHE_MAX_AGE_DAYS', '180'))
+        self.check_interval_hours = 6  # 更新周期が分からないフィードは6時間ごとにチェック
+        # フィードごとの更新周期を学習して取得間隔を調整する
+        self.feed_min_interval_minutes = float(os.getenv('FEED_MIN_INTERVAL_MINUTES', '15'))
+        self.feed_max_interval_hours = float(os.getenv('FEED_MAX_INTERVAL_HOURS', '24'))
+        self.feed_poll_jitter = float(os.getenv('FEED_POLL_JITTER', '0.1'))
+        self.feed_fetch_timeout = float(os.getenv('FEED_FETCH_TIMEOUT', '30'))
+        self.feed_fetch_per_host_limit = int(os.getenv('FEED_FETCH_PER_HOST_LIMIT', '4'))
+        # XMLPullParser によるストリーミングパース (失敗時は feedparser にフォールバック)
+        self.feed_streaming_parser = os.getenv('FEED_STREAMING_PARSER', 'true').lower() == 'true'
+        self.summary_max_concurrency = int(os.getenv('SUMMARY_MAX_CONCURRENCY', '4'))
+        self.openai_requests_per_minute = float(os.getenv('OPENAI_RPM', '200'))
+        self.openai_tokens_per_minute = float(os.getenv('OPENAI_TPM', '100000'))
+        # 複数論文を1リクエストで要約するバッチモード (オプトイン)
+        self.summary_batch_mode = os.getenv('SUMMARY_BATCH_MODE', 'false').lower() == 'true'
+        self.summary_batch_max_size = int(os.getenv('SUMMARY_BATCH_MAX_SIZE', '8'))
+        self.summary_batch_token_budget = int(os.getenv('SUMMARY_BATCH_TOKEN_BUDGET', '6000'))
+        
+        # リアクションから学習した関連度で要約前に論文を絞り込む
+        self.relevance_filter = os.getenv('RELEVANCE_FILTER', 'true').lower() == 'true'
+        self.relevance_min_score = float(os.getenv('RELEVANCE_MIN_SCORE', '0.5'))
+        self.relevance_top_k = int(os.getenv('RELEVANCE_TOP_K', '10'))
+        self.relevance_retrain_hours = float(os.getenv('RELEVANCE_RETRAIN_HOURS', '6'))
+        
+        # 要約をストリーミングで受け取り、投稿したメッセージを順次編集する (オプトイン)
+        self.summary_streaming = os.getenv('SUMMARY_STREAMING', 'false').lower() == 'true'
+        self.summary_stream_edit_interval = float(os.getenv('SUMMARY_STREAM_EDIT_INTERVAL', '1.5'))
+        self.summary_stream_edits_per_minute = float(os.getenv('SUMMARY_STREAM_EDITS_PER_MINUTE', '30'))
+        # 投稿アウトボックスの送信レート (チャンネルへの投稿数/分)
+        self.discord_posts_per_minute = float(os.getenv('DISCORD_POSTS_PER_MINUTE', '30'))
+        
+        # abstract / summary の圧縮形式 (none / zlib / zstd、既存の行は paper_storage.py migrate で変換)
+        self.paper_storage_compression = os.getenv('PAPER_STORAGE_COMPRESSION', 'none').lower()
+        
+        # 日本語以外の要約は初回リクエスト時に生成し、よく使われる言語は投稿時に事前生成する
+        self.user_languages_db = os.getenv('USER_LANGUAGES_DB', 'user_languages.db')
+        self.summary_pregenerate_languages = [
+            lang.strip() for lang in os.getenv('SUMMARY_PREGENERATE_LANGUAGES', '').split(',') if lang.strip()
+        ]
+        self.summary_pregenerate_max_languages = int(os.getenv('SUMMARY_PREGENERATE_MAX_LANGUAGES', '2'))
+        self.summary_pregenerate_min_requests = int(os.getenv('SUMMARY_PREGENERATE_MIN_REQUESTS', '5'))
 
 class PaperDatabase:
     """論文データベース管理"""
     
-    def __init__(self, db_path: str = "papers.db"):
+    # SQLite のバインド変数上限 (古いビルドは 999) を超えないように分割する
+    MAX_QUERY_PARAMS = 900
+    
+    def __init__(self, db_path: str = "papers.db", compression: str = 'none'):
         self.db_path = db_path
+        # エントリごとに接続を開かないよう、接続は使い回す
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.init_database()
+        # 本文の圧縮と著者テーブル (圧縮済みの列は storage.decode か SQL の paper_text() で読む)
+        self.storage = PaperStorage(self.conn, compression)
+        # 処理済み arXiv ID のインメモリセット (起動時に papers テーブルから読み込む)
+        self.known_ids = set()
+        self.warm_known_ids()
     
     def init_database(self):
         """データベース初期化"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS papers (
@@ -53,24 +137,190 @@ class PaperDatabase:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # 投稿へのリアクション (ユーザーごとの評価)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS paper_reactions (
+                arxiv_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                emoji TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (arxiv_id, user_id, emoji)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_papers_discord_message_id
+            ON papers (discord_message_id)
+        ''')
+        
+        # フィードごとの条件付きリクエスト用検証子
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_state (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        self.conn.commit()
+    
+    def warm_known_ids(self):
+        """処理済み ID セットを papers テーブルから読み込む"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT arxiv_id FROM papers')
+        self.known_ids = {row[0] for row in cursor}
+    
+    def close(self):
+        """接続を閉じる"""
+        self.conn.close()
+    
+    def get_feed_state(self, url: str) -> Optional[Dict]:
+        """フィードの ETag / Last-Modified を取得"""
+        cursor = self.conn.cursor()
+        
+        cursor.execute('SELECT etag, last_modified FROM feed_state WHERE url = ?', (url,))
+        result = cursor.fetchone()
+        
+        if result is None:
+            return None
+        return {'etag': result[0], 'last_modified': result[1]}
+    
+    def save_feed_state(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        """フィードの ETag / Last-Modified を保存"""
+        cursor = self.conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO feed_state (url, etag, last_modified, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (url, etag, last_modified))
+        
+        self.conn.commit()
     
     def is_paper_processed(self, arxiv_id: str) -> bool:
         """論文が既に処理済みかチェック"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return not self.filter_unprocessed([arxiv_id])
+    
+    def filter_unprocessed(self, arxiv_ids: List[str]) -> List[str]:
+        """未処理の arXiv ID だけを返す (入力順を保持・重複除去)
         
-        cursor.execute('SELECT id FROM papers WHERE arxiv_id = ?', (arxiv_id,))
+        インメモリセットで大半を弾き、残りのみを IN クエリでまとめて確認する
+        (別プロセスが書き込んだ行も取りこぼさない)
+        """
+        candidates = list(dict.fromkeys(
+            arxiv_id for arxiv_id in arxiv_ids if arxiv_id not in self.known_ids
+        ))
+        if not candidates:
+            return []
+        
+        cursor = self.conn.cursor()
+        found = set()
+        for i in range(0, len(candidates), self.MAX_QUERY_PARAMS):
+            chunk = candidates[i:i + self.MAX_QUERY_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT arxiv_id FROM papers WHERE arxiv_id IN ({placeholders})',
+                chunk
+            )
+            found.update(row[0] for row in cursor)
+        
+        self.known_ids.update(found)
+        return [arxiv_id for arxiv_id in candidates if arxiv_id not in found]
+    
+    def get_papers(self, arxiv_ids: List[str]) -> Dict[str, Dict]:
+        """arXiv ID から論文を取得"""
+        cursor = self.conn.cursor()
+        papers = {}
+        for i in range(0, len(arxiv_ids), self.MAX_QUERY_PARAMS):
+            chunk = arxiv_ids[i:i + self.MAX_QUERY_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT arxiv_id, title, authors, abstract, published_date, summary
+                FROM papers WHERE arxiv_id IN ({placeholders})
+            ''', chunk)
+            for arxiv_id, title, authors, abstract, published_date, summary in cursor.fetchall():
+                papers[arxiv_id] = {
+                    'arxiv_id': arxiv_id,
+                    'title': title,
+                    'authors': authors,
+                    'abstract': self.storage.decode(abstract),
+                    'published_date': published_date,
+                    'summary': self.storage.decode(summary),
+                }
+        return papers
+    
+    def get_papers_by_author(self, name: str, limit: int = 10) -> List[Dict]:
+        """著者名 (フルネーム、または姓) の論文を新しい順に取得"""
+        arxiv_ids = self.storage.papers_by_author(name, limit)
+        papers = self.get_papers(arxiv_ids)
+        return [papers[arxiv_id] for arxiv_id in arxiv_ids if arxiv_id in papers]
+    
+    def set_discord_message_id(self, arxiv_id: str, message_id: int, commit: bool = True):
+        """投稿した Discord メッセージ ID を記録"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            'UPDATE papers SET discord_message_id = ? WHERE arxiv_id = ?',
+            (str(message_id), arxiv_id)
+        )
+        if commit:
+            self.conn.commit()
+    
+    def get_arxiv_id_by_message(self, message_id: int) -> Optional[str]:
+        """Discord メッセージ ID から arXiv ID を取得"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT arxiv_id FROM papers WHERE discord_message_id = ?', (str(message_id),))
         result = cursor.fetchone()
+        return result[0] if result else None
+    
+    def record_reaction(self, arxiv_id: str, user_id: int, emoji: str, added: bool = True):
+        """リアクションの追加・削除を記録"""
+        cursor = self.conn.cursor()
+        if added:
+            cursor.execute('''
+                INSERT OR IGNORE INTO paper_reactions (arxiv_id, user_id, emoji)
+                VALUES (?, ?, ?)
+            ''', (arxiv_id, str(user_id), emoji))
+        else:
+            cursor.execute(
+                'DELETE FROM paper_reactions WHERE arxiv_id = ? AND user_id = ? AND emoji = ?',
+                (arxiv_id, str(user_id), emoji)
+            )
+        self.conn.commit()
+    
+    def get_liked_papers(self, user_id: int, emojis=('👍', '❤️'), limit: int = 50) -> List[str]:
+        """ユーザーが高評価した論文の arXiv ID (新しい順)"""
+        cursor = self.conn.cursor()
+        placeholders = ','.join('?' * len(emojis))
+        cursor.execute(f'''
+            SELECT arxiv_id FROM paper_reactions
+            WHERE user_id = ? AND emoji IN ({placeholders})
+            GROUP BY arxiv_id
+            ORDER BY MAX(created_at) DESC
+            LIMIT ?
+        ''', (str(user_id), *emojis, limit))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def get_reaction_labels(self, min_age_hours: float = 48) -> List[Dict]:
+        """投稿済み論文ごとの高評価 (👍/❤️) と低評価 (🤔) の人数
         
-        conn.close()
-        return result is not None
+        リアクションの無い論文は投稿から min_age_hours 経過したものだけを含める
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT p.arxiv_id, p.title, paper_text(p.abstract),
+                   COUNT(DISTINCT CASE WHEN r.emoji IN ('👍', '❤️') THEN r.user_id END),
+                   COUNT(DISTINCT CASE WHEN r.emoji = '🤔' THEN r.user_id END)
+            FROM papers p
+            LEFT JOIN paper_reactions r ON r.arxiv_id = p.arxiv_id
+            WHERE p.discord_message_id IS NOT NULL
+            GROUP BY p.id
+            HAVING COUNT(r.arxiv_id) > 0 OR p.created_at < datetime('now', ?)
+        ''', (f'{-min_age_hours} hours',))
+        columns = ['arxiv_id', 'title', 'abstract', 'positive', 'negative']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
     
-    def save_paper(self, paper_data: Dict) -> int:
-        """論文データを保存"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def save_paper(self, paper_data: Dict, commit: bool = True) -> int:
+        """論文データを保存 (commit=False の場合はコミットを呼び出し側に任せる)"""
+        cursor = self.conn.cursor()
         
         cursor.execute('''
             INSERT INTO papers (arxiv_id, title, authors, abstract, published_date, summary)
@@ -79,26 +329,54 @@ class PaperDatabase:
             paper_data['arxiv_id'],
             paper_data['title'],
             paper_data['authors'],
-            paper_data['abstract'],
+            self.storage.encode(paper_data['abstract']),
             paper_data['published_date'],
-            paper_data['summary']
+            self.storage.encode(paper_data['summary'])
         ))
         
         paper_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        self.storage.index_authors([(paper_id, paper_data['authors'])])
+        if commit:
+            self.conn.commit()
+        self.known_ids.add(paper_data['arxiv_id'])
         
         return paper_id
 
 class PaperSummarizer:
     """論文要約エンジン"""
     
-    def __init__(self, api_key: str):
-        self.client = openai.OpenAI(api_key=api_key)
+    MODEL = "gpt-3.5-turbo"
+    MAX_TOKENS = 500
+    MAX_RETRIES = 5
+    # プロンプトを変更したら上げる (要約キャッシュのキーに含まれる)
+    PROMPT_VERSION = "1"
+    # バッチモードの見積もり: 指示文のトークン数と1件あたりの出力トークン数
+    BATCH_PROMPT_TOKENS = 250
+    BATCH_OUTPUT_TOKENS = 400
+    BATCH_MAX_OUTPUT_TOKENS = 4000
     
-    async def summarize_paper(self, title: str, abstract: str) -> str:
-        """論文を要約"""
-        prompt = f"""
+    def __init__(self, api_key: str, max_concurrency: int = 4,
+                 requests_per_minute: float = 200, tokens_per_minute: float = 100000,
+                 base_url: Optional[str] = None, cache: Optional[SummaryCache] = None):
+        # リトライは 429 の retry-after を見て自前で行う
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.cache = cache
+        self.budget = PromptBudget(self.MODEL, self.MAX_TOKENS)
+    
+    def build_prompt(self, title: str, abstract: str) -> str:
+        """要約プロンプトを作成 (長すぎるアブストラクトはモデルの入力上限に収まるように切り詰める)"""
+        prompt, _ = self.budget.fit(self.render_prompt, [
+            Section('title', title, priority=0),
+            Section('abstract', abstract, priority=1),
+        ])
+        return prompt
+    
+    @staticmethod
+    def render_prompt(title: str, abstract: str) -> str:
+        """要約プロンプトの本文"""
+        return f"""
 以下の AI/ML 論文のタイトルとアブストラクトを日本語で簡潔に要約してください。
 開発者コミュニティ向けに、技術的なポイントと実用性を重視して説明してください。
 
@@ -112,17 +390,275 @@ class PaperSummarizer:
 🚀 **実用性**: [開発者にとっての意義や応用可能性]
 📊 **結果**: [主要な実験結果や性能向上]
 """
+    
+    def get_cached_summary(self, title: str, abstract: str) -> Optional[str]:
+        """キャッシュ済みの要約 (無ければ None)"""
+        if not self.cache:
+            return None
+        return self.cache.get(make_cache_key(title, abstract, self.PROMPT_VERSION, self.MODEL))
+    
+    def cache_summary(self, title: str, abstract: str, summary: str):
+        """要約をキャッシュに保存"""
+        if self.cache:
+            self.cache.put(make_cache_key(title, abstract, self.PROMPT_VERSION, self.MODEL), summary)
+    
+    async def generate_summary(self, title: str, abstract: str) -> str:
+        """論文を要約 (失敗時は例外を送出)"""
+        # 同じ内容の論文は LLM を呼ばずにキャッシュから返す
+        cached = self.get_cached_summary(title, abstract)
+        if cached is not None:
+            return cached
         
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.7
+        summary = await self.request_summary(title, abstract)
+        self.cache_summary(title, abstract, summary)
+        return summary
+    
+    async def stream_summary(self, title: str, abstract: str,
+                             on_start: Optional[Callable[[], Awaitable[None]]] = None) -> AsyncIterator[str]:
+        """要約を生成されたそばから断片ごとに返す (完了時にキャッシュに保存)
+
+        Args:
+            on_start: 同時実行数の枠を確保した直後に呼ぶ (プレースホルダーの投稿など)
+        """
+        messages = [{"role": "user", "content": self.build_prompt(title, abstract)}]
+        estimated_tokens = self.estimate_tokens(messages, self.MAX_TOKENS)
+        
+        parts = []
+        async with self.semaphore:
+            if on_start:
+                await on_start()
+            stream = await self.create_completion(
+                messages, self.MAX_TOKENS, estimated_tokens, stream=True, temperature=0.7
             )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        
+        # ストリームには usage が含まれないので出力の文字数から見積もる
+        summary = ''.join(parts).strip()
+        self.rate_limiter.record_usage(
+            estimated_tokens, estimated_tokens - self.MAX_TOKENS + self.budget.count(summary)
+        )
+        self.cache_summary(title, abstract, summary)
+    
+    def build_translation_prompt(self, title: str, summary: str, languages: List[str]) -> str:
+        """日本語の要約を他の言語に翻訳するプロンプトを作成"""
+        targets = ', '.join(f'"{lang}" ({LANGUAGE_NAMES[lang]})' for lang in languages)
+        if len(languages) == 1:
+            output = f"Output only the translated summary in {LANGUAGE_NAMES[languages[0]]}."
+        else:
+            output = ('Output only this JSON object, with one entry per language code:\n'
+                      '{"translations": {"<language code>": "<translated summary>"}}')
+        return f"""
+Translate the following Japanese summary of an AI/ML paper into: {targets}.
+Keep the emoji headings, Markdown formatting and technical terms, and translate the heading labels too.
+
+Paper title: {title}
+
+Summary:
+{summary}
+
+{output}
+"""
+    
+    async def translate_summary(self, title: str, summary: str, languages: List[str]) -> Dict[str, str]:
+        """要約を複数の言語に1リクエストで翻訳 (翻訳できなかった言語は含めない)"""
+        languages = [lang for lang in languages if lang in LANGUAGE_NAMES and lang != BASE_LANGUAGE]
+        if not languages:
+            return {}
+        
+        kwargs = {"response_format": {"type": "json_object"}} if len(languages) > 1 else {}
+        response = await self.complete(
+            [{"role": "user", "content": self.build_translation_prompt(title, summary, languages)}],
+            max_tokens=min(self.BATCH_MAX_OUTPUT_TOKENS, len(languages) * self.BATCH_OUTPUT_TOKENS * 2),
+            temperature=0.3,
+            **kwargs
+        )
+        content = response.choices[0].message.content
+        if len(languages) == 1:
+            return {languages[0]: content.strip()} if content and content.strip() else {}
+        
+        try:
+            translations = json.loads(content).get('translations', {})
+        except (TypeError, ValueError, AttributeError):
+            return {}
+        if not isinstance(translations, dict):
+            return {}
+        return {
+            lang: text.strip() for lang, text in translations.items()
+            if lang in languages and isinstance(text, str) and text.strip()
+        }
+    
+    async def request_summary(self, title: str, abstract: str) -> str:
+        """LLM に要約をリクエスト"""
+        response = await self.complete(
+            [{"role": "user", "content": self.build_prompt(title, abstract)}],
+            max_tokens=self.MAX_TOKENS,
+            temperature=0.7
+        )
+        return response.choices[0].message.content.strip()
+    
+    def estimate_tokens(self, messages: List[Dict], max_tokens: int) -> int:
+        """TPM の見積もり: 入力はモデルのトークナイザーで数え、出力は上限で見積もる"""
+        return self.budget.counter.count_messages(messages) + max_tokens
+    
+    async def create_completion(self, messages: List[Dict], max_tokens: int,
+                                estimated_tokens: int, **kwargs):
+        """レート制限と 429 リトライ付きで chat.completions を呼ぶ (同時実行数は呼び出し側で管理)"""
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(estimated_tokens)
+            try:
+                return await self.client.chat.completions.create(
+                    model=self.MODEL,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+            except openai.RateLimitError as e:
+                if attempt == self.MAX_RETRIES:
+                    raise
+                self.rate_limiter.backoff(parse_retry_after(e.response.headers, attempt))
+    
+    async def complete(self, messages: List[Dict], max_tokens: int, **kwargs):
+        """同時実行数・レート制限・429 リトライ付きで chat.completions を呼ぶ"""
+        estimated_tokens = self.estimate_tokens(messages, max_tokens)
+        
+        async with self.semaphore:
+            response = await self.create_completion(messages, max_tokens, estimated_tokens, **kwargs)
+        
+        if response.usage:
+            self.rate_limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+        return response
+    
+    def plan_batches(self, papers: List[Dict], max_batch_size: int,
+                     token_budget: int) -> List[List[Dict]]:
+        """トークン予算に収まるように論文をバッチに分割
+        
+        入力 (アブストラクト) と出力 (1件あたり BATCH_OUTPUT_TOKENS) の両方が
+        予算と出力上限に収まる範囲で、できるだけ多くの論文を1リクエストに詰める
+        """
+        batches = []
+        current = []
+        used = self.BATCH_PROMPT_TOKENS
+        for paper in papers:
+            cost = (self.budget.count(paper['title']) + self.budget.count(paper['abstract'])
+                    + self.BATCH_OUTPUT_TOKENS)
+            over_budget = used + cost > token_budget
+            over_output = (len(current) + 1) * self.BATCH_OUTPUT_TOKENS > self.BATCH_MAX_OUTPUT_TOKENS
+            if current and (len(current) >= max_batch_size or over_budget or over_output):
+                batches.append(current)
+                current = []
+                used = self.BATCH_PROMPT_TOKENS
+            current.append(paper)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+    
+    def build_batch_prompt(self, papers: List[Dict]) -> str:
+        """複数論文をまとめて要約するプロンプトを作成"""
+        items = json.dumps([
+            {"id": paper['arxiv_id'], "title": paper['title'], "abstract": paper['abstract']}
+            for paper in papers
+        ], ensure_ascii=False)
+        return f"""
+以下の AI/ML 論文それぞれについて、タイトルとアブストラクトを日本語で簡潔に要約してください。
+開発者コミュニティ向けに、技術的なポイントと実用性を重視して説明してください。
+
+各要約は以下の形式にしてください：
+🔬 **研究概要**: [1-2文で研究の核心を説明]
+💡 **技術的貢献**: [新しい手法や改善点を説明]
+🚀 **実用性**: [開発者にとっての意義や応用可能性]
+📊 **結果**: [主要な実験結果や性能向上]
+
+出力は次の JSON オブジェクトのみとし、入力のすべての id について1件ずつ要約を含めてください：
+{{"summaries": [{{"id": "<入力の id>", "summary": "<要約>"}}]}}
+
+論文一覧 (JSON):
+{items}
+"""
+    
+    def parse_batch_response(self, content: str) -> Dict[str, str]:
+        """バッチ応答を id → 要約 に分解 (壊れたスロットは含めない)"""
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return {}
+        
+        summaries = {}
+        items = data.get('summaries', []) if isinstance(data, dict) else []
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            paper_id, summary = item.get('id'), item.get('summary')
+            if isinstance(paper_id, str) and isinstance(summary, str) and summary.strip():
+                summaries[paper_id] = summary.strip()
+        return summaries
+    
+    async def summarize_batch(self, papers: List[Dict], max_batch_size: int = 8,
+                              token_budget: int = 6000) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """複数論文をまとめて要約
+        
+        Returns:
+            (arxiv_id → 要約, arxiv_id → エラーメッセージ)
+        """
+        summaries = {}
+        errors = {}
+        
+        # キャッシュ済みの論文はリクエストに含めない
+        pending = []
+        for paper in papers:
+            cache_key = None
+            if self.cache:
+                cache_key = make_cache_key(paper['title'], paper['abstract'], self.PROMPT_VERSION, self.MODEL)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    summaries[paper['arxiv_id']] = cached
+                    continue
+            pending.append((paper, cache_key))
+        
+        cache_keys = {paper['arxiv_id']: key for paper, key in pending}
+        batches = self.plan_batches([paper for paper, _ in pending], max_batch_size, token_budget)
+        
+        async def run_batch(batch: List[Dict]):
+            parsed = {}
+            try:
+                response = await self.complete(
+                    [{"role": "user", "content": self.build_batch_prompt(batch)}],
+                    max_tokens=min(self.BATCH_MAX_OUTPUT_TOKENS, len(batch) * self.BATCH_OUTPUT_TOKENS),
+                    temperature=0.7,
+                    response_format={"type": "json_object"}
+                )
+                parsed = self.parse_batch_response(response.choices[0].message.content)
+            except Exception as e:
+                # バッチ全体が失敗しても、各論文を個別に再試行する
+                if len(batch) == 1:
+                    errors[batch[0]['arxiv_id']] = str(e)
+                    return
             
-            return response.choices[0].message.content.strip()
+            for paper in batch:
+                arxiv_id = paper['arxiv_id']
+                if arxiv_id in parsed:
+                    summaries[arxiv_id] = parsed[arxiv_id]
+                    if self.cache:
+                        self.cache.put(cache_keys[arxiv_id], parsed[arxiv_id])
+                    continue
+                
+                # パースできなかったスロットは単独で再試行
+                try:
+                    summaries[arxiv_id] = await self.generate_summary(paper['title'], paper['abstract'])
+                except Exception as e:
+                    errors[arxiv_id] = str(e)
+        
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        return summaries, errors
+    
+    async def summarize_paper(self, title: str, abstract: str) -> str:
+        """論文を要約"""
+        try:
+            return await self.generate_summary(title, abstract)
         except Exception as e:
             return f"要約生成中にエラーが発生しました: {str(e)}"
 
@@ -133,13 +669,66 @@ class PaperSummarizerBot(BaseBot):
         config = PaperSummarizerConfig()
         super().__init__(config)
         
-        self.db = PaperDatabase()
-        self.summarizer = PaperSummarizer(config.openai_api_key) if config.openai_api_key else None
+        self.db = PaperDatabase(compression=config.paper_storage_compression)
+        self.queue = PaperQueue(self.db)
+        self.search_index = PaperSearchIndex(self.db.conn)
+        self.vector_index = VectorIndex(config.paper_vector_index_path)
+        self.vector_sync_started = False
+        self.relevance_model = RelevanceModel()
+        self.relevance_trained_at = None
+        # ストリーミング編集の上限はチャンネル単位なので全ストリームで共有する
+        self.stream_edit_bucket = TokenBucket(config.summary_stream_edits_per_minute, capacity=5)
+        self.post_bucket = TokenBucket(config.discord_posts_per_minute, capacity=5)
+        # 429 を受けたらこの時刻 (monotonic) まで送信を止める
+        self.post_paused_until = 0.0
+        self.first_content_latency = LatencyStats()
+        self.summary_variants = SummaryVariantStore(self.db.conn)
+        # View はイベントループ内で作る必要があるので setup_hook で用意する
+        self.summary_language_view: Optional[SummaryLanguageView] = None
+        # 同じ (論文, 言語) の生成を重複させないための実行中タスク
+        self.variant_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.background_tasks = set()
+        self.summary_cache = SummaryCache(
+            self.db.conn,
+            max_entries=config.summary_cache_max_entries,
+            max_age_days=config.summary_cache_max_age_days
+        )
+        self.summarizer = PaperSummarizer(
+            config.openai_api_key,
+            max_concurrency=config.summary_max_concurrency,
+            requests_per_minute=config.openai_requests_per_minute,
+            tokens_per_minute=config.openai_tokens_per_minute,
+            cache=self.summary_cache
+        ) if config.openai_api_key else None
         self.summary_channel = None
+        self.feed_scheduler = FeedScheduler(
+            self.db.conn,
+            default_interval=config.check_interval_hours * 3600,
+            min_interval=config.feed_min_interval_minutes * 60,
+            max_interval=config.feed_max_interval_hours * 3600,
+            jitter=config.feed_poll_jitter
+        )
+        self.feed_check_disabled_warned = False
+        # 定期実行と手動実行が重ならないよう、チェックは同時に1つだけ実行する
+        self.check_runs = CheckRunCoordinator()
+        self.feed_fetcher = FeedFetcher(
+            state_store=self.db,
+            timeout=config.feed_fetch_timeout,
+            per_host_limit=config.feed_fetch_per_host_limit
+        )
         
-        # RSS チェックタスクを開始
+        # RSS チェックタスクとキューのワーカーを開始
         if not self.check_rss_feeds.is_running():
             self.check_rss_feeds.start()
+        if not self.summarize_worker.is_running():
+            self.summarize_worker.start()
+        if not self.post_worker.is_running():
+            self.post_worker.start()
+    
+    async def setup_hook(self):
+        """再起動前に投稿したメッセージのボタンも動くよう永続ビューを登録"""
+        self.summary_language_view = SummaryLanguageView(self)
+        self.add_view(self.summary_language_view)
     
     async def on_ready(self):
         """Bot 起動時の処理"""
@@ -155,196 +744,936 @@ class PaperSummarizerBot(BaseBot):
         
         if not self.summary_channel:
             self.logger.warning(f'要約チャンネル "{self.config.summary_channel_name}" が見つかりません')
+        
+        # ベクトルインデックスに未登録の論文を埋め込む (別スレッド・別接続)
+        if not self.vector_sync_started:
+            self.vector_sync_started = True
+            added = await asyncio.to_thread(self.vector_index.sync_from_db, self.db.db_path)
+            if added:
+                self.logger.info(f'{added} 件の論文をベクトルインデックスに追加しました')
     
-    @tasks.loop(hours=6)  # 6時間ごとに実行
-    async def check_rss_feeds(self):
-        """RSS フィードをチェックして新しい論文を処理"""
-        if not self.summarizer or not self.summary_channel:
+    def feed_checks_enabled(self, warn: bool = False) -> bool:
+        """要約機能とチャンネルが揃っているか"""
+        if self.summarizer and self.summary_channel:
+            return True
+        if warn or not self.feed_check_disabled_warned:
             self.logger.warning('要約機能またはチャンネルが設定されていません')
+            self.feed_check_disabled_warned = True
+        return False
+    
+    @tasks.loop(minutes=1)  # 取得時刻を過ぎたフィードだけを取得する
+    async def check_rss_feeds(self):
+        """取得時刻を過ぎたフィードをチェック (手動チェックの実行中ならそれに合流)"""
+        if not self.feed_checks_enabled():
             return
         
-        self.logger.info('RSS フィードをチェック中...')
+        urls = self.feed_scheduler.due(self.config.rss_urls)
+        if not urls:
+            return
+        
+        run, started = self.check_runs.start(lambda run: self.run_feed_check(run, urls), trigger='scheduled')
+        if not started:
+            self.logger.info(f'実行中のチェック #{run.run_id} ({run.trigger}) に合流します')
+        await run.wait()
+    
+    def start_manual_check(self, trigger: str) -> Tuple[CheckRun, bool]:
+        """全フィードのチェックを開始 (実行中のチェックがあればそれに合流)"""
+        return self.check_runs.start(lambda run: self.run_feed_check(run, self.config.rss_urls), trigger=trigger)
+    
+    async def run_feed_check(self, run: CheckRun, urls: List[str]):
+        """フィードを取得して新しい論文をキューに追加 (進捗は run に記録)"""
+        run.begin(len(urls))
+        self.logger.info(f'RSS フィードをチェック中... #{run.run_id} ({len(urls)} / {len(self.config.rss_urls)} 件)')
+        
+        # 対象フィードを並列に取得 (未更新のフィードは 304 で返る)
+        results = await self.feed_fetcher.fetch_all(urls)
         
-        for rss_url in self.config.rss_urls:
-            if not rss_url.strip():
+        for result in results:
+            if result.error:
+                self.logger.error(f'RSS フィード取得エラー ({result.url}): {result.error}')
+                self.feed_scheduler.record_error(result.url)
+                run.record_feed(error=f'{result.url}: {result.error}')
+                continue
+            if result.not_modified:
+                self.logger.info(f'RSS フィードは更新されていません: {result.url}')
+                self.feed_scheduler.record_check(result.url, changed=False)
+                run.record_feed(not_modified=True)
                 continue
                 
             try:
-                await self.process_rss_feed(rss_url.strip())
-                # フィード間で少し待機
-                await asyncio.sleep(5)
+                new_papers_count = await self.process_rss_feed(result.url, result.content)
+                self.feed_fetcher.commit(result)
             except Exception as e:
-                self.logger.error(f'RSS フィード処理エラー ({rss_url}): {e}')
+                # エラーは process_rss_feed でログ済み、次回の取得で再処理される
+                self.feed_scheduler.record_error(result.url)
+                run.record_feed(error=f'{result.url}: {e}')
+                continue
+            
+            run.record_feed(new_papers=new_papers_count)
+            next_run_at = self.feed_scheduler.record_check(
+                result.url, changed=new_papers_count > 0, timing=extract_feed_timing(result.content)
+            )
+            self.logger.info(f'次回の取得: {result.url} ({format_age(next_run_at - time.time())}後)')
     
     @check_rss_feeds.before_loop
     async def before_check_rss_feeds(self):
         """RSS チェックタスク開始前の待機"""
         await self.wait_until_ready()
         # Bot起動後、少し待ってからタスクを開始
+        # (再起動時は保存済みの次回取得時刻に従うので一斉には取得しない)
         await asyncio.sleep(30)
     
-    async def process_rss_feed(self, rss_url: str):
-        """単一の RSS フィードを処理"""
+    async def parse_feed_entries(self, content: bytes) -> List[FeedEntry]:
+        """フィードからエントリを取り出す (処理済みの ID はこの段階で捨てる)"""
+        known_ids = self.db.known_ids
+        
+        def is_known(entry_id: str) -> bool:
+            return extract_arxiv_id(entry_id) in known_ids
+        
+        if self.config.feed_streaming_parser:
+            try:
+                return await asyncio.to_thread(
+                    lambda: list(iter_feed_entries(iter_chunks(content), skip_id=is_known))
+                )
+            except ParseError as e:
+                self.logger.warning(f'ストリーミングパースに失敗したため feedparser で再解析します: {e}')
+        
+        # 取得済みのバイト列のみをパース (feedparser にネットワークアクセスさせない)
+        feed = await asyncio.to_thread(feedparser.parse, content)
+        entries = []
+        for entry in getattr(feed, 'entries', []):
+            if not getattr(entry, 'id', None) or is_known(entry.id):
+                continue
+            
+            # 著者情報を安全に取得
+            authors = []
+            if hasattr(entry, 'authors') and entry.authors:
+                try:
+                    authors = [author.name for author in entry.authors]
+                except:
+                    authors = [str(entry.authors)]
+            
+            entries.append(FeedEntry(
+                entry.id,
+                title=getattr(entry, 'title', ''),
+                summary=getattr(entry, 'summary', ''),
+                published=getattr(entry, 'published', ''),
+                authors=authors
+            ))
+        return entries
+    
+    async def process_rss_feed(self, rss_url: str, content: bytes) -> int:
+        """単一の RSS フィードを処理 (キューに追加した論文数を返す)"""
         try:
-            # RSS フィードを非同期で取得
-            feed = await asyncio.to_thread(feedparser.parse, rss_url)
+            entries = await self.parse_feed_entries(content)
             
-            if not hasattr(feed, 'entries') or not feed.entries:
-                self.logger.warning(f'RSS フィードにエントリがありません: {rss_url}')
-                return
+            if not entries:
+                self.logger.info(f'RSS フィードに未処理のエントリがありません: {rss_url}')
+                return 0
             
-            self.logger.info(f'RSS フィードから {len(feed.entries)} 件のエントリを取得: {rss_url}')
-            new_papers_count = 0
+            self.logger.info(f'RSS フィードから {len(entries)} 件のエントリを取得: {rss_url}')
             
-            for entry in feed.entries[:3]:  # 最新3件のみ処理（負荷軽減）
-                try:
-                    # arXiv ID を抽出
-                    if not hasattr(entry, 'id') or not entry.id:
-                        continue
-                    
-                    arxiv_id = entry.id.split('/')[-1].split('v')[0]  # バージョン番号を除去
-                    
-                    # 既に処理済みかチェック
-                    if self.db.is_paper_processed(arxiv_id):
-                        continue
-                    
-                    # 必要なフィールドの存在確認
-                    if not all([hasattr(entry, attr) for attr in ['title', 'summary', 'published']]):
-                        self.logger.warning(f'必要なフィールドが不足: {arxiv_id}')
-                        continue
-                    
-                    # 著者情報を安全に取得
-                    authors = "Unknown"
-                    if hasattr(entry, 'authors') and entry.authors:
-                        try:
-                            authors = ', '.join([author.name for author in entry.authors])
-                        except:
-                            authors = str(entry.authors)
-                    
-                    # 論文データを準備
-                    paper_data = {
-                        'arxiv_id': arxiv_id,
-                        'title': entry.title.strip(),
-                        'authors': authors,
-                        'abstract': entry.summary.strip(),
-                        'published_date': entry.published,
-                        'summary': ''
-                    }
-                    
-                    # 要約を生成
-                    self.logger.info(f'論文要約を生成中: {paper_data["title"][:50]}...')
-                    summary = await self.summarizer.summarize_paper(
-                        paper_data['title'], 
-                        paper_data['abstract']
-                    )
-                    paper_data['summary'] = summary
-                    
-                    # データベースに保存
-                    paper_id = self.db.save_paper(paper_data)
-                    
-                    # Discord に投稿
-                    await self.post_paper_summary(paper_data)
-                    
-                    new_papers_count += 1
-                    self.logger.info(f'新しい論文を処理しました: {paper_data["title"][:50]}...')
-                    
-                    # レート制限を避けるため少し待機
-                    await asyncio.sleep(3)
-                    
-                except Exception as e:
-                    self.logger.error(f'論文処理エラー ({arxiv_id if "arxiv_id" in locals() else "unknown"}): {e}')
+            # arXiv ID を抽出し、未処理のものを一括で判定
+            entries_by_id = {}
+            for entry in entries:
+                entries_by_id.setdefault(extract_arxiv_id(entry.id), entry)
+            
+            unprocessed_ids = self.db.filter_unprocessed(list(entries_by_id))
+            self.logger.info(f'未処理の論文: {len(unprocessed_ids)} / {len(entries_by_id)} 件')
+            
+            papers = []
+            for arxiv_id in unprocessed_ids:
+                entry = entries_by_id[arxiv_id]
+                
+                # 必要なフィールドの存在確認
+                if not all([entry.title, entry.summary, entry.published]):
+                    self.logger.warning(f'必要なフィールドが不足: {arxiv_id}')
                     continue
+                
+                papers.append({
+                    'arxiv_id': arxiv_id,
+                    'title': entry.title.strip(),
+                    'authors': ', '.join(entry.authors) or "Unknown",
+                    'abstract': entry.summary.strip(),
+                    'published_date': entry.published
+                })
+            
+            # キューに追加 (要約と投稿はワーカーが行う)
+            new_papers_count = self.queue.enqueue(papers)
             
             if new_papers_count > 0:
-                self.logger.info(f'{new_papers_count} 件の新しい論文を処理しました')
+                self.logger.info(f'{new_papers_count} 件の新しい論文をキューに追加しました')
             else:
                 self.logger.info('新しい論文はありませんでした')
+            return new_papers_count
                 
         except Exception as e:
             self.logger.error(f'RSS フィード処理エラー ({rss_url}): {e}')
+            # 呼び出し側が検証子を保存しないよう再送出する
+            raise
     
-    async def post_paper_summary(self, paper_data: Dict):
-        """論文要約を Discord に投稿"""
-        try:
-            # タイトルの長さ制限
-            title = paper_data['title'][:250] + "..." if len(paper_data['title']) > 250 else paper_data['title']
-            
-            # 要約の長さ制限
-            summary = paper_data['summary'][:2000] + "..." if len(paper_data['summary']) > 2000 else paper_data['summary']
+    @tasks.loop(seconds=30)
+    async def summarize_worker(self):
+        """discovered の論文を要約して summarized にする"""
+        if not self.summarizer:
+            return
+        
+        if self.config.relevance_filter:
+            await self.apply_relevance_filter()
+        
+        # 同時実行数とレート制限は PaperSummarizer 側で管理する
+        # (ストリーミングは同時に書き進められる件数だけ取り出す)
+        streaming = self.config.summary_streaming and self.summary_channel
+        batch_size = self.config.summary_max_concurrency * (1 if streaming else 4)
+        while True:
+            batch = self.queue.fetch(PaperQueue.DISCOVERED, limit=batch_size)
+            if not batch:
+                break
             
-            embed = discord.Embed(
-                title=title,
-                url=f"https://arxiv.org/abs/{paper_data['arxiv_id']}",
-                description=summary,
-                color=discord.Color.blue(),
-                timestamp=datetime.now()
-            )
+            if streaming:
+                results = await asyncio.gather(*(self.stream_queued_paper(p) for p in batch))
+            elif self.config.summary_batch_mode:
+                results = await self.summarize_queued_batch(batch)
+            else:
+                results = await asyncio.gather(*(self.summarize_queued_paper(p) for p in batch))
             
-            # 著者情報（長すぎる場合は切り詰め）
-            authors = paper_data['authors'][:500] + "..." if len(paper_data['authors']) > 500 else paper_data['authors']
-            embed.add_field(
-                name="📝 著者", 
-                value=authors, 
-                inline=False
-            )
+            # 全件失敗した場合は次の周期まで待つ (即時の再試行ループを避ける)
+            if not any(results):
+                break
+    
+    async def apply_relevance_filter(self):
+        """新着論文を一括でスコアリングし、関連度の低い論文を skipped にする"""
+        retrain_after = self.config.relevance_retrain_hours * 3600
+        if self.relevance_trained_at is None or time.monotonic() - self.relevance_trained_at > retrain_after:
+            await self.train_relevance_model()
+        
+        papers = self.queue.fetch_unscored()
+        if not papers:
+            return
+        
+        scores = await asyncio.to_thread(self.relevance_model.score, papers)
+        selected = select_relevant(scores, self.config.relevance_min_score, self.config.relevance_top_k)
+        skipped = [p['arxiv_id'] for p, keep in zip(papers, selected) if not keep]
+        self.queue.record_relevance(
+            {p['arxiv_id']: score for p, score in zip(papers, scores)},
+            skipped
+        )
+        
+        if skipped:
+            self.logger.info(f'関連度フィルター: {len(papers)} 件中 {len(skipped)} 件を要約対象から除外しました')
+    
+    async def train_relevance_model(self):
+        """リアクションから関連度モデルを学習 (件数が足りなければ全件を通す)"""
+        rows = self.db.get_reaction_labels()
+        labels, weights = zip(*(reaction_label(r['positive'], r['negative']) for r in rows)) if rows else ((), ())
+        trained = await asyncio.to_thread(self.relevance_model.fit, rows, list(labels), list(weights))
+        self.relevance_trained_at = time.monotonic()
+        
+        if trained:
+            self.logger.info(f'関連度モデルを {len(rows)} 件のリアクションで学習しました')
+    
+    async def summarize_queued_batch(self, batch: List[Dict]) -> List[bool]:
+        """キューの論文をバッチモードでまとめて要約"""
+        summaries, errors = await self.summarizer.summarize_batch(
+            batch,
+            max_batch_size=self.config.summary_batch_max_size,
+            token_budget=self.config.summary_batch_token_budget
+        )
+        
+        results = []
+        for paper_data in batch:
+            arxiv_id = paper_data['arxiv_id']
+            error = errors.get(arxiv_id, 'バッチ要約に失敗しました')
+            if arxiv_id in summaries:
+                paper_data['summary'] = summaries[arxiv_id]
+                try:
+                    self.save_summarized(paper_data)
+                    results.append(True)
+                    continue
+                except Exception as e:
+                    error = str(e)
             
-            embed.add_field(
-                name="🔗 arXiv ID", 
-                value=paper_data['arxiv_id'], 
-                inline=True
+            self.logger.error(f'論文要約エラー ({arxiv_id}): {error}')
+            self.queue.record_failure(arxiv_id, error)
+            results.append(False)
+        return results
+    
+    def save_summarized(self, paper_data: Dict, message_id: Optional[int] = None):
+        """要約済みとして保存し (投稿はアウトボックス経由)、ベクトルインデックスに追加"""
+        self.queue.mark_summarized(paper_data, message_id=message_id)
+        
+        # 埋め込みの失敗は要約の保存を妨げない (次回起動時の同期で再試行される)
+        try:
+            self.vector_index.add_papers([paper_data])
+        except Exception as e:
+            self.logger.error(f'埋め込みエラー ({paper_data["arxiv_id"]}): {e}')
+    
+    async def summarize_queued_paper(self, paper_data: Dict) -> bool:
+        """キューの論文を1件要約 (成功したら True)"""
+        arxiv_id = paper_data['arxiv_id']
+        try:
+            self.logger.info(f'論文要約を生成中: {paper_data["title"][:50]}...')
+            started = time.monotonic()
+            paper_data['summary'] = await self.summarizer.generate_summary(
+                paper_data['title'],
+                paper_data['abstract']
             )
-            
-            # 公開日の安全な処理
-            try:
-                pub_date = paper_data['published_date'][:10] if paper_data['published_date'] else "不明"
-            except:
-                pub_date = "不明"
-            
-            embed.add_field(
-                name="📅 公開日", 
-                value=pub_date, 
-                inline=True
+            # 非ストリーミングでは要約全体の完了が最初の内容になる
+            self.first_content_latency.record(time.monotonic() - started)
+            self.save_summarized(paper_data)
+            return True
+        except Exception as e:
+            self.logger.error(f'論文要約エラー ({arxiv_id}): {e}')
+            self.queue.record_failure(arxiv_id, str(e))
+            return False
+    
+    async def stream_queued_paper(self, paper_data: Dict) -> bool:
+        """プレースホルダーを投稿し、ストリーミングで受け取った要約で順次編集 (成功したら True)"""
+        arxiv_id = paper_data['arxiv_id']
+        
+        # キャッシュ済みなら通常どおり保存して post_worker に任せる
+        cached = self.summarizer.get_cached_summary(paper_data['title'], paper_data['abstract'])
+        if cached is not None:
+            paper_data['summary'] = cached
+            self.save_summarized(paper_data)
+            return True
+        
+        message = None
+        started = None
+        
+        async def post_placeholder():
+            # 要約の枠を確保してから投稿するので、待機中のプレースホルダーが並ばない
+            nonlocal message, started
+            started = time.monotonic()
+            await self.post_bucket.acquire(1)
+            message = await self.summary_channel.send(
+                embed=self.build_summary_embed(paper_data, "⏳ 要約を生成中..."),
+                view=self.summary_language_view
             )
+        
+        try:
+            throttle = EditThrottle(self.stream_edit_bucket, self.config.summary_stream_edit_interval)
+            text = ''
+            async for delta in self.summarizer.stream_summary(paper_data['title'], paper_data['abstract'],
+                                                              on_start=post_placeholder):
+                if not text:
+                    self.first_content_latency.record(time.monotonic() - started)
+                text += delta
+                if throttle.try_acquire():
+                    await message.edit(embed=self.build_summary_embed(paper_data, text + " ▌"))
             
-            embed.set_footer(text="AI Forge Paper Summarizer")
-            
-            message = await self.summary_channel.send(embed=embed)
-            
-            # リアクションを追加（ユーザーフィードバック用）
-            await message.add_reaction('👍')  # 有用
-            await message.add_reaction('🤔')  # 微妙
-            await message.add_reaction('❤️')  # 素晴らしい
+            paper_data['summary'] = text.strip()
+            await throttle.acquire()
+            await message.edit(embed=self.build_summary_embed(paper_data, paper_data['summary']))
             
-            self.logger.info(f'Discord に投稿完了: {paper_data["arxiv_id"]}')
+            # 投稿済みのメッセージなのでアウトボックスを通さずに投稿済みとして保存する
+            self.save_summarized(paper_data, message_id=message.id)
+            await self.add_feedback_reactions(message)
+            self.schedule_variant_pregeneration(paper_data)
+            self.logger.info(f'ストリーミング投稿完了: {arxiv_id} (編集 {throttle.edits} 回, 見送り {throttle.skipped} 回)')
+            return True
+        except Exception as e:
+            self.logger.error(f'ストリーミング要約エラー ({arxiv_id}): {e}')
+            self.queue.record_failure(arxiv_id, str(e))
+            # 途中まで書いたメッセージは再試行時に重複するので消す
+            if message:
+                try:
+                    await message.delete()
+                except discord.HTTPException:
+                    pass
+            return False
+    
+    @tasks.loop(seconds=5)
+    async def post_worker(self):
+        """アウトボックスから送信時刻を過ぎた投稿を取り出して Discord に投稿"""
+        if not self.summary_channel or time.monotonic() < self.post_paused_until:
+            return
+        
+        while True:
+            batch = self.queue.fetch_posts()
+            if not batch:
+                break
             
+            for paper_data in batch:
+                if not await self.send_outbox_post(paper_data):
+                    # 失敗した行はバックオフ後に再送される。残りは次の周期に回す
+                    return
+    
+    async def send_outbox_post(self, paper_data: Dict) -> bool:
+        """アウトボックスの1件を投稿 (成功したら True)"""
+        arxiv_id = paper_data['arxiv_id']
+        await self.post_bucket.acquire(1)
+        try:
+            message = await self.post_paper_summary(paper_data)
         except discord.HTTPException as e:
-            self.logger.error(f'Discord HTTP エラー: {e}')
+            retry_after = None
+            if e.status == 429:
+                # レート制限中はチャンネル全体の送信を止める
+                retry_after = parse_retry_after(getattr(e.response, 'headers', None))
+                self.post_paused_until = time.monotonic() + retry_after
+            # 不正なリクエスト (400) や大きすぎる投稿 (413) は再試行しても成功しない
+            retrying = self.queue.record_post_failure(
+                arxiv_id, f'HTTP {e.status}: {e.text or e}', retry_after=retry_after,
+                permanent=e.status in (400, 413)
+            )
+            self.logger.error(f'Discord HTTP エラー ({arxiv_id}): {e}' + ('' if retrying else ' (再試行を終了)'))
+            return False
         except Exception as e:
-            self.logger.error(f'Discord 投稿エラー: {e}')
+            retrying = self.queue.record_post_failure(arxiv_id, str(e))
+            self.logger.error(f'Discord 投稿エラー ({arxiv_id}): {e}' + ('' if retrying else ' (再試行を終了)'))
+            return False
+        
+        # 送信できた時点で投稿済みにする (リアクションの失敗で再投稿しない)
+        self.queue.mark_posted(arxiv_id, message.id)
+        lag = time.time() - paper_data['queued_at']
+        self.logger.info(f'新しい論文を投稿しました: {paper_data["title"][:50]}... '
+                         f'(遅延 {format_age(lag)}, 試行 {paper_data["post_attempts"] + 1} 回目)')
+        
+        await self.add_feedback_reactions(message)
+        self.schedule_variant_pregeneration(paper_data)
+        return True
+    
+    @summarize_worker.before_loop
+    @post_worker.before_loop
+    async def before_queue_workers(self):
+        """ワーカー開始前に Bot の準備完了を待つ"""
+        await self.wait_until_ready()
+    
+    def build_summary_embed(self, paper_data: Dict, summary: str) -> discord.Embed:
+        """論文要約の Embed を作成"""
+        # タイトルの長さ制限
+        title = paper_data['title'][:250] + "..." if len(paper_data['title']) > 250 else paper_data['title']
+        
+        # 要約の長さ制限
+        summary = summary[:2000] + "..." if len(summary) > 2000 else summary
+        
+        embed = discord.Embed(
+            title=title,
+            url=f"https://arxiv.org/abs/{paper_data['arxiv_id']}",
+            description=summary,
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        
+        # 著者情報（長すぎる場合は切り詰め）
+        authors = paper_data['authors'][:500] + "..." if len(paper_data['authors']) > 500 else paper_data['authors']
+        embed.add_field(
+            name="📝 著者", 
+            value=authors, 
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🔗 arXiv ID", 
+            value=paper_data['arxiv_id'], 
+            inline=True
+        )
+        
+        # 公開日の安全な処理
+        try:
+            pub_date = paper_data['published_date'][:10] if paper_data['published_date'] else "不明"
+        except:
+            pub_date = "不明"
+        
+        embed.add_field(
+            name="📅 公開日", 
+            value=pub_date, 
+            inline=True
+        )
+        
+        embed.set_footer(text="AI Forge Paper Summarizer")
+        return embed
+    
+    async def add_feedback_reactions(self, message: discord.Message):
+        """リアクションを並行して追加（ユーザーフィードバック用、失敗しても投稿は成功扱い）"""
+        reactions = ['👍', '🤔', '❤️']  # 有用 / 微妙 / 素晴らしい
+        results = await asyncio.gather(*(message.add_reaction(emoji) for emoji in reactions),
+                                       return_exceptions=True)
+        for emoji, result in zip(reactions, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f'リアクションの追加に失敗しました ({emoji}): {result}')
+    
+    async def post_paper_summary(self, paper_data: Dict) -> discord.Message:
+        """論文要約を Discord に投稿 (失敗時の再試行はアウトボックスの送信側で行う)"""
+        return await self.summary_channel.send(
+            embed=self.build_summary_embed(paper_data, paper_data['summary']),
+            view=self.summary_language_view
+        )
+    
+    def resolve_user_language(self, interaction: discord.Interaction) -> str:
+        """ユーザーの言語 (/language の設定 → Discord のロケール → 英語の順)"""
+        return (read_user_language(self.config.user_languages_db, interaction.user.id)
+                or language_from_locale(interaction.locale)
+                or 'en')
+    
+    async def get_summary_variant(self, paper_data: Dict, language: str) -> str:
+        """指定言語の要約を返す (未生成なら翻訳して保存、同時リクエストは1回の生成にまとめる)"""
+        arxiv_id = paper_data['arxiv_id']
+        if language == BASE_LANGUAGE:
+            return paper_data['summary']
+        
+        cached = self.summary_variants.get(arxiv_id, language)
+        if cached is not None:
+            return cached
+        
+        key = (arxiv_id, language)
+        task = self.variant_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self.generate_variants(paper_data, [language]))
+            self.variant_tasks[key] = task
+            task.add_done_callback(lambda _: self.variant_tasks.pop(key, None))
+        
+        variants = await asyncio.shield(task)
+        if language not in variants:
+            raise ValueError(f'{LANGUAGE_NAMES[language]} の要約を生成できませんでした')
+        return variants[language]
+    
+    async def generate_variants(self, paper_data: Dict, languages: List[str]) -> Dict[str, str]:
+        """要約を翻訳して保存"""
+        variants = await self.summarizer.translate_summary(
+            paper_data['title'], paper_data['summary'], languages
+        )
+        if variants:
+            self.summary_variants.put_many(paper_data['arxiv_id'], variants)
+        return variants
+    
+    def pregenerate_languages(self) -> List[str]:
+        """投稿時に事前生成する言語 (設定が無ければリクエストの多い言語)"""
+        if self.config.summary_pregenerate_languages:
+            return self.config.summary_pregenerate_languages
+        return self.summary_variants.popular_languages(
+            limit=self.config.summary_pregenerate_max_languages,
+            min_requests=self.config.summary_pregenerate_min_requests
+        )
+    
+    def schedule_variant_pregeneration(self, paper_data: Dict):
+        """よく使われる言語の要約をバックグラウンドでまとめて生成"""
+        if not self.summarizer:
+            return
+        languages = self.summary_variants.missing_languages(paper_data['arxiv_id'], self.pregenerate_languages())
+        if not languages:
+            return
+        
+        async def run():
+            try:
+                variants = await self.generate_variants(paper_data, languages)
+                self.logger.info(f'要約を事前生成しました: {paper_data["arxiv_id"]} ({", ".join(variants)})')
+            except Exception as e:
+                self.logger.error(f'要約の事前生成エラー ({paper_data["arxiv_id"]}): {e}')
+        
+        task = asyncio.create_task(run())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+    
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """論文投稿へのリアクションを記録"""
+        await self.handle_reaction(payload, added=True)
+    
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """論文投稿へのリアクション削除を記録"""
+        await self.handle_reaction(payload, added=False)
+    
+    async def handle_reaction(self, payload: discord.RawReactionActionEvent, added: bool):
+        """リアクションを論文の評価として保存"""
+        if self.user and payload.user_id == self.user.id:
+            return
+        
+        arxiv_id = self.db.get_arxiv_id_by_message(payload.message_id)
+        if arxiv_id:
+            self.db.record_reaction(arxiv_id, payload.user_id, str(payload.emoji), added=added)
+    
+    async def close(self):
+        """Bot 終了時に共有セッションを閉じる"""
+        await self.feed_fetcher.close()
+        await super().close()
+        self.db.close()
 
 # コマンド群
+class SummaryLanguageView(discord.ui.View):
+    """投稿に付ける「自分の言語で表示」ボタン (再起動後も動く永続ビュー)"""
+    
+    def __init__(self, bot: 'PaperSummarizerBot'):
+        super().__init__(timeout=None)
+        self.bot = bot
+    
+    @discord.ui.button(label="🌐 View in my language", style=discord.ButtonStyle.secondary,
+                       custom_id="paper_summary:view_in_my_language")
+    async def view_in_my_language(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """押したユーザーの言語で要約を表示 (本人にだけ見える)"""
+        arxiv_id = self.bot.db.get_arxiv_id_by_message(interaction.message.id)
+        paper = self.bot.db.get_papers([arxiv_id]).get(arxiv_id) if arxiv_id else None
+        if not paper or not paper['summary']:
+            await interaction.response.send_message("❌ この投稿の要約が見つかりません", ephemeral=True)
+            return
+        
+        language = self.bot.resolve_user_language(interaction)
+        self.bot.summary_variants.record_request(language)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        
+        try:
+            summary = await self.bot.get_summary_variant(paper, language)
+        except Exception as e:
+            self.bot.logger.error(f'要約の翻訳エラー ({arxiv_id}, {language}): {e}')
+            await interaction.followup.send(f"❌ 要約を翻訳できませんでした: {e}", ephemeral=True)
+            return
+        
+        await interaction.followup.send(embed=self.bot.build_summary_embed(paper, summary), ephemeral=True)
+
 class PaperCommands(commands.Cog):
     """論文関連コマンド"""
     
     def __init__(self, bot: PaperSummarizerBot):
         self.bot = bot
     
+    # 進捗メッセージを更新する間隔 (秒)
+    CHECK_PROGRESS_INTERVAL = 3
+    
+    @staticmethod
+    def build_check_embed(progress: Dict, started: bool) -> discord.Embed:
+        """フィードチェックの進捗 embed"""
+        finished = progress['stage'] == 'finished'
+        embed = discord.Embed(
+            title=f"{'✅' if finished else '🔍'} RSS フィードのチェック #{progress['run_id']}",
+            color=discord.Color.green() if finished else discord.Color.blue()
+        )
+        if not started:
+            embed.description = f"実行中のチェック ({progress['trigger']}) に合流しました"
+        stages = {'starting': '開始中', 'fetching': '取得中', 'processing': '処理中', 'finished': '完了'}
+        embed.add_field(name="状態", value=stages.get(progress['stage'], progress['stage']), inline=True)
+        embed.add_field(name="フィード", value=f"{progress['feeds_done']} / {progress['feeds_total']}", inline=True)
+        embed.add_field(name="新しい論文", value=f"{progress['new_papers']} 件", inline=True)
+        embed.add_field(name="未更新 (304)", value=progress['not_modified'], inline=True)
+        embed.add_field(name="合流した呼び出し", value=progress['attached'], inline=True)
+        embed.add_field(name="経過時間", value=f"{progress['elapsed']:.1f}s", inline=True)
+        if progress['errors']:
+            embed.add_field(name=f"エラー ({len(progress['errors'])})",
+                            value='\n'.join(e[:200] for e in progress['errors'][:5]), inline=False)
+        return embed
+    
     @discord.app_commands.command(name="check_papers", description="手動で RSS フィードをチェック")
     async def check_papers(self, interaction: discord.Interaction):
-        """手動で論文チェックを実行"""
+        """手動で論文チェックを実行 (実行中のチェックがあればその進捗を表示)"""
         await interaction.response.defer()
         
-        if not self.bot.summarizer:
-            await interaction.followup.send("❌ OpenAI API キーが設定されていません")
+        if not self.bot.feed_checks_enabled(warn=True):
+            await interaction.followup.send("❌ OpenAI API キーまたは要約チャンネルが設定されていません")
             return
         
-        await interaction.followup.send("🔍 RSS フィードをチェック中...")
+        run, started = self.bot.start_manual_check(trigger=f'/check_papers ({interaction.user.display_name})')
+        message = await interaction.followup.send(embed=self.build_check_embed(run.snapshot(), started), wait=True)
+        
+        # 共有している実行が終わるまで進捗を更新する
+        while not run.done:
+            await asyncio.wait({run.task}, timeout=self.CHECK_PROGRESS_INTERVAL)
+            if not run.done:
+                await message.edit(embed=self.build_check_embed(run.snapshot(), started))
         
         try:
-            await self.bot.check_rss_feeds()
-            await interaction.followup.send("✅ RSS フィードのチェックが完了しました")
+            progress = await run.wait()
+            await message.edit(embed=self.build_check_embed(progress, started))
         except Exception as e:
             await interaction.followup.send(f"❌ エラーが発生しました: {str(e)}")
+    
+    @discord.app_commands.command(name="feed_stats", description="RSS フィード取得の統計を表示")
+    async def feed_stats(self, interaction: discord.Interaction):
+        """フィード取得メトリクスを表示"""
+        stats = self.bot.feed_fetcher.stats.snapshot()
+        
+        embed = discord.Embed(
+            title="📡 フィード取得統計",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="リクエスト数", value=stats['requests'], inline=True)
+        embed.add_field(name="304 ヒット率", value=f"{stats['hit_rate']:.0%}", inline=True)
+        embed.add_field(name="取得バイト数", value=f"{stats['bytes_total']:,}", inline=True)
+        
+        for url, feed in list(stats['per_feed'].items())[:10]:  # 最大10件表示
+            embed.add_field(
+                name=url[-60:],
+                value=(f"status {feed['last_status']} | {feed['last_latency_ms']:.0f}ms | "
+                       f"{feed['last_bytes']:,} bytes | 304: {feed['not_modified']}/{feed['requests']}"),
+                inline=False
+            )
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="feed_schedule", description="フィードごとの取得スケジュールを表示")
+    async def feed_schedule(self, interaction: discord.Interaction):
+        """学習した更新間隔と次回取得までの時間を表示"""
+        schedule = self.bot.feed_scheduler.snapshot()
+        
+        embed = discord.Embed(
+            title="🗓️ フィード取得スケジュール",
+            color=discord.Color.blue()
+        )
+        checks = sum(feed['checks'] for feed in schedule)
+        changes = sum(feed['changes'] for feed in schedule)
+        embed.add_field(name="取得回数", value=checks, inline=True)
+        embed.add_field(name="新着ありの取得", value=changes, inline=True)
+        embed.add_field(name="空振り率", value=f"{(checks - changes) / checks:.0%}" if checks else "-", inline=True)
+        
+        now = time.time()
+        for feed in schedule[:10]:  # 最大10件表示
+            embed.add_field(
+                name=feed['url'][-60:],
+                value=(f"間隔 {format_age(feed['interval_seconds'])} | "
+                       f"次回 {format_age(max(0, feed['next_run_at'] - now))}後 | "
+                       f"新着 {feed['changes']}/{feed['checks']}"),
+                inline=False
+            )
+        
+        runs = self.bot.check_runs.get_stats()
+        embed.set_footer(text=f"チェック実行 {runs['runs']} 回 | 合流した呼び出し {runs['coalesced']} 回"
+                              f"{' | 実行中' if runs['running'] else ''}")
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="paper_queue", description="論文キューの状態を表示")
+    async def paper_queue(self, interaction: discord.Interaction):
+        """ステージごとのキュー深さと最古エントリの経過時間を表示"""
+        stats = self.bot.queue.get_stats()
+        
+        embed = discord.Embed(
+            title="📚 論文キュー",
+            color=discord.Color.blue()
+        )
+        
+        labels = {
+            PaperQueue.DISCOVERED: "🆕 要約待ち",
+            PaperQueue.SUMMARIZED: "📝 投稿待ち",
+            PaperQueue.POSTED: "✅ 投稿済み",
+            PaperQueue.FAILED: "❌ 失敗",
+            PaperQueue.SKIPPED: "⏭️ 関連度で除外",
+        }
+        for state, label in labels.items():
+            depth = stats[state]['depth']
+            age = format_age(stats[state]['oldest_age_seconds']) if depth else "-"
+            embed.add_field(name=label, value=f"{depth} 件 (最古: {age})", inline=True)
+        
+        outbox = self.bot.queue.outbox.get_stats()
+        lag = (f"p50 {format_age(outbox['lag_p50'])} / p95 {format_age(outbox['lag_p95'])}"
+               if outbox['sent_in_window'] else "-")
+        embed.add_field(
+            name="📮 投稿アウトボックス",
+            value=(f"待ち {outbox['pending']} 件 (再試行中 {outbox['retrying']} 件, "
+                   f"最古: {format_age(outbox['oldest_pending_seconds']) if outbox['pending'] else '-'}) | "
+                   f"破棄 {outbox['dead']} 件\n"
+                   f"直近1時間: {outbox['sent_in_window']} 件 ({outbox['per_minute']:.1f} 件/分) | 遅延 {lag}"),
+            inline=False
+        )
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="skipped_papers", description="関連度フィルターで除外された論文を表示")
+    async def skipped_papers(self, interaction: discord.Interaction):
+        """除外された論文とスコアを表示"""
+        papers = self.bot.queue.fetch_skipped()
+        if not papers:
+            await interaction.response.send_message("⏭️ 除外された論文はありません")
+            return
+        
+        model = self.bot.relevance_model
+        embed = discord.Embed(
+            title="⏭️ 関連度で除外された論文",
+            description=(f"学習データ: {model.trained_examples} 件 | 閾値: {self.bot.config.relevance_min_score}\n"
+                         "`/summarize_skipped` で要約できます"),
+            color=discord.Color.blue()
+        )
+        for paper in papers:
+            embed.add_field(
+                name=paper['title'][:250],
+                value=f"[{paper['arxiv_id']}](https://arxiv.org/abs/{paper['arxiv_id']}) | スコア {paper['relevance_score']:.2f}",
+                inline=False
+            )
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="summarize_skipped", description="除外された論文を要約して投稿")
+    @discord.app_commands.describe(arxiv_id="arXiv ID (例: 2401.01234)")
+    async def summarize_skipped(self, interaction: discord.Interaction, arxiv_id: str):
+        """除外された論文を要約キューに戻す"""
+        arxiv_id = extract_arxiv_id(arxiv_id)
+        if not self.bot.queue.requeue_skipped(arxiv_id):
+            await interaction.response.send_message(f"❌ {arxiv_id} は除外された論文ではありません")
+            return
+        
+        await interaction.response.send_message(
+            f"📝 {arxiv_id} を要約キューに戻しました。まもなく #{self.bot.config.summary_channel_name} に投稿されます"
+        )
+
+    @discord.app_commands.command(name="summary_cache", description="要約キャッシュの統計を表示")
+    async def summary_cache(self, interaction: discord.Interaction):
+        """キャッシュのヒット・ミス数を表示"""
+        stats = self.bot.summary_cache.get_stats()
+        
+        embed = discord.Embed(
+            title="🗃️ 要約キャッシュ",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="エントリ数", value=f"{stats['entries']:,}", inline=True)
+        embed.add_field(name="ヒット (節約した LLM 呼び出し)", value=stats['hits'], inline=True)
+        embed.add_field(name="ミス", value=stats['misses'], inline=True)
+        embed.add_field(name="ヒット率", value=f"{stats['hit_rate']:.0%}", inline=True)
+        embed.add_field(name="削除数", value=stats['evictions'], inline=True)
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="summary_latency", description="要約が表示されるまでの時間を表示")
+    async def summary_latency(self, interaction: discord.Interaction):
+        """time-to-first-content の統計を表示"""
+        stats = self.bot.first_content_latency.snapshot()
+        mode = "ストリーミング" if self.bot.config.summary_streaming else "一括"
+        
+        embed = discord.Embed(
+            title="⏱️ 最初の内容が表示されるまでの時間",
+            description=f"モード: {mode} (直近 {len(self.bot.first_content_latency.samples)} 件)",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="計測数", value=stats['count'], inline=True)
+        for key in ('p50', 'p95'):
+            value = f"{stats[key]:.2f}s" if stats[key] is not None else "-"
+            embed.add_field(name=key, value=value, inline=True)
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="summary_languages", description="多言語要約の統計を表示")
+    async def summary_languages(self, interaction: discord.Interaction):
+        """言語ごとの要約数・リクエスト数と事前生成する言語を表示"""
+        stats = self.bot.summary_variants.get_stats()
+        pregenerate = self.bot.pregenerate_languages()
+        
+        embed = discord.Embed(
+            title="🌐 多言語要約",
+            description=f"事前生成する言語: {', '.join(pregenerate) or 'なし (初回リクエスト時に生成)'}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="保存済みヒット率", value=f"{stats['hit_rate']:.0%}", inline=True)
+        for language in sorted(set(stats['variants']) | set(stats['requests'])):
+            embed.add_field(
+                name=LANGUAGE_NAMES.get(language, language),
+                value=f"要約 {stats['variants'].get(language, 0)} 件 | 30日のリクエスト {stats['requests'].get(language, 0)} 回",
+                inline=True
+            )
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="search_papers", description="保存済みの論文を全文検索")
+    @discord.app_commands.describe(query="検索キーワード", page="ページ番号")
+    async def search_papers(self, interaction: discord.Interaction, query: str, page: int = 1):
+        """論文を bm25 順に検索して表示"""
+        per_page = 5
+        page = max(page, 1)
+        total = self.bot.search_index.count(query)
+        results = self.bot.search_index.search(query, limit=per_page, offset=(page - 1) * per_page)
+        
+        if not results:
+            await interaction.response.send_message(f"🔍 「{query[:100]}」に一致する論文が見つかりません")
+            return
+        
+        total_pages = (total + per_page - 1) // per_page
+        embed = discord.Embed(
+            title=f"🔍 検索結果: {query[:100]}",
+            description=f"{total} 件中 {(page - 1) * per_page + 1}-{(page - 1) * per_page + len(results)} 件",
+            color=discord.Color.blue()
+        )
+        for result in results:
+            embed.add_field(
+                name=result['title'][:250],
+                value=(f"[{result['arxiv_id']}](https://arxiv.org/abs/{result['arxiv_id']}) | "
+                       f"{result['published_date'][:10]}\n{result['snippet'][:700]}"),
+                inline=False
+            )
+        embed.set_footer(text=f"ページ {page}/{total_pages}")
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="author_papers", description="著者の論文を表示")
+    @discord.app_commands.describe(name="著者名 (フルネーム、または姓)")
+    async def author_papers(self, interaction: discord.Interaction, name: str):
+        """著者テーブルの索引から論文を新しい順に表示"""
+        papers = self.bot.db.get_papers_by_author(name, limit=10)
+        if not papers:
+            await interaction.response.send_message(f"👤 「{name[:100]}」の論文が見つかりません")
+            return
+        
+        embed = discord.Embed(
+            title=f"👤 {name[:100]} の論文",
+            color=discord.Color.blue()
+        )
+        for paper in papers:
+            embed.add_field(
+                name=paper['title'][:250],
+                value=(f"[{paper['arxiv_id']}](https://arxiv.org/abs/{paper['arxiv_id']}) | "
+                       f"{paper['published_date'][:10]}\n{paper['authors'][:300]}"),
+                inline=False
+            )
+        
+        await interaction.response.send_message(embed=embed)
+
+    @discord.app_commands.command(name="related", description="指定した論文に関連する論文を表示")
+    @discord.app_commands.describe(arxiv_id="arXiv ID (例: 2401.01234)")
+    async def related(self, interaction: discord.Interaction, arxiv_id: str):
+        """ベクトルインデックスから類似論文を検索"""
+        arxiv_id = extract_arxiv_id(arxiv_id)
+        vector = self.bot.vector_index.vector_for(arxiv_id)
+        if vector is None:
+            await interaction.response.send_message(f"❌ {arxiv_id} はインデックスに登録されていません")
+            return
+        
+        results = self.bot.vector_index.search(vector, k=5, exclude=[arxiv_id])
+        await interaction.response.send_message(
+            embed=self.build_related_embed(f"🔗 {arxiv_id} の関連論文", results)
+        )
+    
+    @discord.app_commands.command(name="similar_to_liked", description="あなたが高評価した論文に似た論文を表示")
+    async def similar_to_liked(self, interaction: discord.Interaction):
+        """👍/❤️ を付けた論文の平均ベクトルに近い論文を検索"""
+        liked = self.bot.db.get_liked_papers(interaction.user.id)
+        vectors = [v for v in (self.bot.vector_index.vector_for(i) for i in liked) if v is not None]
+        if not vectors:
+            await interaction.response.send_message(
+                f"📭 #{self.bot.config.summary_channel_name} の論文に 👍 か ❤️ を付けるとおすすめが表示されます"
+            )
+            return
+        
+        profile = np.mean(vectors, axis=0)
+        norm = np.linalg.norm(profile)
+        if norm > 0:
+            profile = profile / norm
+        
+        results = self.bot.vector_index.search(profile, k=5, exclude=liked)
+        await interaction.response.send_message(
+            embed=self.build_related_embed("💡 あなたが高評価した論文に似た論文", results)
+        )
+    
+    def build_related_embed(self, title: str, results: List[Tuple[str, float]]) -> discord.Embed:
+        """類似論文の検索結果を Embed にする"""
+        papers = self.bot.db.get_papers([arxiv_id for arxiv_id, _ in results])
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        
+        for arxiv_id, score in results:
+            paper = papers.get(arxiv_id)
+            if not paper:
+                continue
+            embed.add_field(
+                name=paper['title'][:250],
+                value=f"[{arxiv_id}](https://arxiv.org/abs/{arxiv_id}) | 類似度 {score:.2f}",
+                inline=False
+            )
+        
+        if not embed.fields:
+            embed.description = "関連する論文が見つかりませんでした"
+        return embed
+
+def format_age(seconds: float) -> str:
+    """経過秒数を読みやすい文字列にする"""
+    if seconds < 60:
+        return f"{int(seconds)}秒"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}分"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}時間"
+    return f"{seconds / 86400:.1f}日"
 
 async def main():
     """メイン実行関数"""
@@ -0,0 +1,116 @@
+"""
+フィードチェックの単一実行 (single-flight)
+定期実行と /check_papers が同時に走ると同じエントリを並行して取得・処理してしまうので、
+実行中のチェックがあれば新しく始めずにそれに合流し、同じ結果と進捗を共有する
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+class CheckRun:
+    """1回分のフィードチェックと、その進捗"""
+
+    def __init__(self, run_id: int, trigger: str):
+        self.run_id = run_id
+        # 最初に実行を始めた呼び出し元 (scheduled / /check_papers など)
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.stage = 'starting'
+        self.feeds_total = 0
+        self.feeds_done = 0
+        self.not_modified = 0
+        self.new_papers = 0
+        self.errors: List[str] = []
+        # 途中から合流した呼び出しの数
+        self.attached = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    def begin(self, feeds_total: int):
+        """取得対象のフィード数を設定"""
+        self.feeds_total = feeds_total
+        self.stage = 'fetching'
+
+    def record_feed(self, new_papers: int = 0, not_modified: bool = False, error: Optional[str] = None):
+        """フィード1件分の結果を記録"""
+        self.stage = 'processing'
+        self.feeds_done += 1
+        self.new_papers += new_papers
+        if not_modified:
+            self.not_modified += 1
+        if error:
+            self.errors.append(error)
+
+    async def wait(self) -> Dict:
+        """実行の完了を待って結果を返す (待つ側がキャンセルされても実行は止めない)"""
+        await asyncio.shield(self.task)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict:
+        """現在の進捗"""
+        end = self.finished_at or time.time()
+        return {
+            'run_id': self.run_id,
+            'trigger': self.trigger,
+            'stage': 'finished' if self.finished_at else self.stage,
+            'feeds_total': self.feeds_total,
+            'feeds_done': self.feeds_done,
+            'not_modified': self.not_modified,
+            'new_papers': self.new_papers,
+            'errors': list(self.errors),
+            'attached': self.attached,
+            'elapsed': end - self.started_at,
+        }
+
+class CheckRunCoordinator:
+    """フィードチェックを同時に1つだけ実行し、並行した呼び出しを合流させる"""
+
+    def __init__(self):
+        self.current: Optional[CheckRun] = None
+        self.last: Optional[CheckRun] = None
+        self.runs = 0
+        self.coalesced = 0
+
+    def start(self, run_check: Callable[[CheckRun], Awaitable[None]],
+              trigger: str) -> Tuple[CheckRun, bool]:
+        """チェックを開始 (実行中なら合流)
+
+        Args:
+            run_check: CheckRun を受け取って進捗を記録しながらチェックするコルーチン関数
+
+        Returns:
+            (実行, 新しく開始したかどうか)
+        """
+        if self.current is not None and not self.current.done:
+            self.current.attached += 1
+            self.coalesced += 1
+            return self.current, False
+
+        self.runs += 1
+        run = CheckRun(self.runs, trigger)
+        self.current = run
+        run.task = asyncio.create_task(self._execute(run, run_check))
+        return run, True
+
+    async def _execute(self, run: CheckRun, run_check: Callable[[CheckRun], Awaitable[None]]):
+        try:
+            await run_check(run)
+        finally:
+            run.finished_at = time.time()
+            self.last = run
+            if self.current is run:
+                self.current = None
+
+    def get_stats(self) -> Dict:
+        """実行回数と合流した呼び出しの数"""
+        return {
+            'runs': self.runs,
+            'coalesced': self.coalesced,
+            'running': self.current is not None,
+            'last': self.last.snapshot() if self.last else None,
+        }
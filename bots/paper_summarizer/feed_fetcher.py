@@ -0,0 +1,194 @@
+"""
+RSS フィード取得ステージ
+共有 aiohttp セッションで全フィードを並列に取得し、ETag / Last-Modified による
+条件付きリクエストで未更新のフィード (304) はパースせずにスキップする
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class FeedFetchResult:
+    """単一フィードの取得結果"""
+
+    def __init__(self, url: str, status: int, content: Optional[bytes] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 latency_ms: float = 0.0, error: Optional[str] = None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.latency_ms = latency_ms
+        self.error = error
+
+    @property
+    def not_modified(self) -> bool:
+        """304 Not Modified かどうか"""
+        return self.status == 304
+
+    @property
+    def size(self) -> int:
+        """取得したバイト数"""
+        return len(self.content) if self.content else 0
+
+class FeedFetchStats:
+    """フィード取得メトリクス (レイテンシ・バイト数・304 ヒット率)"""
+
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.bytes_total = 0
+        self.per_feed: Dict[str, Dict] = {}
+
+    def record(self, result: FeedFetchResult):
+        """取得結果を記録"""
+        self.requests += 1
+        self.bytes_total += result.size
+        if result.not_modified:
+            self.not_modified += 1
+        if result.error:
+            self.errors += 1
+
+        feed_stats = self.per_feed.setdefault(result.url, {
+            'requests': 0,
+            'not_modified': 0,
+            'bytes_total': 0,
+        })
+        feed_stats['requests'] += 1
+        feed_stats['bytes_total'] += result.size
+        if result.not_modified:
+            feed_stats['not_modified'] += 1
+        feed_stats['last_status'] = result.status
+        feed_stats['last_latency_ms'] = result.latency_ms
+        feed_stats['last_bytes'] = result.size
+
+    @property
+    def hit_rate(self) -> float:
+        """304 ヒット率"""
+        return self.not_modified / self.requests if self.requests else 0.0
+
+    def snapshot(self) -> Dict:
+        """現在のメトリクスを辞書で返す"""
+        return {
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'errors': self.errors,
+            'bytes_total': self.bytes_total,
+            'hit_rate': self.hit_rate,
+            'per_feed': {url: dict(stats) for url, stats in self.per_feed.items()},
+        }
+
+class FeedFetcher:
+    """条件付き GET による並列フィード取得"""
+
+    USER_AGENT = 'AIForgePaperSummarizer/1.0 (+https://github.com/daideguchi/ai-forge-community)'
+
+    def __init__(self, state_store=None, timeout: float = 30.0,
+                 per_host_limit: int = 4, total_limit: int = 32):
+        # state_store は get_feed_state / save_feed_state を持つオブジェクト (PaperDatabase)
+        self.state_store = state_store
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self.total_limit = total_limit
+        self.stats = FeedFetchStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """共有セッションを取得 (初回のみ作成)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.total_limit,
+                limit_per_host=self.per_host_limit
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': self.USER_AGENT}
+            )
+        return self._session
+
+    async def close(self):
+        """セッションを閉じる"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        """保存済みの検証子から条件付きリクエストヘッダーを作成"""
+        headers = {}
+        if not self.state_store:
+            return headers
+
+        state = self.state_store.get_feed_state(url)
+        if state:
+            if state.get('etag'):
+                headers['If-None-Match'] = state['etag']
+            if state.get('last_modified'):
+                headers['If-Modified-Since'] = state['last_modified']
+        return headers
+
+    async def fetch(self, url: str) -> FeedFetchResult:
+        """単一フィードを取得"""
+        session = await self.get_session()
+        headers = self._conditional_headers(url)
+        started = time.perf_counter()
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                content = None
+                if response.status == 200:
+                    content = await response.read()
+
+                result = FeedFetchResult(
+                    url=url,
+                    status=response.status,
+                    content=content,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    latency_ms=(time.perf_counter() - started) * 1000
+                )
+                if response.status not in (200, 304):
+                    result.error = f'HTTP {response.status}'
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result = FeedFetchResult(
+                url=url,
+                status=0,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                error=str(e) or e.__class__.__name__
+            )
+
+        self.stats.record(result)
+        logger.info(
+            f'フィード取得: {url} status={result.status} '
+            f'{result.latency_ms:.0f}ms {result.size} bytes'
+        )
+        return result
+
+    def commit(self, result: FeedFetchResult):
+        """処理が完了したフィードの検証子を保存
+
+        エントリの処理前に保存すると、途中で失敗した場合に次回 304 が返って
+        取りこぼすため、呼び出し側が処理完了後に呼ぶ
+        """
+        if result.status == 200 and self.state_store:
+            self.state_store.save_feed_state(result.url, result.etag, result.last_modified)
+
+    async def fetch_all(self, urls: List[str]) -> List[FeedFetchResult]:
+        """全フィードを並列に取得"""
+        urls = [url.strip() for url in urls if url and url.strip()]
+        results = await asyncio.gather(*(self.fetch(url) for url in urls))
+
+        hosts = {urlparse(url).netloc for url in urls}
+        logger.info(
+            f'{len(urls)} 件のフィードを取得 ({len(hosts)} ホスト), '
+            f'304 ヒット率: {self.stats.hit_rate:.0%}'
+        )
+        return list(results)
@@ -0,0 +1,141 @@
+"""
+ストリーミング RSS / Atom パーサー
+XMLPullParser でエントリを1件ずつ読み出し、process_rss_feed が使うフィールドだけを
+軽量なレコードにする。処理済みの ID は本文を組み立てる前に捨てる
+"""
+
+from typing import Callable, Iterable, Iterator, List, Optional
+from xml.etree.ElementTree import XMLPullParser
+
+# RSS 2.0 / RSS 1.0 (RDF) の item と Atom の entry
+ENTRY_TAGS = {'item', 'entry'}
+ID_TAGS = ('guid', 'id')
+PUBLISHED_TAGS = ('published', 'pubDate', 'date', 'updated')
+SUMMARY_TAGS = ('summary', 'description')
+RDF_ABOUT = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about'
+
+def local_name(tag: str) -> str:
+    """名前空間を除いたタグ名"""
+    return tag.rsplit('}', 1)[-1] if '}' in tag else tag
+
+class FeedEntry:
+    """フィードのエントリ (process_rss_feed が使うフィールドのみ)"""
+
+    __slots__ = ('id', 'title', 'summary', 'published', 'authors')
+
+    def __init__(self, id: str, title: str = '', summary: str = '',
+                 published: str = '', authors: Optional[List[str]] = None):
+        self.id = id
+        self.title = title
+        self.summary = summary
+        self.published = published
+        self.authors = authors or []
+
+    def __repr__(self) -> str:
+        return f'FeedEntry(id={self.id!r}, title={self.title[:30]!r})'
+
+def _entry_id(elem) -> Optional[str]:
+    """エントリ要素から ID を取得 (guid → id → link → rdf:about)"""
+    children = {}
+    for child in elem:
+        children.setdefault(local_name(child.tag), child)
+
+    for tag in ID_TAGS:
+        child = children.get(tag)
+        if child is not None and child.text and child.text.strip():
+            return child.text.strip()
+
+    link = children.get('link')
+    if link is not None:
+        href = link.get('href') or (link.text or '').strip()
+        if href:
+            return href
+
+    about = elem.get(RDF_ABOUT)
+    return about.strip() if about else None
+
+def _build_entry(entry_id: str, elem) -> FeedEntry:
+    """エントリ要素から FeedEntry を組み立てる"""
+    fields = {}
+    authors = []
+    for child in elem:
+        name = local_name(child.tag)
+        if name == 'author':
+            # Atom は <author><name>, RSS 2.0 は <author> のテキスト
+            names = [(c.text or '').strip() for c in child if local_name(c.tag) == 'name']
+            if names:
+                authors.extend(n for n in names if n)
+            elif child.text and child.text.strip():
+                authors.append(child.text.strip())
+        elif name == 'creator':
+            # arXiv の dc:creator はカンマ区切りの1要素
+            if child.text and child.text.strip():
+                authors.extend(a.strip() for a in child.text.split(',') if a.strip())
+        elif name not in fields:
+            fields[name] = ''.join(child.itertext()).strip()
+
+    summary = next((fields[t] for t in SUMMARY_TAGS if fields.get(t)), '')
+    published = next((fields[t] for t in PUBLISHED_TAGS if fields.get(t)), '')
+    return FeedEntry(entry_id, fields.get('title', ''), summary, published, authors)
+
+class StreamingFeedParser:
+    """チャンク単位でバイト列を受け取り、完成したエントリを順に返すパーサー"""
+
+    def __init__(self, skip_id: Optional[Callable[[str], bool]] = None):
+        # skip_id が True を返した ID のエントリは組み立てずに捨てる
+        self.skip_id = skip_id
+        self.skipped = 0
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._stack = []
+
+    def feed(self, chunk: bytes) -> Iterator[FeedEntry]:
+        """チャンクを追加し、完成したエントリを返す"""
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> Iterator[FeedEntry]:
+        """入力の終わりを通知し、残りのエントリを返す"""
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> Iterator[FeedEntry]:
+        """パーサーに溜まったイベントを処理"""
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                self._stack.append(elem)
+                continue
+
+            self._stack.pop()
+            if local_name(elem.tag) not in ENTRY_TAGS:
+                continue
+
+            entry_id = _entry_id(elem)
+            if entry_id and self.skip_id and self.skip_id(entry_id):
+                self.skipped += 1
+            elif entry_id:
+                yield _build_entry(entry_id, elem)
+
+            # 処理済みのエントリを親から外してメモリを解放
+            elem.clear()
+            if self._stack:
+                parent = self._stack[-1]
+                if len(parent) and parent[-1] is elem:
+                    parent.remove(elem)
+
+def iter_feed_entries(chunks: Iterable[bytes],
+                      skip_id: Optional[Callable[[str], bool]] = None) -> Iterator[FeedEntry]:
+    """バイト列のチャンクからエントリを1件ずつ返す
+
+    Raises:
+        xml.etree.ElementTree.ParseError: XML として解釈できない場合
+    """
+    parser = StreamingFeedParser(skip_id)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+def iter_chunks(content: bytes, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """バイト列を固定サイズのチャンクに分割 (コピーせずに memoryview で切り出す)"""
+    view = memoryview(content)
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
@@ -0,0 +1,255 @@
+"""
+フィードごとの適応的なポーリングスケジューラー
+観測した更新間隔と、フィードが宣言する ttl / sy:updatePeriod / 最終更新日時から
+各フィードの次の更新を予測し、その直後にジッター付きで取得する
+次回実行時刻は SQLite に保存するので、再起動しても全フィードを一斉に取得し直さない
+"""
+
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+from feed_parser import ENTRY_TAGS, iter_chunks, local_name
+
+# sy:updatePeriod の秒数
+UPDATE_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 7 * 86400,
+    'monthly': 30 * 86400,
+    'yearly': 365 * 86400,
+}
+# チャンネル / フィード全体の最終更新日時を表す要素
+LAST_UPDATED_TAGS = ('lastBuildDate', 'updated', 'pubDate', 'date')
+
+def parse_feed_date(text: str) -> Optional[float]:
+    """RFC 822 (RSS) または ISO 8601 (Atom) の日時を UNIX 時刻にする"""
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        parsed = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def extract_feed_timing(content: bytes) -> Dict:
+    """フィードの先頭 (最初のエントリより前) から更新周期のヒントを取り出す
+
+    Returns:
+        ttl_seconds / declared_interval / last_updated (見つかったものだけ)
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    fields = {}
+    reached_entries = False
+    try:
+        for chunk in iter_chunks(content, 16 * 1024):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                name = local_name(elem.tag)
+                if name in ENTRY_TAGS:
+                    # エントリ以降はチャンネル情報ではないので読まない
+                    reached_entries = True
+                    break
+                if event == 'end' and name not in fields and elem.text:
+                    fields[name] = elem.text.strip()
+            if reached_entries:
+                break
+    except ParseError:
+        pass
+
+    timing = {}
+    try:
+        if fields.get('ttl'):
+            timing['ttl_seconds'] = float(fields['ttl']) * 60
+    except ValueError:
+        pass
+
+    period = UPDATE_PERIODS.get(fields.get('updatePeriod', '').lower())
+    if period:
+        try:
+            frequency = max(1, int(fields.get('updateFrequency') or 1))
+        except ValueError:
+            frequency = 1
+        timing['declared_interval'] = period / frequency
+
+    for tag in LAST_UPDATED_TAGS:
+        updated = parse_feed_date(fields.get(tag))
+        if updated:
+            timing['last_updated'] = updated
+            break
+    return timing
+
+class FeedScheduler:
+    """フィードごとの次回取得時刻を学習・永続化するスケジューラー"""
+
+    # 更新間隔の指数移動平均の重み
+    SMOOTHING = 0.3
+    # 予測時刻を過ぎても更新が無いときの最初の再確認 (間隔に対する割合)
+    RECHECK_FRACTION = 0.1
+    MAX_RECHECK_FRACTION = 0.25
+
+    def __init__(self, conn, default_interval: float = 6 * 3600, min_interval: float = 15 * 60,
+                 max_interval: float = 24 * 3600, jitter: float = 0.1, initial_spread: float = 60):
+        self.conn = conn
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        # 初めて見るフィードはこの秒数の範囲にばらして取得する
+        self.initial_spread = initial_spread
+        self.init_table()
+
+    def init_table(self):
+        """スケジュールテーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_schedule (
+                url TEXT PRIMARY KEY,
+                interval_seconds REAL NOT NULL,
+                next_run_at REAL NOT NULL,
+                last_checked_at REAL,
+                last_changed_at REAL,
+                ttl_seconds REAL,
+                misses INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                checks INTEGER DEFAULT 0,
+                changes INTEGER DEFAULT 0
+            )
+        ''')
+
+        self.conn.commit()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """フィードのスケジュール"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT url, interval_seconds, next_run_at, last_checked_at, last_changed_at,
+                   ttl_seconds, misses, errors, checks, changes
+            FROM feed_schedule WHERE url = ?
+        ''', (url,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        columns = ['url', 'interval_seconds', 'next_run_at', 'last_checked_at', 'last_changed_at',
+                   'ttl_seconds', 'misses', 'errors', 'checks', 'changes']
+        return dict(zip(columns, row))
+
+    def due(self, urls: List[str], now: Optional[float] = None) -> List[str]:
+        """取得時刻を過ぎたフィード (初めて見るフィードは登録して取得時刻をばらす)"""
+        now = time.time() if now is None else now
+        # record_check には FeedFetcher.fetch_all が正規化した URL が渡るので揃える
+        urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+        cursor = self.conn.cursor()
+
+        cursor.executemany('''
+            INSERT OR IGNORE INTO feed_schedule (url, interval_seconds, next_run_at)
+            VALUES (?, ?, ?)
+        ''', [(url, self.default_interval, now + random.uniform(0, self.initial_spread)) for url in urls])
+        self.conn.commit()
+
+        due = []
+        for url in urls:
+            cursor.execute('SELECT next_run_at FROM feed_schedule WHERE url = ?', (url,))
+            if cursor.fetchone()[0] <= now:
+                due.append(url)
+        return due
+
+    def record_check(self, url: str, changed: bool, timing: Optional[Dict] = None,
+                     now: Optional[float] = None) -> float:
+        """取得結果から更新間隔を学習して次回取得時刻を決める
+
+        Args:
+            changed: 新しい論文が見つかったかどうか
+            timing: extract_feed_timing の結果 (304 の場合は None)
+
+        Returns:
+            次回取得時刻 (UNIX 時刻)
+        """
+        now = time.time() if now is None else now
+        timing = timing or {}
+        state = self.get(url) or {
+            'interval_seconds': self.default_interval, 'last_changed_at': None,
+            'ttl_seconds': None, 'misses': 0, 'checks': 0, 'changes': 0,
+        }
+        interval = state['interval_seconds']
+        last_changed_at = state['last_changed_at']
+        misses = state['misses']
+        changes = state['changes']
+        ttl = timing.get('ttl_seconds', state['ttl_seconds'])
+
+        if changed:
+            # フィードが宣言する最終更新日時の方が観測時刻より正確
+            changed_at = timing.get('last_updated')
+            if (changed_at is None or changed_at > now
+                    or (last_changed_at is not None and changed_at <= last_changed_at)):
+                changed_at = now
+
+            if last_changed_at is not None:
+                observed = changed_at - last_changed_at
+                interval = (1 - self.SMOOTHING) * interval + self.SMOOTHING * observed
+            elif timing.get('declared_interval'):
+                interval = timing['declared_interval']
+
+            interval = self._clamp(max(interval, ttl or 0))
+            last_changed_at = changed_at
+            misses = 0
+            changes += 1
+            wait = max(self.min_interval, changed_at + interval - now)
+        else:
+            misses += 1
+            expected = last_changed_at + interval if last_changed_at is not None else None
+            if expected is not None and expected - now > self.min_interval:
+                # 予測時刻より前に取得していた (手動チェックなど)
+                wait = expected - now
+            else:
+                # 予測時刻を過ぎても更新が無いので、間隔を倍々に延ばしながら再確認する
+                wait = self._clamp(min(interval * self.RECHECK_FRACTION * 2 ** (misses - 1),
+                                       interval * self.MAX_RECHECK_FRACTION))
+            wait = max(wait, ttl or 0)
+
+        next_run_at = now + self._jittered(wait)
+        self.conn.execute('''
+            INSERT OR REPLACE INTO feed_schedule
+                (url, interval_seconds, next_run_at, last_checked_at, last_changed_at,
+                 ttl_seconds, misses, errors, checks, changes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+        ''', (url, interval, next_run_at, now, last_changed_at, ttl, misses, state['checks'] + 1, changes))
+        self.conn.commit()
+        return next_run_at
+
+    def record_error(self, url: str, now: Optional[float] = None) -> float:
+        """取得エラー時は指数バックオフで再試行する"""
+        now = time.time() if now is None else now
+        state = self.get(url)
+        errors = (state['errors'] if state else 0) + 1
+        next_run_at = now + self._jittered(self._clamp(self.min_interval * 2 ** (errors - 1)))
+
+        self.conn.execute('''
+            UPDATE feed_schedule
+            SET errors = ?, next_run_at = ?, last_checked_at = ?, checks = checks + 1
+            WHERE url = ?
+        ''', (errors, next_run_at, now, url))
+        self.conn.commit()
+        return next_run_at
+
+    def snapshot(self) -> List[Dict]:
+        """全フィードのスケジュール (次回取得が近い順)"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT url FROM feed_schedule ORDER BY next_run_at')
+        return [self.get(row[0]) for row in cursor.fetchall()]
+
+    def _clamp(self, seconds: float) -> float:
+        return min(self.max_interval, max(self.min_interval, seconds))
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
@@ -0,0 +1,254 @@
+"""
+論文データベースの一括バックフィル
+arXiv のメタデータエクスポート (OAI-PMH の XML、または JSON Lines スナップショット) を
+ストリーミングで読み込み、大きなトランザクションと executemany で papers に投入する
+要約は空のまま残し、必要になった時点で生成する
+
+使い方:
+    python bots/paper_summarizer/paper_backfill.py --db papers.db arxiv-metadata-oai-snapshot.json
+    python bots/paper_summarizer/paper_backfill.py --db papers.db --format oai listrecords-*.xml.gz
+    python bots/paper_summarizer/paper_backfill.py --db papers.db --compression zlib arxiv-metadata-oai-snapshot.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+from feed_parser import local_name
+
+# (arxiv_id, title, authors, abstract, published_date)
+PaperRow = Tuple[str, str, str, str, str]
+
+def normalize_arxiv_id(identifier: str) -> str:
+    """OAI 識別子やバージョン付き ID から arXiv ID を取り出す (旧形式の hep-th/9901001 も保持)"""
+    identifier = identifier.strip()
+    identifier = re.sub(r'^oai:arXiv\.org:', '', identifier)
+    identifier = re.sub(r'^https?://arxiv\.org/abs/', '', identifier)
+    return re.sub(r'v\d+$', '', identifier)
+
+def clean_text(text: Optional[str]) -> str:
+    """改行やインデントを1つの空白にまとめる"""
+    return ' '.join((text or '').split())
+
+def open_source(path: str) -> IO[bytes]:
+    """入力ファイルを開く (.gz は透過的に展開、- は標準入力)"""
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def detect_format(path: str) -> str:
+    """拡張子から形式を推測"""
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'oai' if name.endswith('.xml') else 'jsonl'
+
+def iter_jsonl_records(stream: IO[bytes]) -> Iterator[PaperRow]:
+    """arXiv の JSON Lines スナップショット (Kaggle 形式) を1行ずつ読む"""
+    for line in stream:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        arxiv_id = record.get('id')
+        title = clean_text(record.get('title'))
+        if not arxiv_id or not title:
+            continue
+
+        # 公開日は最初のバージョンの作成日 (無ければ更新日)
+        versions = record.get('versions') or []
+        published = versions[0].get('created', '') if versions else ''
+        yield (
+            normalize_arxiv_id(arxiv_id),
+            title,
+            clean_text(record.get('authors')) or 'Unknown',
+            clean_text(record.get('abstract')),
+            published or record.get('update_date') or '',
+        )
+
+def _oai_authors(metadata) -> List[str]:
+    """arXiv / oai_dc 形式のメタデータから著者名を取り出す"""
+    authors = []
+    for elem in metadata.iter():
+        name = local_name(elem.tag)
+        if name == 'author':
+            # arXiv 形式: <author><keyname>Doe</keyname><forenames>Jane</forenames></author>
+            parts = {local_name(c.tag): clean_text(c.text) for c in elem}
+            full = ' '.join(p for p in (parts.get('forenames'), parts.get('keyname'), parts.get('suffix')) if p)
+            if full:
+                authors.append(full)
+        elif name == 'creator' and elem.text:
+            # oai_dc 形式: <dc:creator>Doe, Jane</dc:creator>
+            last, _, first = clean_text(elem.text).partition(', ')
+            authors.append(f'{first} {last}' if first else last)
+    return authors
+
+def _oai_row(record) -> Optional[PaperRow]:
+    """OAI-PMH の record 要素を行にする (削除済みレコードは None)"""
+    header = next((c for c in record if local_name(c.tag) == 'header'), None)
+    metadata = next((c for c in record if local_name(c.tag) == 'metadata'), None)
+    if header is None or metadata is None or header.get('status') == 'deleted':
+        return None
+
+    fields = {}
+    for elem in metadata.iter():
+        name = local_name(elem.tag)
+        if name not in fields and elem.text and elem.text.strip():
+            fields[name] = elem.text
+
+    identifier = fields.get('id') or next(
+        (c.text for c in header if local_name(c.tag) == 'identifier' and c.text), None
+    )
+    title = clean_text(fields.get('title'))
+    if not identifier or not title:
+        return None
+
+    # arXiv 形式は abstract と created、oai_dc 形式は description と date
+    return (
+        normalize_arxiv_id(identifier),
+        title,
+        ', '.join(_oai_authors(metadata)) or 'Unknown',
+        clean_text(fields.get('abstract') or fields.get('description')),
+        clean_text(fields.get('created') or fields.get('date')),
+    )
+
+def iter_oai_records(stream: IO[bytes]) -> Iterator[PaperRow]:
+    """OAI-PMH ListRecords の XML を record 要素ごとに読む"""
+    stack = []
+    for event, elem in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if local_name(elem.tag) != 'record':
+            continue
+
+        row = _oai_row(elem)
+        if row:
+            yield row
+
+        # 読み終えた record を親から外してメモリを一定に保つ
+        elem.clear()
+        if stack and len(stack[-1]) and stack[-1][-1] is elem:
+            stack[-1].remove(elem)
+
+class PaperBackfill:
+    """papers テーブルへの一括投入"""
+
+    def __init__(self, conn, batch_size: int = 50000, progress=None, search_index=None, storage=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        # search_index (PaperSearchIndex) があれば行ごとのトリガーではなくバッチ単位で索引する
+        self.search_index = search_index
+        # storage (PaperStorage) があれば abstract を圧縮し、著者テーブルもバッチごとに埋める
+        self.storage = storage
+        # progress(inserted, seen, elapsed) をトランザクションごとに呼ぶ
+        self.progress = progress
+        self.seen = 0
+        self.inserted = 0
+        self.started = None
+
+    def load(self, rows: Iterable[PaperRow]) -> Dict:
+        """行を batch_size ごとのトランザクションで投入 (既存の ID は無視)"""
+        if self.started is None:
+            self.started = time.perf_counter()
+        # 一括投入中は同期を緩める (中断しても投入済みのトランザクションは残る)
+        self.conn.execute('PRAGMA synchronous = OFF')
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+        finally:
+            self.conn.execute('PRAGMA synchronous = FULL')
+        return self.stats()
+
+    def _write(self, batch: List[PaperRow]):
+        """1トランザクション分を書き込む"""
+        # トリガーの付け外しも含めて1トランザクションにする (途中で落ちても索引と papers は揃う)
+        self.conn.execute('BEGIN')
+        try:
+            last_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM papers').fetchone()[0]
+            if self.search_index:
+                self.search_index.suspend_insert_trigger()
+            rows = batch
+            if self.storage:
+                encode = self.storage.encode
+                rows = [(arxiv_id, title, authors, encode(abstract), published)
+                        for arxiv_id, title, authors, abstract, published in batch]
+            cursor = self.conn.executemany('''
+                INSERT OR IGNORE INTO papers (arxiv_id, title, authors, abstract, published_date)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            inserted = cursor.rowcount
+            if self.search_index:
+                self.search_index.resume_insert_trigger(last_id)
+            if self.storage:
+                self.storage.index_authors_after(last_id)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.inserted += inserted
+        self.seen += len(batch)
+        if self.progress:
+            self.progress(self.inserted, self.seen, time.perf_counter() - self.started)
+
+    def stats(self) -> Dict:
+        """投入結果"""
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'seen': self.seen,
+            'inserted': self.inserted,
+            'skipped': self.seen - self.inserted,
+            'elapsed': elapsed,
+            'rows_per_second': self.seen / elapsed if elapsed else 0.0,
+        }
+
+def main():
+    """コマンドライン実行"""
+    parser = argparse.ArgumentParser(description='arXiv メタデータから papers.db を一括投入')
+    parser.add_argument('sources', nargs='+', help='入力ファイル (.json / .jsonl / .xml、.gz 可、- は標準入力)')
+    parser.add_argument('--db', default='papers.db', help='papers.db のパス')
+    parser.add_argument('--format', choices=['jsonl', 'oai'], help='入力形式 (省略時は拡張子から判定)')
+    parser.add_argument('--batch-size', type=int, default=50000, help='1トランザクションあたりの行数')
+    parser.add_argument('--compression', choices=['none', 'zlib', 'zstd'],
+                        default=os.getenv('PAPER_STORAGE_COMPRESSION', 'none'), help='abstract の圧縮形式')
+    args = parser.parse_args()
+
+    from bot import PaperDatabase
+    from paper_search import PaperSearchIndex
+
+    # スキーマと全文検索インデックスを用意してから投入する
+    db = PaperDatabase(args.db, compression=args.compression)
+    search_index = PaperSearchIndex(db.conn)
+
+    def report(inserted: int, seen: int, elapsed: float):
+        print(f'  {seen:,} 件読み込み / {inserted:,} 件追加 ({seen / elapsed:,.0f} 行/秒)', flush=True)
+
+    backfill = PaperBackfill(db.conn, batch_size=args.batch_size, progress=report,
+                             search_index=search_index, storage=db.storage)
+    for source in args.sources:
+        fmt = args.format or detect_format(source)
+        print(f'📥 {source} ({fmt})')
+        with open_source(source) as stream:
+            rows = iter_oai_records(stream) if fmt == 'oai' else iter_jsonl_records(stream)
+            backfill.load(rows)
+
+    stats = backfill.stats()
+    print(f"✅ {stats['inserted']:,} 件追加, {stats['skipped']:,} 件は既存 "
+          f"({stats['elapsed']:.1f}s, {stats['rows_per_second']:,.0f} 行/秒)")
+    db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+論文ワークキュー
+arXiv ID ごとに discovered → summarized → posted の状態を永続化し、
+クラッシュ後の再起動でも途中の段階から処理を再開できるようにする
+関連度フィルターで除外された論文は skipped として残し、必要に応じて要約できる
+投稿は要約の保存と同じトランザクションで post_outbox に書き込み、送信タスクが取り出す
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from post_outbox import PostOutbox
+
+class PaperQueue:
+    """SQLite に永続化される論文処理キュー"""
+
+    DISCOVERED = 'discovered'
+    SUMMARIZED = 'summarized'
+    POSTED = 'posted'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    STATES = (DISCOVERED, SUMMARIZED, POSTED, FAILED, SKIPPED)
+
+    def __init__(self, db, max_attempts: int = 5, outbox: Optional[PostOutbox] = None):
+        # db は PaperDatabase (接続を共有して papers への保存と同一トランザクションにする)
+        self.db = db
+        self.conn = db.conn
+        self.max_attempts = max_attempts
+        self.outbox = outbox or PostOutbox(self.conn)
+        self.init_table()
+
+    def init_table(self):
+        """キューテーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS paper_queue (
+                arxiv_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                abstract TEXT NOT NULL,
+                published_date TEXT NOT NULL,
+                summary TEXT,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                relevance_score REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_paper_queue_state
+            ON paper_queue (state, updated_at)
+        ''')
+
+        # 関連度スコア列が無い古いテーブルに追加
+        cursor.execute('PRAGMA table_info(paper_queue)')
+        if 'relevance_score' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE paper_queue ADD COLUMN relevance_score REAL')
+
+        # 投稿済みの行に残っている本文を消す (papers に保存済み)
+        cursor.execute('''
+            UPDATE paper_queue SET abstract = '', summary = NULL
+            WHERE state = ? AND (abstract != '' OR summary IS NOT NULL)
+        ''', (self.POSTED,))
+
+        # アウトボックス導入前に要約済みになっていた論文を投稿予定に移す
+        now = time.time()
+        cursor.execute('''
+            INSERT OR IGNORE INTO post_outbox (arxiv_id, state, next_attempt_at, created_at)
+            SELECT arxiv_id, ?, ?, ? FROM paper_queue WHERE state = ?
+        ''', (PostOutbox.PENDING, now, now, self.SUMMARIZED))
+
+        self.conn.commit()
+
+    def enqueue(self, papers: List[Dict]) -> int:
+        """新しく見つかった論文を discovered として追加 (既にキューにあるものは無視)"""
+        cursor = self.conn.cursor()
+        before = self.conn.total_changes
+
+        cursor.executemany('''
+            INSERT OR IGNORE INTO paper_queue
+                (arxiv_id, state, title, authors, abstract, published_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (p['arxiv_id'], self.DISCOVERED, p['title'], p['authors'],
+             p['abstract'], p['published_date'])
+            for p in papers
+        ])
+
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def fetch(self, state: str, limit: int = 20) -> List[Dict]:
+        """指定した状態の論文を古い順に取得"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT arxiv_id, title, authors, abstract, published_date, summary, attempts
+            FROM paper_queue
+            WHERE state = ?
+            ORDER BY updated_at, arxiv_id
+            LIMIT ?
+        ''', (state, limit))
+
+        columns = ['arxiv_id', 'title', 'authors', 'abstract',
+                   'published_date', 'summary', 'attempts']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def fetch_unscored(self, limit: int = 1000) -> List[Dict]:
+        """関連度をまだ判定していない discovered の論文を取得"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT arxiv_id, title, abstract
+            FROM paper_queue
+            WHERE state = ? AND relevance_score IS NULL
+            ORDER BY updated_at, arxiv_id
+            LIMIT ?
+        ''', (self.DISCOVERED, limit))
+
+        return [dict(zip(['arxiv_id', 'title', 'abstract'], row)) for row in cursor.fetchall()]
+
+    def record_relevance(self, scores: Dict[str, float], skipped: List[str]):
+        """関連度スコアを保存し、除外した論文を skipped にする"""
+        cursor = self.conn.cursor()
+
+        cursor.executemany(
+            'UPDATE paper_queue SET relevance_score = ? WHERE arxiv_id = ?',
+            [(float(score), arxiv_id) for arxiv_id, score in scores.items()]
+        )
+        cursor.executemany('''
+            UPDATE paper_queue SET state = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE arxiv_id = ? AND state = ?
+        ''', [(self.SKIPPED, arxiv_id, self.DISCOVERED) for arxiv_id in skipped])
+
+        self.conn.commit()
+
+    def fetch_skipped(self, limit: int = 10) -> List[Dict]:
+        """除外された論文を新しい順に取得"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT arxiv_id, title, relevance_score
+            FROM paper_queue
+            WHERE state = ?
+            ORDER BY updated_at DESC, arxiv_id
+            LIMIT ?
+        ''', (self.SKIPPED, limit))
+
+        return [dict(zip(['arxiv_id', 'title', 'relevance_score'], row)) for row in cursor.fetchall()]
+
+    def requeue_skipped(self, arxiv_id: str) -> bool:
+        """skipped の論文を要約待ちに戻す (スコアは残すので再び除外されない)
+
+        Returns:
+            戻した場合は True
+        """
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            UPDATE paper_queue SET state = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE arxiv_id = ? AND state = ?
+        ''', (self.DISCOVERED, arxiv_id, self.SKIPPED))
+        requeued = cursor.rowcount > 0
+
+        self.conn.commit()
+        return requeued
+
+    def mark_summarized(self, paper_data: Dict, message_id: Optional[int] = None):
+        """要約済みにし、投稿予定をアウトボックスに追加 (papers への保存と同一トランザクション)
+
+        Args:
+            message_id: 既に投稿済み (ストリーミング投稿) なら投稿済みとして保存する
+        """
+        arxiv_id = paper_data['arxiv_id']
+        try:
+            if self.db.filter_unprocessed([arxiv_id]):
+                self.db.save_paper(paper_data, commit=False)
+            if message_id is None:
+                self._set_state(arxiv_id, self.SUMMARIZED, summary=paper_data['summary'])
+                self.outbox.add(arxiv_id)
+            else:
+                self._set_state(arxiv_id, self.POSTED, summary=paper_data['summary'])
+                self.db.set_discord_message_id(arxiv_id, message_id, commit=False)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.db.known_ids.discard(arxiv_id)
+            raise
+
+    def fetch_posts(self, limit: int = 20) -> List[Dict]:
+        """送信時刻を過ぎた投稿予定を論文データ付きで取得"""
+        due = self.outbox.fetch_due(limit)
+        if not due:
+            return []
+
+        cursor = self.conn.cursor()
+        placeholders = ','.join('?' * len(due))
+        cursor.execute(f'''
+            SELECT arxiv_id, title, authors, abstract, published_date, summary
+            FROM paper_queue WHERE arxiv_id IN ({placeholders})
+        ''', [row['arxiv_id'] for row in due])
+        columns = ['arxiv_id', 'title', 'authors', 'abstract', 'published_date', 'summary']
+        papers = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+        posts = []
+        for row in due:
+            paper = papers.get(row['arxiv_id'])
+            if paper:
+                paper.update(post_attempts=row['attempts'], queued_at=row['created_at'])
+                posts.append(paper)
+        return posts
+
+    def mark_posted(self, arxiv_id: str, message_id: Optional[int] = None):
+        """投稿済みにし、メッセージ ID とアウトボックスの送信結果を記録"""
+        self._set_state(arxiv_id, self.POSTED)
+        self.outbox.mark_sent(arxiv_id, message_id)
+        if message_id is not None:
+            self.db.set_discord_message_id(arxiv_id, message_id, commit=False)
+        self.conn.commit()
+
+    def record_post_failure(self, arxiv_id: str, error: str, retry_after: Optional[float] = None,
+                            permanent: bool = False) -> bool:
+        """投稿の失敗を記録し、再試行の上限に達したら failed にする
+
+        Returns:
+            まだ再試行される場合は True
+        """
+        retrying = self.outbox.record_failure(arxiv_id, error, retry_after=retry_after, permanent=permanent)
+        if not retrying:
+            self.conn.execute('''
+                UPDATE paper_queue SET state = ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE arxiv_id = ?
+            ''', (self.FAILED, error[:500], arxiv_id))
+        self.conn.commit()
+        return retrying
+
+    def record_failure(self, arxiv_id: str, error: str) -> bool:
+        """失敗を記録し、試行回数の上限に達したら failed にする
+
+        Returns:
+            まだ再試行される場合は True
+        """
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            UPDATE paper_queue
+            SET attempts = attempts + 1,
+                last_error = ?,
+                state = CASE WHEN attempts + 1 >= ? THEN ? ELSE state END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE arxiv_id = ?
+        ''', (error[:500], self.max_attempts, self.FAILED, arxiv_id))
+        cursor.execute('SELECT state FROM paper_queue WHERE arxiv_id = ?', (arxiv_id,))
+        row = cursor.fetchone()
+
+        self.conn.commit()
+        return row is not None and row[0] != self.FAILED
+
+    def _set_state(self, arxiv_id: str, state: str, summary: str = None):
+        """状態を更新 (コミットは呼び出し側)
+
+        posted になった行の abstract / summary は papers に (圧縮して) 保存済みなので消す
+        """
+        cursor = self.conn.cursor()
+
+        if state == self.POSTED:
+            cursor.execute('''
+                UPDATE paper_queue
+                SET state = ?, abstract = '', summary = NULL, attempts = 0, last_error = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE arxiv_id = ?
+            ''', (state, arxiv_id))
+        elif summary is None:
+            cursor.execute('''
+                UPDATE paper_queue
+                SET state = ?, attempts = 0, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE arxiv_id = ?
+            ''', (state, arxiv_id))
+        else:
+            cursor.execute('''
+                UPDATE paper_queue
+                SET state = ?, summary = ?, attempts = 0, last_error = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE arxiv_id = ?
+            ''', (state, summary, arxiv_id))
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """状態ごとの件数と最古エントリの経過秒数"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT state, COUNT(*),
+                   (julianday('now') - julianday(MIN(updated_at))) * 86400
+            FROM paper_queue
+            GROUP BY state
+        ''')
+
+        stats = {state: {'depth': 0, 'oldest_age_seconds': 0.0} for state in self.STATES}
+        for state, depth, age in cursor.fetchall():
+            stats[state] = {'depth': depth, 'oldest_age_seconds': age or 0.0}
+        return stats
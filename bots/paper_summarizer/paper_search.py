@@ -0,0 +1,181 @@
+"""
+論文の全文検索インデックス
+papers テーブルを外部コンテンツとする SQLite FTS5 インデックスをトリガーで同期し、
+bm25 でランク付けした検索結果を返す
+abstract / summary は圧縮されている場合があるので、paper_text() で展開するビューを経由して読む
+
+オフライン再構築:
+    python bots/paper_summarizer/paper_search.py --db papers.db rebuild
+"""
+
+import argparse
+import re
+import sqlite3
+import time
+from typing import Dict, List
+
+from paper_storage import register_text_functions
+
+class PaperSearchIndex:
+    """papers テーブルの FTS5 インデックス"""
+
+    # bm25 の列ごとの重み (title, authors, abstract, summary)
+    COLUMN_WEIGHTS = (10.0, 3.0, 4.0, 1.0)
+
+    # 外部コンテンツ (スニペットや再構築で読む) は展開済みのビュー
+    CONTENT_VIEW = '''
+        CREATE VIEW IF NOT EXISTS papers_fts_content AS
+        SELECT id, title, authors, paper_text(abstract) AS abstract, paper_text(summary) AS summary
+        FROM papers
+    '''
+
+    INSERT_TRIGGER = '''
+        CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN
+            INSERT INTO papers_fts (rowid, title, authors, abstract, summary)
+            VALUES (new.id, new.title, new.authors, paper_text(new.abstract), paper_text(new.summary));
+        END
+    '''
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.init_index()
+
+    def init_index(self):
+        """FTS5 テーブルと同期トリガーを作成 (既存の論文があれば初回のみ再構築)"""
+        cursor = self.conn.cursor()
+
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'papers_fts'"
+        )
+        row = cursor.fetchone()
+        exists = row is not None
+        if exists and "content='papers'" in row[0]:
+            # papers を直接読む旧形式のインデックスは作り直す
+            cursor.execute('DROP TABLE papers_fts')
+            exists = False
+
+        cursor.execute(self.CONTENT_VIEW)
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, authors, abstract, summary,
+                content='papers_fts_content', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        ''')
+
+        # トリガーは定義が変わっていても置き換わるように毎回作り直す
+        for trigger in ('papers_fts_insert', 'papers_fts_delete', 'papers_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(self.INSERT_TRIGGER)
+        cursor.execute('''
+            CREATE TRIGGER papers_fts_delete AFTER DELETE ON papers BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, authors, abstract, summary)
+                VALUES ('delete', old.id, old.title, old.authors,
+                        paper_text(old.abstract), paper_text(old.summary));
+            END
+        ''')
+        # 圧縮形式を変えただけの更新 (移行) では索引し直さない
+        cursor.execute('''
+            CREATE TRIGGER papers_fts_update
+            AFTER UPDATE OF title, authors, abstract, summary ON papers
+            WHEN old.title IS NOT new.title OR old.authors IS NOT new.authors
+                 OR paper_text(old.abstract) IS NOT paper_text(new.abstract)
+                 OR paper_text(old.summary) IS NOT paper_text(new.summary)
+            BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, authors, abstract, summary)
+                VALUES ('delete', old.id, old.title, old.authors,
+                        paper_text(old.abstract), paper_text(old.summary));
+                INSERT INTO papers_fts (rowid, title, authors, abstract, summary)
+                VALUES (new.id, new.title, new.authors, paper_text(new.abstract), paper_text(new.summary));
+            END
+        ''')
+        self.conn.commit()
+
+        if not exists:
+            self.rebuild()
+
+    def rebuild(self):
+        """papers テーブルからインデックスを作り直して最適化"""
+        cursor = self.conn.cursor()
+        cursor.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        cursor.execute("INSERT INTO papers_fts (papers_fts) VALUES ('optimize')")
+        self.conn.commit()
+
+    def suspend_insert_trigger(self):
+        """一括投入の間だけ挿入トリガーを外す (呼び出し側のトランザクション内で使う)"""
+        self.conn.execute('DROP TRIGGER IF EXISTS papers_fts_insert')
+
+    def resume_insert_trigger(self, after_id: int):
+        """after_id より後に追加された論文をまとめて索引に入れ、挿入トリガーを戻す"""
+        self.conn.execute('''
+            INSERT INTO papers_fts (rowid, title, authors, abstract, summary)
+            SELECT id, title, authors, abstract, summary FROM papers_fts_content WHERE id > ?
+        ''', (after_id,))
+        self.conn.execute(self.INSERT_TRIGGER)
+
+    @staticmethod
+    def build_match_query(query: str) -> str:
+        """ユーザー入力を安全な FTS5 クエリに変換 (各語をフレーズとして AND 検索)"""
+        terms = re.findall(r'\w+', query, flags=re.UNICODE)
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def count(self, query: str) -> int:
+        """検索にヒットする件数"""
+        match = self.build_match_query(query)
+        if not match:
+            return 0
+
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM papers_fts WHERE papers_fts MATCH ?', (match,))
+        return cursor.fetchone()[0]
+
+    def search(self, query: str, limit: int = 5, offset: int = 0) -> List[Dict]:
+        """bm25 順に検索"""
+        match = self.build_match_query(query)
+        if not match:
+            return []
+
+        cursor = self.conn.cursor()
+        weights = ', '.join(str(w) for w in self.COLUMN_WEIGHTS)
+        cursor.execute(f'''
+            SELECT p.arxiv_id, p.title, p.authors, p.published_date,
+                   snippet(papers_fts, 2, '**', '**', '…', 24),
+                   bm25(papers_fts, {weights}) AS rank
+            FROM papers_fts
+            JOIN papers p ON p.id = papers_fts.rowid
+            WHERE papers_fts MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        ''', (match, limit, offset))
+
+        columns = ['arxiv_id', 'title', 'authors', 'published_date', 'snippet', 'rank']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def main():
+    """コマンドライン実行 (インデックスのオフライン再構築)"""
+    parser = argparse.ArgumentParser(description='論文全文検索インデックスの管理')
+    parser.add_argument('--db', default='papers.db', help='papers.db のパス')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help='インデックスを再構築')
+    search_parser = subparsers.add_parser('search', help='インデックスを検索')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    register_text_functions(conn)
+    index = PaperSearchIndex(conn)
+
+    if args.command == 'rebuild':
+        started = time.perf_counter()
+        index.rebuild()
+        count = conn.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+        print(f'✅ {count:,} 件の論文でインデックスを再構築しました ({time.perf_counter() - started:.2f}s)')
+    elif args.command == 'search':
+        for result in index.search(args.query, limit=args.limit):
+            print(f"{result['rank']:8.3f}  {result['arxiv_id']}  {result['title']}")
+
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,502 @@
+"""
+論文本文の圧縮保存と著者の正規化
+abstract / summary を共有辞書付きの zlib (zstandard があれば zstd も可) で圧縮して BLOB で保存し、
+著者はカンマ区切りの表示用文字列とは別に authors / paper_authors テーブルへ正規化して索引する
+TEXT のままの行と圧縮済みの行が混在していても読めるので、既存 DB は稼働中に少しずつ変換できる
+
+SQL からは paper_text(列) で展開できる (全文検索のコンテンツビューもこの関数を使う)
+
+使い方:
+    python bots/paper_summarizer/paper_storage.py --db papers.db report
+    python bots/paper_summarizer/paper_storage.py --db papers.db migrate --compression zlib
+    python bots/paper_summarizer/paper_storage.py --db papers.db migrate --compression zstd --vacuum
+"""
+
+import argparse
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 圧縮した値の先頭: 形式 (1 バイト) と辞書 ID (4 バイト、0 は辞書なし)
+HEADER = struct.Struct('>BI')
+CODEC_IDS = {'zlib': 1, 'zstd': 2}
+ALGORITHMS = ('none',) + tuple(CODEC_IDS)
+# これより短い文字列は圧縮しない (ヘッダーの分だけ大きくなりやすい)
+MIN_COMPRESS_BYTES = 64
+# zlib が参照できるのは直前 32KB まで
+ZLIB_MAX_DICT_BYTES = 32 * 1024
+# 学習する辞書の大きさ (zlib は 8KB 以上にしても圧縮率が変わらず圧縮だけ遅くなる)
+DEFAULT_DICT_BYTES = {'zlib': 8 * 1024, 'zstd': 32 * 1024}
+
+def split_authors(authors: Optional[str]) -> List[str]:
+    """カンマ区切りの著者文字列を名前のリストにする"""
+    names = [' '.join(name.split()) for name in (authors or '').split(',')]
+    return [name for name in names if name and name != 'Unknown']
+
+def train_zlib_dictionary(samples: Iterable[str], size: int = ZLIB_MAX_DICT_BYTES) -> bytes:
+    """頻出する語の並び (1〜4 語) を集めて zlib の辞書を作る
+
+    zlib は辞書の末尾ほど短い距離で参照できるので、効果の大きいものを末尾に置く
+    """
+    counts = Counter()
+    for text in samples:
+        words = text.split()
+        for n in range(1, 5):
+            for i in range(len(words) - n + 1):
+                counts[' '.join(words[i:i + n]) + ' '] += 1
+
+    # 2回以上出る並びを (出現回数 - 1) × 長さ = 節約できるバイト数の見込みで選ぶ
+    scored = sorted(
+        ((count - 1) * len(gram.encode('utf-8')), gram) for gram, count in counts.items() if count > 1
+    )
+    chosen, total = [], 0
+    for score, gram in reversed(scored):
+        encoded = gram.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+def train_dictionary(samples: List[str], algorithm: str, size: Optional[int] = None) -> bytes:
+    """サンプルから共有辞書を学習"""
+    size = size or DEFAULT_DICT_BYTES[algorithm]
+    if algorithm == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd には zstandard パッケージが必要です')
+        return zstandard.train_dictionary(size, [s.encode('utf-8') for s in samples]).as_bytes()
+    return train_zlib_dictionary(samples, min(size, ZLIB_MAX_DICT_BYTES))
+
+class TextCodec:
+    """TEXT はそのまま、圧縮済みの BLOB は展開して文字列にする"""
+
+    def __init__(self, algorithm: str = 'none', level: Optional[int] = None, reload=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'未対応の圧縮形式です: {algorithm}')
+        if algorithm == 'zstd' and zstandard is None:
+            raise RuntimeError('zstd には zstandard パッケージが必要です')
+        self.algorithm = algorithm
+        self.level = level
+        # 辞書 ID → (形式, 辞書)
+        self.dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        # 書き込みに使う辞書 (0 は辞書なし)
+        self.dict_id = 0
+        # 知らない辞書 ID を見たときに辞書を読み直す関数 (別プロセスの migrate で学習された辞書)
+        self.reload = reload
+        self._zstd = {}
+
+    def add_dictionary(self, dict_id: int, algorithm: str, data: bytes):
+        """辞書を登録 (書き込み中の形式と同じなら以降の書き込みに使う)"""
+        self.dictionaries[dict_id] = (algorithm, data)
+        if algorithm == self.algorithm and dict_id > self.dict_id:
+            self.dict_id = dict_id
+
+    def encode(self, text: Optional[str]):
+        """保存する値 (圧縮しても縮まない短い文字列は TEXT のまま)"""
+        if text is None or self.algorithm == 'none':
+            return text
+        raw = text.encode('utf-8')
+        if len(raw) < MIN_COMPRESS_BYTES:
+            return text
+
+        zdict = self.dictionaries[self.dict_id][1] if self.dict_id else None
+        if self.algorithm == 'zlib':
+            # 生の deflate にしてヘッダーとチェックサムの 6 バイトを省く
+            compressor = zlib.compressobj(self.level if self.level is not None else 6, zlib.DEFLATED, -15,
+                                          **({'zdict': zdict} if zdict else {}))
+            payload = compressor.compress(raw) + compressor.flush()
+        else:
+            payload = self._zstd_compressor(zdict).compress(raw)
+
+        if len(payload) + HEADER.size >= len(raw):
+            return text
+        return HEADER.pack(CODEC_IDS[self.algorithm], self.dict_id) + payload
+
+    def decode(self, value) -> Optional[str]:
+        """保存された値を文字列にする"""
+        if value is None or isinstance(value, str):
+            return value
+        codec, dict_id = HEADER.unpack_from(value)
+        payload = bytes(value[HEADER.size:])
+        zdict = None
+        if dict_id:
+            if dict_id not in self.dictionaries and self.reload:
+                self.reload(self)
+            if dict_id not in self.dictionaries:
+                raise ValueError(f'圧縮辞書 {dict_id} が見つかりません')
+            zdict = self.dictionaries[dict_id][1]
+
+        if codec == CODEC_IDS['zlib']:
+            decompressor = zlib.decompressobj(-15, **({'zdict': zdict} if zdict else {}))
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        elif codec == CODEC_IDS['zstd']:
+            if zstandard is None:
+                raise RuntimeError('zstd で圧縮された行の展開には zstandard パッケージが必要です')
+            raw = self._zstd_decompressor(dict_id, zdict).decompress(payload)
+        else:
+            raise ValueError(f'未対応の圧縮形式です: {codec}')
+        return raw.decode('utf-8')
+
+    def _zstd_compressor(self, zdict: Optional[bytes]):
+        key = ('c', self.dict_id)
+        if key not in self._zstd:
+            dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+            self._zstd[key] = zstandard.ZstdCompressor(level=self.level or 3, dict_data=dict_data)
+        return self._zstd[key]
+
+    def _zstd_decompressor(self, dict_id: int, zdict: Optional[bytes]):
+        key = ('d', dict_id)
+        if key not in self._zstd:
+            dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+            self._zstd[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return self._zstd[key]
+
+def load_dictionaries(conn: sqlite3.Connection, codec: TextCodec):
+    """DB に保存された辞書のうち、まだ登録していないものをコーデックに登録"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'storage_dictionaries'"
+    ).fetchone()
+    if exists:
+        for dict_id, dict_algorithm, data in conn.execute(
+            'SELECT id, algorithm, data FROM storage_dictionaries WHERE id > ? ORDER BY id',
+            (max(codec.dictionaries, default=0),)
+        ):
+            codec.add_dictionary(dict_id, dict_algorithm, data)
+
+def load_codec(conn: sqlite3.Connection, algorithm: str = 'none', level: Optional[int] = None) -> TextCodec:
+    """DB に保存された辞書を読み込んだコーデック (後から追加された辞書も必要になった時点で読む)"""
+    codec = TextCodec(algorithm, level, reload=lambda codec: load_dictionaries(conn, codec))
+    load_dictionaries(conn, codec)
+    return codec
+
+def register_text_functions(conn: sqlite3.Connection, codec: Optional[TextCodec] = None) -> TextCodec:
+    """接続に paper_text() を登録 (papers を読む別接続でも呼ぶ)"""
+    codec = codec or load_codec(conn)
+    conn.create_function('paper_text', 1, codec.decode, deterministic=True)
+    return codec
+
+class PaperStorage:
+    """papers の本文の圧縮と著者テーブル"""
+
+    def __init__(self, conn: sqlite3.Connection, compression: str = 'none', level: Optional[int] = None):
+        self.conn = conn
+        self.init_tables()
+        self.codec = register_text_functions(conn, load_codec(conn, compression, level))
+
+    @property
+    def compression(self) -> str:
+        return self.codec.algorithm
+
+    def init_tables(self):
+        """辞書と著者のテーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storage_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                algorithm TEXT NOT NULL,
+                data BLOB NOT NULL,
+                samples INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS authors (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                last_name TEXT NOT NULL COLLATE NOCASE
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_authors_last_name ON authors (last_name)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS paper_authors (
+                paper_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                author_id INTEGER NOT NULL,
+                PRIMARY KEY (paper_id, position)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_paper_authors_author
+            ON paper_authors (author_id, paper_id)
+        ''')
+
+        self.conn.commit()
+
+    def encode(self, text: Optional[str]):
+        """保存する値"""
+        return self.codec.encode(text)
+
+    def decode(self, value) -> Optional[str]:
+        """保存された値を文字列にする"""
+        return self.codec.decode(value)
+
+    def train(self, algorithm: Optional[str] = None, samples: int = 2000, size: Optional[int] = None) -> int:
+        """既存の abstract / summary から辞書を学習して保存 (以降の書き込みに使う)
+
+        Returns:
+            辞書 ID
+        """
+        algorithm = algorithm or self.compression
+        rows = self.conn.execute('''
+            SELECT paper_text(abstract), paper_text(summary) FROM papers
+            WHERE id IN (SELECT id FROM papers ORDER BY random() LIMIT ?)
+        ''', (samples,)).fetchall()
+        texts = [text for row in rows for text in row if text]
+        if not texts:
+            raise ValueError('辞書を学習する論文がありません')
+
+        data = train_dictionary(texts, algorithm, size)
+        cursor = self.conn.execute(
+            'INSERT INTO storage_dictionaries (algorithm, data, samples) VALUES (?, ?, ?)',
+            (algorithm, data, len(texts))
+        )
+        self.conn.commit()
+        self.codec.add_dictionary(cursor.lastrowid, algorithm, data)
+        return cursor.lastrowid
+
+    def index_authors(self, papers: Iterable[Tuple[int, str]]):
+        """(paper_id, 著者文字列) を著者テーブルに登録 (コミットは呼び出し側)"""
+        links = []
+        for paper_id, authors in papers:
+            for position, name in enumerate(split_authors(authors)):
+                links.append((paper_id, position, name))
+        if not links:
+            return
+
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO authors (name, last_name) VALUES (?, ?)',
+            {(name, name.split()[-1]) for _, _, name in links}
+        )
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO paper_authors (paper_id, position, author_id)
+            SELECT ?, ?, id FROM authors WHERE name = ?
+        ''', links)
+
+    def index_authors_after(self, after_id: int):
+        """after_id より後に追加された論文の著者を登録 (コミットは呼び出し側)"""
+        self.index_authors(self.conn.execute(
+            'SELECT id, authors FROM papers WHERE id > ?', (after_id,)
+        ).fetchall())
+
+    def papers_by_author(self, name: str, limit: int = 10) -> List[str]:
+        """著者名 (フルネーム、または姓) の論文の arXiv ID を新しい順に返す"""
+        name = ' '.join(name.split())
+        cursor = self.conn.execute('''
+            SELECT p.arxiv_id FROM authors a
+            JOIN paper_authors pa ON pa.author_id = a.id
+            JOIN papers p ON p.id = pa.paper_id
+            WHERE a.name = ? OR a.last_name = ?
+            GROUP BY p.id
+            ORDER BY p.id DESC
+            LIMIT ?
+        ''', (name, name, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+    def migrate(self, batch_size: int = 500, pause: float = 0.05, progress=None) -> Dict:
+        """既存の行を現在の形式で圧縮し直し、著者テーブルを埋める
+
+        batch_size 行ごとに短いトランザクションでコミットし、合間に pause 秒待つので
+        Bot が同じ DB に書き込んでいる間も実行できる
+        """
+        started = time.perf_counter()
+        stats = {'converted': 0, 'authors_indexed': 0, 'batches': 0}
+        last_id = 0
+        while True:
+            rows = self.conn.execute('''
+                SELECT id, abstract, summary, authors,
+                       EXISTS (SELECT 1 FROM paper_authors pa WHERE pa.paper_id = papers.id)
+                FROM papers WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates, missing_authors = [], []
+            for paper_id, abstract, summary, authors, has_authors in rows:
+                encoded = (self._recode(abstract), self._recode(summary))
+                if encoded != (abstract, summary):
+                    updates.append((*encoded, paper_id))
+                if not has_authors:
+                    missing_authors.append((paper_id, authors))
+
+            if updates or missing_authors:
+                self.conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self.conn.executemany('UPDATE papers SET abstract = ?, summary = ? WHERE id = ?', updates)
+                    self.index_authors(missing_authors)
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            stats['converted'] += len(updates)
+            stats['authors_indexed'] += len(missing_authors)
+            stats['batches'] += 1
+            if progress:
+                progress(last_id, stats)
+            if pause:
+                time.sleep(pause)
+
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    def _recode(self, value):
+        """現在の形式・辞書で保存し直した値 (既に同じなら元の値)"""
+        if value is None:
+            return None
+        if isinstance(value, bytes) and self.compression != 'none':
+            codec, dict_id = HEADER.unpack_from(value)
+            if codec == CODEC_IDS[self.compression] and dict_id == self.codec.dict_id:
+                return value
+        return self.encode(self.decode(value))
+
+    def size_report(self, author: Optional[str] = None, repeat: int = 3) -> Dict:
+        """ファイルサイズ・本文のバイト数と、全件走査・著者検索の所要時間"""
+        conn = self.conn
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        papers, compressed, abstract_bytes, summary_bytes = conn.execute('''
+            SELECT COUNT(*), SUM(typeof(abstract) = 'blob' OR typeof(summary) = 'blob'),
+                   SUM(length(CAST(abstract AS BLOB))), SUM(length(CAST(summary AS BLOB)))
+            FROM papers
+        ''').fetchone()
+
+        def best_of(func) -> float:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        def read_all():
+            for abstract, summary in conn.execute('SELECT abstract, summary FROM papers'):
+                self.decode(abstract)
+                self.decode(summary)
+
+        report = {
+            'papers': papers,
+            'compressed_rows': compressed or 0,
+            'file_bytes': page_size * page_count,
+            'free_bytes': page_size * freelist,
+            'abstract_bytes': abstract_bytes or 0,
+            'summary_bytes': summary_bytes or 0,
+            'authors': conn.execute('SELECT COUNT(*) FROM authors').fetchone()[0],
+            # 本文以外の列だけを見る集計 (行が小さいほど読むページが減る)
+            'metadata_scan_seconds': best_of(lambda: conn.execute(
+                "SELECT COUNT(*), MAX(published_date) FROM papers WHERE discord_message_id IS NULL"
+            ).fetchone()),
+            # 本文を展開しながら全件読む
+            'full_scan_seconds': best_of(read_all),
+        }
+        if author:
+            last_name = author.split()[-1]
+            report['author_like_seconds'] = best_of(lambda: conn.execute(
+                'SELECT arxiv_id FROM papers WHERE authors LIKE ?', (f'%{last_name}%',)
+            ).fetchall())
+            # 著者テーブルが空 (移行前) なら索引の計測は意味がない
+            if report['authors']:
+                report['author_index_seconds'] = best_of(lambda: self.papers_by_author(last_name, limit=1000000))
+        return report
+
+def format_report(before: Dict, after: Optional[Dict] = None) -> str:
+    """レポートを表にする (after があれば変化も表示)"""
+    rows = [
+        ('論文', 'papers', lambda v: f'{v:,}'),
+        ('圧縮済みの行', 'compressed_rows', lambda v: f'{v:,}'),
+        ('著者', 'authors', lambda v: f'{v:,}'),
+        ('ファイル', 'file_bytes', lambda v: f'{v / 1024 / 1024:,.1f}MB'),
+        ('空きページ', 'free_bytes', lambda v: f'{v / 1024 / 1024:,.1f}MB'),
+        ('abstract', 'abstract_bytes', lambda v: f'{v / 1024 / 1024:,.1f}MB'),
+        ('summary', 'summary_bytes', lambda v: f'{v / 1024 / 1024:,.1f}MB'),
+        ('メタデータ走査', 'metadata_scan_seconds', lambda v: f'{v * 1000:,.1f}ms'),
+        ('本文の全件読み込み', 'full_scan_seconds', lambda v: f'{v * 1000:,.1f}ms'),
+        ('著者検索 (LIKE)', 'author_like_seconds', lambda v: f'{v * 1000:,.2f}ms'),
+        ('著者検索 (索引)', 'author_index_seconds', lambda v: f'{v * 1000:,.2f}ms'),
+    ]
+    lines = []
+    for label, key, fmt in rows:
+        if key not in before and (after is None or key not in after):
+            continue
+        line = f"  {label:<12} {fmt(before[key]) if key in before else '-':>12}"
+        if after is not None:
+            line += f" → {fmt(after[key]) if key in after else '-':>12}"
+            if before.get(key) and after.get(key) is not None and key not in ('papers', 'compressed_rows', 'authors'):
+                line += f'  ({after[key] / before[key]:.0%})'
+        lines.append(line)
+    return '\n'.join(lines)
+
+def main():
+    """コマンドライン実行 (サイズレポートとオンライン移行)"""
+    parser = argparse.ArgumentParser(description='論文本文の圧縮保存と著者テーブルの管理')
+    parser.add_argument('--db', default='papers.db', help='papers.db のパス')
+    parser.add_argument('--author', help='著者検索の計測に使う名前 (省略時は著者テーブルから選ぶ)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('report', help='サイズと走査時間を表示')
+    migrate_parser = subparsers.add_parser('migrate', help='既存の行を圧縮し、著者テーブルを埋める')
+    migrate_parser.add_argument('--compression', choices=ALGORITHMS,
+                                default=os.getenv('PAPER_STORAGE_COMPRESSION', 'zlib'))
+    migrate_parser.add_argument('--retrain', action='store_true', help='辞書を学習し直す')
+    migrate_parser.add_argument('--batch-size', type=int, default=500)
+    migrate_parser.add_argument('--pause', type=float, default=0.05, help='バッチ間の待機秒数')
+    migrate_parser.add_argument('--vacuum', action='store_true',
+                                help='移行後に VACUUM してファイルを縮める (実行中は DB がロックされる)')
+    args = parser.parse_args()
+
+    from bot import PaperDatabase
+    from paper_search import PaperSearchIndex
+
+    # スキーマ (著者テーブルと全文検索のコンテンツビュー) を最新にしてから始める
+    db = PaperDatabase(args.db, compression=args.compression if args.command == 'migrate' else 'none')
+    db.conn.execute('PRAGMA busy_timeout = 10000')
+    PaperSearchIndex(db.conn)
+    storage = db.storage
+
+    def pick_author() -> Optional[str]:
+        if args.author:
+            return args.author
+        row = db.conn.execute('''
+            SELECT a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+            GROUP BY pa.author_id ORDER BY random() LIMIT 1
+        ''').fetchone()
+        return row[0] if row else None
+
+    before = storage.size_report(author=pick_author())
+    if args.command == 'report':
+        print(format_report(before))
+        db.close()
+        return
+
+    if storage.compression != 'none' and (args.retrain or storage.codec.dict_id == 0):
+        started = time.perf_counter()
+        dict_id = storage.train()
+        size = len(storage.codec.dictionaries[dict_id][1])
+        print(f'📚 辞書 {dict_id} を学習しました ({size:,} bytes, {time.perf_counter() - started:.1f}s)')
+
+    def report(last_id: int, stats: Dict):
+        print(f"  id {last_id:,} まで: {stats['converted']:,} 行を変換, "
+              f"{stats['authors_indexed']:,} 件の著者を登録", flush=True)
+
+    stats = storage.migrate(batch_size=args.batch_size, pause=args.pause, progress=report)
+    print(f"✅ {stats['converted']:,} 行を {storage.compression} で保存し直しました ({stats['elapsed']:.1f}s)")
+
+    if args.vacuum:
+        started = time.perf_counter()
+        db.conn.execute('VACUUM')
+        print(f'🧹 VACUUM ({time.perf_counter() - started:.1f}s)')
+
+    print(format_report(before, storage.size_report(author=pick_author())))
+    db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+"""
+論文のローカルベクトルインデックス
+ハッシュ化した TF-IDF 特徴量で論文を埋め込み、メモリマップした float32 行列と
+ID 対応表に追記していく。検索は NumPy の内積による top-k (任意で IVF 分割)
+
+オフライン構築 (既存の papers を一括で埋め込む):
+    python bots/paper_summarizer/paper_vectors.py --db papers.db --index data/paper_vectors build
+
+IDF の重みは追記した時点の文書頻度で決まり、既存の行は更新しない。
+論文が大きく増えたら rebuild で全件の文書頻度から埋め込み直す:
+    python bots/paper_summarizer/paper_vectors.py --db papers.db --index data/paper_vectors rebuild
+"""
+
+import argparse
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from paper_storage import register_text_functions
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to was '
+    'were with we our us can which these those their than then also into using based via'.split()
+)
+
+class HashingEmbedder:
+    """単語・バイグラムをハッシュして固定次元の TF-IDF ベクトルにする"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        """特徴量 (ストップワードを除いた単語とバイグラム)"""
+        words = [w for w in re.findall(r'[a-z0-9]+', text.lower()) if w not in STOPWORDS and len(w) > 1]
+        return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+    def hashed_counts(self, text: str) -> Dict[int, float]:
+        """バケットごとの符号付き出現回数"""
+        counts: Dict[int, float] = {}
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            bucket = h % self.dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def transform(self, text: str, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        """テキストを L2 正規化したベクトルにする"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for bucket, count in self.hashed_counts(text).items():
+            # サブリニア TF (符号は保持)
+            vector[bucket] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+        if idf is not None:
+            vector *= idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+class VectorIndex:
+    """追記型のメモリマップ float32 行列 + ID 対応表
+
+    ファイル構成 (path_prefix を基準):
+        .f32   行優先の float32 行列 (1行 = 1論文)
+        .ids   arXiv ID (1行1件、行列と同じ順序)
+        .df    バケットごとの文書頻度と文書数 (IDF 用)
+        .sync  sync_from_db で読み込み済みの papers.id の最大値
+        .ivf.npz  任意の IVF セントロイドと割り当て
+    """
+
+    def __init__(self, path_prefix: str, dim: int = 256):
+        self.path_prefix = path_prefix
+        self.dim = dim
+        self.embedder = HashingEmbedder(dim)
+        self._lock = threading.Lock()
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.doc_freq = np.zeros(dim, dtype=np.float64)
+        self.doc_count = 0
+        self.synced_id = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        # 読み込んだ .ids ファイル (rebuild で置き換えられたら読み直す)
+        self._ids_identity: Optional[Tuple[int, int]] = None
+        directory = os.path.dirname(path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    @property
+    def size(self) -> int:
+        """登録済みの論文数"""
+        return len(self.ids)
+
+    def _file_identity(self) -> Optional[Tuple[int, int]]:
+        """.ids ファイルの (デバイス, inode) (追記では変わらず、rebuild の置き換えで変わる)"""
+        try:
+            st = os.stat(self.path_prefix + '.ids')
+        except FileNotFoundError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def refresh(self):
+        """別プロセスの rebuild でファイルが置き換えられていたら読み直す"""
+        if self._file_identity() != self._ids_identity:
+            self.load()
+
+    def load(self):
+        """ファイルから読み込む (行列はメモリマップするので件数に関係なく高速)"""
+        self._ids_identity = self._file_identity()
+        ids = []
+        if os.path.exists(self.path_prefix + '.ids'):
+            with open(self.path_prefix + '.ids', encoding='utf-8') as f:
+                ids = f.read().split()
+
+        rows = 0
+        if os.path.exists(self.path_prefix + '.f32'):
+            rows = os.path.getsize(self.path_prefix + '.f32') // (4 * self.dim)
+
+        # 書き込み途中で落ちた場合は両方に揃っている行までを有効とする
+        count = min(len(ids), rows)
+        self.ids = ids[:count]
+        self.positions = {arxiv_id: i for i, arxiv_id in enumerate(self.ids)}
+        self._matrix = None
+
+        if os.path.exists(self.path_prefix + '.df'):
+            stats = np.fromfile(self.path_prefix + '.df', dtype=np.float64)
+            if len(stats) == self.dim + 1:
+                self.doc_freq = stats[:self.dim].copy()
+                self.doc_count = int(stats[self.dim])
+
+        # 行列が空 (作り直した・消した) なら papers を最初から読む
+        self.synced_id = 0
+        if self.ids and os.path.exists(self.path_prefix + '.sync'):
+            with open(self.path_prefix + '.sync', encoding='utf-8') as f:
+                self.synced_id = int(f.read().strip() or 0)
+
+        if os.path.exists(self.path_prefix + '.ivf.npz'):
+            ivf = np.load(self.path_prefix + '.ivf.npz')
+            self.centroids = ivf['centroids']
+            self.assignments = ivf['assignments']
+
+    def matrix(self) -> np.ndarray:
+        """埋め込み行列 (読み取り専用のメモリマップ)"""
+        self.refresh()
+        if self._matrix is None or len(self._matrix) != self.size:
+            if self.size == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(
+                    self.path_prefix + '.f32', dtype=np.float32, mode='r', shape=(self.size, self.dim)
+                )
+        return self._matrix
+
+    def idf(self) -> np.ndarray:
+        """現在の文書頻度から IDF を計算"""
+        return np.log((1 + self.doc_count) / (1 + self.doc_freq)).astype(np.float32) + 1.0
+
+    @staticmethod
+    def paper_text(paper: Dict) -> str:
+        """埋め込み対象のテキスト (タイトルは重みを上げるため2回含める)"""
+        title = paper.get('title', '')
+        return f"{title} {title} {paper.get('abstract', '')}"
+
+    def add_papers(self, papers: Iterable[Dict]) -> int:
+        """論文を埋め込んで追記 (登録済みの ID は無視。IDF はこの時点の値で、既存の行は重み付けし直さない)"""
+        with self._lock:
+            # 古い ID 一覧の続きの位置に追記したり、古い文書頻度で .df を上書きしたりしない
+            self.refresh()
+            vectors = []
+            new_ids = []
+            seen = set()
+            for paper in papers:
+                arxiv_id = paper['arxiv_id']
+                if arxiv_id in self.positions or arxiv_id in seen:
+                    continue
+                seen.add(arxiv_id)
+                text = self.paper_text(paper)
+                buckets = list(self.embedder.hashed_counts(text))
+                self.doc_freq[buckets] += 1
+                self.doc_count += 1
+                vectors.append(self.embedder.transform(text, self.idf()))
+                new_ids.append(arxiv_id)
+
+            if not new_ids:
+                return 0
+
+            # 行列を先に書き、ID は後に書く (途中で落ちても ID の無い行は無視される)
+            with open(self.path_prefix + '.f32', 'ab') as f:
+                np.asarray(vectors, dtype=np.float32).tofile(f)
+            with open(self.path_prefix + '.ids', 'a', encoding='utf-8') as f:
+                f.write(''.join(f'{arxiv_id}\n' for arxiv_id in new_ids))
+            self._ids_identity = self._file_identity()
+            np.append(self.doc_freq, self.doc_count).tofile(self.path_prefix + '.df')
+
+            start = self.size
+            for offset, arxiv_id in enumerate(new_ids):
+                self.positions[arxiv_id] = start + offset
+            self.ids.extend(new_ids)
+            return len(new_ids)
+
+    def vector_for(self, arxiv_id: str) -> Optional[np.ndarray]:
+        """登録済み論文のベクトル"""
+        self.refresh()
+        position = self.positions.get(arxiv_id)
+        if position is None:
+            return None
+        return np.array(self.matrix()[position])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """任意のテキストをクエリベクトルにする"""
+        return self.embedder.transform(text, self.idf())
+
+    def search(self, vector: np.ndarray, k: int = 5, exclude: Iterable[str] = (),
+               nprobe: int = 4) -> List[Tuple[str, float]]:
+        """コサイン類似度の上位 k 件を返す"""
+        matrix = self.matrix()
+        if len(matrix) == 0:
+            return []
+
+        exclude = set(exclude)
+        candidates = None
+        if self.centroids is not None and self.assignments is not None:
+            # 近いセントロイドの行だけを走査する
+            probes = np.argsort(-(self.centroids @ vector))[:nprobe]
+            candidates = np.flatnonzero(np.isin(self.assignments, probes))
+            # IVF 学習後に追加された行は割り当てが無いので常に走査する
+            if len(self.assignments) < len(matrix):
+                candidates = np.concatenate([candidates, np.arange(len(self.assignments), len(matrix))])
+
+        scores = matrix @ vector if candidates is None else matrix[candidates] @ vector
+        take = min(len(scores), k + len(exclude))
+        if take == 0:
+            return []
+        top = np.argpartition(-scores, take - 1)[:take]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            position = int(i if candidates is None else candidates[i])
+            arxiv_id = self.ids[position]
+            if arxiv_id in exclude:
+                continue
+            results.append((arxiv_id, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def build_ivf(self, nlist: int = 64, iterations: int = 10, seed: int = 0):
+        """k-means で IVF のセントロイドを学習して保存"""
+        matrix = np.asarray(self.matrix())
+        if len(matrix) < nlist:
+            return
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = matrix[assignments == c]
+                if len(members):
+                    center = members.mean(axis=0)
+                    norm = np.linalg.norm(center)
+                    centroids[c] = center / norm if norm > 0 else center
+        with self._lock:
+            self.centroids = centroids.astype(np.float32)
+            self.assignments = np.argmax(matrix @ self.centroids.T, axis=1)
+            np.savez(self.path_prefix + '.ivf.npz', centroids=self.centroids, assignments=self.assignments)
+
+    @staticmethod
+    def iter_papers(db_path: str, after_id: int = 0, batch_size: int = 1000):
+        """papers.id が after_id より大きい論文を (最後の id, 論文のリスト) のバッチで返す (別接続)"""
+        conn = sqlite3.connect(db_path)
+        register_text_functions(conn)
+        try:
+            cursor = conn.execute(
+                'SELECT id, arxiv_id, title, paper_text(abstract) FROM papers WHERE id > ? ORDER BY id',
+                (after_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows[-1][0], [{'arxiv_id': r[1], 'title': r[2], 'abstract': r[3]} for r in rows]
+        finally:
+            conn.close()
+
+    def save_synced_id(self, paper_id: int):
+        """読み込み済みの papers.id を保存 (行列と ID を書いた後に呼ぶ)"""
+        self.synced_id = paper_id
+        with open(self.path_prefix + '.sync', 'w', encoding='utf-8') as f:
+            f.write(f'{paper_id}\n')
+
+    def sync_from_db(self, db_path: str, batch_size: int = 1000) -> int:
+        """前回読み込んだ papers.id より後の論文のうち未登録のものを埋め込む (別接続で実行できる)"""
+        added = 0
+        for last_id, papers in self.iter_papers(db_path, self.synced_id, batch_size):
+            added += self.add_papers(papers)
+            self.save_synced_id(last_id)
+        return added
+
+    def rebuild(self, db_path: str, batch_size: int = 1000) -> int:
+        """papers 全件の文書頻度を数えてから、全ての論文を同じ IDF で埋め込み直す
+
+        IVF は行が入れ替わるので削除する (必要なら学習し直す)
+        Bot の起動中でも実行できる (Bot 側はファイルの置き換えを検知して読み直す)。
+        読み込み後に Bot が追加した論文は、次回の sync_from_db で追加される
+        """
+        doc_freq = np.zeros(self.dim, dtype=np.float64)
+        doc_count = 0
+        for _, papers in self.iter_papers(db_path, 0, batch_size):
+            for paper in papers:
+                doc_freq[list(self.embedder.hashed_counts(self.paper_text(paper)))] += 1
+                doc_count += 1
+        idf = np.log((1 + doc_count) / (1 + doc_freq)).astype(np.float32) + 1.0
+
+        # 一時ファイルに書いてから置き換える (途中で落ちても元のインデックスが残る)
+        tmp_prefix = self.path_prefix + '.rebuild'
+        last_id = 0
+        with open(tmp_prefix + '.f32', 'wb') as matrix_file, \
+                open(tmp_prefix + '.ids', 'w', encoding='utf-8') as ids_file:
+            for last_id, papers in self.iter_papers(db_path, 0, batch_size):
+                np.asarray([self.embedder.transform(self.paper_text(p), idf) for p in papers],
+                           dtype=np.float32).tofile(matrix_file)
+                ids_file.write(''.join(f"{p['arxiv_id']}\n" for p in papers))
+        np.append(doc_freq, doc_count).tofile(tmp_prefix + '.df')
+        with open(tmp_prefix + '.sync', 'w', encoding='utf-8') as f:
+            f.write(f'{last_id}\n')
+
+        with self._lock:
+            for suffix in ('.f32', '.ids', '.df', '.sync'):
+                os.replace(tmp_prefix + suffix, self.path_prefix + suffix)
+            if os.path.exists(self.path_prefix + '.ivf.npz'):
+                os.remove(self.path_prefix + '.ivf.npz')
+            self.centroids = None
+            self.assignments = None
+            self.load()
+        return doc_count
+
+def main():
+    """コマンドライン実行 (インデックスの構築)"""
+    parser = argparse.ArgumentParser(description='論文ベクトルインデックスの管理')
+    parser.add_argument('--db', default='papers.db', help='papers.db のパス')
+    parser.add_argument('--index', default='paper_vectors', help='インデックスファイルの接頭辞')
+    parser.add_argument('--dim', type=int, default=256)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help='未登録の論文を埋め込む')
+    subparsers.add_parser('rebuild', help='全件の文書頻度で全ての論文を埋め込み直す (起動中の Bot は次のアクセスで読み直す)')
+    ivf_parser = subparsers.add_parser('ivf', help='IVF セントロイドを学習')
+    ivf_parser.add_argument('--nlist', type=int, default=64)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = VectorIndex(args.index, dim=args.dim)
+    print(f'インデックス読み込み: {index.size:,} 件 ({(time.perf_counter() - started) * 1000:.1f}ms)')
+
+    started = time.perf_counter()
+    if args.command == 'build':
+        added = index.sync_from_db(args.db)
+        print(f'✅ {added:,} 件を追加しました ({time.perf_counter() - started:.1f}s)')
+    elif args.command == 'rebuild':
+        total = index.rebuild(args.db)
+        print(f'✅ {total:,} 件を埋め込み直しました ({time.perf_counter() - started:.1f}s)')
+    elif args.command == 'ivf':
+        index.build_ivf(args.nlist)
+        print(f'✅ IVF を学習しました (nlist={args.nlist}, {time.perf_counter() - started:.1f}s)')
+
+if __name__ == '__main__':
+    main()
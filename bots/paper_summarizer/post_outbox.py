@@ -0,0 +1,149 @@
+"""
+Discord 投稿のアウトボックス
+要約の保存 (papers / paper_queue) と同じトランザクションで投稿予定を書き込み、
+送信タスクが指数バックオフ付きで再試行しながら取り出す
+送信済みの行は投稿までの遅延 (lag) とスループットの計測に使う
+"""
+
+import random
+import time
+from typing import Dict, List, Optional
+
+class PostOutbox:
+    """SQLite に永続化される投稿待ちの行"""
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+
+    def __init__(self, conn, max_attempts: int = 8, base_backoff: float = 30, max_backoff: float = 3600):
+        self.conn = conn
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.init_table()
+
+    def init_table(self):
+        """アウトボックステーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS post_outbox (
+                arxiv_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                message_id TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_post_outbox_due
+            ON post_outbox (state, next_attempt_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_post_outbox_sent
+            ON post_outbox (sent_at)
+        ''')
+
+        self.conn.commit()
+
+    def add(self, arxiv_id: str, now: Optional[float] = None):
+        """投稿予定を追加 (コミットは呼び出し側のトランザクションで行う)"""
+        now = time.time() if now is None else now
+        self.conn.execute('''
+            INSERT OR IGNORE INTO post_outbox (arxiv_id, state, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (arxiv_id, self.PENDING, now, now))
+
+    def fetch_due(self, limit: int = 20, now: Optional[float] = None) -> List[Dict]:
+        """送信時刻を過ぎた行を古い順に取得"""
+        now = time.time() if now is None else now
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT arxiv_id, attempts, created_at
+            FROM post_outbox
+            WHERE state = ? AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, created_at
+            LIMIT ?
+        ''', (self.PENDING, now, limit))
+
+        return [dict(zip(['arxiv_id', 'attempts', 'created_at'], row)) for row in cursor.fetchall()]
+
+    def mark_sent(self, arxiv_id: str, message_id: Optional[int], now: Optional[float] = None):
+        """送信済みにする (コミットは呼び出し側)"""
+        now = time.time() if now is None else now
+        self.conn.execute('''
+            UPDATE post_outbox
+            SET state = ?, message_id = ?, sent_at = ?, last_error = NULL
+            WHERE arxiv_id = ?
+        ''', (self.SENT, str(message_id) if message_id is not None else None, now, arxiv_id))
+
+    def record_failure(self, arxiv_id: str, error: str, retry_after: Optional[float] = None,
+                       permanent: bool = False, now: Optional[float] = None) -> bool:
+        """失敗を記録して次の送信時刻を決める (コミットは呼び出し側)
+
+        Args:
+            retry_after: Discord が指定した待機秒数 (バックオフより長ければこちらを使う)
+            permanent: 再試行しても成功しない失敗 (不正なリクエストなど)
+
+        Returns:
+            まだ再試行される場合は True
+        """
+        now = time.time() if now is None else now
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT attempts FROM post_outbox WHERE arxiv_id = ?', (arxiv_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+
+        attempts = row[0] + 1
+        retrying = not permanent and attempts < self.max_attempts
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        wait = max(backoff * random.uniform(0.5, 1.0), retry_after or 0)
+
+        cursor.execute('''
+            UPDATE post_outbox
+            SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ?
+            WHERE arxiv_id = ?
+        ''', (self.PENDING if retrying else self.DEAD, attempts, error[:500], now + wait, arxiv_id))
+        return retrying
+
+    def get_stats(self, window: float = 3600, now: Optional[float] = None) -> Dict:
+        """待ち件数・最古の待ち時間・直近 window 秒のスループットと遅延"""
+        now = time.time() if now is None else now
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT COUNT(*), MIN(created_at), SUM(attempts > 0), SUM(next_attempt_at <= ?)
+            FROM post_outbox WHERE state = ?
+        ''', (now, self.PENDING))
+        pending, oldest, retrying, due = cursor.fetchone()
+
+        cursor.execute('SELECT COUNT(*) FROM post_outbox WHERE state = ?', (self.DEAD,))
+        dead = cursor.fetchone()[0]
+
+        cursor.execute('''
+            SELECT sent_at - created_at FROM post_outbox
+            WHERE state = ? AND sent_at >= ?
+            ORDER BY 1
+        ''', (self.SENT, now - window))
+        lags = [row[0] for row in cursor.fetchall()]
+
+        def percentile(pct: float) -> Optional[float]:
+            return lags[min(len(lags) - 1, int(len(lags) * pct))] if lags else None
+
+        return {
+            'pending': pending,
+            'due': due or 0,
+            'retrying': retrying or 0,
+            'dead': dead,
+            'oldest_pending_seconds': now - oldest if oldest is not None else 0.0,
+            'sent_in_window': len(lags),
+            'per_minute': len(lags) / (window / 60),
+            'lag_p50': percentile(0.5),
+            'lag_p95': percentile(0.95),
+        }
@@ -0,0 +1,95 @@
+"""
+論文の関連度フィルター
+投稿に付いたリアクション (👍/❤️ は高評価、🤔 と無反応は低評価) から
+ハッシュ特徴量のロジスティック回帰を学習し、LLM に渡す前に新着論文を一括でスコアリングする
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from paper_vectors import HashingEmbedder
+
+class RelevanceModel:
+    """ハッシュ特徴量 + ロジスティック回帰による関連度モデル"""
+
+    def __init__(self, dim: int = 4096, l2: float = 1e-3, min_examples: int = 5):
+        self.embedder = HashingEmbedder(dim)
+        self.l2 = l2
+        # 高評価・低評価それぞれの最低件数 (満たない間は全件を通す)
+        self.min_examples = min_examples
+        self.weights: Optional[np.ndarray] = None
+        self.bias = 0.0
+        self.trained_examples = 0
+
+    @property
+    def trained(self) -> bool:
+        """学習済みかどうか"""
+        return self.weights is not None
+
+    def featurize(self, papers: List[Dict]) -> np.ndarray:
+        """論文を特徴量行列にする (1行 = 1論文)"""
+        matrix = np.zeros((len(papers), self.embedder.dim), dtype=np.float32)
+        for i, paper in enumerate(papers):
+            matrix[i] = self.embedder.transform(f"{paper['title']} {paper['title']} {paper['abstract']}")
+        return matrix
+
+    def fit(self, papers: List[Dict], labels: List[float], sample_weights: Optional[List[float]] = None,
+            epochs: int = 200, learning_rate: float = 1.0) -> bool:
+        """重み付きロジスティック回帰を全バッチの勾配降下で学習
+
+        Returns:
+            学習した場合は True (件数不足の場合は未学習のまま)
+        """
+        y = np.asarray(labels, dtype=np.float32)
+        positives = int((y >= 0.5).sum())
+        if positives < self.min_examples or len(y) - positives < self.min_examples:
+            self.weights = None
+            self.trained_examples = 0
+            return False
+
+        x = self.featurize(papers)
+        sw = np.ones(len(y), dtype=np.float32) if sample_weights is None else np.asarray(sample_weights, dtype=np.float32)
+        sw = sw / sw.sum()
+
+        weights = np.zeros(x.shape[1], dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            error = (self._sigmoid(x @ weights + bias) - y) * sw
+            weights -= learning_rate * (x.T @ error + self.l2 * weights)
+            bias -= learning_rate * float(error.sum())
+
+        self.weights = weights
+        self.bias = bias
+        self.trained_examples = len(y)
+        return True
+
+    def score(self, papers: List[Dict]) -> np.ndarray:
+        """関連度スコア (0〜1) を一括で計算 (未学習なら全件 1.0)"""
+        if not papers:
+            return np.zeros(0, dtype=np.float32)
+        if not self.trained:
+            return np.ones(len(papers), dtype=np.float32)
+        return self._sigmoid(self.featurize(papers) @ self.weights + self.bias)
+
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+def reaction_label(positive: int, negative: int) -> Tuple[float, float]:
+    """リアクション数からラベルとサンプル重みを求める
+
+    無反応は弱い低評価として扱う
+    """
+    if positive == 0 and negative == 0:
+        return 0.0, 0.5
+    label = 1.0 if positive > negative else 0.0
+    return label, 1.0 + math.log1p(abs(positive - negative))
+
+def select_relevant(scores: np.ndarray, min_score: float, top_k: int) -> List[bool]:
+    """スコアが閾値以上、またはこの周期の上位 top_k 件に入る論文を選ぶ"""
+    selected = scores >= min_score
+    if top_k > 0 and len(scores):
+        selected[np.argsort(-scores, kind='stable')[:top_k]] = True
+    return selected.tolist()
@@ -0,0 +1,128 @@
+"""
+要約キャッシュ
+正規化したタイトル・アブストラクト・プロンプトのバージョン・モデル名のハッシュをキーに
+要約を保存し、クロスリストや再投稿 (v2, v3) された論文で LLM を再度呼ばないようにする
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, Optional
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化 (NFKC・小文字化・空白の圧縮)"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+def make_cache_key(title: str, abstract: str, prompt_version: str, model: str) -> str:
+    """キャッシュキーを作成"""
+    material = '\x1f'.join([
+        normalize_text(title),
+        normalize_text(abstract),
+        prompt_version,
+        model,
+    ])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class SummaryCache:
+    """SQLite に永続化されるサイズ・経過日数制限付きの要約キャッシュ"""
+
+    def __init__(self, conn, max_entries: int = 50000, max_age_days: float = 180):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.init_table()
+
+    def init_table(self):
+        """キャッシュテーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                cache_key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used
+            ON summary_cache (last_used_at)
+        ''')
+
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュから要約を取得 (期限切れは無いものとして扱う)"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            SELECT summary FROM summary_cache
+            WHERE cache_key = ? AND created_at >= datetime('now', ?)
+        ''', (key, f'-{self.max_age_days} days'))
+        row = cursor.fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        cursor.execute(
+            'UPDATE summary_cache SET last_used_at = CURRENT_TIMESTAMP WHERE cache_key = ?',
+            (key,)
+        )
+        self.conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, summary: str):
+        """要約を保存し、上限を超えた分を削除"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO summary_cache (cache_key, summary, created_at, last_used_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', (key, summary))
+        self.conn.commit()
+
+        self.evict()
+
+    def evict(self):
+        """期限切れと、件数上限を超えた最も使われていないエントリを削除"""
+        cursor = self.conn.cursor()
+
+        cursor.execute(
+            "DELETE FROM summary_cache WHERE created_at < datetime('now', ?)",
+            (f'-{self.max_age_days} days',)
+        )
+        removed = cursor.rowcount
+
+        cursor.execute('SELECT COUNT(*) FROM summary_cache')
+        overflow = cursor.fetchone()[0] - self.max_entries
+        if overflow > 0:
+            cursor.execute('''
+                DELETE FROM summary_cache WHERE cache_key IN (
+                    SELECT cache_key FROM summary_cache
+                    ORDER BY last_used_at, created_at
+                    LIMIT ?
+                )
+            ''', (overflow,))
+            removed += cursor.rowcount
+
+        self.conn.commit()
+        self.evictions += removed
+
+    def get_stats(self) -> Dict:
+        """ヒット・ミス数などの統計"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM summary_cache')
+        lookups = self.hits + self.misses
+        return {
+            'entries': cursor.fetchone()[0],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,68 @@
+"""
+ストリーミング要約の補助
+Discord のメッセージ編集を間引くスロットルと、最初の内容が表示されるまでの時間
+(time-to-first-content) の統計
+"""
+
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from rate_limit import TokenBucket
+
+class EditThrottle:
+    """メッセージごとの最小間隔と、チャンネル全体で共有する編集数の上限"""
+
+    def __init__(self, bucket: TokenBucket, min_interval: float = 1.5):
+        # bucket は同じチャンネルへの全ストリームで共有する
+        self.bucket = bucket
+        self.min_interval = min_interval
+        self.last_edit: Optional[float] = None
+        self.edits = 0
+        self.skipped = 0
+
+    def try_acquire(self) -> bool:
+        """途中経過の編集をしてよいか (枠が無ければ待たずに見送る)"""
+        now = time.monotonic()
+        if self.last_edit is not None and now - self.last_edit < self.min_interval:
+            self.skipped += 1
+            return False
+        if not self.bucket.try_acquire(1):
+            self.skipped += 1
+            return False
+        self.last_edit = now
+        self.edits += 1
+        return True
+
+    async def acquire(self):
+        """最終結果の編集枠を取得 (枠が空くまで待つ)"""
+        await self.bucket.acquire(1)
+        self.last_edit = time.monotonic()
+        self.edits += 1
+
+class LatencyStats:
+    """直近のレイテンシ (秒) を保持してパーセンタイルを返す"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float):
+        """計測値を追加"""
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """パーセンタイル (サンプルが無ければ None)"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def snapshot(self) -> Dict:
+        """現在の統計"""
+        return {
+            'count': self.count,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
@@ -0,0 +1,156 @@
+"""
+要約の多言語バリアント
+(論文, 言語) ごとに翻訳した要約を保存し、初回のリクエスト時に生成する
+言語ごとのリクエスト数を数え、よく使われる言語は投稿時にまとめて事前生成する
+"""
+
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+# 対応言語 (i18n.locales.SupportedLanguages と同じコード) と、プロンプトで使う言語名
+LANGUAGE_NAMES = {
+    'ja': 'Japanese',
+    'en': 'English',
+    'ko': 'Korean',
+    'zh-cn': 'Simplified Chinese',
+    'zh-tw': 'Traditional Chinese',
+    'es': 'Spanish',
+    'fr': 'French',
+    'de': 'German',
+}
+# 要約を最初に生成する言語
+BASE_LANGUAGE = 'ja'
+
+def language_from_locale(locale: Optional[str]) -> Optional[str]:
+    """Discord のロケール (en-US, zh-CN など) を対応言語のコードにする"""
+    if not locale:
+        return None
+    locale = str(locale).lower()
+    if locale in LANGUAGE_NAMES:
+        return locale
+    base = locale.split('-')[0]
+    if base == 'zh':
+        return 'zh-tw' if locale in ('zh-tw', 'zh-hk') else 'zh-cn'
+    return base if base in LANGUAGE_NAMES else None
+
+def read_user_language(db_path: str, user_id: int) -> Optional[str]:
+    """多言語 Bot の user_languages テーブルからユーザーの言語設定を読む (未設定なら None)"""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            row = conn.execute(
+                'SELECT language_code FROM user_languages WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row and row[0] in LANGUAGE_NAMES else None
+
+class SummaryVariantStore:
+    """(論文, 言語) ごとの要約と言語ごとのリクエスト数"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.hits = 0
+        self.misses = 0
+        self.init_table()
+
+    def init_table(self):
+        """テーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_variants (
+                arxiv_id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (arxiv_id, language)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_language_requests (
+                language TEXT NOT NULL,
+                day DATE NOT NULL,
+                requests INTEGER DEFAULT 0,
+                PRIMARY KEY (language, day)
+            )
+        ''')
+
+        self.conn.commit()
+
+    def get(self, arxiv_id: str, language: str) -> Optional[str]:
+        """保存済みのバリアントを取得"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            'SELECT summary FROM summary_variants WHERE arxiv_id = ? AND language = ?',
+            (arxiv_id, language)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def missing_languages(self, arxiv_id: str, languages: List[str]) -> List[str]:
+        """まだ生成していない言語"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT language FROM summary_variants WHERE arxiv_id = ?', (arxiv_id,))
+        existing = {row[0] for row in cursor.fetchall()}
+        return [language for language in languages if language not in existing]
+
+    def put_many(self, arxiv_id: str, variants: Dict[str, str]):
+        """バリアントをまとめて保存"""
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO summary_variants (arxiv_id, language, summary)
+            VALUES (?, ?, ?)
+        ''', [(arxiv_id, language, summary) for language, summary in variants.items()])
+        self.conn.commit()
+
+    def record_request(self, language: str):
+        """言語ごとのリクエスト数を数える (事前生成する言語の判定に使う)"""
+        self.conn.execute('''
+            INSERT INTO summary_language_requests (language, day, requests)
+            VALUES (?, DATE('now'), 1)
+            ON CONFLICT (language, day) DO UPDATE SET requests = requests + 1
+        ''', (language,))
+        self.conn.commit()
+
+    def popular_languages(self, limit: int = 2, min_requests: int = 5, days: int = 30) -> List[str]:
+        """直近 days 日でリクエストの多い言語 (基準言語は除く)"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT language, SUM(requests) AS total
+            FROM summary_language_requests
+            WHERE day >= DATE('now', ?) AND language != ?
+            GROUP BY language
+            HAVING total >= ?
+            ORDER BY total DESC, language
+            LIMIT ?
+        ''', (f'-{days} days', BASE_LANGUAGE, min_requests, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_stats(self) -> Dict:
+        """言語ごとの保存数とリクエスト数"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT language, COUNT(*) FROM summary_variants GROUP BY language')
+        variants = dict(cursor.fetchall())
+        cursor.execute('''
+            SELECT language, SUM(requests) FROM summary_language_requests
+            WHERE day >= DATE('now', '-30 days')
+            GROUP BY language
+        ''')
+        requests = dict(cursor.fetchall())
+        lookups = self.hits + self.misses
+        return {
+            'variants': variants,
+            'requests': requests,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
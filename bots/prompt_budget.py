@@ -0,0 +1,288 @@
+"""
+トークン数に基づくプロンプトの予算管理
+モデルごとのトークナイザーでローカルにトークン数を数え、プロンプトの各セクションを優先度順に
+コンテキスト長 (入力の予算) へ詰める。文字数で切ると ASCII のコードでは予算を使い切れず、
+日本語では予算を超えてコンテキスト長エラーになるため、各 Bot はこのモジュールで入力を切り詰める
+
+tiktoken があればモデルのエンコーディングで正確に数え (BPE ファイルは TIKTOKEN_CACHE_DIR に事前に置けば
+ネットワーク不要)、無ければ文字種ごとの近似で少し多めに見積もる
+同じテキスト (プロンプトの定型部分・再レビューの差分など) は LRU キャッシュで数え直さない
+"""
+
+import logging
+import math
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gpt-4'
+
+# モデル名の接頭辞 -> (エンコーディング, コンテキスト長)。長い接頭辞から順に照合する
+MODEL_SPECS: List[Tuple[str, str, int]] = [
+    ('gpt-4o', 'o200k_base', 128000),
+    ('gpt-4-turbo', 'cl100k_base', 128000),
+    ('gpt-4-1106', 'cl100k_base', 128000),
+    ('gpt-4-0125', 'cl100k_base', 128000),
+    ('gpt-4-32k', 'cl100k_base', 32768),
+    ('gpt-4', 'cl100k_base', 8192),
+    ('gpt-3.5-turbo-instruct', 'cl100k_base', 4096),
+    ('gpt-3.5-turbo', 'cl100k_base', 16385),
+]
+DEFAULT_ENCODING = 'cl100k_base'
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# chat 形式の1メッセージあたりの追加トークンと、応答の前置き
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+
+# 切り詰めたセクションの末尾に付ける印
+TRUNCATION_MARKER = '\n…(以下省略)'
+
+# 近似トークナイザーの区切り: (前の空白を含む) 英字の連続・数字の連続・(前の空白を含む) 記号の連続・空白・改行・CJK 1文字・その他1文字
+_PIECE = re.compile(
+    r" ?[A-Za-z]+|[0-9]+| ?[!-/:-@\[-`{-~]+|[ \t]+|\r?\n+|[぀-ヿ㐀-鿿豈-﫿＀-￯]|[^\sA-Za-z0-9]"
+)
+
+def model_spec(model: str) -> Tuple[str, int]:
+    """モデル名から (エンコーディング, コンテキスト長)"""
+    for prefix, encoding, context_window in MODEL_SPECS:
+        if model.startswith(prefix):
+            return encoding, context_window
+    return DEFAULT_ENCODING, DEFAULT_CONTEXT_WINDOW
+
+class HeuristicTokenizer:
+    """tiktoken が無い場合の近似 (実際より少し多めに数える)
+
+    英字は5文字ごと、数字は3桁ごと、記号は2文字ごとに1トークン、日本語などの CJK 文字は1文字あたり
+    cjk_tokens_per_char、空白・改行の連続は1トークンとして数える
+    """
+
+    def __init__(self, encoding: str = DEFAULT_ENCODING):
+        self.name = f'heuristic:{encoding}'
+        # o200k_base は日本語をより少ないトークンで表す
+        self.cjk_tokens_per_char = 0.9 if encoding == 'o200k_base' else 1.3
+
+    def _piece_tokens(self, piece: str) -> float:
+        """1区切り分のトークン数"""
+        last = piece[-1]
+        if last.isascii():
+            if last.isalpha():
+                return math.ceil(len(piece) / 5)
+            if last.isdigit():
+                return math.ceil(len(piece) / 3)
+            if last.isspace():
+                return 1
+            return math.ceil(len(piece) / 2)
+        if '぀' <= last <= '￯':
+            return self.cjk_tokens_per_char
+        # その他の非 ASCII 文字 (アクセント付きの文字・絵文字など) は UTF-8 のバイト数で見積もる
+        return min(len(last.encode('utf-8')), 3)
+
+    def pieces(self, text: str) -> Iterator[Tuple[int, float]]:
+        """(区切りの終了位置, トークン数) を順に返す"""
+        for match in _PIECE.finditer(text):
+            yield match.end(), self._piece_tokens(match.group())
+
+    def count(self, text: str) -> int:
+        """トークン数"""
+        return math.ceil(sum(self._piece_tokens(m.group()) for m in _PIECE.finditer(text)))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """先頭から max_tokens トークン以内に切り詰める"""
+        used = 0.0
+        end = 0
+        for piece_end, tokens in self.pieces(text):
+            if used + tokens > max_tokens:
+                break
+            used += tokens
+            end = piece_end
+        return text[:end]
+
+class TiktokenTokenizer:
+    """tiktoken のエンコーディングで数える"""
+
+    def __init__(self, encoding):
+        self.name = encoding.name
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        """トークン数"""
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """先頭から max_tokens トークン以内に切り詰める (途中で切れたマルチバイト文字は除く)"""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max(0, max_tokens)]).rstrip('�')
+
+def load_tokenizer(encoding: str):
+    """エンコーディングのトークナイザー (tiktoken が使えなければ近似)"""
+    if tiktoken is not None:
+        try:
+            return TiktokenTokenizer(tiktoken.get_encoding(encoding))
+        except Exception as e:
+            # BPE ファイルをダウンロードできない環境 (TIKTOKEN_CACHE_DIR が未設定のオフライン環境など)
+            logger.warning(f'tiktoken のエンコーディング {encoding} を読み込めないため近似で数えます: {e}')
+    return HeuristicTokenizer(encoding)
+
+class TokenCounter:
+    """LRU キャッシュ付きのトークンカウンター"""
+
+    # これより短いテキストはキャッシュしない (数え直す方が速い)
+    MIN_CACHE_CHARS = 256
+
+    def __init__(self, tokenizer, max_entries: int = 2048):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[str, int]' = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @property
+    def name(self) -> str:
+        """トークナイザーの名前"""
+        return self.tokenizer.name
+
+    def count(self, text: str) -> int:
+        """トークン数"""
+        if len(text) < self.MIN_CACHE_CHARS:
+            return self.tokenizer.count(text)
+        tokens = self._cache.get(text)
+        if tokens is not None:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(text)
+            return tokens
+        self.stats['misses'] += 1
+        tokens = self.tokenizer.count(text)
+        self._cache[text] = tokens
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        """chat 形式のメッセージ全体のトークン数"""
+        return sum(self.count(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in messages) + REPLY_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int, marker: str = TRUNCATION_MARKER) -> str:
+        """max_tokens 以内に収める (切り詰めた場合は末尾に marker を付ける)"""
+        if self.count(text) <= max_tokens:
+            return text
+        keep = max_tokens - self.tokenizer.count(marker)
+        if keep <= 0:
+            return ''
+        return self.tokenizer.truncate(text, keep) + marker
+
+    def snapshot(self) -> Dict:
+        """キャッシュのヒット率"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._cache),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'tokenizer': self.name,
+        }
+
+_encoding_counters: Dict[str, TokenCounter] = {}
+_model_counters: Dict[str, TokenCounter] = {}
+
+def get_counter(model: str = DEFAULT_MODEL) -> TokenCounter:
+    """モデルのトークンカウンター (エンコーディングごとに1つを共有)"""
+    counter = _model_counters.get(model)
+    if counter is None:
+        encoding, _ = model_spec(model)
+        counter = _encoding_counters.get(encoding)
+        if counter is None:
+            counter = TokenCounter(load_tokenizer(encoding))
+            _encoding_counters[encoding] = counter
+        _model_counters[model] = counter
+    return counter
+
+class Section:
+    """プロンプトの可変部分 (priority が小さいほど先に予算を割り当てる)"""
+
+    def __init__(self, name: str, text: str, priority: int = 0, truncatable: bool = True,
+                 min_tokens: int = 32):
+        self.name = name
+        self.text = text or ''
+        self.priority = priority
+        # 切り詰められないセクションは全体が入らなければ空にする
+        self.truncatable = truncatable
+        # 残りがこれ未満なら切り詰めずに空にする (数トークンだけ残しても役に立たない)
+        self.min_tokens = min_tokens
+
+class PackResult:
+    """セクションを予算に詰めた結果"""
+
+    def __init__(self, texts: Dict[str, str], tokens: int, budget: int,
+                 truncated: List[str], dropped: List[str]):
+        self.texts = texts
+        self.tokens = tokens
+        self.budget = budget
+        self.truncated = truncated
+        self.dropped = dropped
+
+class PromptBudget:
+    """モデルのコンテキスト長から出力分を除いた入力の予算"""
+
+    def __init__(self, model: str, max_output_tokens: int, context_window: Optional[int] = None,
+                 max_input_tokens: Optional[int] = None, safety_margin: int = 16):
+        encoding, default_window = model_spec(model)
+        self.model = model
+        self.counter = get_counter(model)
+        self.context_window = context_window or default_window
+        self.max_output_tokens = max_output_tokens
+        # 出力分・chat 形式の追加分・近似の誤差分を除いた入力の上限
+        input_tokens = (self.context_window - max_output_tokens - MESSAGE_OVERHEAD_TOKENS
+                        - REPLY_OVERHEAD_TOKENS - safety_margin)
+        if max_input_tokens is not None:
+            input_tokens = min(input_tokens, max_input_tokens)
+        self.input_tokens = max(0, input_tokens)
+
+    def count(self, text: str) -> int:
+        """トークン数"""
+        return self.counter.count(text)
+
+    def pack(self, sections: List[Section], reserved_tokens: int = 0) -> PackResult:
+        """セクションを優先度順に予算へ詰める
+
+        入りきらないセクションは切り詰め (truncatable の場合)、それでも入らなければ空にする
+        reserved_tokens は定型部分など必ず入る部分のトークン数
+        """
+        budget = self.input_tokens - reserved_tokens
+        remaining = budget
+        texts = {}
+        truncated = []
+        dropped = []
+        for section in sorted(sections, key=lambda s: s.priority):
+            tokens = self.counter.count(section.text)
+            if tokens <= remaining:
+                texts[section.name] = section.text
+                remaining -= tokens
+            elif section.truncatable and remaining >= section.min_tokens:
+                texts[section.name] = self.counter.truncate(section.text, remaining)
+                remaining -= self.counter.count(texts[section.name])
+                truncated.append(section.name)
+            else:
+                texts[section.name] = ''
+                if section.text:
+                    dropped.append(section.name)
+        return PackResult(texts, reserved_tokens + budget - remaining, self.input_tokens, truncated, dropped)
+
+    def fit(self, render: Callable[..., str], sections: List[Section]) -> Tuple[str, PackResult]:
+        """render(**セクションの本文) で作るプロンプトを予算に収める
+
+        セクションを空にして render した定型部分のトークン数を先に差し引いてから詰める
+        """
+        fixed = self.counter.count(render(**{section.name: '' for section in sections}))
+        result = self.pack(sections, reserved_tokens=fixed)
+        if result.truncated or result.dropped:
+            logger.info(f'プロンプトを {self.input_tokens} トークンに収めました ({self.model}): '
+                        f'切り詰め {result.truncated} 省略 {result.dropped}')
+        return render(**result.texts), result
@@ -0,0 +1,131 @@
+"""
+トークンバケットによるレート制限
+LLM API の requests-per-minute / tokens-per-minute を事前に守り、
+429 応答時は retry-after に従って全体を一時停止する
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+class TokenBucket:
+    """1分あたりの補充量で管理するトークンバケット"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """経過時間分のトークンを補充"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount を取得できるまでの秒数 (取得はしない)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.per_minute
+
+    async def acquire(self, amount: float = 1) -> float:
+        """トークンを取得 (不足していれば補充を待つ)
+
+        Returns:
+            待機した秒数
+        """
+        # 容量を超える要求は容量分だけ消費する (永久に待たないように)
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                wait = self.wait_time(amount)
+                if wait <= 0:
+                    self.tokens -= amount
+                    return waited
+                await asyncio.sleep(wait)
+                waited += wait
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """待たずに取得できる場合だけトークンを取得"""
+        if self.wait_time(amount) > 0:
+            return False
+        self.tokens -= min(amount, self.capacity)
+        return True
+
+    def adjust(self, delta: float):
+        """実際の消費量との差分を反映 (負の値で返却、正の値で追加消費)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+class RateLimiter:
+    """RPM / TPM の2つのバケットと 429 バックオフをまとめたリミッター"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self.stats = {
+            'acquired': 0,
+            'rate_limited': 0,
+            'wait_seconds': 0.0,
+        }
+
+    async def acquire(self, estimated_tokens: int):
+        """1リクエスト分の枠を取得"""
+        # 429 によるバックオフ中は解除まで待つ
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            self.stats['wait_seconds'] += pause
+
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(estimated_tokens)
+        self.stats['acquired'] += 1
+        self.stats['wait_seconds'] += waited
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """見積もりと実際のトークン数の差を TPM バケットに反映"""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def backoff(self, seconds: float):
+        """429 応答を受けて全リクエストを一時停止"""
+        self.stats['rate_limited'] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> Dict:
+        """現在の状態"""
+        return {
+            **self.stats,
+            'requests_available': self.requests.tokens,
+            'tokens_available': self.tokens.tokens,
+            'paused_for': max(0.0, self.paused_until - time.monotonic()),
+        }
+
+def parse_retry_after(headers, attempt: int = 0, base: float = 1.0, cap: float = 60.0) -> float:
+    """retry-after 系ヘッダーから待機秒数を求める (無ければ指数バックオフ + ジッター)"""
+    if headers is not None:
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    return min(cap, base * (2 ** attempt)) * (0.5 + random.random() / 2)
@@ -0,0 +1,101 @@
+"""
+フィードチェックの単一実行のテスト
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from check_runs import CheckRunCoordinator
+
+class TestCheckRunCoordinator:
+    """CheckRunCoordinator のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_triggers_share_one_run(self):
+        """実行中に呼ばれたら新しく始めずに合流し、同じ結果を受け取る"""
+        coordinator = CheckRunCoordinator()
+        release = asyncio.Event()
+        calls = []
+
+        async def run_check(run):
+            calls.append(run.run_id)
+            run.begin(2)
+            run.record_feed(new_papers=3)
+            await release.wait()
+            run.record_feed(not_modified=True)
+
+        first, started_first = coordinator.start(run_check, trigger='scheduled')
+        second, started_second = coordinator.start(run_check, trigger='/check_papers')
+        await asyncio.sleep(0)
+
+        assert (started_first, started_second) == (True, False)
+        assert second is first
+        # 合流した側も実行中の進捗を見られる
+        progress = second.snapshot()
+        assert (progress['stage'], progress['feeds_done'], progress['new_papers']) == ('processing', 1, 3)
+
+        release.set()
+        results = await asyncio.gather(first.wait(), second.wait())
+
+        assert calls == [1]
+        assert results[0] == results[1]
+        assert results[0]['stage'] == 'finished'
+        assert (results[0]['feeds_done'], results[0]['not_modified'], results[0]['attached']) == (2, 1, 1)
+        assert coordinator.get_stats()['coalesced'] == 1
+
+    @pytest.mark.asyncio
+    async def test_new_run_after_completion(self):
+        """完了後の呼び出しは新しい実行になる"""
+        coordinator = CheckRunCoordinator()
+
+        async def run_check(run):
+            run.begin(0)
+
+        first, _ = coordinator.start(run_check, trigger='scheduled')
+        await first.wait()
+        second, started = coordinator.start(run_check, trigger='scheduled')
+        await second.wait()
+
+        assert started and second.run_id == 2
+        assert coordinator.get_stats()['running'] is False
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_waiter(self):
+        """実行が失敗したら合流した全員に例外が届き、次の呼び出しで再実行できる"""
+        coordinator = CheckRunCoordinator()
+
+        async def run_check(run):
+            await asyncio.sleep(0)
+            raise RuntimeError('boom')
+
+        run, _ = coordinator.start(run_check, trigger='scheduled')
+        coordinator.start(run_check, trigger='/check_papers')
+        results = await asyncio.gather(run.wait(), run.wait(), return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert coordinator.current is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_run(self):
+        """待っている側がキャンセルされても共有の実行は続く"""
+        coordinator = CheckRunCoordinator()
+        release = asyncio.Event()
+
+        async def run_check(run):
+            await release.wait()
+
+        run, _ = coordinator.start(run_check, trigger='scheduled')
+        waiter = asyncio.create_task(run.wait())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+
+        assert not run.done
+        release.set()
+        assert (await run.wait())['stage'] == 'finished'
@@ -0,0 +1,116 @@
+"""
+レビュー前の差分フィルターのテスト
+"""
+
+import os
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from diff_filter import DiffFilter, glob_to_regex, parse_gitattributes
+from review_engine import parse_unified_diff
+
+def file_diff(path: str, added_lines, hunks: int = 1) -> str:
+    """1ファイル分の unified diff"""
+    lines = [f'diff --git a/{path} b/{path}', 'index 111..222 100644', f'--- a/{path}', f'+++ b/{path}']
+    for h in range(hunks):
+        lines.append(f'@@ -{h * 100 + 1},1 +{h * 100 + 1},{len(added_lines) + 1} @@')
+        lines.append(' context')
+        lines.extend(f'+{line}' for line in added_lines)
+    return '\n'.join(lines) + '\n'
+
+def test_glob_to_regex():
+    """スラッシュの無いパターンはどの階層にも、末尾スラッシュはディレクトリ以下に一致"""
+    assert glob_to_regex('*.lock').match('a/b/c.lock')
+    assert glob_to_regex('vendor/').match('src/vendor/x.go')
+    assert not glob_to_regex('vendor/').match('vendor.go')
+    assert glob_to_regex('docs/*.md').match('docs/a.md')
+    assert not glob_to_regex('docs/*.md').match('docs/sub/a.md')
+    assert glob_to_regex('docs/**/*.md').match('docs/sub/a.md')
+
+def test_build_output_is_matched_only_at_root():
+    """build/ や dist/ はルートの出力先だけ、ノートブックは指定した場合だけ対象外"""
+    diff_filter = DiffFilter()
+    assert diff_filter.classify_path('build/app.js') == 'generated'
+    assert diff_filter.classify_path('dist/app.js') == 'generated'
+    assert diff_filter.classify_path('scripts/build/release.py') is None
+    assert diff_filter.classify_path('notebooks/eda.ipynb') is None
+    assert DiffFilter(exclude_globs=['*.ipynb']).classify_path('notebooks/eda.ipynb') == 'excluded'
+
+def test_lockfile_is_summarized_and_tokens_saved():
+    """ロックファイルはヘッダーと1行の要約だけになり、削減量が集計される"""
+    diff = file_diff('app.py', ['print(1)']) + file_diff('web/package-lock.json', ['"x": 1,'] * 500)
+    result = DiffFilter().filter(diff)
+
+    files = {f.path: f for f in parse_unified_diff(result.text)}
+    assert set(files) == {'app.py', 'web/package-lock.json'}
+    assert '+print(1)' in files['app.py'].text
+    assert '# [省略: ロックファイル] +500 -0 行' in files['web/package-lock.json'].text
+    assert '"x": 1' not in result.text
+
+    summary = result.summary()
+    assert summary['files_total'] == 2
+    assert summary['dropped'] == [{'path': 'web/package-lock.json', 'reason': 'lockfile'}]
+    assert summary['tokens_saved'] > 1000
+    assert summary['tokens_after'] < summary['tokens_before']
+
+def test_drop_mode_removes_file():
+    """drop モードでは対象外のファイルを差分から消す"""
+    diff = file_diff('app.py', ['print(1)']) + file_diff('yarn.lock', ['x'] * 10)
+    result = DiffFilter(mode='drop').filter(diff)
+    assert [f.path for f in parse_unified_diff(result.text)] == ['app.py']
+    assert result.summary()['files_dropped'] == 1
+
+def test_gitattributes_rules_and_override():
+    """linguist-generated は対象外、後の =false 行が既定の規則を打ち消す"""
+    attributes = '\n'.join([
+        '# 生成コード',
+        'api/schema.py linguist-generated',
+        'dist/keep.js linguist-generated=false',
+        'assets/*.bin binary',
+    ])
+    assert parse_gitattributes(attributes)[1] == ('dist/keep.js', None)
+
+    diff_filter = DiffFilter(exclude_globs=['fixtures/']).with_gitattributes(attributes)
+    assert diff_filter.classify_path('api/schema.py') == 'generated'
+    assert diff_filter.classify_path('dist/other.js') == 'generated'
+    assert diff_filter.classify_path('dist/keep.js') is None
+    assert diff_filter.classify_path('assets/a.bin') == 'binary'
+    assert diff_filter.classify_path('tests/fixtures/a.json') == 'excluded'
+    assert diff_filter.classify_path('app.py') is None
+
+def test_minified_and_too_large_files():
+    """長すぎる行を含むファイルと行数の上限を超えたファイルは要約する"""
+    diff = (file_diff('static/app.js', ['var a=1;' * 300])
+            + file_diff('big.py', [f'x{i} = {i}' for i in range(50)], hunks=3)
+            + file_diff('ok.py', ['y = 1']))
+    result = DiffFilter(max_file_lines=100).filter(diff)
+    reasons = {d['path']: d['reason'] for d in result.dropped}
+    assert reasons == {'static/app.js': 'minified', 'big.py': 'too_large'}
+    assert 'x10 = 10' not in result.text
+    assert '+y = 1' in result.text
+
+def test_oversized_hunk_is_summarized():
+    """大きすぎるハンクだけを要約し、同じファイルの他のハンクは残す"""
+    diff = (file_diff('a.py', ['small = 1'])
+            + '@@ -200,1 +200,30 @@\n' + ''.join(f'+big{i}\n' for i in range(30)))
+    result = DiffFilter(max_hunk_lines=10).filter(diff)
+    assert result.hunks_summarized == 1
+    assert result.dropped == []
+    assert '+small = 1' in result.text
+    assert '# [省略: 大きなハンク] +30 -0 行' in result.text
+    assert 'big20' not in result.text
+
+def test_binary_file_and_unknown_mode():
+    """Binary files 行のあるファイルはバイナリとして扱い、不明なモードはエラー"""
+    diff = ('diff --git a/logo.png b/logo.png\nindex 1..2 100644\n'
+            'Binary files a/logo.png and b/logo.png differ\n') + file_diff('a.py', ['z = 1'])
+    result = DiffFilter().filter(diff)
+    assert result.dropped[0]['reason'] == 'binary'
+    assert '+z = 1' in result.text
+    with pytest.raises(ValueError):
+        DiffFilter(mode='skip')
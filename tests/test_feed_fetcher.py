@@ -0,0 +1,79 @@
+"""
+フィード取得ステージのテスト
+"""
+
+import pytest
+import os
+import sys
+from aiohttp import web
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from feed_fetcher import FeedFetcher
+
+FEED_BODY = b'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title></channel></rss>'
+
+async def start_feed_server(etag: str = '"v1"'):
+    """ETag を返すテスト用フィードサーバーを起動"""
+    async def handler(request):
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        return web.Response(body=FEED_BODY, headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/rss/{category}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+@pytest.mark.asyncio
+async def test_conditional_get_returns_304_after_commit(tmp_path):
+    """処理完了後は条件付きリクエストで 304 が返る"""
+    runner, base_url = await start_feed_server()
+    db = PaperDatabase(str(tmp_path / "papers.db"))
+    fetcher = FeedFetcher(state_store=db)
+
+    try:
+        urls = [f'{base_url}/rss/cs.AI', f'{base_url}/rss/cs.LG']
+        first = await fetcher.fetch_all(urls)
+        assert [r.status for r in first] == [200, 200]
+        assert first[0].content == FEED_BODY
+
+        # commit 前は検証子が保存されていないので再取得される
+        second = await fetcher.fetch_all(urls[:1])
+        assert second[0].status == 200
+
+        for result in first:
+            fetcher.commit(result)
+
+        third = await fetcher.fetch_all(urls)
+        assert all(r.not_modified for r in third)
+        assert all(r.content is None for r in third)
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+    stats = fetcher.stats.snapshot()
+    assert stats['requests'] == 5
+    assert stats['not_modified'] == 2
+    assert stats['bytes_total'] == len(FEED_BODY) * 3
+
+@pytest.mark.asyncio
+async def test_fetch_error_is_recorded():
+    """接続エラーは例外ではなく結果として返る"""
+    fetcher = FeedFetcher(timeout=2)
+    try:
+        results = await fetcher.fetch_all(['http://127.0.0.1:9/rss', ' '])
+    finally:
+        await fetcher.close()
+
+    assert len(results) == 1
+    assert results[0].status == 0
+    assert results[0].error
+    assert fetcher.stats.errors == 1
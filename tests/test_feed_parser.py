@@ -0,0 +1,97 @@
+"""
+ストリーミングフィードパーサーのテスト
+"""
+
+import pytest
+import os
+import sys
+from xml.etree.ElementTree import ParseError
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from feed_parser import FeedEntry, StreamingFeedParser, iter_chunks, iter_feed_entries
+
+ARXIV_RSS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss xmlns:dc="http://purl.org/dc/elements/1.1/" version="2.0">
+  <channel>
+    <title>cs.AI updates on arXiv.org</title>
+    <item>
+      <title>First Paper</title>
+      <link>https://arxiv.org/abs/2401.00001</link>
+      <description>arXiv:2401.00001v1 Announce Type: new Abstract: First &amp; abstract</description>
+      <guid isPermaLink="false">oai:arXiv.org:2401.00001v1</guid>
+      <pubDate>Mon, 01 Jan 2024 00:00:00 -0500</pubDate>
+      <dc:creator>Alice, Bob</dc:creator>
+    </item>
+    <item>
+      <title>Second Paper</title>
+      <description>Second abstract</description>
+      <guid isPermaLink="false">oai:arXiv.org:2401.00002v2</guid>
+      <pubDate>Mon, 01 Jan 2024 00:00:00 -0500</pubDate>
+      <dc:creator>Carol</dc:creator>
+    </item>
+  </channel>
+</rss>"""
+
+ATOM = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>http://arxiv.org/abs/2401.00003v1</id>
+    <title>Atom Paper</title>
+    <summary>Atom abstract</summary>
+    <published>2024-01-01T00:00:00Z</published>
+    <author><name>Dave</name></author>
+    <author><name>Eve</name></author>
+  </entry>
+</feed>"""
+
+def test_parses_arxiv_rss():
+    """arXiv の RSS 2.0 からエントリを取り出す"""
+    entries = list(iter_feed_entries([ARXIV_RSS]))
+
+    assert [e.id for e in entries] == ['oai:arXiv.org:2401.00001v1', 'oai:arXiv.org:2401.00002v2']
+    first = entries[0]
+    assert first.title == 'First Paper'
+    assert first.summary.endswith('First & abstract')
+    assert first.published.startswith('Mon, 01 Jan 2024')
+    assert first.authors == ['Alice', 'Bob']
+
+def test_parses_atom():
+    """Atom フィードからエントリを取り出す"""
+    entries = list(iter_feed_entries([ATOM]))
+
+    assert len(entries) == 1
+    assert entries[0].id == 'http://arxiv.org/abs/2401.00003v1'
+    assert entries[0].summary == 'Atom abstract'
+    assert entries[0].authors == ['Dave', 'Eve']
+
+def test_small_chunks_and_skip():
+    """チャンク境界に関係なく解析され、スキップ対象は組み立てられない"""
+    seen = []
+
+    def skip_id(entry_id):
+        seen.append(entry_id)
+        return entry_id.endswith('00001v1')
+
+    parser = StreamingFeedParser(skip_id)
+    entries = []
+    for chunk in iter_chunks(ARXIV_RSS, chunk_size=7):
+        entries.extend(parser.feed(chunk))
+    entries.extend(parser.close())
+
+    assert [e.title for e in entries] == ['Second Paper']
+    assert parser.skipped == 1
+    assert len(seen) == 2
+
+def test_entries_are_light_records():
+    """エントリは __slots__ の軽量レコード"""
+    entry = next(iter_feed_entries([ATOM]))
+    assert isinstance(entry, FeedEntry)
+    assert not hasattr(entry, '__dict__')
+
+def test_malformed_feed_raises_parse_error():
+    """壊れた XML は ParseError (呼び出し側で feedparser にフォールバック)"""
+    with pytest.raises(ParseError):
+        list(iter_feed_entries([b'<rss><channel><item><title>x</item>']))
@@ -0,0 +1,119 @@
+"""
+フィードポーリングスケジューラーのテスト
+"""
+
+import os
+import sqlite3
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from feed_scheduler import FeedScheduler, extract_feed_timing, parse_feed_date
+
+HOUR = 3600
+DAY = 24 * HOUR
+URL = 'http://export.arxiv.org/rss/cs.AI'
+
+RSS = b'''<?xml version="1.0"?>
+<rss version="2.0" xmlns:sy="http://purl.org/rss/1.0/modules/syndication/">
+  <channel>
+    <title>cs.AI updates</title>
+    <lastBuildDate>Mon, 01 Jan 2024 05:00:00 GMT</lastBuildDate>
+    <ttl>60</ttl>
+    <sy:updatePeriod>daily</sy:updatePeriod>
+    <sy:updateFrequency>1</sy:updateFrequency>
+    <item><title>Paper</title><pubDate>Sun, 31 Dec 2023 00:00:00 GMT</pubDate></item>
+  </channel>
+</rss>
+'''
+
+def make_scheduler(**kwargs) -> FeedScheduler:
+    """ジッター無しのスケジューラー"""
+    return FeedScheduler(sqlite3.connect(':memory:'), jitter=0, initial_spread=0, **kwargs)
+
+def test_parse_feed_date():
+    """RFC 822 と ISO 8601 の両方を読む"""
+    assert parse_feed_date('Mon, 01 Jan 2024 00:00:00 GMT') == 1704067200
+    assert parse_feed_date('2024-01-01T00:00:00Z') == 1704067200
+    assert parse_feed_date('not a date') is None
+
+def test_extract_feed_timing_reads_channel_only():
+    """チャンネルの ttl・更新周期・最終更新日時を読み、エントリの日付は使わない"""
+    timing = extract_feed_timing(RSS)
+    assert timing == {
+        'ttl_seconds': 3600,
+        'declared_interval': DAY,
+        'last_updated': parse_feed_date('Mon, 01 Jan 2024 05:00:00 GMT'),
+    }
+    assert extract_feed_timing(b'<not xml') == {}
+
+def test_new_feeds_are_due_and_persisted_times_are_respected():
+    """初めてのフィードは取得対象になり、保存した次回時刻までは取得しない"""
+    scheduler = make_scheduler()
+    assert scheduler.due([URL], now=1000) == [URL]
+
+    next_run_at = scheduler.record_check(URL, changed=True, now=1000)
+    assert scheduler.due([URL], now=next_run_at - 1) == []
+    assert scheduler.due([URL], now=next_run_at) == [URL]
+
+def test_due_normalizes_urls_like_the_fetcher():
+    """カンマ区切りの空白や空の URL は、取得時と同じく除いてから判定する"""
+    scheduler = make_scheduler()
+    urls = 'a, b,'.split(',')
+    assert scheduler.due(urls, now=1000) == ['a', 'b']
+
+    next_run_at = min(scheduler.record_check(url, changed=True, now=1000) for url in ('a', 'b'))
+    assert scheduler.due(urls, now=next_run_at - 1) == []
+    assert scheduler.get('') is None and scheduler.get(' b') is None
+
+def test_learns_daily_cadence():
+    """毎日更新されるフィードは1日間隔に近づく"""
+    scheduler = make_scheduler(default_interval=6 * HOUR)
+    now = 0
+    for _ in range(10):
+        now += DAY
+        scheduler.record_check(URL, changed=True, now=now)
+
+    state = scheduler.get(URL)
+    assert 20 * HOUR < state['interval_seconds'] <= DAY
+    assert state['next_run_at'] > now + 20 * HOUR
+
+def test_declared_interval_and_feed_timestamp():
+    """最初の更新では宣言された周期とフィードの最終更新日時から次回を予測する"""
+    scheduler = make_scheduler()
+    timing = extract_feed_timing(RSS)
+    now = timing['last_updated'] + 2 * HOUR
+
+    next_run_at = scheduler.record_check(URL, changed=True, timing=timing, now=now)
+    assert next_run_at == timing['last_updated'] + DAY
+
+def test_misses_back_off_exponentially():
+    """予測時刻を過ぎても更新が無ければ再確認の間隔を延ばす (間隔の 1/4 まで)"""
+    scheduler = make_scheduler(default_interval=DAY, min_interval=60)
+    scheduler.record_check(URL, changed=True, now=0)
+
+    waits = []
+    now = DAY
+    for _ in range(3):
+        next_run_at = scheduler.record_check(URL, changed=False, now=now)
+        waits.append(next_run_at - now)
+        now = next_run_at
+    assert waits == [0.1 * DAY, 0.2 * DAY, 0.25 * DAY]
+
+def test_early_manual_check_keeps_expected_time():
+    """予測時刻より前の手動チェックでは予測時刻まで待つ"""
+    scheduler = make_scheduler(default_interval=DAY)
+    scheduler.record_check(URL, changed=True, now=0)
+    assert scheduler.record_check(URL, changed=False, now=2 * HOUR) == DAY
+
+def test_errors_back_off():
+    """取得エラーは最小間隔から倍々に待つ"""
+    scheduler = make_scheduler(min_interval=60)
+    scheduler.due([URL], now=0)
+    assert scheduler.record_error(URL, now=0) == 60
+    assert scheduler.record_error(URL, now=0) == 120
+    # 成功すればエラー回数はリセットされる
+    scheduler.record_check(URL, changed=True, now=0)
+    assert scheduler.get(URL)['errors'] == 0
@@ -0,0 +1,154 @@
+"""
+非同期 GitHub クライアントのテスト
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from github_client import DIFF_MEDIA_TYPE, GitHubClient, GitHubError
+from github_scheduler import GitHubRequestScheduler
+
+DIFF = 'diff --git a/app.py b/app.py\n+print("hello")\n'
+
+def make_app(calls: list, delay: float = 0.0) -> web.Application:
+    """GitHub API のスタブ"""
+
+    async def pull(request):
+        accept = request.headers['Accept']
+        calls.append(('pull', accept, request.headers.get('If-None-Match')))
+        await asyncio.sleep(delay)
+        etag = '"diff-1"' if accept == DIFF_MEDIA_TYPE else '"pull-1"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        if accept == DIFF_MEDIA_TYPE:
+            return web.Response(text=DIFF, headers={'ETag': etag})
+        return web.json_response({
+            'number': 7, 'title': 'Add greeting', 'body': None, 'changed_files': 3,
+            'additions': 3, 'deletions': 0, 'user': {'login': 'octocat'},
+            'html_url': 'https://github.com/o/r/pull/7', 'head': {'sha': 'abc123'},
+        }, headers={'ETag': etag})
+
+    async def files(request):
+        page = int(request.query.get('page', '1'))
+        calls.append(('files', page, request.headers.get('Authorization')))
+        await asyncio.sleep(delay)
+        headers = {}
+        if page == 1:
+            headers['Link'] = f'<{request.url.with_query(per_page=2, page=2)}>; rel="next"'
+        names = ['a.py', 'b.py'] if page == 1 else ['c.py']
+        return web.json_response([
+            {'filename': name, 'status': 'modified', 'additions': 1, 'deletions': 0, 'changes': 1, 'patch': '+x'}
+            for name in names
+        ], headers=headers)
+
+    async def reviews(request):
+        payload = await request.json()
+        calls.append(('review', payload))
+        if any(c['path'] == 'stale.py' for c in payload.get('comments', [])):
+            return web.json_response({'message': 'Unprocessable Entity'}, status=422)
+        return web.json_response({'id': 1})
+
+    async def missing(request):
+        return web.json_response({'message': 'Not Found'}, status=404)
+
+    app = web.Application()
+    app.router.add_get('/repos/o/r/pulls/7', pull)
+    app.router.add_get('/repos/o/r/pulls/7/files', files)
+    app.router.add_post('/repos/o/r/pulls/7/reviews', reviews)
+    app.router.add_get('/repos/o/r/pulls/8', missing)
+    return app
+
+@pytest.mark.asyncio
+async def test_context_fetches_in_parallel_once_per_review():
+    """メタデータ・差分・ファイル一覧を並列に1回だけ取得し、レビュー作成で PR を取り直さない"""
+    calls = []
+    server = TestServer(make_app(calls, delay=0.2))
+    await server.start_server()
+    client = GitHubClient('secret', 'o', 'r', api_url=str(server.make_url('')))
+    try:
+        pr = client.open_pull_request(7)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        pull, diff, files = await pr.load()
+        elapsed = loop.time() - started
+
+        assert pull['title'] == 'Add greeting' and diff == DIFF
+        assert [f['filename'] for f in files] == ['a.py', 'b.py', 'c.py']
+        # 直列なら 0.2s x 4 リクエスト、並列なら ページング分の 0.4s 程度
+        assert elapsed < 0.7
+
+        info = await pr.info()
+        assert (info['author'], info['head_sha'], info['body']) == ('octocat', 'abc123', '')
+        await pr.create_review('LGTM')
+        assert [c[0] for c in calls].count('pull') == 2
+        assert calls[-1] == ('review', {'body': 'LGTM', 'event': 'COMMENT', 'commit_id': 'abc123'})
+        assert all(c[2] == 'Bearer secret' for c in calls if c[0] == 'files')
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_etag_revalidation_returns_cached_body():
+    """2回目のレビューは If-None-Match を送り、304 なら保存済みの本文を使う"""
+    calls = []
+    server = TestServer(make_app(calls))
+    await server.start_server()
+    client = GitHubClient('secret', 'o', 'r', api_url=str(server.make_url('')))
+    try:
+        first = await client.get_pr_diff(7)
+        second = await client.get_pr_diff(7)
+        assert first == second == DIFF
+        assert calls == [('pull', DIFF_MEDIA_TYPE, None), ('pull', DIFF_MEDIA_TYPE, '"diff-1"')]
+        # JSON と diff は別々にキャッシュされる
+        assert (await client.get_pull_request(7))['number'] == 7
+        assert client.snapshot()['not_modified'] == 1
+        assert client.snapshot()['etag_entries'] == 2
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_error_status_raises():
+    """4xx は GitHubError として呼び出し側に渡す"""
+    server = TestServer(make_app([]))
+    await server.start_server()
+    client = GitHubClient('secret', 'o', 'r', api_url=str(server.make_url('')))
+    try:
+        with pytest.raises(GitHubError) as excinfo:
+            await client.open_pull_request(8).load()
+        assert excinfo.value.status == 404
+        assert client.snapshot()['errors'] >= 1
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_post_review_falls_back_to_body_when_comments_rejected():
+    """行コメントが 422 で拒否されたら fallback_body だけで送り直す"""
+    calls = []
+    server = TestServer(make_app(calls))
+    await server.start_server()
+    client = GitHubClient('secret', 'o', 'r', api_url=str(server.make_url('')),
+                          scheduler=GitHubRequestScheduler(mutation_interval=0))
+    try:
+        pr = client.open_pull_request(7)
+        comment = {'path': 'app.py', 'line': 1, 'side': 'RIGHT', 'body': '💡 x'}
+        await pr.post_review({'body': 'ok', 'comments': [comment], 'fallback_body': 'all'})
+        assert calls[-1][1]['comments'] == [comment]
+
+        stale = {**comment, 'path': 'stale.py'}
+        await pr.post_review({'body': 'ok', 'comments': [stale], 'fallback_body': 'all'})
+        reviews = [c[1] for c in calls if c[0] == 'review']
+        assert reviews[-2]['comments'] == [stale]
+        assert reviews[-1] == {'body': 'all', 'event': 'COMMENT', 'commit_id': 'abc123'}
+    finally:
+        await client.close()
+        await server.close()
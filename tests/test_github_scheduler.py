@@ -0,0 +1,136 @@
+"""
+GitHub API のレート制限スケジューラーのテスト
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from github_client import GitHubClient, GitHubError
+from github_scheduler import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, GitHubRequestScheduler, RateLimitExceeded, resource_for, token_key
+)
+
+def rate_headers(remaining: int, reset_in: float, limit: int = 100) -> dict:
+    """X-RateLimit-* ヘッダー"""
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset': str(time.time() + reset_in),
+        'X-RateLimit-Used': str(limit - remaining),
+        'X-RateLimit-Resource': 'core',
+    }
+
+def test_update_records_budget_and_secondary_limit():
+    """ヘッダーの残りを記録し、二次レート制限ではトークン全体を止める (トークンはメトリクスに出さない)"""
+    scheduler = GitHubRequestScheduler()
+    assert scheduler.update('t', 200, rate_headers(40, 600)) is None
+    snapshot = scheduler.snapshot('t')
+    assert 't' not in snapshot['tokens'] and token_key('t') in snapshot['tokens']
+    core = snapshot['tokens'][token_key('t')]['resources']['core']
+    assert (core['limit'], core['remaining'], core['used']) == (100, 40, 60)
+
+    wait = scheduler.update('t', 403, {'retry-after': '30'}, 'You have exceeded a secondary rate limit')
+    assert wait == 30
+    assert scheduler.delay('t', PRIORITY_INTERACTIVE)[1] == 'secondary'
+    assert scheduler.snapshot()['secondary_limited'] == 1
+    # 権限不足の 403 はレート制限ではない
+    assert scheduler.update('t', 403, {}, 'Resource not accessible by integration') is None
+    assert resource_for('search/issues') == 'search' and resource_for('repos/o/r/pulls') == 'core'
+
+def test_background_keeps_reserve_for_interactive():
+    """残りが予約分以下ならバックグラウンドはリセットまで待ち、対話的なリクエストは出せる"""
+    scheduler = GitHubRequestScheduler(reserve_ratio=0.05, reset_margin=0)
+    scheduler.update('t', 200, rate_headers(5, 120))
+    wait, reason = scheduler.delay('t', PRIORITY_BACKGROUND)
+    assert reason == 'primary' and 119 < wait <= 120
+    assert scheduler.delay('t', PRIORITY_INTERACTIVE) == (0.0, '')
+
+    scheduler.update('t', 200, rate_headers(0, 120))
+    assert scheduler.delay('t', PRIORITY_INTERACTIVE)[1] == 'primary'
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire_sync('t', PRIORITY_INTERACTIVE, max_wait=10)
+    assert scheduler.snapshot()['rejected'] == 1
+
+@pytest.mark.asyncio
+async def test_low_budget_spreads_background_requests():
+    """残りが少なくなったらバックグラウンドのリクエストをリセットまでの時間に散らす"""
+    scheduler = GitHubRequestScheduler(reserve_ratio=0, pace_ratio=0.2)
+    scheduler.update('t', 200, rate_headers(10, 1.0))
+    started = time.monotonic()
+    for _ in range(3):
+        await scheduler.acquire('t', PRIORITY_BACKGROUND)
+        scheduler.release('t')
+    # 1秒に残り10回なので約 0.1 秒間隔
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.snapshot()['delayed'] >= 2
+
+@pytest.mark.asyncio
+async def test_interactive_requests_jump_the_queue():
+    """同時実行の上限で待っている間に来た対話的なリクエストが先に出る"""
+    scheduler = GitHubRequestScheduler(max_concurrency=1)
+    order = []
+    await scheduler.acquire('t')
+
+    async def call(name, priority):
+        await scheduler.acquire('t', priority)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        scheduler.release('t')
+
+    tasks = [asyncio.create_task(call('background-1', PRIORITY_BACKGROUND)),
+             asyncio.create_task(call('background-2', PRIORITY_BACKGROUND))]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(call('interactive', PRIORITY_INTERACTIVE)))
+    await asyncio.sleep(0.01)
+    queued = scheduler.snapshot('t')['tokens'][token_key('t')]['queued']
+    assert queued == {'interactive': 1, 'background': 2}
+
+    scheduler.release('t')
+    await asyncio.gather(*tasks)
+    assert order == ['interactive', 'background-1', 'background-2']
+
+@pytest.mark.asyncio
+async def test_client_retries_after_secondary_limit():
+    """二次レート制限の 403 は retry-after だけ待って再試行し、待ちが長すぎればエラーにする"""
+    calls = []
+
+    async def pull(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return web.json_response({'message': 'You have exceeded a secondary rate limit'},
+                                     status=403, headers={'Retry-After': '0.2'})
+        if request.match_info['number'] == '9':
+            return web.json_response({'message': 'API rate limit exceeded'}, status=403,
+                                     headers=rate_headers(0, 3600))
+        return web.json_response({'number': 7}, headers=rate_headers(99, 3600))
+
+    app = web.Application()
+    app.router.add_get('/repos/o/r/pulls/{number}', pull)
+    server = TestServer(app)
+    await server.start_server()
+    scheduler = GitHubRequestScheduler()
+    client = GitHubClient('secret', 'o', 'r', api_url=str(server.make_url('')), scheduler=scheduler,
+                          max_rate_limit_wait=60)
+    try:
+        assert (await client.get_pull_request(7))['number'] == 7
+        assert len(calls) == 2 and calls[1] - calls[0] >= 0.2
+        assert client.snapshot()['rate_limited'] == 1
+
+        # 一次レート制限に達したら、リセットまで待たずにエラーにする
+        with pytest.raises(GitHubError) as error:
+            await client.get_pull_request(9)
+        assert error.value.status == 429 and error.value.retry_after > 3000
+        assert scheduler.snapshot()['primary_limited'] == 1
+        assert client.snapshot()['rate_limit']['tokens'][token_key('secret')]['pause_reason'] == 'primary'
+    finally:
+        await client.close()
+        await server.close()
@@ -0,0 +1,124 @@
+"""
+論文バックフィルのテスト
+"""
+
+import io
+import json
+import os
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from paper_backfill import PaperBackfill, iter_jsonl_records, iter_oai_records, normalize_arxiv_id
+from paper_search import PaperSearchIndex
+
+OAI_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">
+  <ListRecords>
+    <record>
+      <header><identifier>oai:arXiv.org:2401.00001</identifier></header>
+      <metadata>
+        <arXiv xmlns="http://arxiv.org/OAI/arXiv/">
+          <id>2401.00001</id>
+          <created>2024-01-01</created>
+          <authors>
+            <author><keyname>Doe</keyname><forenames>Jane</forenames></author>
+            <author><keyname>Smith</keyname><forenames>John</forenames></author>
+          </authors>
+          <title>Diffusion models
+            for audio</title>
+          <abstract>  We study sound generation.  </abstract>
+        </arXiv>
+      </metadata>
+    </record>
+    <record>
+      <header status="deleted"><identifier>oai:arXiv.org:2401.00002</identifier></header>
+    </record>
+    <record>
+      <header><identifier>oai:arXiv.org:hep-th/9901001</identifier></header>
+      <metadata>
+        <oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/"
+                   xmlns:dc="http://purl.org/dc/elements/1.1/">
+          <dc:title>String dualities</dc:title>
+          <dc:creator>Witten, Edward</dc:creator>
+          <dc:description>Dualities in string theory.</dc:description>
+          <dc:date>1999-01-01</dc:date>
+        </oai_dc:dc>
+      </metadata>
+    </record>
+  </ListRecords>
+</OAI-PMH>
+'''
+
+def make_jsonl(records) -> io.BytesIO:
+    """JSON Lines のストリームを作成"""
+    return io.BytesIO(b''.join(json.dumps(r).encode('utf-8') + b'\n' for r in records))
+
+def test_normalize_arxiv_id():
+    """識別子の接頭辞とバージョンを除去する"""
+    assert normalize_arxiv_id('oai:arXiv.org:2401.01234') == '2401.01234'
+    assert normalize_arxiv_id('2401.01234v3') == '2401.01234'
+    assert normalize_arxiv_id('hep-th/9901001v2') == 'hep-th/9901001'
+
+def test_iter_jsonl_records():
+    """スナップショット形式の行を読む"""
+    stream = make_jsonl([
+        {'id': '0704.0001', 'title': 'Calculation of\n  prompt diphoton', 'authors': 'C. Balazs, E. L. Berger',
+         'abstract': ' A fully differential calculation. ', 'update_date': '2008-11-13',
+         'versions': [{'version': 'v1', 'created': 'Mon, 2 Apr 2007 19:18:42 GMT'}]},
+        {'id': '0704.0002', 'title': '', 'abstract': 'no title'},
+        {'id': '0704.0003', 'title': 'No versions', 'abstract': 'x', 'update_date': '2008-01-01'},
+    ])
+    rows = list(iter_jsonl_records(stream))
+    assert rows == [
+        ('0704.0001', 'Calculation of prompt diphoton', 'C. Balazs, E. L. Berger',
+         'A fully differential calculation.', 'Mon, 2 Apr 2007 19:18:42 GMT'),
+        ('0704.0003', 'No versions', 'Unknown', 'x', '2008-01-01'),
+    ]
+
+def test_iter_oai_records():
+    """arXiv 形式と oai_dc 形式の両方を読み、削除済みレコードは飛ばす"""
+    rows = list(iter_oai_records(io.BytesIO(OAI_XML)))
+    assert rows == [
+        ('2401.00001', 'Diffusion models for audio', 'Jane Doe, John Smith',
+         'We study sound generation.', '2024-01-01'),
+        ('hep-th/9901001', 'String dualities', 'Edward Witten',
+         'Dualities in string theory.', '1999-01-01'),
+    ]
+
+class TestPaperBackfill:
+    """PaperBackfill のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:")
+        self.search_index = PaperSearchIndex(self.db.conn)
+        self.db.save_paper({'arxiv_id': '2401.00001', 'title': 'Existing paper', 'authors': 'A',
+                            'abstract': 'Already here', 'published_date': '2024-01-01', 'summary': 'S'})
+
+    def test_load_skips_existing_and_leaves_summary_empty(self):
+        """既存の ID は上書きせず、要約は空のまま投入する"""
+        progress = []
+        backfill = PaperBackfill(self.db.conn, batch_size=1, search_index=self.search_index,
+                                 progress=lambda *args: progress.append(args))
+        stats = backfill.load(iter_oai_records(io.BytesIO(OAI_XML)))
+
+        assert (stats['seen'], stats['inserted'], stats['skipped']) == (2, 1, 1)
+        assert len(progress) == 2
+        rows = self.db.conn.execute('SELECT arxiv_id, title, summary FROM papers ORDER BY id').fetchall()
+        assert rows == [('2401.00001', 'Existing paper', 'S'), ('hep-th/9901001', 'String dualities', None)]
+
+    def test_batch_indexing_keeps_search_in_sync(self):
+        """バッチ単位の索引でも全文検索でき、後続の挿入トリガーも戻っている"""
+        PaperBackfill(self.db.conn, batch_size=2, search_index=self.search_index).load(
+            iter_oai_records(io.BytesIO(OAI_XML))
+        )
+        assert [r['arxiv_id'] for r in self.search_index.search('dualities')] == ['hep-th/9901001']
+
+        self.db.save_paper({'arxiv_id': '2401.00009', 'title': 'Dualities again', 'authors': 'B',
+                            'abstract': 'More', 'published_date': '2024-01-02', 'summary': ''})
+        assert self.search_index.count('dualities') == 2
+        self.db.conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('integrity-check')")
@@ -0,0 +1,175 @@
+"""
+論文ワークキューのテスト
+"""
+
+import os
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from paper_queue import PaperQueue
+
+def make_paper(arxiv_id: str) -> dict:
+    """テスト用の論文データ"""
+    return {
+        'arxiv_id': arxiv_id,
+        'title': f'Paper {arxiv_id}',
+        'authors': 'Test Author',
+        'abstract': 'Test abstract',
+        'published_date': '2024-01-01',
+    }
+
+class TestPaperQueue:
+    """PaperQueue のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:")
+        self.queue = PaperQueue(self.db, max_attempts=2)
+
+    def test_enqueue_ignores_duplicates(self):
+        """同じ ID は二重に追加されない"""
+        assert self.queue.enqueue([make_paper('2401.00001'), make_paper('2401.00002')]) == 2
+        assert self.queue.enqueue([make_paper('2401.00001')]) == 0
+        assert self.queue.get_stats()[PaperQueue.DISCOVERED]['depth'] == 2
+
+    def test_state_transitions(self):
+        """discovered → summarized → posted"""
+        self.queue.enqueue([make_paper('2401.00001')])
+
+        paper = self.queue.fetch(PaperQueue.DISCOVERED)[0]
+        paper['summary'] = 'summary'
+        self.queue.mark_summarized(paper)
+
+        # 要約時点で papers に保存されている
+        assert self.db.is_paper_processed('2401.00001')
+        summarized = self.queue.fetch(PaperQueue.SUMMARIZED)
+        assert summarized[0]['summary'] == 'summary'
+
+        self.queue.mark_posted('2401.00001')
+        stats = self.queue.get_stats()
+        assert stats[PaperQueue.POSTED]['depth'] == 1
+        assert stats[PaperQueue.SUMMARIZED]['depth'] == 0
+
+        # 投稿済みの本文はキューに残さず papers から読む
+        row = self.db.conn.execute('SELECT abstract, summary FROM paper_queue').fetchone()
+        assert row == ('', None)
+        assert self.db.get_papers(['2401.00001'])['2401.00001']['summary'] == 'summary'
+
+    def test_resume_after_restart(self, tmp_path):
+        """再起動後も未投稿の論文が残っている"""
+        db_path = str(tmp_path / "papers.db")
+        db = PaperDatabase(db_path)
+        queue = PaperQueue(db)
+        queue.enqueue([make_paper('2401.00001')])
+        paper = queue.fetch(PaperQueue.DISCOVERED)[0]
+        paper['summary'] = 'summary'
+        queue.mark_summarized(paper)
+        db.close()
+
+        restarted = PaperQueue(PaperDatabase(db_path))
+        pending = restarted.fetch(PaperQueue.SUMMARIZED)
+        assert [p['arxiv_id'] for p in pending] == ['2401.00001']
+
+    def test_record_failure_gives_up_after_max_attempts(self):
+        """試行回数の上限で failed になる"""
+        self.queue.enqueue([make_paper('2401.00001')])
+
+        assert self.queue.record_failure('2401.00001', 'error') is True
+        assert self.queue.record_failure('2401.00001', 'error') is False
+        assert self.queue.get_stats()[PaperQueue.FAILED]['depth'] == 1
+        assert self.queue.fetch(PaperQueue.DISCOVERED) == []
+
+    def test_skipped_papers_can_be_requeued(self):
+        """除外した論文は要約待ちに戻せ、再び判定されない"""
+        self.queue.enqueue([make_paper('2401.00001'), make_paper('2401.00002')])
+        assert len(self.queue.fetch_unscored()) == 2
+
+        self.queue.record_relevance({'2401.00001': 0.9, '2401.00002': 0.1}, skipped=['2401.00002'])
+        assert self.queue.fetch_unscored() == []
+        assert [p['arxiv_id'] for p in self.queue.fetch(PaperQueue.DISCOVERED)] == ['2401.00001']
+        assert self.queue.fetch_skipped()[0]['relevance_score'] == 0.1
+
+        assert self.queue.requeue_skipped('2401.00002')
+        assert not self.queue.requeue_skipped('2401.00002')
+        assert self.queue.fetch_unscored() == []
+        assert self.queue.get_stats()[PaperQueue.DISCOVERED]['depth'] == 2
+
+    def test_summarized_paper_is_added_to_outbox(self):
+        """要約の保存と同時に投稿予定が入り、投稿でメッセージ ID が記録される"""
+        self.queue.enqueue([make_paper('2401.00001')])
+        paper = self.queue.fetch(PaperQueue.DISCOVERED)[0]
+        paper['summary'] = 'summary'
+        self.queue.mark_summarized(paper)
+
+        posts = self.queue.fetch_posts()
+        assert [p['arxiv_id'] for p in posts] == ['2401.00001']
+        assert posts[0]['summary'] == 'summary' and posts[0]['post_attempts'] == 0
+
+        self.queue.mark_posted('2401.00001', 1234)
+        assert self.queue.fetch_posts() == []
+        assert self.db.get_arxiv_id_by_message(1234) == '2401.00001'
+        assert self.queue.outbox.get_stats()['sent_in_window'] == 1
+
+    def test_streamed_paper_skips_outbox(self):
+        """投稿済みのメッセージがあれば投稿済みとして保存し、アウトボックスには入れない"""
+        self.queue.enqueue([make_paper('2401.00001')])
+        paper = self.queue.fetch(PaperQueue.DISCOVERED)[0]
+        paper['summary'] = 'summary'
+        self.queue.mark_summarized(paper, message_id=99)
+
+        assert self.queue.fetch_posts() == []
+        assert self.queue.get_stats()[PaperQueue.POSTED]['depth'] == 1
+        assert self.db.get_arxiv_id_by_message(99) == '2401.00001'
+
+    def test_failed_save_leaves_no_outbox_row(self):
+        """papers への保存に失敗したら投稿予定も残らない"""
+        self.queue.enqueue([make_paper('2401.00001')])
+        paper = self.queue.fetch(PaperQueue.DISCOVERED)[0]
+        del paper['summary']
+        try:
+            self.queue.mark_summarized(paper)
+        except KeyError:
+            pass
+
+        assert self.queue.fetch_posts() == []
+        assert self.queue.outbox.get_stats()['pending'] == 0
+
+    def test_existing_summarized_rows_are_migrated(self, tmp_path):
+        """アウトボックス導入前の投稿待ちは起動時に投稿予定へ移される"""
+        db = PaperDatabase(str(tmp_path / "papers.db"))
+        queue = PaperQueue(db)
+        queue.enqueue([make_paper('2401.00001')])
+        queue._set_state('2401.00001', PaperQueue.SUMMARIZED, summary='summary')
+        db.conn.execute('DELETE FROM post_outbox')
+        db.conn.commit()
+
+        restarted = PaperQueue(db)
+        assert [p['arxiv_id'] for p in restarted.fetch_posts()] == ['2401.00001']
+
+    def test_existing_posted_rows_drop_text(self, tmp_path):
+        """本文を残したまま投稿済みになっていた行は起動時に本文を消す"""
+        db = PaperDatabase(str(tmp_path / "papers.db"))
+        queue = PaperQueue(db)
+        queue.enqueue([make_paper('2401.00001'), make_paper('2401.00002')])
+        db.conn.execute("UPDATE paper_queue SET state = ?, summary = 'summary' WHERE arxiv_id = '2401.00001'",
+                        (PaperQueue.POSTED,))
+        db.conn.commit()
+
+        PaperQueue(db)
+        rows = db.conn.execute('SELECT arxiv_id, abstract, summary FROM paper_queue ORDER BY arxiv_id').fetchall()
+        assert rows == [('2401.00001', '', None), ('2401.00002', 'Test abstract', None)]
+
+    def test_post_failure_marks_failed_after_max_attempts(self):
+        """投稿の再試行が尽きたら failed になる"""
+        self.queue.enqueue([make_paper('2401.00001')])
+        paper = self.queue.fetch(PaperQueue.DISCOVERED)[0]
+        paper['summary'] = 'summary'
+        self.queue.mark_summarized(paper)
+
+        assert self.queue.record_post_failure('2401.00001', 'HTTP 400', permanent=True) is False
+        assert self.queue.get_stats()[PaperQueue.FAILED]['depth'] == 1
+        assert self.queue.fetch_posts() == []
@@ -0,0 +1,66 @@
+"""
+論文全文検索インデックスのテスト
+"""
+
+import os
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from paper_search import PaperSearchIndex
+
+def make_paper(arxiv_id: str, title: str, abstract: str) -> dict:
+    """テスト用の論文データ"""
+    return {
+        'arxiv_id': arxiv_id,
+        'title': title,
+        'authors': 'Test Author',
+        'abstract': abstract,
+        'published_date': '2024-01-01',
+        'summary': ''
+    }
+
+class TestPaperSearchIndex:
+    """PaperSearchIndex のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:")
+        self.index = PaperSearchIndex(self.db.conn)
+        self.db.save_paper(make_paper('2401.00001', 'Diffusion models for audio', 'We study sound generation.'))
+        self.db.save_paper(make_paper('2401.00002', 'Efficient transformers', 'Attention with diffusion of tokens.'))
+        self.db.save_paper(make_paper('2401.00003', 'Graph neural networks', 'Message passing.'))
+
+    def test_search_ranks_title_matches_first(self):
+        """タイトルに一致する論文が上位になる"""
+        results = self.index.search('diffusion')
+        assert [r['arxiv_id'] for r in results] == ['2401.00001', '2401.00002']
+        assert self.index.count('diffusion') == 2
+
+    def test_pagination(self):
+        """limit / offset でページングできる"""
+        assert [r['arxiv_id'] for r in self.index.search('diffusion', limit=1, offset=1)] == ['2401.00002']
+
+    def test_triggers_keep_index_in_sync(self):
+        """papers の更新・削除がインデックスに反映される"""
+        self.db.conn.execute("UPDATE papers SET summary = 'quantum' WHERE arxiv_id = '2401.00003'")
+        assert [r['arxiv_id'] for r in self.index.search('quantum')] == ['2401.00003']
+
+        self.db.conn.execute("DELETE FROM papers WHERE arxiv_id = '2401.00003'")
+        assert self.index.search('quantum') == []
+
+    def test_query_syntax_is_escaped(self):
+        """FTS5 の構文文字を含む入力でもエラーにならない"""
+        assert self.index.search('diffusion" (') != []
+        assert self.index.search('***') == []
+
+    def test_existing_rows_are_indexed_on_first_open(self, tmp_path):
+        """インデックス作成前に保存された論文も検索できる"""
+        db = PaperDatabase(str(tmp_path / "papers.db"))
+        db.save_paper(make_paper('2401.00004', 'Reinforcement learning', 'Policy gradients.'))
+
+        index = PaperSearchIndex(db.conn)
+        assert index.count('policy') == 1
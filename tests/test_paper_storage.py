@@ -0,0 +1,166 @@
+"""
+論文本文の圧縮保存と著者テーブルのテスト
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from paper_search import PaperSearchIndex
+from paper_storage import TextCodec, split_authors, train_zlib_dictionary
+
+ABSTRACT = ('We propose a diffusion model for audio generation that uses a transformer backbone '
+            'and a latent representation learned with contrastive self supervised training. ')
+
+def make_paper(arxiv_id: str, authors: str = 'Jane Doe, John Smith', abstract: str = ABSTRACT * 3) -> dict:
+    """テスト用の論文データ"""
+    return {
+        'arxiv_id': arxiv_id,
+        'title': f'Paper {arxiv_id}',
+        'authors': authors,
+        'abstract': abstract,
+        'published_date': '2024-01-01',
+        'summary': '🔬 **研究概要**: 拡散モデルによる音声生成 ' * 5,
+    }
+
+def test_split_authors():
+    """カンマ区切りの著者を名前にし、空白と Unknown を除く"""
+    assert split_authors(' Jane  Doe,John Smith , ') == ['Jane Doe', 'John Smith']
+    assert split_authors('Unknown') == []
+    assert split_authors(None) == []
+
+def test_zlib_dictionary_improves_compression():
+    """共有辞書があると短い文書でもよく縮む"""
+    samples = [f'{ABSTRACT} sample {i}' for i in range(50)]
+    plain = TextCodec('zlib')
+    with_dict = TextCodec('zlib')
+    with_dict.add_dictionary(1, 'zlib', train_zlib_dictionary(samples))
+
+    text = ABSTRACT + 'A new sentence.'
+    encoded = with_dict.encode(text)
+    assert isinstance(encoded, bytes)
+    assert len(encoded) < len(plain.encode(text)) < len(text.encode('utf-8'))
+    assert with_dict.decode(encoded) == text
+    # 短い文字列と None はそのまま
+    assert with_dict.encode('short') == 'short'
+    assert with_dict.encode(None) is None
+
+def test_decode_without_dictionary_fails():
+    """辞書が無ければ展開できない (黙って壊れた文字列を返さない)"""
+    codec = TextCodec('zlib')
+    codec.add_dictionary(7, 'zlib', train_zlib_dictionary([ABSTRACT] * 3))
+    with pytest.raises(ValueError):
+        TextCodec().decode(codec.encode(ABSTRACT))
+
+class TestPaperStorage:
+    """PaperDatabase と PaperStorage の連携のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:", compression='zlib')
+        self.search_index = PaperSearchIndex(self.db.conn)
+
+    def test_compressed_rows_round_trip_and_stay_searchable(self):
+        """圧縮して保存しても読み出し・全文検索・スニペットは元の文字列"""
+        paper = make_paper('2401.00001')
+        self.db.save_paper(paper)
+
+        typeof = self.db.conn.execute('SELECT typeof(abstract), typeof(summary) FROM papers').fetchone()
+        assert typeof == ('blob', 'blob')
+        stored = self.db.get_papers(['2401.00001'])['2401.00001']
+        assert (stored['abstract'], stored['summary']) == (paper['abstract'], paper['summary'])
+
+        results = self.search_index.search('contrastive')
+        assert [r['arxiv_id'] for r in results] == ['2401.00001']
+        assert '**contrastive**' in results[0]['snippet']
+        self.db.conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('integrity-check')")
+
+    def test_papers_by_author_uses_normalized_table(self):
+        """フルネームでも姓でも、大文字小文字を問わず引ける"""
+        self.db.save_paper(make_paper('2401.00001', authors='Jane Doe, John Smith'))
+        self.db.save_paper(make_paper('2401.00002', authors='Alice Smith'))
+        self.db.save_paper(make_paper('2401.00003', authors='Bob Jones'))
+
+        assert [p['arxiv_id'] for p in self.db.get_papers_by_author('smith')] == ['2401.00002', '2401.00001']
+        assert [p['arxiv_id'] for p in self.db.get_papers_by_author('jane  doe')] == ['2401.00001']
+        plan = self.db.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM authors WHERE name = ? OR last_name = ?', ('x', 'x')
+        ).fetchall()
+        assert all('SCAN' not in row[-1] for row in plan)
+
+    def test_migrate_existing_database(self, tmp_path):
+        """TEXT のままの既存 DB を変換し、辞書・著者・検索が揃う"""
+        db_path = str(tmp_path / 'papers.db')
+        # 圧縮も著者テーブルも無い頃の DB を再現する
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE papers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, arxiv_id TEXT UNIQUE NOT NULL, title TEXT NOT NULL,
+                authors TEXT NOT NULL, abstract TEXT NOT NULL, published_date TEXT NOT NULL, summary TEXT,
+                discord_message_id TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE papers_fts USING fts5(
+                title, authors, abstract, summary, content='papers', content_rowid='id'
+            )
+        ''')
+        for i in range(20):
+            p = make_paper(f'2401.{i:05d}', abstract=f'{ABSTRACT * 2} variant {i}')
+            conn.execute('''
+                INSERT INTO papers (arxiv_id, title, authors, abstract, published_date, summary)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (p['arxiv_id'], p['title'], p['authors'], p['abstract'], p['published_date'], p['summary']))
+        conn.commit()
+        conn.close()
+
+        db = PaperDatabase(db_path, compression='zlib')
+        search_index = PaperSearchIndex(db.conn)
+        before = db.storage.size_report(author='Jane Doe', repeat=1)
+        dict_id = db.storage.train()
+        stats = db.storage.migrate(batch_size=7, pause=0)
+        after = db.storage.size_report(author='Jane Doe', repeat=1)
+
+        assert (stats['converted'], stats['authors_indexed'], stats['batches']) == (20, 20, 3)
+        assert (before['compressed_rows'], after['compressed_rows']) == (0, 20)
+        assert after['abstract_bytes'] < before['abstract_bytes'] / 3
+        assert db.conn.execute('SELECT COUNT(*) FROM paper_authors').fetchone()[0] == 40
+        assert db.get_papers(['2401.00005'])['2401.00005']['abstract'].endswith('variant 5')
+        assert search_index.count('variant') == 20
+
+        # 2回目は何も変換しない
+        assert db.storage.migrate(pause=0)['converted'] == 0
+        db.close()
+
+        # 再起動後も保存済みの辞書で読める
+        reopened = PaperDatabase(db_path)
+        assert reopened.storage.codec.dictionaries.keys() == {dict_id}
+        assert reopened.get_papers(['2401.00019'])['2401.00019']['abstract'].endswith('variant 19')
+        reopened.close()
+
+    def test_connection_reads_rows_migrated_by_another_process(self, tmp_path):
+        """別の接続で学習された辞書も、起動済みの接続で読み出し・更新できる"""
+        db_path = str(tmp_path / 'papers.db')
+        live = PaperDatabase(db_path)
+        search_index = PaperSearchIndex(live.conn)
+        for i in range(5):
+            live.save_paper(make_paper(f'2401.{i:05d}'))
+
+        migrator = PaperDatabase(db_path, compression='zlib')
+        migrator.storage.train()
+        assert migrator.storage.migrate(pause=0)['converted'] == 5
+        migrator.close()
+
+        assert live.get_papers(['2401.00001'])['2401.00001']['abstract'] == ABSTRACT * 3
+        # FTS の更新トリガーは古い値を paper_text() で展開する
+        live.conn.execute("UPDATE papers SET summary = 'updated' WHERE arxiv_id = '2401.00002'")
+        live.conn.commit()
+        assert [r['arxiv_id'] for r in search_index.search('updated')] == ['2401.00002']
+        live.close()
@@ -4,15 +4,19 @@
 
 import pytest
 import asyncio
+import json
 import os
 import sys
 from unittest.mock import Mock, patch, AsyncMock
+import httpx
+import openai
 
 # テスト用にパスを追加
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
 
-from bots.paper_summarizer.bot import PaperSummarizer, PaperDatabase
+from bots.paper_summarizer.bot import PaperSummarizer, PaperDatabase, extract_arxiv_id
+from summary_cache import SummaryCache
 
 class TestPaperDatabase:
     """PaperDatabase のテスト"""
@@ -49,6 +53,46 @@ class TestPaperDatabase:
         # 保存された論文が処理済みとして認識されることを確認
         result = self.db.is_paper_processed("2024.01001")
         assert result is True
+    
+    def test_filter_unprocessed(self):
+        """未処理 ID の一括判定"""
+        for arxiv_id in ['2401.00001', '2401.00003']:
+            self.db.save_paper({
+                'arxiv_id': arxiv_id,
+                'title': 'Test Paper',
+                'authors': 'Test Author',
+                'abstract': 'Test abstract',
+                'published_date': '2024-01-01',
+                'summary': ''
+            })
+        
+        ids = ['2401.00001', '2401.00002', '2401.00003', '2401.00004', '2401.00002']
+        assert self.db.filter_unprocessed(ids) == ['2401.00002', '2401.00004']
+    
+    def test_filter_unprocessed_sees_rows_written_elsewhere(self, tmp_path):
+        """インメモリセットに無い行も DB から検出される"""
+        db_path = str(tmp_path / "papers.db")
+        db = PaperDatabase(db_path)
+        other = PaperDatabase(db_path)
+        other.save_paper({
+            'arxiv_id': '2401.00001',
+            'title': 'Test Paper',
+            'authors': 'Test Author',
+            'abstract': 'Test abstract',
+            'published_date': '2024-01-01',
+            'summary': ''
+        })
+        
+        ids = [f'2401.{i:05d}' for i in range(1, 2001)]
+        unseen = db.filter_unprocessed(ids)
+        assert len(unseen) == 1999
+        assert '2401.00001' in db.known_ids
+
+def test_extract_arxiv_id():
+    """エントリ ID からの arXiv ID 抽出"""
+    assert extract_arxiv_id("http://arxiv.org/abs/2401.01234v2") == "2401.01234"
+    assert extract_arxiv_id("oai:arXiv.org:2401.01234v1") == "2401.01234"
+    assert extract_arxiv_id("2401.01234") == "2401.01234"
 
 class TestPaperSummarizer:
     """PaperSummarizer のテスト"""
@@ -58,17 +102,17 @@ class TestPaperSummarizer:
         self.summarizer = PaperSummarizer("test-api-key")
     
     @pytest.mark.asyncio
-    @patch('openai.OpenAI')
-    async def test_summarize_paper(self, mock_openai):
+    async def test_summarize_paper(self):
         """論文要約のテスト"""
         # OpenAI API のモックレスポンス
         mock_response = Mock()
         mock_response.choices = [Mock()]
         mock_response.choices[0].message.content = "🔬 **研究概要**: テスト要約"
+        mock_response.usage = None
         
         mock_client = Mock()
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai.return_value = mock_client
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+        self.summarizer.client = mock_client
         
         # 要約を実行
         result = await self.summarizer.summarize_paper(
@@ -79,12 +123,11 @@ class TestPaperSummarizer:
         assert "🔬 **研究概要**: テスト要約" in result
     
     @pytest.mark.asyncio
-    @patch('openai.OpenAI')
-    async def test_summarize_paper_error(self, mock_openai):
+    async def test_summarize_paper_error(self):
         """API エラー時のテスト"""
         mock_client = Mock()
-        mock_client.chat.completions.create.side_effect = Exception("API Error")
-        mock_openai.return_value = mock_client
+        mock_client.chat.completions.create = AsyncMock(side_effect=Exception("API Error"))
+        self.summarizer.client = mock_client
         
         result = await self.summarizer.summarize_paper(
             "Test Title",
@@ -92,6 +135,135 @@ class TestPaperSummarizer:
         )
         
         assert "要約生成中にエラーが発生しました" in result
+    
+    @pytest.mark.asyncio
+    async def test_generate_summary_retries_after_429(self):
+        """429 応答では retry-after だけ待って再試行する"""
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        rate_limited = openai.RateLimitError(
+            "rate limited",
+            response=httpx.Response(429, headers={"retry-after-ms": "10"}, request=request),
+            body=None
+        )
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "要約"
+        mock_response.usage = None
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=[rate_limited, mock_response])
+        self.summarizer.client = mock_client
+        
+        result = await self.summarizer.generate_summary("Test Title", "Test abstract")
+        
+        assert result == "要約"
+        assert mock_client.chat.completions.create.await_count == 2
+        assert self.summarizer.rate_limiter.stats['rate_limited'] == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_summary_yields_deltas(self):
+        """ストリーミングでは断片を順に返し、完了後にキャッシュする"""
+        def chunk(content):
+            c = Mock()
+            c.choices = [Mock()]
+            c.choices[0].delta.content = content
+            return c
+        
+        async def stream():
+            for content in ["🔬 ", None, "テスト", "要約"]:
+                yield chunk(content)
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create = AsyncMock(return_value=stream())
+        self.summarizer.client = mock_client
+        self.summarizer.cache = SummaryCache(PaperDatabase(":memory:").conn)
+        
+        deltas = [d async for d in self.summarizer.stream_summary("Test Title", "Test abstract")]
+        
+        assert deltas == ["🔬 ", "テスト", "要約"]
+        assert mock_client.chat.completions.create.call_args.kwargs['stream'] is True
+        assert self.summarizer.get_cached_summary("Test Title", "Test abstract") == "🔬 テスト要約"
+
+    @pytest.mark.asyncio
+    async def test_stream_summary_calls_on_start_after_acquiring_slot(self):
+        """on_start (プレースホルダーの投稿) は同時実行数の枠が空いてから呼ばれる"""
+        async def stream():
+            c = Mock()
+            c.choices = [Mock()]
+            c.choices[0].delta.content = "要約"
+            yield c
+        
+        summarizer = PaperSummarizer("test-api-key", max_concurrency=1)
+        summarizer.client = Mock()
+        summarizer.client.chat.completions.create = AsyncMock(side_effect=lambda **kwargs: stream())
+        started = []
+        
+        async def on_start():
+            started.append(True)
+        
+        async def consume():
+            return [d async for d in summarizer.stream_summary("Title", "Abstract", on_start=on_start)]
+        
+        await summarizer.semaphore.acquire()
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.01)
+        assert started == []
+        
+        summarizer.semaphore.release()
+        assert await task == ["要約"]
+        assert started == [True]
+
+class TestBatchSummarization:
+    """バッチ要約モードのテスト"""
+    
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.summarizer = PaperSummarizer("test-api-key")
+        self.papers = [
+            {'arxiv_id': f'2401.0000{i}', 'title': f'Paper {i}', 'abstract': 'Abstract ' * 50}
+            for i in range(1, 6)
+        ]
+    
+    def test_plan_batches_respects_size_and_budget(self):
+        """バッチサイズとトークン予算で分割される"""
+        assert [len(b) for b in self.summarizer.plan_batches(self.papers, 2, 100000)] == [2, 2, 1]
+        
+        # 予算が小さいと1件ずつになる
+        batches = self.summarizer.plan_batches(self.papers, 8, 500)
+        assert [len(b) for b in batches] == [1, 1, 1, 1, 1]
+    
+    def test_parse_batch_response_skips_broken_slots(self):
+        """壊れたスロットは結果に含まれない"""
+        content = json.dumps({"summaries": [
+            {"id": "2401.00001", "summary": "要約1"},
+            {"id": "2401.00002", "summary": ""},
+            {"id": "2401.00003"},
+            "broken",
+        ]})
+        assert self.summarizer.parse_batch_response(content) == {"2401.00001": "要約1"}
+        assert self.summarizer.parse_batch_response("not json") == {}
+    
+    @pytest.mark.asyncio
+    async def test_summarize_batch_retries_missing_slot_individually(self):
+        """バッチ応答に無い論文だけ単独で再試行する"""
+        content = json.dumps({"summaries": [
+            {"id": p['arxiv_id'], "summary": f"要約 {p['arxiv_id']}"} for p in self.papers[:4]
+        ]})
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = content
+        mock_response.usage = None
+        
+        self.summarizer.complete = AsyncMock(return_value=mock_response)
+        self.summarizer.request_summary = AsyncMock(return_value="単独要約")
+        
+        summaries, errors = await self.summarizer.summarize_batch(self.papers, max_batch_size=8)
+        
+        assert errors == {}
+        assert self.summarizer.complete.await_count == 1
+        assert summaries['2401.00001'] == "要約 2401.00001"
+        assert summaries['2401.00005'] == "単独要約"
+        self.summarizer.request_summary.assert_awaited_once_with('Paper 5', self.papers[4]['abstract'])
 
 @pytest.mark.asyncio
 async def test_rss_feed_parsing():
@@ -0,0 +1,201 @@
+"""
+論文ベクトルインデックスのテスト
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from paper_vectors import HashingEmbedder, VectorIndex
+
+PAPERS = [
+    {'arxiv_id': '2401.00001', 'title': 'Diffusion models for audio generation',
+     'abstract': 'We train diffusion models to generate speech and music audio.'},
+    {'arxiv_id': '2401.00002', 'title': 'Latent diffusion for music synthesis',
+     'abstract': 'Diffusion models in latent space generate music audio efficiently.'},
+    {'arxiv_id': '2401.00003', 'title': 'Graph neural networks for molecules',
+     'abstract': 'Message passing networks predict molecular properties.'},
+]
+
+class TestHashingEmbedder:
+    """HashingEmbedder のテスト"""
+
+    def test_transform_is_normalized_and_deterministic(self):
+        """同じテキストは同じ単位ベクトルになる"""
+        embedder = HashingEmbedder(dim=64)
+        a = embedder.transform('diffusion models for audio')
+        b = embedder.transform('diffusion models for audio')
+        assert a.dtype == np.float32
+        assert np.allclose(a, b)
+        assert abs(np.linalg.norm(a) - 1.0) < 1e-5
+
+    def test_empty_text(self):
+        """空のテキストはゼロベクトル"""
+        assert not HashingEmbedder(dim=64).transform('the of and').any()
+
+class TestVectorIndex:
+    """VectorIndex のテスト"""
+
+    def test_related_papers_rank_by_similarity(self, tmp_path):
+        """内容の近い論文が上位になる"""
+        index = VectorIndex(str(tmp_path / 'vectors'))
+        assert index.add_papers(PAPERS) == 3
+
+        results = index.search(index.vector_for('2401.00001'), k=2, exclude=['2401.00001'])
+        assert [arxiv_id for arxiv_id, _ in results] == ['2401.00002', '2401.00003']
+        assert results[0][1] > results[1][1]
+
+    def test_add_papers_ignores_known_ids(self, tmp_path):
+        """登録済みの ID は追記しない"""
+        index = VectorIndex(str(tmp_path / 'vectors'))
+        index.add_papers(PAPERS[:2])
+        assert index.add_papers(PAPERS) == 1
+        assert index.size == 3
+
+    def test_reload_from_disk(self, tmp_path):
+        """保存したインデックスを読み直せる"""
+        prefix = str(tmp_path / 'vectors')
+        index = VectorIndex(prefix)
+        index.add_papers(PAPERS)
+
+        reloaded = VectorIndex(prefix)
+        assert reloaded.ids == index.ids
+        assert reloaded.doc_count == 3
+        assert np.allclose(reloaded.vector_for('2401.00003'), index.vector_for('2401.00003'))
+
+    def test_truncated_ids_are_ignored(self, tmp_path):
+        """ID の書き込み前に落ちた行は無視される"""
+        prefix = str(tmp_path / 'vectors')
+        VectorIndex(prefix).add_papers(PAPERS)
+        with open(prefix + '.ids', 'w', encoding='utf-8') as f:
+            f.write('2401.00001\n2401.00002\n')
+
+        index = VectorIndex(prefix)
+        assert index.size == 2
+        assert index.add_papers(PAPERS) == 1
+
+    def test_ivf_search_includes_rows_added_after_training(self, tmp_path):
+        """IVF 学習後に追加した論文も検索される"""
+        index = VectorIndex(str(tmp_path / 'vectors'))
+        index.add_papers(PAPERS)
+        index.build_ivf(nlist=2)
+        assert index.centroids is not None
+
+        index.add_papers([{'arxiv_id': '2401.00004', 'title': 'Diffusion audio models',
+                           'abstract': 'Audio generation with diffusion models.'}])
+        results = index.search(index.vector_for('2401.00001'), k=3, exclude=['2401.00001'], nprobe=1)
+        assert '2401.00004' in [arxiv_id for arxiv_id, _ in results]
+
+    def test_sync_from_db(self, tmp_path):
+        """papers テーブルの未登録分だけを埋め込む"""
+        db_path = str(tmp_path / 'papers.db')
+        db = PaperDatabase(db_path)
+        for paper in PAPERS:
+            db.save_paper({**paper, 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+
+        index = VectorIndex(str(tmp_path / 'vectors'))
+        index.add_papers(PAPERS[:1])
+        assert index.sync_from_db(db_path) == 2
+        assert index.sync_from_db(db_path) == 0
+        db.close()
+
+    def test_sync_reads_only_papers_after_last_synced_id(self, tmp_path):
+        """前回読み込んだ papers.id より後の行だけを読み、再起動後も続きから読む"""
+        db_path = str(tmp_path / 'papers.db')
+        db = PaperDatabase(db_path)
+        for paper in PAPERS[:2]:
+            db.save_paper({**paper, 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+        prefix = str(tmp_path / 'vectors')
+        assert VectorIndex(prefix).sync_from_db(db_path) == 2
+
+        # 読み込み済みの行は展開されない (壊れていてもエラーにならない)
+        db.conn.execute("UPDATE papers SET abstract = X'01000000ff' WHERE arxiv_id = '2401.00001'")
+        db.save_paper({**PAPERS[2], 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+        reloaded = VectorIndex(prefix)
+        assert reloaded.synced_id == 2
+        assert reloaded.sync_from_db(db_path) == 1
+        assert reloaded.synced_id == 3
+        db.close()
+
+    def test_rebuild_reweights_all_rows(self, tmp_path):
+        """作り直すと全ての行が全件の IDF で重み付けされる"""
+        db_path = str(tmp_path / 'papers.db')
+        db = PaperDatabase(db_path)
+        for paper in PAPERS:
+            db.save_paper({**paper, 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+        db.close()
+
+        index = VectorIndex(str(tmp_path / 'vectors'))
+        index.sync_from_db(db_path)
+        index.build_ivf(nlist=2)
+        first = index.vector_for('2401.00001')
+        assert index.rebuild(db_path) == 3
+
+        expected = index.embedder.transform(index.paper_text(PAPERS[0]), index.idf())
+        assert np.allclose(index.vector_for('2401.00001'), expected)
+        assert not np.allclose(first, expected)
+        assert index.ids == [p['arxiv_id'] for p in PAPERS] and index.centroids is None
+        assert VectorIndex(str(tmp_path / 'vectors')).synced_id == 3
+
+    def test_running_index_reloads_after_rebuild_elsewhere(self, tmp_path):
+        """別プロセスで作り直されたら、起動中のインデックスは読み直してから追記する"""
+        db_path = str(tmp_path / 'papers.db')
+        db = PaperDatabase(db_path)
+        for paper in PAPERS[:2]:
+            db.save_paper({**paper, 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+        db.close()
+        prefix = str(tmp_path / 'vectors')
+        running = VectorIndex(prefix)
+        # Bot だけが知っている論文 (papers には無い) を登録しておく
+        running.add_papers(PAPERS[2:])
+        running.sync_from_db(db_path)
+        assert running.size == 3
+
+        VectorIndex(prefix).rebuild(db_path)
+        new_paper = {'arxiv_id': '2401.00004', 'title': 'Diffusion audio models',
+                     'abstract': 'Audio generation with diffusion models.'}
+        assert running.add_papers([new_paper]) == 1
+
+        on_disk = VectorIndex(prefix)
+        assert running.ids == on_disk.ids == ['2401.00001', '2401.00002', '2401.00004']
+        assert running.doc_count == on_disk.doc_count == 3
+        assert running.matrix().shape == (3, running.dim)
+        assert np.allclose(running.vector_for('2401.00004'), on_disk.vector_for('2401.00004'))
+
+class TestPaperReactions:
+    """リアクション記録のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:")
+        for paper in PAPERS:
+            self.db.save_paper({**paper, 'authors': 'Test', 'published_date': '2024-01-01', 'summary': ''})
+
+    def test_message_lookup(self):
+        """投稿メッセージ ID から論文を引ける"""
+        self.db.set_discord_message_id('2401.00002', 1234567890)
+        assert self.db.get_arxiv_id_by_message(1234567890) == '2401.00002'
+        assert self.db.get_arxiv_id_by_message(42) is None
+
+    def test_liked_papers(self):
+        """高評価のリアクションだけが対象になり、削除も反映される"""
+        self.db.record_reaction('2401.00001', 7, '👍')
+        self.db.record_reaction('2401.00002', 7, '❤️')
+        self.db.record_reaction('2401.00003', 7, '👀')
+        self.db.record_reaction('2401.00001', 8, '👍')
+        assert sorted(self.db.get_liked_papers(7)) == ['2401.00001', '2401.00002']
+
+        self.db.record_reaction('2401.00002', 7, '❤️', added=False)
+        assert self.db.get_liked_papers(7) == ['2401.00001']
+
+    def test_get_papers(self):
+        """複数の論文をまとめて取得"""
+        papers = self.db.get_papers(['2401.00001', '2401.00003', 'missing'])
+        assert set(papers) == {'2401.00001', '2401.00003'}
+        assert papers['2401.00003']['title'] == 'Graph neural networks for molecules'
@@ -0,0 +1,64 @@
+"""
+投稿アウトボックスのテスト
+"""
+
+import os
+import sqlite3
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from post_outbox import PostOutbox
+
+class TestPostOutbox:
+    """PostOutbox のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.conn = sqlite3.connect(":memory:")
+        self.outbox = PostOutbox(self.conn, max_attempts=3, base_backoff=10, max_backoff=100)
+
+    def test_backoff_and_retry_after(self):
+        """失敗した行はバックオフ後 (retry_after が長ければそれ以降) まで取り出されない"""
+        self.outbox.add('a', now=0)
+        self.outbox.add('a', now=5)  # 二重に追加しない
+        assert [r['arxiv_id'] for r in self.outbox.fetch_due(now=0)] == ['a']
+
+        assert self.outbox.record_failure('a', 'timeout', now=0) is True
+        assert self.outbox.fetch_due(now=4) == []
+        assert [r['attempts'] for r in self.outbox.fetch_due(now=10)] == [1]
+
+        assert self.outbox.record_failure('a', 'rate limited', retry_after=60, now=10) is True
+        assert self.outbox.fetch_due(now=69) == []
+        assert self.outbox.fetch_due(now=70) != []
+
+    def test_gives_up_after_max_attempts(self):
+        """試行回数の上限、または再試行しても無駄な失敗で破棄する"""
+        self.outbox.add('a', now=0)
+        self.outbox.add('b', now=0)
+        assert self.outbox.record_failure('a', 'x', now=0)
+        assert self.outbox.record_failure('a', 'x', now=100)
+        assert not self.outbox.record_failure('a', 'x', now=200)
+        assert not self.outbox.record_failure('b', 'bad request', permanent=True, now=0)
+        assert not self.outbox.record_failure('missing', 'x', now=0)
+
+        stats = self.outbox.get_stats(now=1000)
+        assert (stats['pending'], stats['dead']) == (0, 2)
+        assert self.outbox.fetch_due(now=10000) == []
+
+    def test_stats_report_lag_and_throughput(self):
+        """送信までの遅延と直近のスループット"""
+        for i, arxiv_id in enumerate(['a', 'b', 'c', 'd']):
+            self.outbox.add(arxiv_id, now=1000 + i)
+        self.outbox.mark_sent('a', 1, now=1002)
+        self.outbox.mark_sent('b', 2, now=1011)
+        self.outbox.mark_sent('c', 3, now=1102)
+        self.outbox.record_failure('d', 'x', now=1103)
+
+        stats = self.outbox.get_stats(window=3600, now=1200)
+        assert stats['sent_in_window'] == 3
+        assert stats['per_minute'] == 3 / 60
+        assert (stats['lag_p50'], stats['lag_p95']) == (10, 100)
+        assert (stats['pending'], stats['retrying'], stats['due']) == (1, 1, 1)
+        assert stats['oldest_pending_seconds'] == 1200 - 1003
@@ -0,0 +1,86 @@
+"""
+トークン数に基づくプロンプトの予算管理のテスト
+"""
+
+import os
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+
+from prompt_budget import (
+    HeuristicTokenizer, PromptBudget, Section, TokenCounter, get_counter, model_spec
+)
+
+CODE = 'def handler(request):\n    return json_response({"status": "ok", "count": 42})\n'
+JAPANESE = 'この論文では大規模言語モデルの推論を高速化する新しい手法を提案する。'
+
+def test_model_spec():
+    """モデル名の接頭辞からエンコーディングとコンテキスト長を決める"""
+    assert model_spec('gpt-4') == ('cl100k_base', 8192)
+    assert model_spec('gpt-4-turbo-preview') == ('cl100k_base', 128000)
+    assert model_spec('gpt-4o-mini') == ('o200k_base', 128000)
+    assert model_spec('gpt-3.5-turbo') == ('cl100k_base', 16385)
+    assert get_counter('gpt-4') is get_counter('gpt-3.5-turbo')
+
+def test_heuristic_counts_by_script():
+    """ASCII のコードは1トークンあたりの文字数が多く、日本語は少ない"""
+    tokenizer = HeuristicTokenizer()
+    code_tokens = tokenizer.count(CODE)
+    japanese_tokens = tokenizer.count(JAPANESE)
+    assert len(CODE) / code_tokens > 1.5
+    assert len(JAPANESE) / japanese_tokens < 1.0
+    assert tokenizer.count('') == 0
+
+    truncated = tokenizer.truncate(JAPANESE, 10)
+    assert JAPANESE.startswith(truncated)
+    assert tokenizer.count(truncated) <= 10
+
+def test_counter_cache_and_truncate():
+    """長いテキストはキャッシュから返し、切り詰めは予算内で印を付ける"""
+    counter = TokenCounter(HeuristicTokenizer(), max_entries=2)
+    texts = [CODE * 10, JAPANESE * 10, CODE * 11]
+    first = counter.count(texts[0])
+    assert counter.count(texts[0]) == first
+    assert counter.snapshot()['hits'] == 1
+    counter.count(texts[1])
+    counter.count(texts[2])
+    assert counter.snapshot()['entries'] == 2
+    # 短いテキストはキャッシュしない
+    counter.count('short')
+    assert counter.snapshot()['misses'] == 3
+
+    truncated = counter.truncate(JAPANESE * 20, 50)
+    assert truncated.endswith('…(以下省略)')
+    assert counter.count(truncated) <= 50
+    assert counter.truncate(CODE, 1000) == CODE
+
+def test_pack_by_priority():
+    """優先度の高いセクションから詰め、入らない部分は切り詰めるか省く"""
+    budget = PromptBudget('gpt-4', 500, max_input_tokens=200)
+    result = budget.pack([
+        Section('optional', CODE * 50, priority=2, truncatable=False),
+        Section('main', JAPANESE * 20, priority=1),
+        Section('title', 'Short title', priority=0),
+    ], reserved_tokens=20)
+
+    assert result.texts['title'] == 'Short title'
+    assert result.truncated == ['main']
+    assert result.dropped == ['optional'] and result.texts['optional'] == ''
+    assert result.tokens <= 200
+
+def test_fit_keeps_prompt_within_context():
+    """定型部分を含めたプロンプト全体が入力の予算に収まる"""
+    budget = PromptBudget('gpt-4', 1500)
+    assert budget.input_tokens < 8192 - 1500
+
+    def render(abstract):
+        return f'以下を要約してください。\n\n{abstract}\n\n形式: 箇条書き'
+
+    prompt, result = budget.fit(render, [Section('abstract', JAPANESE * 1000)])
+    assert prompt.startswith('以下を要約してください。') and prompt.endswith('形式: 箇条書き')
+    assert budget.count(prompt) <= budget.input_tokens
+    assert result.truncated == ['abstract']
+
+    prompt, result = budget.fit(render, [Section('abstract', JAPANESE)])
+    assert prompt == render(JAPANESE) and not result.truncated
@@ -0,0 +1,43 @@
+"""
+レート制限のテスト
+"""
+
+import pytest
+import os
+import sys
+import time
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+
+from rate_limit import TokenBucket, RateLimiter, parse_retry_after
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    """容量を使い切ると補充を待つ"""
+    bucket = TokenBucket(per_minute=600, capacity=2)  # 10 トークン / 秒
+    
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == 0
+    
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.05
+
+@pytest.mark.asyncio
+async def test_rate_limiter_backoff_pauses_requests():
+    """backoff 中は acquire が待機する"""
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=1000000)
+    limiter.backoff(0.1)
+    
+    started = time.monotonic()
+    await limiter.acquire(100)
+    assert time.monotonic() - started >= 0.09
+    assert limiter.stats['rate_limited'] == 1
+
+def test_parse_retry_after():
+    """retry-after 系ヘッダーの解釈"""
+    assert parse_retry_after({'retry-after-ms': '250'}) == 0.25
+    assert parse_retry_after({'retry-after': '3'}) == 3.0
+    # ヘッダーが無い場合は指数バックオフ (ジッターで 50-100%)
+    assert 2.0 <= parse_retry_after({}, attempt=2) <= 4.0
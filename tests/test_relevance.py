@@ -0,0 +1,82 @@
+"""
+関連度フィルターのテスト
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase
+from relevance import RelevanceModel, reaction_label, select_relevant
+
+LIKED_TOPICS = ['language model reasoning', 'retrieval augmented generation', 'instruction tuning for agents']
+OTHER_TOPICS = ['protein folding energy', 'galaxy cluster survey', 'soil moisture sensors']
+
+def make_papers(topics, count: int, prefix: str):
+    """テスト用の論文データ"""
+    return [
+        {'arxiv_id': f'{prefix}.{i:05d}', 'title': f'{topics[i % len(topics)]} study {i}',
+         'abstract': f'We investigate {topics[i % len(topics)]} in detail.'}
+        for i in range(count)
+    ]
+
+class TestRelevanceModel:
+    """RelevanceModel のテスト"""
+
+    def test_untrained_model_passes_everything(self):
+        """学習データが足りない間は全件スコア 1.0"""
+        model = RelevanceModel(min_examples=5)
+        papers = make_papers(LIKED_TOPICS, 3, 'a')
+        assert not model.fit(papers, [1.0, 1.0, 0.0])
+        assert np.all(model.score(papers) == 1.0)
+
+    def test_learns_from_reactions(self):
+        """高評価された話題の論文ほどスコアが高い"""
+        liked = make_papers(LIKED_TOPICS, 12, 'a')
+        other = make_papers(OTHER_TOPICS, 12, 'b')
+        model = RelevanceModel(dim=1024)
+        assert model.fit(liked + other, [1.0] * 12 + [0.0] * 12)
+
+        scores = model.score([
+            {'title': 'Retrieval augmented generation for code', 'abstract': 'A language model study.'},
+            {'title': 'Soil moisture sensors at scale', 'abstract': 'Galaxy and protein data.'},
+        ])
+        assert scores[0] > 0.5 > scores[1]
+
+def test_reaction_label():
+    """リアクション数からラベルと重みを求める"""
+    assert reaction_label(0, 0) == (0.0, 0.5)
+    assert reaction_label(2, 0)[0] == 1.0
+    assert reaction_label(1, 3)[0] == 0.0
+    assert reaction_label(3, 0)[1] > reaction_label(1, 0)[1]
+
+def test_select_relevant():
+    """閾値以上か上位 K 件に入る論文を選ぶ"""
+    scores = np.array([0.9, 0.2, 0.4, 0.1], dtype=np.float32)
+    assert select_relevant(scores, 0.5, 0) == [True, False, False, False]
+    assert select_relevant(scores, 0.5, 2) == [True, False, True, False]
+    assert select_relevant(scores, 0.95, 1) == [True, False, False, False]
+
+def test_reaction_labels_from_database():
+    """投稿済み論文のリアクションを人数で集計する"""
+    db = PaperDatabase(":memory:")
+    for arxiv_id in ['2401.00001', '2401.00002', '2401.00003']:
+        db.save_paper({'arxiv_id': arxiv_id, 'title': 'T', 'authors': 'A', 'abstract': 'B',
+                       'published_date': '2024-01-01', 'summary': 'S'})
+    db.set_discord_message_id('2401.00001', 1)
+    db.set_discord_message_id('2401.00002', 2)
+    db.record_reaction('2401.00001', 7, '👍')
+    db.record_reaction('2401.00001', 7, '❤️')
+    db.record_reaction('2401.00001', 8, '🤔')
+
+    labels = {row['arxiv_id']: row for row in db.get_reaction_labels(min_age_hours=48)}
+    # 反応の無い新しい投稿と未投稿の論文は含まない
+    assert set(labels) == {'2401.00001'}
+    assert (labels['2401.00001']['positive'], labels['2401.00001']['negative']) == (1, 1)
+
+    assert set(row['arxiv_id'] for row in db.get_reaction_labels(min_age_hours=-1)) == {'2401.00001', '2401.00002'}
@@ -0,0 +1,159 @@
+"""
+差分の分割レビュー (map-reduce) のテスト
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from review_engine import ChunkedReviewEngine, estimate_tokens, pack_diff, parse_unified_diff
+from review_findings import number_diff_lines
+
+def make_file_diff(path: str, hunks: int = 1, lines: int = 5) -> str:
+    """テスト用の1ファイル分の差分"""
+    parts = [
+        f'diff --git a/{path} b/{path}\n',
+        'index 0000000..1111111 100644\n',
+        f'--- a/{path}\n',
+        f'+++ b/{path}\n',
+    ]
+    for h in range(hunks):
+        parts.append(f'@@ -{h * 10 + 1},0 +{h * 10 + 1},{lines} @@ def f{h}():\n')
+        parts.extend(f'+    value_{h}_{i} = compute({i})\n' for i in range(lines))
+    return ''.join(parts)
+
+def test_parse_unified_diff_splits_files_and_hunks():
+    """ファイル・ハンクに分かれ、つなげ直すと元の差分に戻る"""
+    diff = make_file_diff('app.py', hunks=2) + make_file_diff('lib/util.py')
+    files = parse_unified_diff(diff)
+
+    assert [f.path for f in files] == ['app.py', 'lib/util.py']
+    assert [len(f.hunks) for f in files] == [2, 1]
+    assert ''.join(f.text for f in files) == diff
+
+def test_pack_diff_respects_budget_and_covers_everything():
+    """小さなファイルはまとめ、予算を超えるファイルはハンク・行単位でヘッダーを付けて分ける"""
+    diff = (make_file_diff('a.py') + make_file_diff('b.py')
+            + make_file_diff('big.py', hunks=3, lines=40) + make_file_diff('huge.py', hunks=1, lines=200))
+    budget = 600
+    chunks = pack_diff(parse_unified_diff(diff), budget)
+
+    assert chunks[0].paths[:2] == ['a.py', 'b.py']
+    assert all(chunk.tokens <= budget for chunk in chunks)
+    # どの片もファイルヘッダーから始まる
+    assert all(part.startswith('diff --git ') for chunk in chunks for part in chunk.parts)
+    # 全ての追加行がどこかのチャンクに入っている
+    packed = ''.join(chunk.text for chunk in chunks)
+    added = [line for line in diff.splitlines() if line.startswith('+    ')]
+    assert all(line in packed for line in added)
+    assert sum(chunk.text.count('+    value_') for chunk in chunks) == len(added)
+
+class TestChunkedReviewEngine:
+    """ChunkedReviewEngine のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_small_diff_is_reviewed_in_one_call(self):
+        """1チャンクに収まる差分は分割もまとめもしない"""
+        prompts = []
+
+        async def complete(prompt, max_tokens):
+            prompts.append(prompt)
+            return 'LGTM'
+
+        engine = ChunkedReviewEngine(complete, chunk_token_budget=4000)
+        result = await engine.review(make_file_diff('app.py'), {'title': 'Small'}, '観点')
+
+        assert result['review'] == 'LGTM'
+        assert (result['chunks'], result['files_reviewed'], result['files_total']) == (1, 1, 1)
+        assert len(prompts) == 1 and 'value_0_4' in prompts[0]
+        assert result['findings'] == []
+
+    @pytest.mark.asyncio
+    async def test_single_call_returns_line_findings(self):
+        """差分に行番号を付けて渡し、応答を講評と行に紐づいた指摘に分ける"""
+        prompts = []
+
+        async def complete(prompt, max_tokens):
+            prompts.append(prompt)
+            return '良い変更です。\n\n#### app.py\n- L3: ⚠️ compute の戻り値を確認してください'
+
+        engine = ChunkedReviewEngine(complete, chunk_token_budget=4000)
+        result = await engine.review(make_file_diff('app.py'), {'title': 'Small'}, '観点')
+
+        assert '+    3 |     value_0_2 = compute(2)' in prompts[0]
+        assert result['review'] == '良い変更です。'
+        assert result['findings'] == [{'path': 'app.py', 'line': 3, 'end_line': None, 'severity': 'critical',
+                                       'message': 'compute の戻り値を確認してください'}]
+
+    @pytest.mark.asyncio
+    async def test_large_diff_map_reduce_runs_chunks_concurrently(self):
+        """チャンクは上限付きで並列にレビューされ、最後に1回でまとめる"""
+        diff = ''.join(make_file_diff(f'mod{i}.py', lines=30) for i in range(8))
+        running = 0
+        peak = 0
+        calls = []
+
+        async def complete(prompt, max_tokens):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            calls.append(prompt)
+            if '部分レビュー' in prompt:
+                return 'merged review'
+            return 'finding in ' + prompt.split('## この部分に含まれるファイル\n')[1].split('\n')[0]
+
+        # エンジンは行番号を付けた差分をチャンクに分ける
+        file_tokens = estimate_tokens(number_diff_lines(make_file_diff('mod0.py', lines=30)))
+        engine = ChunkedReviewEngine(complete, chunk_token_budget=file_tokens * 2, max_concurrency=3)
+        result = await engine.review(diff, {'title': 'Big'}, '観点')
+
+        assert result['review'] == 'merged review'
+        assert result['chunks'] == 4
+        assert (result['files_reviewed'], result['files_total'], result['omitted_files']) == (8, 8, [])
+        assert peak == 3
+        reduce_prompt = calls[-1]
+        assert all(f'finding in - mod{i}.py' in reduce_prompt for i in (0, 2, 4, 6))
+
+    @pytest.mark.asyncio
+    async def test_failed_and_capped_chunks_are_reported(self):
+        """失敗したチャンクと上限を超えたチャンクのファイルは未レビューとして返す"""
+        diff = ''.join(make_file_diff(f'mod{i}.py', lines=30) for i in range(4))
+
+        async def complete(prompt, max_tokens):
+            if '- mod1.py' in prompt and '部分レビュー' not in prompt:
+                raise RuntimeError('boom')
+            return 'ok'
+
+        # エンジンは行番号を付けた差分をチャンクに分ける
+        file_tokens = estimate_tokens(number_diff_lines(make_file_diff('mod0.py', lines=30)))
+        engine = ChunkedReviewEngine(complete, chunk_token_budget=file_tokens, max_chunks=3)
+        result = await engine.review(diff, {'title': 'Partial'}, '観点')
+
+        assert (result['chunks'], result['failed_chunks']) == (3, 1)
+        assert result['files_reviewed'] == 2
+        assert sorted(result['omitted_files']) == ['mod1.py', 'mod3.py']
+
+    @pytest.mark.asyncio
+    async def test_chunk_budget_is_capped_by_model_context(self):
+        """設定のチャンク予算がモデルの入力上限を超えていても、プロンプトはコンテキスト長に収まる"""
+        diff = ''.join(make_file_diff(f'mod{i}.py', lines=200) for i in range(12))
+        prompts = []
+
+        async def complete(prompt, max_tokens):
+            prompts.append((prompt, max_tokens))
+            return 'ok'
+
+        engine = ChunkedReviewEngine(complete, chunk_token_budget=100000, model='gpt-4')
+        result = await engine.review(diff, {'title': 'Huge', 'body': '説明' * 2000}, '観点')
+
+        assert result['chunks'] > 1
+        assert all(engine.counter.count(prompt) + max_tokens <= 8192 for prompt, max_tokens in prompts)
+        assert '…(以下省略)' in prompts[0][0]
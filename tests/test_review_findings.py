@@ -0,0 +1,117 @@
+"""
+行に紐づいたレビューの指摘のテスト
+"""
+
+import os
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from review_engine import split_review
+from review_findings import (
+    Finding, build_review_payload, collect_findings, format_digest, format_report, number_diff_lines,
+    parse_file_findings, shift_findings
+)
+
+DIFF = '''diff --git a/app.py b/app.py
+index 111..222 100644
+--- a/app.py
++++ b/app.py
+@@ -10,3 +10,4 @@ def main():
+ keep = 1
+-old = 2
++new = 2
++extra = 3
+ tail = 4
+diff --git a/util.py b/util.py
+--- a/util.py
++++ b/util.py
+@@ -1,1 +1,2 @@
+ a = 1
++b = 2
+'''
+
+def test_number_diff_lines():
+    """変更後の行番号を記号の直後に付け、削除行は空欄にする"""
+    numbered = number_diff_lines(DIFF).splitlines()
+    assert ' ' + '   10 | keep = 1' in numbered
+    assert '-      | old = 2' in numbered
+    assert '+   11 | new = 2' in numbered
+    assert '+   12 | extra = 3' in numbered
+    assert '+    2 | b = 2' in numbered
+    assert '@@ -10,3 +10,4 @@ def main():' in numbered
+
+def test_parse_findings_from_review():
+    """講評とファイルごとの指摘に分け、行番号・範囲・重要度を取り出す"""
+    review = '''全体として良い変更です。
+
+#### app.py
+- L11: ⚠️ `new` は未使用です
+  戻り値を確認してください
+- **L11-L12**: 💡 まとめられます
+- 👍 テストが追加されています
+
+#### `util.py`
+- L2: 📝 命名
+'''
+    summary, file_findings = split_review(review, ['app.py', 'util.py'])
+    assert summary == '全体として良い変更です。'
+    findings = collect_findings(file_findings)
+    assert [(f.path, f.line, f.end_line, f.severity) for f in findings] == [
+        ('app.py', 11, None, 'critical'),
+        ('app.py', 11, 12, 'suggestion'),
+        ('app.py', None, None, 'good'),
+        ('util.py', 2, None, 'note'),
+    ]
+    assert findings[0].message == '`new` は未使用です\n戻り値を確認してください'
+    assert Finding.from_dict(findings[1].to_dict()).location == 'app.py:L11-L12'
+
+def test_payload_batches_inline_comments():
+    """差分内の指摘は行コメントにまとめ、差分外・ファイル全体の指摘は本文に入れる"""
+    findings = [
+        Finding('app.py', '未使用', 'critical', 11),
+        Finding('app.py', '同じ行', 'suggestion', 11),
+        Finding('app.py', '範囲', 'suggestion', 11, 12),
+        Finding('app.py', '差分外', 'critical', 50),
+        Finding('util.py', '全体', 'good'),
+    ]
+    payload = build_review_payload('講評', findings, DIFF, notes=['> 注記'], header='## H')
+
+    comments = {(c['path'], c.get('start_line'), c['line']): c for c in payload['comments']}
+    assert set(comments) == {('app.py', None, 11), ('app.py', 11, 12)}
+    assert comments[('app.py', None, 11)]['body'] == '⚠️ 未使用\n\n💡 同じ行'
+    assert comments[('app.py', 11, 12)]['side'] == 'RIGHT'
+    assert (payload['inline'], payload['unanchored']) == (3, 2)
+    assert payload['body'].startswith('## H\n\n講評')
+    assert 'L50: ⚠️ 差分外' in payload['body'] and '👍 全体' in payload['body']
+    assert '未使用' not in payload['body'] and '> 注記' in payload['body']
+    # 行コメントが拒否された場合の本文には全ての指摘が入る
+    assert all(f.message in payload['fallback_body'] for f in findings)
+
+def test_payload_caps_comments_by_severity():
+    """上限を超えた指摘は重要度の低いものから本文に回す"""
+    findings = [Finding('app.py', 'good', 'good', 12), Finding('app.py', 'bad', 'critical', 11)]
+    payload = build_review_payload('', findings, DIFF, max_comments=1)
+    assert [c['body'] for c in payload['comments']] == ['⚠️ bad']
+    assert 'L12: 👍 good' in payload['body']
+
+def test_digest_keeps_counts_and_reports_omitted():
+    """ダイジェストは重要な指摘から入れ、入りきらない件数を返す (レポートには全て入る)"""
+    findings = [Finding(f'f{i}.py', 'x' * 300, 'suggestion', i) for i in range(30)]
+    findings.append(Finding('z.py', '危険', 'critical', 1))
+    fields, omitted = format_digest(findings, max_total_chars=1000)
+    assert fields[0] == ('`z.py`', '⚠️ L1 危険')
+    assert all(len(value) <= 1024 for _, value in fields)
+    assert omitted == 31 - len(fields)
+    assert omitted > 0
+    report = format_report('PR #1', '講評', findings)
+    assert report.count('x' * 300) == 30 and '⚠️ 1 · 💡 30' in report
+
+def test_shift_findings_follows_moved_hunks():
+    """ベースの更新でハンクがずれた分だけ保存済みの指摘の行番号を動かす"""
+    text = '- L12: ⚠️ a\n- L50-L52: 💡 b\n本文の L12 はそのまま'
+    assert shift_findings(text, [10, 48], [20, 60]) == '- L22: ⚠️ a\n- L62-L64: 💡 b\n本文の L12 はそのまま'
+    assert shift_findings(text, [10], [20, 60]) == text
+    assert parse_file_findings('a.py', shift_findings(text, [10, 48], [20, 60]))[0].line == 22
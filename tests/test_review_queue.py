@@ -0,0 +1,83 @@
+"""
+PR レビューのジョブキューのテスト
+"""
+
+import os
+import sqlite3
+import sys
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'webhooks'))
+
+from review_queue import ReviewQueue
+
+class TestReviewQueue:
+    """ReviewQueue のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.queue = ReviewQueue(sqlite3.connect(':memory:'), max_attempts=2, base_backoff=10)
+
+    def test_burst_of_pushes_collapses_to_newest_sha(self):
+        """待機中の同じ PR へのイベントは1件にまとめ、配送順が前後しても最新の SHA を残す"""
+        first = self.queue.enqueue('o/r', 1, 'sha1', event_updated_at='2024-01-01T00:00:01Z', now=100)
+        second = self.queue.enqueue('o/r', 1, 'sha3', event_updated_at='2024-01-01T00:00:03Z', now=101)
+        late = self.queue.enqueue('o/r', 1, 'sha2', event_updated_at='2024-01-01T00:00:02Z', now=102)
+        other = self.queue.enqueue('o/r', 2, 'other', now=103)
+
+        assert (first['collapsed'], second['collapsed'], late['collapsed'], other['collapsed']) == (
+            False, True, True, False)
+        job = self.queue.claim(now=110)
+        assert (job['pr_number'], job['head_sha'], job['collapsed'], job['wait_seconds']) == (1, 'sha3', 2, 10)
+
+    def test_same_pr_never_runs_twice_at_once(self):
+        """実行中の PR に届いた push は新しいジョブになり、実行中のジョブが終わるまで取り出さない"""
+        self.queue.enqueue('o/r', 1, 'sha1', now=100)
+        running = self.queue.claim(now=100)
+        self.queue.enqueue('o/r', 1, 'sha2', now=101)
+        self.queue.enqueue('o/r', 2, 'other', now=102)
+
+        assert self.queue.claim(now=103)['pr_number'] == 2
+        assert self.queue.claim(now=103) is None
+        self.queue.complete(running['id'], now=110)
+        assert self.queue.claim(now=111)['head_sha'] == 'sha2'
+
+    def test_debounce_delays_claim(self):
+        """delay の間は取り出さず、まとめても実行時刻は延びない"""
+        self.queue.enqueue('o/r', 1, 'sha1', delay=10, now=100)
+        self.queue.enqueue('o/r', 1, 'sha2', delay=10, now=108)
+        assert self.queue.claim(now=105) is None
+        assert self.queue.next_due_in(now=105) == 5
+        assert self.queue.claim(now=110)['head_sha'] == 'sha2'
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        """失敗はバックオフして再試行し、上限で failed にする"""
+        self.queue.enqueue('o/r', 1, 'sha1', now=100)
+        job = self.queue.claim(now=100)
+        assert self.queue.fail(job['id'], 'HTTP 502', now=101)
+        assert self.queue.claim(now=101) is None
+        job = self.queue.claim(now=120)
+        assert job['attempts'] == 1
+        assert not self.queue.fail(job['id'], 'HTTP 502', now=121)
+        assert self.queue.get_stats(now=121)['failed'] == 1
+
+    def test_failure_with_newer_job_is_not_retried(self):
+        """同じ PR の新しいジョブが待っていれば失敗したジョブは再試行しない"""
+        self.queue.enqueue('o/r', 1, 'sha1', now=100)
+        job = self.queue.claim(now=100)
+        self.queue.enqueue('o/r', 1, 'sha2', now=101)
+        assert not self.queue.fail(job['id'], 'boom', now=102)
+        assert self.queue.claim(now=103)['head_sha'] == 'sha2'
+
+    def test_recover_and_stats(self):
+        """中断された実行中ジョブは再開され、待ち時間と所要時間が集計される"""
+        self.queue.enqueue('o/r', 1, 'sha1', now=100)
+        self.queue.claim(now=100)
+        assert self.queue.recover() == 1
+        job = self.queue.claim(now=104)
+        self.queue.complete(job['id'], head_sha='sha1b', now=134)
+        self.queue.enqueue('o/r', 2, 'sha', now=130)
+
+        stats = self.queue.get_stats(now=140)
+        assert (stats['depth'], stats['running'], stats['done']) == (1, 0, 1)
+        assert (stats['wait_p50'], stats['latency_p50'], stats['oldest_wait_seconds']) == (4, 30, 10)
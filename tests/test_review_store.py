@@ -0,0 +1,139 @@
+"""
+差分レビューの再利用ストアのテスト
+"""
+
+import os
+import re
+import sqlite3
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'code_reviewer'))
+
+from review_engine import ChunkedReviewEngine
+from review_store import ReviewStore, patch_hash, review_incrementally
+
+def make_file_diff(path: str, body: str, start: int = 1) -> str:
+    """テスト用の1ファイル分の差分"""
+    return (f'diff --git a/{path} b/{path}\n'
+            f'index 1234567..89abcde 100644\n'
+            f'--- a/{path}\n+++ b/{path}\n'
+            f'@@ -{start},0 +{start},1 @@\n+{body}\n')
+
+class FakeLLM:
+    """ファイルごとに見出し付きの指摘を返す LLM (headings=False なら見出しを付けない)"""
+
+    def __init__(self, headings: bool = True):
+        self.headings = headings
+        self.review_calls = []
+        self.chunk_calls = []
+        self.reduce_calls = []
+
+    async def __call__(self, prompt: str, max_tokens: int) -> str:
+        if '## 部分レビュー' in prompt:
+            self.reduce_calls.append(prompt)
+            return f'merged review {len(self.reduce_calls)}'
+        if '## この部分に含まれるファイル\n' in prompt:
+            paths = prompt.split('## この部分に含まれるファイル\n')[1].split('\n\n')[0].splitlines()
+            paths = [line[2:] for line in paths]
+            self.chunk_calls.append(paths)
+        else:
+            # 1回で収まる差分のレビュー
+            paths = re.findall(r'^diff --git a/\S+ b/(\S+)$', prompt, re.MULTILINE)
+            self.review_calls.append(paths)
+        call = len(self.review_calls) + len(self.chunk_calls)
+        if not self.headings:
+            return f'- general finding (call {call})'
+        return '\n'.join([f'overall review {call}'] + [
+            f'#### {path}\n- finding for {path} (call {call})' for path in paths
+        ])
+
+def test_patch_hash_ignores_line_numbers_and_blob_ids():
+    """ベースの更新で行番号や index 行だけが変わっても同じハッシュ"""
+    a = make_file_diff('app.py', 'x = 1', start=1)
+    b = make_file_diff('app.py', 'x = 1', start=40).replace('1234567', 'fedcba9')
+    assert patch_hash(a) == patch_hash(b)
+    assert patch_hash(a) != patch_hash(make_file_diff('app.py', 'x = 2'))
+    assert patch_hash(a, 'v1') != patch_hash(a, 'v2')
+
+class TestIncrementalReview:
+    """review_incrementally のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.store = ReviewStore(sqlite3.connect(':memory:'))
+        self.llm = FakeLLM()
+        self.engine = ChunkedReviewEngine(self.llm, chunk_token_budget=4000)
+        self.pr_info = {'title': 'Feature', 'number': 5}
+
+    async def review(self, diff: str, head_sha: str, full: bool = False):
+        """PR #5 をレビュー"""
+        return await review_incrementally(self.engine, self.store, 'o/r', 5, head_sha, diff,
+                                          self.pr_info, '観点', full=full)
+
+    @pytest.mark.asyncio
+    async def test_only_changed_files_are_reviewed_again(self):
+        """パッチが変わったファイルだけを LLM に渡し、残りは前回の指摘をまとめに使う"""
+        first = await self.review(make_file_diff('a.py', 'a = 1') + make_file_diff('b.py', 'b = 1'), 'sha1')
+        assert first['reused_files'] == [] and not first['cached']
+        # 1チャンクに収まる差分は分割せず1回でレビューする
+        assert self.llm.review_calls == [['a.py', 'b.py']] and self.llm.reduce_calls == []
+        assert first['review'] == 'overall review 1'
+
+        second = await self.review(make_file_diff('a.py', 'a = 1') + make_file_diff('b.py', 'b = 2')
+                                   + make_file_diff('c.py', 'c = 1'), 'sha2')
+        assert self.llm.chunk_calls[-1] == ['b.py', 'c.py']
+        assert second['reused_files'] == ['a.py']
+        assert second['changed_files'] == ['b.py', 'c.py']
+        assert second['previous_head_sha'] == 'sha1'
+        # 再利用した指摘はファイル単位で切り出されている
+        reduce_prompt = self.llm.reduce_calls[-1]
+        assert '- finding for a.py (call 1)' in reduce_prompt
+        assert '- finding for b.py (call 1)' not in reduce_prompt
+
+        run = self.store.get_run('o/r', 5)
+        assert (run['head_sha'], run['files_reused'], run['review']) == ('sha2', 1, 'merged review 1')
+
+    @pytest.mark.asyncio
+    async def test_unchanged_diff_reuses_whole_review_and_full_forces(self):
+        """差分全体が同じなら LLM を呼ばず、full なら全ファイルをレビューし直す"""
+        diff = make_file_diff('a.py', 'a = 1')
+        await self.review(diff, 'sha1')
+        cached = await self.review(diff, 'sha1-rebased')
+        assert cached['cached'] and cached['review'] == 'overall review 1'
+        assert len(self.llm.review_calls) == 1
+
+        forced = await self.review(diff, 'sha1-rebased', full=True)
+        assert not forced['cached'] and forced['reused_files'] == []
+        assert len(self.llm.review_calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_review_without_headings_is_not_copied_to_each_file(self):
+        """見出しの無いレビューは指摘なしとして保存し、再レビューでファイルごとの指摘に化けない"""
+        self.llm.headings = False
+        files = {'a.py': 'a = 1', 'b.py': 'b = 1', 'c.py': 'c = 1'}
+        first = await self.review(''.join(make_file_diff(p, body) for p, body in files.items()), 'sha1')
+        assert first['file_findings'] == {} and first['findings'] == []
+        assert first['review'] == '- general finding (call 1)'
+
+        files['b.py'] = 'b = 2'
+        second = await self.review(''.join(make_file_diff(p, body) for p, body in files.items()), 'sha2')
+        assert second['reused_files'] == ['a.py', 'c.py'] and self.llm.chunk_calls == [['b.py']]
+        assert second['findings'] == []
+        assert '- general finding (call 1)' not in self.llm.reduce_calls[-1]
+
+        cached = await self.review(''.join(make_file_diff(p, body) for p, body in files.items()), 'sha3')
+        assert cached['cached'] and cached['findings'] == []
+
+    @pytest.mark.asyncio
+    async def test_removed_files_are_forgotten(self):
+        """差分から消えたファイルの指摘は削除する"""
+        await self.review(make_file_diff('a.py', 'a = 1') + make_file_diff('b.py', 'b = 1'), 'sha1')
+        await self.review(make_file_diff('a.py', 'a = 1'), 'sha2')
+
+        plan = self.store.plan('o/r', 5, {'b.py': 'anything'})
+        assert plan['reuse'] == {} and plan['changed'] == ['b.py']
+        assert self.store.get_stats()['stored_files'] == 1
@@ -0,0 +1,75 @@
+"""
+要約キャッシュのテスト
+"""
+
+import pytest
+import os
+import sqlite3
+import sys
+from unittest.mock import AsyncMock
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperSummarizer
+from summary_cache import SummaryCache, make_cache_key
+
+class TestSummaryCache:
+    """SummaryCache のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.cache = SummaryCache(sqlite3.connect(":memory:"), max_entries=2)
+
+    def test_key_ignores_whitespace_and_case(self):
+        """正規化後に同じ内容なら同じキーになる"""
+        a = make_cache_key("Attention Is  All You Need", "We propose\nthe Transformer.", "1", "gpt-3.5-turbo")
+        b = make_cache_key("attention is all you need", "We propose the Transformer. ", "1", "gpt-3.5-turbo")
+        assert a == b
+        assert a != make_cache_key("attention is all you need", "We propose the Transformer.", "2", "gpt-3.5-turbo")
+        assert a != make_cache_key("attention is all you need", "We propose the Transformer.", "1", "gpt-4")
+
+    def test_hit_and_miss_counters(self):
+        """ヒット・ミスが数えられる"""
+        assert self.cache.get("k1") is None
+        self.cache.put("k1", "summary")
+        assert self.cache.get("k1") == "summary"
+
+        stats = self.cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_size_eviction(self):
+        """件数上限を超えると最も古いものから削除される"""
+        for key in ["k1", "k2"]:
+            self.cache.put(key, key)
+        self.cache.conn.execute(
+            "UPDATE summary_cache SET last_used_at = datetime('now', '-1 hour') WHERE cache_key = 'k1'"
+        )
+        self.cache.put("k3", "k3")
+
+        assert self.cache.get("k1") is None
+        assert self.cache.get("k3") == "k3"
+        assert self.cache.evictions == 1
+
+    def test_age_eviction(self):
+        """期限切れのエントリは返されない"""
+        self.cache.put("k1", "summary")
+        self.cache.conn.execute(
+            "UPDATE summary_cache SET created_at = datetime('now', '-365 days')"
+        )
+        assert self.cache.get("k1") is None
+
+@pytest.mark.asyncio
+async def test_summarizer_skips_llm_on_cache_hit():
+    """キャッシュにある論文は LLM を呼ばない"""
+    summarizer = PaperSummarizer("test-api-key", cache=SummaryCache(sqlite3.connect(":memory:")))
+    summarizer.request_summary = AsyncMock(return_value="要約")
+
+    first = await summarizer.generate_summary("Title", "Abstract")
+    # 別フィード・別バージョンで空白だけ異なるエントリ
+    second = await summarizer.generate_summary("Title ", "Abstract\n")
+
+    assert first == second == "要約"
+    assert summarizer.request_summary.await_count == 1
@@ -0,0 +1,45 @@
+"""
+ストリーミング要約の補助クラスのテスト
+"""
+
+import os
+import sys
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from rate_limit import TokenBucket
+from summary_stream import EditThrottle, LatencyStats
+
+def test_edit_throttle_respects_min_interval():
+    """最小間隔の間の途中経過は見送る"""
+    throttle = EditThrottle(TokenBucket(600, capacity=5), min_interval=60)
+    assert throttle.try_acquire()
+    assert not throttle.try_acquire()
+    assert (throttle.edits, throttle.skipped) == (1, 1)
+
+def test_edit_throttle_shares_channel_budget():
+    """チャンネル全体の編集枠を使い切ると他のストリームも見送る"""
+    bucket = TokenBucket(1, capacity=2)
+    throttles = [EditThrottle(bucket, min_interval=0) for _ in range(3)]
+    assert [t.try_acquire() for t in throttles] == [True, True, False]
+
+@pytest.mark.asyncio
+async def test_edit_throttle_final_edit_waits():
+    """最終結果の編集は枠が空くまで待つ"""
+    bucket = TokenBucket(600, capacity=1)
+    throttle = EditThrottle(bucket, min_interval=0)
+    assert throttle.try_acquire()
+    await throttle.acquire()
+    assert throttle.edits == 2
+
+def test_latency_stats():
+    """パーセンタイルを返す"""
+    stats = LatencyStats(window=3)
+    assert stats.snapshot() == {'count': 0, 'p50': None, 'p95': None}
+    for seconds in [5.0, 1.0, 2.0, 3.0]:
+        stats.record(seconds)
+    assert stats.snapshot() == {'count': 4, 'p50': 2.0, 'p95': 3.0}
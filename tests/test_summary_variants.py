@@ -0,0 +1,118 @@
+"""
+要約の多言語バリアントのテスト
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bots', 'paper_summarizer'))
+
+from bots.paper_summarizer.bot import PaperDatabase, PaperSummarizer
+from summary_variants import SummaryVariantStore, language_from_locale, read_user_language
+
+def make_response(content: str) -> Mock:
+    """chat.completions のモックレスポンス"""
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    response.usage = None
+    return response
+
+def test_language_from_locale():
+    """Discord のロケールを対応言語にする"""
+    assert language_from_locale('en-US') == 'en'
+    assert language_from_locale('ja') == 'ja'
+    assert language_from_locale('zh-CN') == 'zh-cn'
+    assert language_from_locale('zh-TW') == 'zh-tw'
+    assert language_from_locale('es-ES') == 'es'
+    assert language_from_locale('pt-BR') is None
+    assert language_from_locale(None) is None
+
+def test_read_user_language(tmp_path):
+    """多言語 Bot の設定を読み、無ければ None"""
+    db_path = str(tmp_path / 'user_languages.db')
+    assert read_user_language(db_path, 1) is None
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE user_languages (user_id TEXT PRIMARY KEY, language_code TEXT)')
+    conn.execute("INSERT INTO user_languages VALUES ('1', 'ko'), ('2', 'xx')")
+    conn.commit()
+    conn.close()
+
+    assert read_user_language(db_path, 1) == 'ko'
+    assert read_user_language(db_path, 2) is None
+    assert read_user_language(db_path, 3) is None
+
+class TestSummaryVariantStore:
+    """SummaryVariantStore のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.db = PaperDatabase(":memory:")
+        self.store = SummaryVariantStore(self.db.conn)
+
+    def test_put_and_get(self):
+        """保存したバリアントを取得し、ヒット率を数える"""
+        assert self.store.get('2401.00001', 'en') is None
+        self.store.put_many('2401.00001', {'en': 'English summary', 'ko': 'Korean summary'})
+
+        assert self.store.get('2401.00001', 'en') == 'English summary'
+        assert self.store.missing_languages('2401.00001', ['en', 'fr', 'ko']) == ['fr']
+        stats = self.store.get_stats()
+        assert stats['variants'] == {'en': 1, 'ko': 1}
+        assert (stats['hits'], stats['misses']) == (1, 1)
+
+    def test_popular_languages(self):
+        """リクエストの多い言語から、しきい値以上のものだけ (基準言語は除く)"""
+        for language, count in [('en', 6), ('ko', 8), ('fr', 2), ('ja', 20)]:
+            for _ in range(count):
+                self.store.record_request(language)
+
+        assert self.store.popular_languages(limit=2, min_requests=5) == ['ko', 'en']
+        assert self.store.popular_languages(limit=1, min_requests=5) == ['ko']
+        assert self.store.get_stats()['requests']['fr'] == 2
+
+class TestTranslateSummary:
+    """PaperSummarizer.translate_summary のテスト"""
+
+    def setup_method(self):
+        """各テストの前に実行"""
+        self.summarizer = PaperSummarizer("test-api-key")
+        self.client = Mock()
+        self.summarizer.client = self.client
+
+    @pytest.mark.asyncio
+    async def test_single_language(self):
+        """1言語ならテキストのまま返す"""
+        self.client.chat.completions.create = AsyncMock(return_value=make_response(' English summary \n'))
+
+        result = await self.summarizer.translate_summary('Title', '要約', ['en', 'ja'])
+
+        assert result == {'en': 'English summary'}
+        assert 'response_format' not in self.client.chat.completions.create.call_args.kwargs
+
+    @pytest.mark.asyncio
+    async def test_multiple_languages_in_one_request(self):
+        """複数言語は1回の JSON 応答でまとめて翻訳し、頼んでいない言語は捨てる"""
+        content = json.dumps({'translations': {'en': 'English', 'ko': 'Korean', 'de': 'German', 'fr': ''}})
+        self.client.chat.completions.create = AsyncMock(return_value=make_response(content))
+
+        result = await self.summarizer.translate_summary('Title', '要約', ['en', 'ko', 'fr'])
+
+        assert result == {'en': 'English', 'ko': 'Korean'}
+        assert self.client.chat.completions.create.await_count == 1
+        kwargs = self.client.chat.completions.create.call_args.kwargs
+        assert kwargs['response_format'] == {'type': 'json_object'}
+
+    @pytest.mark.asyncio
+    async def test_invalid_json(self):
+        """JSON として読めなければ空"""
+        self.client.chat.completions.create = AsyncMock(return_value=make_response('not json'))
+        assert await self.summarizer.translate_summary('Title', '要約', ['en', 'ko']) == {}
@@ -0,0 +1,155 @@
+"""
+GitHub Webhook 受信サーバーのテスト
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+# テスト用にパスを追加
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'webhooks'))
+
+from review_queue import ReviewQueue
+from server import ReviewWorkerPool, WebhookServer, verify_signature
+
+SECRET = 'topsecret'
+
+def sign(body: bytes, secret: str = SECRET) -> str:
+    """X-Hub-Signature-256 ヘッダーの値"""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def pr_event(number: int, sha: str, action: str = 'synchronize', draft: bool = False) -> bytes:
+    """pull_request イベントのペイロード"""
+    return json.dumps({
+        'action': action,
+        'repository': {'full_name': 'o/r'},
+        'pull_request': {'number': number, 'draft': draft, 'head': {'sha': sha},
+                         'updated_at': f'2024-01-01T00:00:{sha[-1]}0Z'},
+    }).encode()
+
+def test_verify_signature():
+    """正しい HMAC だけを受け付ける"""
+    body = b'{"a": 1}'
+    assert verify_signature(SECRET, body, sign(body))
+    assert not verify_signature(SECRET, body, sign(body, 'other'))
+    assert not verify_signature(SECRET, body, None)
+    assert not verify_signature('', body, sign(body, ''))
+
+class TestWebhookServer:
+    """WebhookServer とワーカーの連携のテスト"""
+
+    async def start(self, run_job, concurrency: int = 2, debounce: float = 0.0):
+        """サーバーとテストクライアントを起動"""
+        self.queue = ReviewQueue(sqlite3.connect(':memory:'))
+        self.pool = ReviewWorkerPool(self.queue, run_job, concurrency=concurrency, poll_interval=0.05)
+        self.server = WebhookServer(SECRET, self.queue, self.pool, debounce_seconds=debounce)
+        self.client = TestClient(TestServer(self.server.create_app()))
+        await self.client.start_server()
+
+    async def post(self, body: bytes, event: str = 'pull_request', signature: str = None):
+        """Webhook を送信"""
+        return await self.client.post('/webhook', data=body, headers={
+            'X-GitHub-Event': event,
+            'X-Hub-Signature-256': signature or sign(body),
+            'Content-Type': 'application/json',
+        })
+
+    @pytest.mark.asyncio
+    async def test_rejects_bad_signature_and_ignores_other_events(self):
+        """署名が違えば 401、レビュー対象外のイベントはキューに入れない"""
+        await self.start(run_job=None, concurrency=0)
+        try:
+            assert (await self.post(pr_event(1, 'a1'), signature='sha256=00')).status == 401
+            assert (await self.post(b'{}', event='ping')).status == 200
+            assert (await self.post(pr_event(1, 'a1', action='closed'))).status == 202
+            assert (await self.post(pr_event(1, 'a1', action='opened', draft=True))).status == 202
+            assert (await self.post(b'not json')).status == 400
+            assert self.queue.get_stats()['depth'] == 0
+        finally:
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_burst_is_reviewed_once_for_newest_sha(self):
+        """デバウンス中に続いた push は1回のレビューにまとまり、メトリクスに現れる"""
+        reviewed = []
+        done = asyncio.Event()
+
+        async def run_job(job):
+            reviewed.append((job['pr_number'], job['head_sha']))
+            done.set()
+            return job['head_sha']
+
+        await self.start(run_job, debounce=0.2)
+        try:
+            for sha in ('s1', 's2', 's3'):
+                response = await self.post(pr_event(7, sha))
+                assert response.status == 202
+            assert (await response.json())['collapsed'] is True
+
+            await asyncio.wait_for(done.wait(), 2)
+            await asyncio.sleep(0.1)
+            assert reviewed == [(7, 's3')]
+
+            metrics = await (await self.client.get('/metrics')).json()
+            assert metrics['queue']['done'] == 1
+            assert metrics['queue']['collapsed_in_window'] == 2
+            assert metrics['webhooks']['enqueued'] == 1 and metrics['webhooks']['collapsed'] == 2
+            assert metrics['workers']['processed'] == 1
+            assert 'by_priority' in metrics['github']
+        finally:
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_worker_pool_is_bounded(self):
+        """同時に走るレビューはワーカー数まで"""
+        running = 0
+        peak = 0
+        finished = []
+
+        async def run_job(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            finished.append(job['pr_number'])
+            return job['head_sha']
+
+        await self.start(run_job, concurrency=2)
+        try:
+            for number in range(1, 6):
+                await self.post(pr_event(number, f'x{number}', action='opened'))
+            for _ in range(100):
+                if len(finished) == 5:
+                    break
+                await asyncio.sleep(0.02)
+            assert sorted(finished) == [1, 2, 3, 4, 5]
+            assert peak == 2
+        finally:
+            await self.client.close()
+
+@pytest.mark.asyncio
+async def test_worker_pool_prunes_finished_jobs():
+    """起動時に古い終了済みジョブを削除する"""
+    queue = ReviewQueue(sqlite3.connect(':memory:'))
+    queue.enqueue('o/r', 1, 'old', now=100)
+    queue.complete(queue.claim(now=100)['id'], 'old', now=100)
+    queue.enqueue('o/r', 2, 'new')
+    queue.complete(queue.claim()['id'], 'new')
+
+    async def run_job(job):
+        return job['head_sha']
+
+    pool = ReviewWorkerPool(queue, run_job, concurrency=1, poll_interval=0.05)
+    pool.start()
+    await asyncio.sleep(0.05)
+    await pool.stop()
+    assert pool.snapshot()['pruned'] == 1
+    assert queue.get_stats()['done'] == 1
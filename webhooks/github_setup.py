@@ -4,10 +4,15 @@ GitHub リポジトリに Discord Webhook を自動設定
 """
 
 import os
+import sys
 import requests
 from typing import Dict, List
 from dotenv import load_dotenv
 
+# コードレビュー Bot と同じレート制限スケジューラーを使う
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'code_reviewer'))
+from github_scheduler import PRIORITY_INTERACTIVE, get_scheduler
+
 load_dotenv()
 
 class GitHubWebhookManager:
@@ -29,6 +34,20 @@ class GitHubWebhookManager:
         }
         
         self.base_url = f'https://api.github.com/repos/{self.repo_owner}/{self.repo_name}'
+        self.scheduler = get_scheduler()
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """レート制限スケジューラーを通して API を呼び出す (レート制限で拒否されたら待って1回だけ再試行)"""
+        for attempt in range(2):
+            self.scheduler.acquire_sync(self.github_token, PRIORITY_INTERACTIVE, method, max_wait=120)
+            try:
+                response = requests.request(method, url, headers=self.headers, **kwargs)
+            finally:
+                self.scheduler.release(self.github_token)
+            wait = self.scheduler.update(self.github_token, response.status_code, response.headers, response.text)
+            if wait is None or attempt == 1:
+                return response
+            print(f"⏳ GitHub のレート制限のため {wait:.0f} 秒後に再試行します")
     
     def create_webhook(self, events: List[str] = None) -> Dict:
         """Discord Webhook を作成"""
@@ -58,11 +77,7 @@ class GitHubWebhookManager:
             }
         }
         
-        response = requests.post(
-            f'{self.base_url}/hooks',
-            headers=self.headers,
-            json=webhook_data
-        )
+        response = self.request('POST', f'{self.base_url}/hooks', json=webhook_data)
         
         if response.status_code == 201:
             print("✅ Webhook が正常に作成されました！")
@@ -74,10 +89,7 @@ class GitHubWebhookManager:
     
     def list_webhooks(self) -> List[Dict]:
         """既存の Webhook を一覧表示"""
-        response = requests.get(
-            f'{self.base_url}/hooks',
-            headers=self.headers
-        )
+        response = self.request('GET', f'{self.base_url}/hooks')
         
         if response.status_code == 200:
             webhooks = response.json()
@@ -97,10 +109,7 @@ class GitHubWebhookManager:
     
     def delete_webhook(self, webhook_id: int) -> bool:
         """Webhook を削除"""
-        response = requests.delete(
-            f'{self.base_url}/hooks/{webhook_id}',
-            headers=self.headers
-        )
+        response = self.request('DELETE', f'{self.base_url}/hooks/{webhook_id}')
         
         if response.status_code == 204:
             print(f"✅ Webhook (ID: {webhook_id}) が削除されました")
@@ -111,10 +120,7 @@ class GitHubWebhookManager:
     
     def test_webhook(self, webhook_id: int) -> bool:
         """Webhook をテスト"""
-        response = requests.post(
-            f'{self.base_url}/hooks/{webhook_id}/test',
-            headers=self.headers
-        )
+        response = self.request('POST', f'{self.base_url}/hooks/{webhook_id}/test')
         
         if response.status_code == 204:
             print(f"✅ Webhook (ID: {webhook_id}) のテストが送信されました")
@@ -0,0 +1,256 @@
+"""
+PR レビューのジョブキュー
+Webhook で受けた pull_request イベントを SQLite に永続化し、レビューワーカーが取り出す
+同じ PR への連続した push は待機中のジョブ1件にまとめ、最新の head SHA だけをレビューする
+同じ PR のジョブは同時に1件しか実行しない
+"""
+
+import random
+import time
+from typing import Dict, List, Optional
+
+def percentile(values: List[float], q: float) -> float:
+    """q (0-1) パーセンタイル (最近傍法)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ReviewQueue:
+    """SQLite に永続化されるレビュージョブ"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = (QUEUED, RUNNING, DONE, FAILED)
+
+    def __init__(self, conn, max_attempts: int = 3, base_backoff: float = 30, max_backoff: float = 900):
+        self.conn = conn
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.init_table()
+
+    def init_table(self):
+        """ジョブテーブル初期化"""
+        cursor = self.conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                head_sha TEXT NOT NULL,
+                event_updated_at TEXT,
+                delivery_id TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                collapsed INTEGER DEFAULT 0,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
+        # 待機中のジョブは PR ごとに1件
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_review_jobs_queued_pr
+            ON review_jobs (repo, pr_number) WHERE state = 'queued'
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_review_jobs_due
+            ON review_jobs (state, next_attempt_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_review_jobs_finished
+            ON review_jobs (finished_at)
+        ''')
+
+        self.conn.commit()
+
+    def recover(self) -> int:
+        """前回のプロセスで実行中のまま終わったジョブを待機中に戻す
+
+        Returns:
+            戻したジョブ数
+        """
+        running = self.conn.execute(
+            'SELECT id, repo, pr_number FROM review_jobs WHERE state = ?', (self.RUNNING,)
+        ).fetchall()
+        for job_id, repo, pr_number in running:
+            # 同じ PR の新しいジョブが待っていればそちらに任せる
+            queued = self.conn.execute(
+                'SELECT 1 FROM review_jobs WHERE repo = ? AND pr_number = ? AND state = ?',
+                (repo, pr_number, self.QUEUED)
+            ).fetchone()
+            if queued:
+                self.conn.execute(
+                    'UPDATE review_jobs SET state = ?, last_error = ? WHERE id = ?',
+                    (self.DONE, 'superseded', job_id)
+                )
+            else:
+                self.conn.execute(
+                    'UPDATE review_jobs SET state = ?, started_at = NULL WHERE id = ?', (self.QUEUED, job_id)
+                )
+        self.conn.commit()
+        return len(running)
+
+    def enqueue(self, repo: str, pr_number: int, head_sha: str, event_updated_at: Optional[str] = None,
+                delivery_id: Optional[str] = None, delay: float = 0.0, now: Optional[float] = None) -> Dict:
+        """ジョブを追加 (同じ PR の待機中ジョブがあれば head SHA を新しい方に更新してまとめる)
+
+        delay 秒は実行しないので、その間に続いた push は同じジョブにまとまる
+        (まとめても実行時刻は延ばさないので、push が続いても最初のイベントから delay 秒で実行される)
+
+        Returns:
+            id, collapsed (既存ジョブにまとめたら True)
+        """
+        now = time.time() if now is None else now
+        cursor = self.conn.cursor()
+        row = cursor.execute('''
+            SELECT id, event_updated_at FROM review_jobs
+            WHERE repo = ? AND pr_number = ? AND state = ?
+        ''', (repo, pr_number, self.QUEUED)).fetchone()
+
+        if row:
+            job_id, queued_updated_at = row
+            # 配送順が前後して古いイベントが後から届いた場合は SHA を巻き戻さない
+            if not (queued_updated_at and event_updated_at and event_updated_at < queued_updated_at):
+                cursor.execute('''
+                    UPDATE review_jobs
+                    SET head_sha = ?, event_updated_at = ?, delivery_id = ?, collapsed = collapsed + 1
+                    WHERE id = ?
+                ''', (head_sha, event_updated_at, delivery_id, job_id))
+            else:
+                cursor.execute('UPDATE review_jobs SET collapsed = collapsed + 1 WHERE id = ?', (job_id,))
+            self.conn.commit()
+            return {'id': job_id, 'collapsed': True}
+
+        cursor.execute('''
+            INSERT INTO review_jobs
+                (repo, pr_number, head_sha, event_updated_at, delivery_id, state, enqueued_at, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (repo, pr_number, head_sha, event_updated_at, delivery_id, self.QUEUED, now, now + delay))
+        self.conn.commit()
+        return {'id': cursor.lastrowid, 'collapsed': False}
+
+    def claim(self, now: Optional[float] = None) -> Optional[Dict]:
+        """実行時刻を過ぎた最も古いジョブを実行中にして返す (同じ PR が実行中のものは除く)"""
+        now = time.time() if now is None else now
+        row = self.conn.execute('''
+            SELECT id, repo, pr_number, head_sha, attempts, collapsed, enqueued_at
+            FROM review_jobs AS q
+            WHERE state = ? AND next_attempt_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM review_jobs AS r
+                  WHERE r.repo = q.repo AND r.pr_number = q.pr_number AND r.state = ?
+              )
+            ORDER BY enqueued_at, id
+            LIMIT 1
+        ''', (self.QUEUED, now, self.RUNNING)).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute(
+            'UPDATE review_jobs SET state = ?, started_at = ? WHERE id = ?', (self.RUNNING, now, row[0])
+        )
+        self.conn.commit()
+        columns = ['id', 'repo', 'pr_number', 'head_sha', 'attempts', 'collapsed', 'enqueued_at']
+        job = dict(zip(columns, row))
+        job['started_at'] = now
+        job['wait_seconds'] = now - job['enqueued_at']
+        return job
+
+    def complete(self, job_id: int, head_sha: Optional[str] = None, now: Optional[float] = None):
+        """ジョブを完了にする (実際にレビューした head SHA を記録)"""
+        now = time.time() if now is None else now
+        self.conn.execute('''
+            UPDATE review_jobs SET state = ?, finished_at = ?, head_sha = COALESCE(?, head_sha), last_error = NULL
+            WHERE id = ?
+        ''', (self.DONE, now, head_sha, job_id))
+        self.conn.commit()
+
+    def fail(self, job_id: int, error: str, now: Optional[float] = None) -> bool:
+        """失敗を記録し、上限まではバックオフして待機中に戻す
+
+        同じ PR の新しいジョブが既に待っている場合は再試行しない (そちらが最新の SHA をレビューする)
+
+        Returns:
+            再試行される場合は True
+        """
+        now = time.time() if now is None else now
+        repo, pr_number, attempts = self.conn.execute(
+            'SELECT repo, pr_number, attempts FROM review_jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        attempts += 1
+        newer = self.conn.execute(
+            'SELECT 1 FROM review_jobs WHERE repo = ? AND pr_number = ? AND state = ?',
+            (repo, pr_number, self.QUEUED)
+        ).fetchone()
+
+        if newer or attempts >= self.max_attempts:
+            self.conn.execute('''
+                UPDATE review_jobs SET state = ?, attempts = ?, last_error = ?, finished_at = ?
+                WHERE id = ?
+            ''', (self.FAILED, attempts, error[:500], now, job_id))
+            self.conn.commit()
+            return False
+
+        backoff = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        backoff *= 0.5 + random.random() / 2
+        self.conn.execute('''
+            UPDATE review_jobs SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ?, started_at = NULL
+            WHERE id = ?
+        ''', (self.QUEUED, attempts, error[:500], now + backoff, job_id))
+        self.conn.commit()
+        return True
+
+    def next_due_in(self, now: Optional[float] = None) -> Optional[float]:
+        """次に実行できる待機中ジョブまでの秒数 (無ければ None)"""
+        now = time.time() if now is None else now
+        row = self.conn.execute(
+            'SELECT MIN(next_attempt_at) FROM review_jobs WHERE state = ?', (self.QUEUED,)
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    def prune(self, max_age_days: float = 30, now: Optional[float] = None) -> int:
+        """終了から日数が経ったジョブを削除"""
+        cutoff = (time.time() if now is None else now) - max_age_days * 86400
+        cursor = self.conn.execute('''
+            DELETE FROM review_jobs WHERE state IN (?, ?) AND finished_at < ?
+        ''', (self.DONE, self.FAILED, cutoff))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def get_stats(self, window_seconds: float = 3600, now: Optional[float] = None) -> Dict:
+        """キューの深さ・待ち時間・レビュー所要時間"""
+        now = time.time() if now is None else now
+        stats = {state: 0 for state in self.STATES}
+        for state, count in self.conn.execute('SELECT state, COUNT(*) FROM review_jobs GROUP BY state'):
+            stats[state] = count
+
+        oldest = self.conn.execute(
+            'SELECT MIN(enqueued_at) FROM review_jobs WHERE state = ?', (self.QUEUED,)
+        ).fetchone()[0]
+        recent = self.conn.execute('''
+            SELECT started_at - enqueued_at, finished_at - started_at, collapsed
+            FROM review_jobs WHERE state = ? AND finished_at >= ?
+        ''', (self.DONE, now - window_seconds)).fetchall()
+        waits = [row[0] for row in recent if row[0] is not None]
+        latencies = [row[1] for row in recent if row[1] is not None]
+
+        return {
+            'depth': stats[self.QUEUED],
+            'running': stats[self.RUNNING],
+            'done': stats[self.DONE],
+            'failed': stats[self.FAILED],
+            'oldest_wait_seconds': now - oldest if oldest else 0.0,
+            'completed_in_window': len(recent),
+            'collapsed_in_window': sum(row[2] for row in recent),
+            'wait_p50': percentile(waits, 0.5),
+            'wait_p95': percentile(waits, 0.95),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+        }
@@ -0,0 +1,413 @@
+"""
+GitHub Webhook 受信サーバー
+pull_request イベント (opened / synchronize など) の署名を検証してレビュージョブをキューに入れ、
+上限付きのワーカーがキューから取り出して AI レビューを GitHub と Discord に投稿する
+/health で死活、/metrics でキューの深さ・待ち時間・レビュー所要時間・GitHub API のレート制限の状態を返す
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+# コードレビュー Bot のモジュールを使う
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bots', 'code_reviewer'))
+from ai_reviewer import AICodeReviewer
+from diff_filter import DiffFilter
+from github_client import GitHubClient
+from github_scheduler import get_scheduler
+from review_findings import Finding, build_review_payload, format_counts, format_digest
+from review_queue import ReviewQueue
+from review_store import ReviewStore, review_incrementally
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# レビューする pull_request イベントの action
+REVIEW_ACTIONS = {'opened', 'synchronize', 'reopened', 'ready_for_review'}
+
+class WebhookServerConfig:
+    """Webhook サーバーの設定"""
+    def __init__(self):
+        self.secret = os.getenv('GITHUB_SECRET') or os.getenv('GITHUB_WEBHOOK_SECRET')
+        self.port = int(os.getenv('WEBHOOK_PORT', '8080'))
+        self.github_token = os.getenv('GITHUB_TOKEN')
+        self.github_api_url = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+        # レート制限の解除をこれ以上待つ必要があればジョブを失敗にしてキューの再試行に任せる (秒)
+        self.github_max_rate_limit_wait = float(os.getenv('WEBHOOK_MAX_RATE_LIMIT_WAIT', '300'))
+        self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        self.discord_webhook_url = os.getenv('DISCORD_WEBHOOK_URL')
+        # カンマ区切りの owner/name (空なら全リポジトリ)
+        self.allowed_repos = {r.strip() for r in os.getenv('WEBHOOK_ALLOWED_REPOS', '').split(',') if r.strip()}
+        self.queue_db = os.getenv('REVIEW_QUEUE_DB', 'review_queue.db')
+        self.review_store_db = os.getenv('REVIEW_STORE_DB', 'code_reviews.db')
+        self.review_store_max_age_days = float(os.getenv('REVIEW_STORE_MAX_AGE_DAYS', '90'))
+        self.workers = int(os.getenv('REVIEW_WORKERS', '2'))
+        # 終了してからこの日数が経ったジョブはキューから削除する
+        self.job_max_age_days = float(os.getenv('REVIEW_JOB_MAX_AGE_DAYS', '30'))
+        self.debounce_seconds = float(os.getenv('WEBHOOK_DEBOUNCE_SECONDS', '10'))
+        self.review_chunk_tokens = int(os.getenv('REVIEW_CHUNK_TOKENS', '4000'))
+        self.review_reduce_tokens = int(os.getenv('REVIEW_REDUCE_TOKENS', '5000'))
+        self.review_max_concurrency = int(os.getenv('REVIEW_MAX_CONCURRENCY', '4'))
+        self.review_max_chunks = int(os.getenv('REVIEW_MAX_CHUNKS', '20'))
+        self.diff_exclude_globs = [p.strip() for p in os.getenv('DIFF_EXCLUDE_GLOBS', '').split(',') if p.strip()]
+        self.diff_max_hunk_lines = int(os.getenv('DIFF_MAX_HUNK_LINES', '400'))
+        self.diff_max_file_lines = int(os.getenv('DIFF_MAX_FILE_LINES', '3000'))
+        self.diff_max_line_length = int(os.getenv('DIFF_MAX_LINE_LENGTH', '1000'))
+        self.diff_filter_mode = os.getenv('DIFF_FILTER_MODE', 'summarize')
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """X-Hub-Signature-256 (sha256=<HMAC-SHA256 の16進>) を検証"""
+    if not secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+class ReviewWorkerPool:
+    """キューを取り出してレビューを実行する上限付きのワーカー"""
+
+    def __init__(self, queue: ReviewQueue, run_job: Callable[[Dict], Awaitable[Optional[str]]],
+                 concurrency: int = 2, poll_interval: float = 5.0, job_max_age_days: float = 30,
+                 prune_interval: float = 3600):
+        # run_job はレビューした head SHA を返す (失敗時は例外)
+        self.queue = queue
+        self.run_job = run_job
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.job_max_age_days = job_max_age_days
+        self.prune_interval = prune_interval
+        self.busy = 0
+        self.stats = {
+            'processed': 0,
+            'failed': 0,
+            'retried': 0,
+            'pruned': 0,
+            'last_wait_seconds': 0.0,
+            'last_latency_seconds': 0.0,
+        }
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """ワーカーを起動"""
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._pruner()))
+
+    async def stop(self):
+        """ワーカーを止める (実行中のジョブは次回起動時に recover で再開される)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """新しいジョブが入ったことを待機中のワーカーに知らせる"""
+        self._wakeup.set()
+
+    async def _sleep_until_due(self):
+        """次のジョブの実行時刻か通知まで待つ"""
+        due = self.queue.next_due_in()
+        timeout = self.poll_interval if due is None else min(self.poll_interval, max(due, 0.05))
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _pruner(self):
+        """終了したジョブを起動時と prune_interval 秒ごとに削除"""
+        while True:
+            try:
+                pruned = self.queue.prune(self.job_max_age_days)
+                self.stats['pruned'] += pruned
+                if pruned:
+                    logger.info(f'{pruned} 件の終了したジョブを削除しました')
+            except Exception as e:
+                logger.error(f'ジョブの削除に失敗: {e}')
+            await asyncio.sleep(self.prune_interval)
+
+    async def _worker(self, index: int):
+        """ジョブを1件ずつ処理"""
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                await self._sleep_until_due()
+                continue
+
+            self.busy += 1
+            started = time.monotonic()
+            try:
+                head_sha = await self.run_job(job)
+                self.queue.complete(job['id'], head_sha)
+                self.stats['processed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                if self.queue.fail(job['id'], error):
+                    self.stats['retried'] += 1
+                else:
+                    self.stats['failed'] += 1
+                logger.error(f"レビュー失敗: {job['repo']}#{job['pr_number']} {error}")
+            finally:
+                self.busy -= 1
+                latency = time.monotonic() - started
+                self.stats['last_wait_seconds'] = job['wait_seconds']
+                self.stats['last_latency_seconds'] = latency
+                logger.info(
+                    f"ワーカー {index}: {job['repo']}#{job['pr_number']} "
+                    f"待ち {job['wait_seconds']:.1f}s, レビュー {latency:.1f}s (まとめた push {job['collapsed']})"
+                )
+                # 同じ PR の次のジョブを待っているワーカーを起こす
+                self._wakeup.set()
+
+    def snapshot(self) -> Dict:
+        """現在の状態"""
+        return {**self.stats, 'workers': self.concurrency, 'busy': self.busy}
+
+class PullRequestReviewRunner:
+    """1件のジョブを GitHub から取得してレビューし、GitHub と Discord に投稿する"""
+
+    def __init__(self, config: WebhookServerConfig, reviewer: AICodeReviewer, store: ReviewStore):
+        self.config = config
+        self.reviewer = reviewer
+        self.store = store
+        self.clients: Dict[str, GitHubClient] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def client_for(self, repo: str) -> GitHubClient:
+        """リポジトリごとの GitHub クライアント (接続プールと ETag キャッシュを使い回す)"""
+        if repo not in self.clients:
+            owner, name = repo.split('/', 1)
+            # 全リポジトリのクライアントが同じトークンのレート制限をスケジューラーで共有する
+            self.clients[repo] = GitHubClient(self.config.github_token, owner, name,
+                                              api_url=self.config.github_api_url,
+                                              max_rate_limit_wait=self.config.github_max_rate_limit_wait)
+        return self.clients[repo]
+
+    async def close(self):
+        """セッションを閉じる"""
+        for client in self.clients.values():
+            await client.close()
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def __call__(self, job: Dict) -> Optional[str]:
+        """ジョブを実行してレビューした head SHA を返す"""
+        pr = self.client_for(job['repo']).open_pull_request(job['pr_number'])
+        try:
+            # イベント後にさらに push されていれば PR の最新の head をレビューする
+            pull, diff, gitattributes = await asyncio.gather(pr.pull(), pr.diff(), pr.file_text('.gitattributes'))
+            if pull['state'] != 'open' or pull.get('draft'):
+                logger.info(f"クローズ済みまたはドラフトのためスキップ: {job['repo']}#{job['pr_number']}")
+                return None
+            info = await pr.info()
+            if not diff:
+                return info['head_sha']
+
+            result = await review_incrementally(
+                self.reviewer.engine, self.store, job['repo'], job['pr_number'], info['head_sha'],
+                diff, info, self.reviewer.REVIEW_INSTRUCTIONS,
+                diff_filter=self.reviewer.diff_filter.with_gitattributes(gitattributes)
+            )
+            if result['cached'] and result['previous_head_sha'] == info['head_sha']:
+                logger.info(f"レビュー済みの head のためスキップ: {job['repo']}#{job['pr_number']}")
+                return info['head_sha']
+
+            await pr.post_review(self.format_review(result, diff))
+            await self.notify_discord(info, result)
+            return info['head_sha']
+        finally:
+            pr.close()
+
+    @staticmethod
+    def format_review(result: Dict, diff: str) -> Dict:
+        """GitHub に1回で投稿するレビューの本文と行コメント (build_review_payload の結果)"""
+        notes = []
+        if result.get('reused_files'):
+            notes.append(f"> ♻️ パッチに変更が無いため前回の指摘を再利用: {', '.join(result['reused_files'][:30])}")
+        if result.get('omitted_files'):
+            notes.append(f"> ℹ️ 分量の上限により未レビュー: {', '.join(result['omitted_files'][:30])}")
+        dropped = (result.get('filter') or {}).get('dropped')
+        if dropped:
+            notes.append(f"> ✂️ 生成ファイル・ロックファイルなどのため対象外: {', '.join(d['path'] for d in dropped[:30])}")
+        findings = [Finding.from_dict(f) for f in result.get('findings', [])]
+        return build_review_payload(
+            result['review'], findings, diff, notes,
+            header='## 🤖 AI Code Review',
+            footer='---\n*このレビューは AI によって自動生成されました。参考程度にご利用ください。*'
+        )
+
+    async def notify_discord(self, info: Dict, result: Dict):
+        """Discord Webhook にレビュー完了を通知 (失敗してもジョブは成功扱い)"""
+        if not self.config.discord_webhook_url:
+            return
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        review = result['review']
+        findings = [Finding.from_dict(f) for f in result.get('findings', [])]
+        # embed 全体の上限 (6000 文字) に収まるように講評とダイジェストの文字数を分ける
+        fields, omitted = format_digest(findings, max_total_chars=2800)
+        description = f"**指摘**: {format_counts(findings)}\n\n"
+        description += review if len(review) <= 1500 else review[:1499] + '…'
+        if omitted or len(review) > 1500:
+            description += f"\n\n全ての指摘は [PR のレビュー]({info['url']}) を参照してください"
+        embed = {
+            'title': f"🔍 コードレビュー: #{info['number']} {info['title'][:100]}",
+            'url': info['url'],
+            'description': description,
+            'fields': [{'name': name, 'value': value, 'inline': False} for name, value in fields],
+            'color': 0x3498DB,
+            'footer': {'text': f"{result['files_reviewed']}/{result['files_total']} ファイルをレビュー"
+                               f" | 再利用 {len(result.get('reused_files', []))}"},
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            async with self._session.post(self.config.discord_webhook_url, json={'embeds': [embed]}) as response:
+                if response.status >= 400:
+                    logger.warning(f'Discord 通知エラー: HTTP {response.status}')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f'Discord 通知エラー: {e}')
+
+class WebhookServer:
+    """署名を検証して pull_request イベントをキューに入れる HTTP サーバー"""
+
+    def __init__(self, secret: str, queue: ReviewQueue, pool: ReviewWorkerPool,
+                 allowed_repos: Optional[set] = None, debounce_seconds: float = 0.0):
+        self.secret = secret
+        self.queue = queue
+        self.pool = pool
+        self.allowed_repos = allowed_repos or set()
+        self.debounce_seconds = debounce_seconds
+        self.stats = {'received': 0, 'rejected': 0, 'enqueued': 0, 'collapsed': 0, 'ignored': 0}
+
+    def create_app(self) -> web.Application:
+        """aiohttp アプリケーションを作成"""
+        app = web.Application(client_max_size=5 * 1024 * 1024)
+        app.router.add_post('/webhook', self.handle_webhook)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app: web.Application):
+        """中断されたジョブを戻してワーカーを起動"""
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info(f'{recovered} 件の中断されたジョブを再開します')
+        self.pool.start()
+
+    async def on_cleanup(self, app: web.Application):
+        """ワーカーを止める"""
+        await self.pool.stop()
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        """GitHub からのイベントを受信"""
+        body = await request.read()
+        self.stats['received'] += 1
+        if not verify_signature(self.secret, body, request.headers.get('X-Hub-Signature-256')):
+            self.stats['rejected'] += 1
+            return web.json_response({'error': 'invalid signature'}, status=401)
+
+        event = request.headers.get('X-GitHub-Event')
+        if event == 'ping':
+            return web.json_response({'ok': True})
+        if event != 'pull_request':
+            self.stats['ignored'] += 1
+            return web.json_response({'ignored': event}, status=202)
+
+        try:
+            payload = json.loads(body)
+            action = payload['action']
+            pull = payload['pull_request']
+            repo = payload['repository']['full_name']
+            pr_number = int(pull['number'])
+            head_sha = pull['head']['sha']
+        except (ValueError, KeyError, TypeError):
+            self.stats['rejected'] += 1
+            return web.json_response({'error': 'invalid payload'}, status=400)
+
+        if action not in REVIEW_ACTIONS or pull.get('draft') or (
+                self.allowed_repos and repo not in self.allowed_repos):
+            self.stats['ignored'] += 1
+            return web.json_response({'ignored': action}, status=202)
+
+        job = self.queue.enqueue(
+            repo, pr_number, head_sha, event_updated_at=pull.get('updated_at'),
+            delivery_id=request.headers.get('X-GitHub-Delivery'), delay=self.debounce_seconds
+        )
+        self.stats['collapsed' if job['collapsed'] else 'enqueued'] += 1
+        self.pool.notify()
+        logger.info(f"ジョブ{'を更新' if job['collapsed'] else 'を追加'}: {repo}#{pr_number} {head_sha[:7]} ({action})")
+        return web.json_response({'job_id': job['id'], 'collapsed': job['collapsed']}, status=202)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """死活確認"""
+        return web.json_response({'ok': True})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """キュー・ワーカー・受信数・GitHub API のレート制限のメトリクス"""
+        return web.json_response({
+            'queue': self.queue.get_stats(),
+            'workers': self.pool.snapshot(),
+            'webhooks': dict(self.stats),
+            'github': get_scheduler().snapshot(),
+        })
+
+def main():
+    """メイン実行関数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = WebhookServerConfig()
+    if not all([config.secret, config.github_token, config.openai_api_key]):
+        logger.error('GITHUB_SECRET / GITHUB_TOKEN / OPENAI_API_KEY が設定されていません')
+        sys.exit(1)
+
+    queue = ReviewQueue(sqlite3.connect(config.queue_db))
+    store = ReviewStore(sqlite3.connect(config.review_store_db))
+    pruned = store.prune(config.review_store_max_age_days)
+    if pruned:
+        logger.info(f'{pruned} 件の PR のレビュー結果を削除しました')
+    reviewer = AICodeReviewer(
+        config.openai_api_key,
+        chunk_token_budget=config.review_chunk_tokens,
+        reduce_token_budget=config.review_reduce_tokens,
+        max_concurrency=config.review_max_concurrency,
+        max_chunks=config.review_max_chunks,
+        store=store,
+        diff_filter=DiffFilter(
+            config.diff_exclude_globs,
+            max_hunk_lines=config.diff_max_hunk_lines,
+            max_file_lines=config.diff_max_file_lines,
+            max_line_length=config.diff_max_line_length,
+            mode=config.diff_filter_mode
+        )
+    )
+    runner = PullRequestReviewRunner(config, reviewer, store)
+    pool = ReviewWorkerPool(queue, runner, concurrency=config.workers, job_max_age_days=config.job_max_age_days)
+    server = WebhookServer(config.secret, queue, pool, allowed_repos=config.allowed_repos,
+                           debounce_seconds=config.debounce_seconds)
+
+    app = server.create_app()
+
+    async def close_runner(app):
+        await runner.close()
+
+    app.on_cleanup.append(close_runner)
+    web.run_app(app, port=config.port)
+
+if __name__ == '__main__':
+    main()